@@ -19,7 +19,11 @@ import calendar
 import secrets
 import hashlib
 import queue
+import struct
+import zlib
 import heapq
+import bisect
+import math
 import signal
 import socket
 import sys
@@ -36,7 +40,7 @@ from telebot.types import InputMediaDocument, InputMediaPhoto, InputMediaVideo,
 from flask import Flask, request
 
 
-from collections import defaultdict, deque
+from collections import OrderedDict, defaultdict, deque
 from contextlib import contextmanager
 from pathlib import Path
 
@@ -50,45 +54,207 @@ except Exception:
 
 window_locks = defaultdict(threading.Lock)
 
+# v199: компактная гистограмма задержек (фиксированные корзины в мс).
+# Хранит только счётчики, поэтому годится для горячих путей: Telegram limiter,
+# очереди задач. Перцентили считаются по верхней границе корзины.
+class LatencyHistogram:
+    BOUNDS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.BOUNDS_MS) + 1)
+        self._total = 0
+        self._sum_ms = 0.0
+        self._max_ms = 0.0
+
+    def observe(self, seconds: float):
+        ms = max(0.0, float(seconds or 0.0) * 1000.0)
+        idx = len(self.BOUNDS_MS)
+        for i, bound in enumerate(self.BOUNDS_MS):
+            if ms <= bound:
+                idx = i
+                break
+        with self._lock:
+            self._counts[idx] += 1
+            self._total += 1
+            self._sum_ms += ms
+            if ms > self._max_ms:
+                self._max_ms = ms
+
+    def percentile(self, q: float) -> float:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._total
+            max_ms = self._max_ms
+        if total <= 0:
+            return 0.0
+        need = max(1, int(total * float(q) + 0.999999))
+        seen = 0
+        for i, c in enumerate(counts):
+            seen += c
+            if seen >= need:
+                return min(float(self.BOUNDS_MS[i]), max_ms) if i < len(self.BOUNDS_MS) else max_ms
+        return max_ms
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self._total
+            avg = (self._sum_ms / total) if total else 0.0
+            max_ms = self._max_ms
+            labels = [f"<={b}" for b in self.BOUNDS_MS] + [f">{self.BOUNDS_MS[-1]}"]
+            buckets = {label: c for label, c in zip(labels, self._counts) if c}
+        return {
+            "count": total,
+            "avg_ms": round(avg, 2),
+            "max_ms": round(max_ms, 2),
+            "p50_ms": self.percentile(0.50),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "buckets": buckets,
+        }
+
+    def short_text(self) -> str:
+        snap = self.snapshot()
+        return f"n={snap['count']} p50≤{snap['p50_ms']:.0f}ms p95≤{snap['p95_ms']:.0f}ms p99≤{snap['p99_ms']:.0f}ms max={snap['max_ms']:.0f}ms"
+
+
 # ─────────────────────────────────────────────────────────────
 # Ограниченные очереди с сохранением порядка внутри одного чата
 # ─────────────────────────────────────────────────────────────
 # KeyedTaskPool выполняет задачи разных чатов параллельно, но задачи одного
 # chat_id/source_chat_id всегда идут строго по порядку. Это не даёт 100 активным
 # чатам создавать сотни бесконтрольных потоков.
+# v199: внутри линии задачи имеют приоритет 0..3 (0 — самый важный, как классы v178),
+# порядок одного ключа сохраняется всегда. Ключ, ждущий дольше POOL_PRIORITY_AGING_SECONDS,
+# обгоняет более приоритетные, чтобы фоновая работа не голодала. Простаивающая
+# линия-донор может одолжить воркер перегруженной линии (lend_to).
+POOL_PRIORITY_LEVELS = 4
+POOL_DEFAULT_PRIORITY = 1
+try:
+    POOL_PRIORITY_AGING_SECONDS = max(0.1, min(120.0, float(os.getenv("POOL_PRIORITY_AGING_SECONDS", "3") or "3")))
+except Exception:
+    POOL_PRIORITY_AGING_SECONDS = 3.0
+POOL_WORK_STEALING = str(os.getenv("POOL_WORK_STEALING", "1")).strip().lower() in {"1", "true", "yes", "y", "on", "да"}
+
+
 class KeyedTaskPool:
-    def __init__(self, name: str, workers: int = 4, max_pending: int = 1000):
+    def __init__(self, name: str, workers: int = 4, max_pending: int = 1000,
+                 priority_rules: dict | None = None, slo_wait_ms: float | None = None):
         self.name = str(name)
         self.workers = max(1, int(workers))
         self.max_pending = max(10, int(max_pending))
-        self._ready = queue.Queue()
-        self._lock = threading.RLock()
+        self._cv = threading.Condition(threading.RLock())
+        self._lock = self._cv
+        # Готовые ключи по уровням приоритета: (key, ready_since).
+        self._ready = [deque() for _ in range(POOL_PRIORITY_LEVELS)]
+        self._ready_count = 0
         self._by_key = defaultdict(deque)
         self._active_keys = set()
         self._pending = 0
         self._active_workers = 0
+        self._borrowed_active = 0
         self._submitted = 0
         self._completed = 0
         self._failed = 0
         self._rejected = 0
+        self._aged = 0
+        self._by_priority = [0] * POOL_PRIORITY_LEVELS
         self._max_wait = 0.0
         self._last_error = ""
+        self._priority_rules = []
+        self.set_priority_rules(priority_rules or {})
+        self.slo_wait_ms = float(slo_wait_ms) if slo_wait_ms else None
+        self._wait_hist = LatencyHistogram()
+        self._run_hist = LatencyHistogram()
+        # Work stealing: кому эта линия одалживает воркеры и кто одалживает ей.
+        self._recipients = []
+        self._donors = []
+        self._lend_max = 0
+        self._lent = 0
+        self._lent_total = 0
+        self._borrowed_total = 0
         for idx in range(self.workers):
             t = threading.Thread(target=self._worker, name=f"{self.name}-{idx+1}", daemon=True)
             t.start()
 
+    # --- priorities ----------------------------------------------------------------------
+    def set_priority_rules(self, rules: dict):
+        """``{key_prefix: priority}``; the longest matching prefix wins, others get the default."""
+        parsed = []
+        for prefix, prio in dict(rules or {}).items():
+            parsed.append((str(prefix), max(0, min(POOL_PRIORITY_LEVELS - 1, int(prio)))))
+        parsed.sort(key=lambda item: -len(item[0]))
+        with self._lock:
+            self._priority_rules = parsed
+
+    def priority_for(self, key) -> int:
+        key = str(key)
+        for prefix, prio in self._priority_rules:
+            if key.startswith(prefix):
+                return prio
+        return POOL_DEFAULT_PRIORITY
+
+    def _push_ready_locked(self, key: str):
+        q = self._by_key.get(key)
+        prio = q[0][4] if q else POOL_DEFAULT_PRIORITY
+        self._ready[prio].append((key, time.time()))
+        self._ready_count += 1
+        self._cv.notify()
+
+    def _pop_ready_locked(self):
+        if not self._ready_count:
+            return None
+        now_ts = time.time()
+        level = None
+        oldest = None
+        for prio, dq in enumerate(self._ready):
+            if not dq:
+                continue
+            if level is None:
+                level = prio
+            elif now_ts - dq[0][1] >= POOL_PRIORITY_AGING_SECONDS and (oldest is None or dq[0][1] < oldest):
+                # Старение: ключ нижнего уровня ждёт слишком долго.
+                level, oldest = prio, dq[0][1]
+        if oldest is not None:
+            self._aged += 1
+        key, _since = self._ready[level].popleft()
+        self._ready_count -= 1
+        return key
+
+    # --- submit --------------------------------------------------------------------------
+    def _enqueue_locked(self, key: str, prio: int, func, args, kwargs):
+        self._by_key[key].append((func, args, kwargs, time.time(), prio))
+        self._pending += 1
+        self._submitted += 1
+        self._by_priority[prio] += 1
+        if key not in self._active_keys:
+            self._active_keys.add(key)
+            self._push_ready_locked(key)
+            return self._donors and self._saturated_locked()
+        return False
+
+    def _saturated_locked(self) -> bool:
+        return bool(self._ready_count) and self._active_workers - self._borrowed_active >= self.workers
+
+    def _wake_donors(self):
+        for donor in self._donors:
+            with donor._cv:
+                donor._cv.notify()
+
     def submit(self, key, func, *args, **kwargs) -> bool:
+        return self.submit_priority(self.priority_for(key), key, func, *args, **kwargs)
+
+    def submit_priority(self, priority: int, key, func, *args, **kwargs) -> bool:
+        """submit() with an explicit priority 0..3 (0 runs first); per-key order is unchanged."""
         key = str(key)
+        prio = max(0, min(POOL_PRIORITY_LEVELS - 1, int(priority)))
         with self._lock:
             if self._pending >= self.max_pending:
                 self._rejected += 1
                 return False
-            self._by_key[key].append((func, args, kwargs, time.time()))
-            self._pending += 1
-            self._submitted += 1
-            if key not in self._active_keys:
-                self._active_keys.add(key)
-                self._ready.put(key)
+            wake = self._enqueue_locked(key, prio, func, args, kwargs)
+        if wake:
+            self._wake_donors()
         return True
 
     def submit_unique(self, key, func, *args, **kwargs) -> bool:
@@ -105,11 +271,9 @@ class KeyedTaskPool:
             if self._pending >= self.max_pending:
                 self._rejected += 1
                 return False
-            self._by_key[key].append((func, args, kwargs, time.time()))
-            self._pending += 1
-            self._submitted += 1
-            self._active_keys.add(key)
-            self._ready.put(key)
+            wake = self._enqueue_locked(key, self.priority_for(key), func, args, kwargs)
+        if wake:
+            self._wake_donors()
         return True
 
     def key_status(self, key) -> dict:
@@ -122,51 +286,127 @@ class KeyedTaskPool:
                 "queued": len(q) if q else 0,
             }
 
+    # --- work stealing -------------------------------------------------------------------
+    def lend_to(self, recipient: "KeyedTaskPool", max_workers: int = 1):
+        """Let up to ``max_workers`` idle workers of this lane run ready keys of ``recipient``.
+
+        Only a key already popped from the recipient's ready queue is borrowed, so a key
+        is still executed by one worker at a time and keeps its order.
+        """
+        if recipient is self:
+            return
+        with self._lock:
+            if recipient not in self._recipients:
+                self._recipients.append(recipient)
+            self._lend_max = max(self._lend_max, max(1, min(self.workers, int(max_workers))))
+        with recipient._lock:
+            if self not in recipient._donors:
+                recipient._donors.append(self)
+        with self._cv:
+            self._cv.notify_all()
+
+    def _steal_ready(self):
+        with self._lock:
+            if not self._saturated_locked():
+                return None
+            key = self._pop_ready_locked()
+            if key is None:
+                return None
+            self._borrowed_active += 1
+            self._borrowed_total += 1
+            return key
+
+    def _next_job(self):
+        """(pool, key): own ready key first, otherwise a key borrowed from a saturated recipient."""
+        while True:
+            with self._cv:
+                key = self._pop_ready_locked()
+                if key is not None:
+                    return self, key
+                can_lend = POOL_WORK_STEALING and self._recipients and self._lent < self._lend_max
+                if not can_lend:
+                    self._cv.wait()
+                    continue
+                self._lent += 1
+            for recipient in list(self._recipients):
+                key = recipient._steal_ready()
+                if key is not None:
+                    with self._cv:
+                        self._lent_total += 1
+                    return recipient, key
+            with self._cv:
+                self._lent -= 1
+                if not self._ready_count:
+                    # Таймаут страхует от пропущенного notify между проверкой и ожиданием.
+                    self._cv.wait(0.5)
+
     def _worker(self):
         while True:
-            key = self._ready.get()
-            task = None
+            pool, key = self._next_job()
+            try:
+                pool._run_key(key, borrowed=pool is not self)
+            finally:
+                if pool is not self:
+                    with self._cv:
+                        self._lent = max(0, self._lent - 1)
+
+    def _run_key(self, key: str, borrowed: bool = False):
+        task = None
+        wake = False
+        with self._lock:
+            q = self._by_key.get(key)
+            if q:
+                task = q.popleft()
+                self._active_workers += 1
+                wake = bool(self._donors) and self._saturated_locked()
+            else:
+                self._active_keys.discard(key)
+                self._by_key.pop(key, None)
+                if borrowed:
+                    self._borrowed_active = max(0, self._borrowed_active - 1)
+        if task is None:
+            return
+        if wake:
+            # Все свои воркеры заняты, а готовые ключи ещё есть — зовём доноров.
+            self._wake_donors()
+        func, args, kwargs, enqueued_at, _prio = task
+        wait = max(0.0, time.time() - enqueued_at)
+        self._wait_hist.observe(wait)
+        with self._lock:
+            self._max_wait = max(self._max_wait, wait)
+        started = time.perf_counter()
+        try:
+            func(*args, **kwargs)
+            with self._lock:
+                self._completed += 1
+        except Exception as exc:
+            with self._lock:
+                self._failed += 1
+                self._last_error = str(exc)[:300]
+            try:
+                log_error(f"POOL {self.name}: {exc}")
+            except Exception:
+                logging.exception("POOL %s", self.name)
+        finally:
+            self._run_hist.observe(time.perf_counter() - started)
+            wake = False
             with self._lock:
+                self._pending = max(0, self._pending - 1)
+                self._active_workers = max(0, self._active_workers - 1)
+                if borrowed:
+                    self._borrowed_active = max(0, self._borrowed_active - 1)
                 q = self._by_key.get(key)
                 if q:
-                    task = q.popleft()
-                    self._active_workers += 1
+                    self._push_ready_locked(key)
+                    wake = bool(self._donors) and self._saturated_locked()
                 else:
-                    self._active_keys.discard(key)
                     self._by_key.pop(key, None)
-            if task is None:
-                self._ready.task_done()
-                continue
-            func, args, kwargs, enqueued_at = task
-            wait = max(0.0, time.time() - enqueued_at)
-            with self._lock:
-                self._max_wait = max(self._max_wait, wait)
-            try:
-                func(*args, **kwargs)
-                with self._lock:
-                    self._completed += 1
-            except Exception as exc:
-                with self._lock:
-                    self._failed += 1
-                    self._last_error = str(exc)[:300]
-                try:
-                    log_error(f"POOL {self.name}: {exc}")
-                except Exception:
-                    logging.exception("POOL %s", self.name)
-            finally:
-                with self._lock:
-                    self._pending = max(0, self._pending - 1)
-                    self._active_workers = max(0, self._active_workers - 1)
-                    q = self._by_key.get(key)
-                    if q:
-                        self._ready.put(key)
-                    else:
-                        self._by_key.pop(key, None)
-                        self._active_keys.discard(key)
-                # Drop references to Telegram updates / media payloads immediately instead
-                # of keeping them alive in worker locals until the next task arrives.
-                task = func = args = kwargs = None
-                self._ready.task_done()
+                    self._active_keys.discard(key)
+            # Drop references to Telegram updates / media payloads immediately instead
+            # of keeping them alive in worker locals until the next task arrives.
+            task = func = args = kwargs = None
+            if wake:
+                self._wake_donors()
 
     def wait_key_idle(self, key, timeout: float = 15.0) -> bool:
         """Wait until all already-submitted tasks for one logical key finish.
@@ -186,9 +426,22 @@ class KeyedTaskPool:
                 return False
             time.sleep(0.02)
 
+    def latency_stats(self) -> dict:
+        wait = self._wait_hist.snapshot()
+        run = self._run_hist.snapshot()
+        out = {
+            "wait_p50_ms": wait["p50_ms"], "wait_p95_ms": wait["p95_ms"], "wait_p99_ms": wait["p99_ms"],
+            "run_p50_ms": run["p50_ms"], "run_p95_ms": run["p95_ms"], "run_p99_ms": run["p99_ms"],
+            "run_max_ms": run["max_ms"],
+        }
+        if self.slo_wait_ms:
+            out["slo_wait_ms"] = self.slo_wait_ms
+            out["slo_ok"] = bool(wait["p95_ms"] <= self.slo_wait_ms)
+        return out
+
     def stats(self) -> dict:
         with self._lock:
-            return {
+            row = {
                 "name": self.name,
                 "workers": self.workers,
                 "active": self._active_workers,
@@ -200,7 +453,15 @@ class KeyedTaskPool:
                 "rejected": self._rejected,
                 "max_wait": round(self._max_wait, 3),
                 "last_error": self._last_error,
+                "ready_by_priority": [len(dq) for dq in self._ready],
+                "submitted_by_priority": list(self._by_priority),
+                "aged": self._aged,
+                "borrowed": self._borrowed_total,
+                "borrowed_active": self._borrowed_active,
+                "lent": self._lent_total,
             }
+        row.update(self.latency_stats())
+        return row
 
 
 class DelayedTaskScheduler:
@@ -266,6 +527,7 @@ class DelayedTaskScheduler:
     def stats(self):
         with self._cv:
             return {
+                "backend": "heap",
                 "scheduled": len(self._deadlines),
                 "heap": len(self._heap),
                 "submitted": self._submitted,
@@ -313,6 +575,246 @@ class DelayedTaskScheduler:
                 self._executed += 1
 
 
+# v199: иерархическое колесо таймеров. Перепланирование ключа (автозакрытие окон,
+# панели баланса, обратные отсчёты) — O(1): запись переносится между слотами, без
+# новых элементов в heap и без периодической пересборки. DELAYED_SCHEDULER_BACKEND=heap
+# возвращает прежний heap-планировщик.
+DELAYED_SCHEDULER_BACKEND = str(os.getenv("DELAYED_SCHEDULER_BACKEND", "wheel") or "wheel").strip().lower()
+try:
+    DELAYED_WHEEL_TICK_MS = max(1, min(100, int(os.getenv("DELAYED_WHEEL_TICK_MS", "10") or "10")))
+except Exception:
+    DELAYED_WHEEL_TICK_MS = 10
+
+
+class TimingWheelScheduler:
+    """Hierarchical timing wheel with the DelayedTaskScheduler API.
+
+    Level 0 has 256 slots of one tick; levels 1..3 have 64 slots, each covering a
+    whole rotation of the level below (10 ms ticks: 2.56 s, 2.7 min, 2.9 h, 7.8 days).
+    Longer timers wait in an overflow bucket.  Every slot is a dict keyed by timer
+    key, so schedule/cancel/reschedule move one entry in O(1); slots are cascaded
+    down when the lower level wraps, as in the classic kernel timer wheel.
+    """
+
+    L0_BITS = 8
+    LN_BITS = 6
+    LEVELS = 4
+
+    def __init__(self, executor_pool: KeyedTaskPool, tick_ms: int = 10):
+        self.executor_pool = executor_pool
+        self.tick = max(0.001, float(tick_ms) / 1000.0)
+        self._cv = threading.Condition(threading.RLock())
+        self._l0_mask = (1 << self.L0_BITS) - 1
+        self._ln_mask = (1 << self.LN_BITS) - 1
+        self._wheel = [[{} for _ in range(1 << self.L0_BITS)]] + [
+            [{} for _ in range(1 << self.LN_BITS)] for _ in range(self.LEVELS - 1)
+        ]
+        self._overflow = {}
+        # key -> [tick, run_at, seq, func, args, kwargs, slot_dict]
+        self._entries = {}
+        self._due = []
+        # key -> seq уже сработавшего таймера, пока он передаётся в executor.
+        self._inflight = {}
+        self._current_tick = int(time.time() / self.tick)
+        # Тик, до которого спит поток колеса: более поздние таймеры его не будят.
+        self._wake_tick = 0
+        self._seq = 0
+        self._submitted = 0
+        self._rescheduled = 0
+        self._executed = 0
+        self._cancelled = 0
+        self._cascaded = 0
+        self._failed_dispatch = 0
+        threading.Thread(target=self._worker, name=f"{self.executor_pool.name}-scheduler", daemon=True).start()
+
+    def _slot_for_locked(self, tick: int):
+        delta = tick - self._current_tick
+        if delta < 0:
+            return None
+        if delta < (1 << self.L0_BITS):
+            return self._wheel[0][tick & self._l0_mask]
+        for level in range(1, self.LEVELS):
+            shift = self.L0_BITS + self.LN_BITS * level
+            if delta < (1 << shift):
+                return self._wheel[level][(tick >> (shift - self.LN_BITS)) & self._ln_mask]
+        return self._overflow
+
+    def _place_locked(self, key: str, entry: list):
+        slot = self._slot_for_locked(entry[0])
+        if slot is None:
+            entry[6] = None
+            self._due.append((key, entry))
+            return
+        entry[6] = slot
+        slot[key] = entry
+
+    def _unlink_locked(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[6] is not None:
+            entry[6].pop(key, None)
+        elif entry is not None:
+            self._due = [(k, e) for k, e in self._due if e is not entry]
+        return entry
+
+    def compact(self) -> int:
+        """API compatibility with the heap scheduler: the wheel never keeps stale entries."""
+        return 0
+
+    def schedule(self, key, delay: float, func, *args, **kwargs):
+        key = str(key)
+        run_at = time.time() + max(0.0, float(delay or 0))
+        with self._cv:
+            self._seq += 1
+            old = self._unlink_locked(key)
+            if old is not None:
+                self._rescheduled += 1
+            self._inflight.pop(key, None)
+            tick = int(-(-run_at // self.tick))
+            entry = [tick, run_at, self._seq, func, args, kwargs, None]
+            self._entries[key] = entry
+            self._place_locked(key, entry)
+            self._submitted += 1
+            if tick < self._wake_tick or entry[6] is None:
+                self._wake_tick = tick
+                self._cv.notify_all()
+        return run_at
+
+    def cancel(self, key):
+        key = str(key)
+        with self._cv:
+            self._inflight.pop(key, None)
+            if self._unlink_locked(key) is not None:
+                self._cancelled += 1
+
+    def deadline(self, key):
+        with self._cv:
+            entry = self._entries.get(str(key))
+            return entry[1] if entry is not None else None
+
+    def stats(self):
+        with self._cv:
+            return {
+                "backend": "wheel",
+                "scheduled": len(self._entries),
+                "overflow": len(self._overflow),
+                "tick_ms": round(self.tick * 1000.0, 3),
+                "submitted": self._submitted,
+                "rescheduled": self._rescheduled,
+                "cascaded": self._cascaded,
+                "executed": self._executed,
+                "cancelled": self._cancelled,
+                "dispatch_failed": self._failed_dispatch,
+            }
+
+    def _cascade_locked(self, tick: int):
+        """At a level-0 wrap move the next slot of each upper level one level down."""
+        for level in range(1, self.LEVELS):
+            shift = self.L0_BITS + self.LN_BITS * (level - 1)
+            idx = (tick >> shift) & self._ln_mask
+            slot = self._wheel[level][idx]
+            if slot:
+                moved = list(slot.items())
+                slot.clear()
+                for key, entry in moved:
+                    self._place_locked(key, entry)
+                self._cascaded += len(moved)
+            if idx:
+                return
+        if self._overflow:
+            moved = list(self._overflow.items())
+            self._overflow.clear()
+            for key, entry in moved:
+                self._place_locked(key, entry)
+
+    def _advance_locked(self, now_tick: int):
+        if not self._entries:
+            self._current_tick = max(self._current_tick, now_tick + 1)
+            return
+        while self._current_tick <= now_tick:
+            t = self._current_tick
+            if not (t & self._l0_mask):
+                self._cascade_locked(t)
+            slot = self._wheel[0][t & self._l0_mask]
+            if slot:
+                expired = list(slot.items())
+                slot.clear()
+                for key, entry in expired:
+                    entry[6] = None
+                    self._due.append((key, entry))
+            # Пустые слоты текущего оборота пропускаются сразу до следующего занятого.
+            nxt = t + 1
+            block_end = (t | self._l0_mask) + 1
+            level0 = self._wheel[0]
+            while nxt < block_end and nxt <= now_tick and not level0[nxt & self._l0_mask]:
+                nxt += 1
+            self._current_tick = nxt
+            if not self._entries and not self._due:
+                self._current_tick = max(self._current_tick, now_tick + 1)
+                return
+
+    def _next_wait_locked(self):
+        if self._due:
+            self._wake_tick = 0
+            return 0.0
+        if not self._entries:
+            self._wake_tick = float("inf")
+            return None
+        t = self._current_tick
+        block_end = (t | self._l0_mask) + 1
+        level0 = self._wheel[0]
+        target = block_end
+        for tick in range(t, block_end):
+            if level0[tick & self._l0_mask]:
+                target = tick
+                break
+        self._wake_tick = target
+        return max(0.0, target * self.tick - time.time())
+
+    def _worker(self):
+        while True:
+            with self._cv:
+                while True:
+                    self._advance_locked(int(time.time() / self.tick))
+                    if self._due:
+                        due = []
+                        for key, entry in sorted(self._due, key=lambda item: (item[1][1], item[1][2])):
+                            if self._entries.get(key) is entry:
+                                self._entries.pop(key, None)
+                                self._inflight[key] = entry[2]
+                                due.append((key, entry))
+                        self._due = []
+                        break
+                    self._cv.wait(timeout=self._next_wait_locked())
+            for key, entry in due:
+                _tick, _run_at, seq, func, args, kwargs, _slot = entry
+                ok = self.executor_pool.submit(f"delay:{key}:{seq}", self._execute, func, args, kwargs)
+                with self._cv:
+                    if ok:
+                        if self._inflight.get(key) == seq:
+                            self._inflight.pop(key, None)
+                        continue
+                    # Не теряем таймер при кратком всплеске: возвращаем его в колесо и пробуем позже.
+                    self._failed_dispatch += 1
+                    if self._inflight.pop(key, None) == seq and key not in self._entries:
+                        retry_at = time.time() + 0.5
+                        entry = [int(-(-retry_at // self.tick)), retry_at, seq, func, args, kwargs, None]
+                        self._entries[key] = entry
+                        self._place_locked(key, entry)
+                        self._cv.notify_all()
+                try:
+                    log_error(f"DELAYED QUEUE FULL, RETRY: {key}")
+                except Exception:
+                    pass
+            due = entry = func = args = kwargs = None
+
+    def _execute(self, func, args, kwargs):
+        try:
+            func(*args, **kwargs)
+        finally:
+            with self._cv:
+                self._executed += 1
+
+
 def _env_int(name: str, default: int, minimum: int = 1, maximum: int = 128) -> int:
     try:
         return max(minimum, min(maximum, int(os.getenv(name, str(default)) or default)))
@@ -324,6 +826,7 @@ WEBHOOK_TASK_POOL = KeyedTaskPool(
     "content",
     _env_int("WEBHOOK_WORKERS", 2, 2, 8),
     _env_int("WEBHOOK_MAX_PENDING", 400, 50, 2000),
+    slo_wait_ms=_env_int("WEBHOOK_SLO_WAIT_MS", 1000, 10, 60000),
 )
 # v138: callback/UI updates have a reserved lane. A long finance/forward durable finalizer
 # can no longer occupy every content worker and leave inline buttons waiting in the same queue.
@@ -331,6 +834,7 @@ UI_TASK_POOL = KeyedTaskPool(
     "ui",
     _env_int("UI_WORKERS", 2, 2, 8),
     _env_int("UI_MAX_PENDING", 400, 50, 2000),
+    slo_wait_ms=_env_int("UI_SLO_WAIT_MS", 250, 10, 60000),
 )
 # Telegram callback acknowledgements are tiny network calls and must not share GENERAL with
 # MEGA/runtime/restore work. The dedicated delayed scheduler provides a receipt-level fallback.
@@ -338,6 +842,7 @@ CALLBACK_ACK_TASK_POOL = KeyedTaskPool(
     "callback-ack",
     _env_int("CALLBACK_ACK_WORKERS", 1, 1, 3),
     _env_int("CALLBACK_ACK_MAX_PENDING", 600, 50, 3000),
+    slo_wait_ms=_env_int("CALLBACK_ACK_SLO_WAIT_MS", 100, 10, 60000),
 )
 # Durable verification/recovery may wait for forwarding and delta witnesses for up to tens of
 # seconds. It is isolated from both content and UI lanes.
@@ -357,6 +862,7 @@ FINANCE_TASK_POOL = KeyedTaskPool(
     "finance",
     _env_int("FINANCE_WORKERS", 2, 2, 8),
     _env_int("FINANCE_MAX_PENDING", 400, 50, 2000),
+    slo_wait_ms=_env_int("FINANCE_SLO_WAIT_MS", 1000, 10, 60000),
 )
 # v142: финансовая пересылка получает отдельную высокоприоритетную линию.
 # Она сохраняет порядок одного исходного чата, но не ждёт обычную пересылку,
@@ -365,6 +871,7 @@ FIN_FORWARD_TASK_POOL = KeyedTaskPool(
     "fin-forward",
     _env_int("FIN_FORWARD_WORKERS", 2, 1, 6),
     _env_int("FIN_FORWARD_MAX_PENDING", 500, 50, 2500),
+    slo_wait_ms=_env_int("FIN_FORWARD_SLO_WAIT_MS", 1000, 10, 60000),
 )
 FORWARD_TASK_POOL = KeyedTaskPool(
     "forward",
@@ -375,6 +882,8 @@ BACKUP_TASK_POOL = KeyedTaskPool(
     "backup",
     _env_int("BACKUP_WORKERS", 1, 1, 2),
     _env_int("BACKUP_MAX_PENDING", 120, 20, 500),
+    # v199: уборка MEGA не задерживает выгрузку SECRET и бэкапы чатов.
+    priority_rules={"secret-media-delete:": 2, "secret-media-recover:": 2, "mega-task-prune": 2},
 )
 # v90: маленькие аварийные delta не ждут Excel/канал/полный файл чата в backup queue.
 DELTA_TASK_POOL = KeyedTaskPool(
@@ -387,6 +896,13 @@ EXPORT_TASK_POOL = KeyedTaskPool(
     _env_int("EXPORT_WORKERS", 1, 1, 2),
     _env_int("EXPORT_MAX_PENDING", 40, 5, 200),
 )
+# v199: ffmpeg для SECRET-видео — своя короткая очередь; переполнение = повтор позже,
+# а не сжатие внутри backup-линии.
+TRANSCODE_TASK_POOL = KeyedTaskPool(
+    "transcode",
+    _env_int("TRANSCODE_WORKERS", 1, 1, 2),
+    _env_int("TRANSCODE_MAX_PENDING", 10, 10, 100),
+)
 # v117: slow cosmetic retro-updates must never block business callbacks/general work.
 # One low-priority worker is intentionally isolated from finance/forward/webhook/export.
 # v179 CLEAN: service/journal/config work shares one background lane.
@@ -395,6 +911,13 @@ BACKGROUND_TASK_POOL = KeyedTaskPool(
     "background",
     _env_int("BACKGROUND_WORKERS", 2, 1, 4),
     _env_int("BACKGROUND_MAX_PENDING", 1600, 100, 6000),
+    # v199: то, что ждёт пользователь (кнопка «Назад», напоминание о расходе, restore),
+    # идёт раньше heartbeat/lease/journal/reconcile; старение не даёт им голодать.
+    priority_rules={
+        "back-": 0, "expense-ping:": 0, "restore:": 0, "manual-mega-restore:": 0, "chat-description:": 0,
+        "journal-": 2, "runtime-": 2, "v146-": 2, "v147-": 2, "v153-": 2, "v176-": 2,
+        "archive-": 2, "lowram-": 2, "probe-chat-": 2, "usd-rate-refresh": 2, "expense-recent-migration": 2,
+    },
 )
 MAINTENANCE_TASK_POOL = BACKGROUND_TASK_POOL
 JOURNAL_TASK_POOL = BACKGROUND_TASK_POOL
@@ -410,8 +933,17 @@ DOZVON_TASK_POOL = KeyedTaskPool(
     _env_int("DOZVON_WORKERS", 1, 1, 2),
     _env_int("DOZVON_MAX_PENDING", 100, 10, 500),
 )
-DELAYED_SCHEDULER = DelayedTaskScheduler(DELAYED_TASK_POOL)
-CALLBACK_ACK_SCHEDULER = DelayedTaskScheduler(CALLBACK_ACK_TASK_POOL)
+# v199: простаивающие фоновые линии помогают перегруженным. Одолжен максимум один
+# воркер донора; ключ по-прежнему выполняется одним воркером и по порядку.
+BACKGROUND_TASK_POOL.lend_to(UI_TASK_POOL, 1)
+BACKGROUND_TASK_POOL.lend_to(WEBHOOK_TASK_POOL, 1)
+FORWARD_TASK_POOL.lend_to(FIN_FORWARD_TASK_POOL, 1)
+if DELAYED_SCHEDULER_BACKEND == "heap":
+    DELAYED_SCHEDULER = DelayedTaskScheduler(DELAYED_TASK_POOL)
+    CALLBACK_ACK_SCHEDULER = DelayedTaskScheduler(CALLBACK_ACK_TASK_POOL)
+else:
+    DELAYED_SCHEDULER = TimingWheelScheduler(DELAYED_TASK_POOL, DELAYED_WHEEL_TICK_MS)
+    CALLBACK_ACK_SCHEDULER = TimingWheelScheduler(CALLBACK_ACK_TASK_POOL, DELAYED_WHEEL_TICK_MS)
 
 
 # ─────────────────────────────────────────────────────────────
@@ -892,6 +1424,10 @@ def _env_bool(name: str, default: str = "0") -> bool:
     return str(os.getenv(name, default)).strip().lower() in {"1", "true", "yes", "y", "on", "да"}
 
 MEGA_ENABLED = _env_bool("MEGA_ENABLED", "0")
+# v199: "megacmd" = настоящий MEGA через MEGAcmd; "local" = локальная папка
+# вместо облака (offline-прогон и benchmark всего durable-пути).
+MEGA_BACKEND = (os.getenv("MEGA_BACKEND", "megacmd") or "megacmd").strip().lower()
+MEGA_LOCAL_BACKEND_DIR = os.getenv("MEGA_LOCAL_BACKEND_DIR", "").strip()
 MEGA_AUTORESTORE = _env_bool("MEGA_AUTORESTORE", "1")
 MEGA_EMAIL = os.getenv("MEGA_EMAIL", "").strip()
 MEGA_PASSWORD = os.getenv("MEGA_PASSWORD", "").strip()
@@ -929,6 +1465,332 @@ try:
     MEGA_TASK_FINALIZE_RETRIES = max(1, min(5, int(os.getenv("MEGA_TASK_FINALIZE_RETRIES", "3") or "3")))
 except Exception:
     MEGA_TASK_FINALIZE_RETRIES = 3
+# v199: group commit durable witnesses. Pending-задачи, пришедшие в пределах окна,
+# пишутся одним segment-файлом с manifest; переходы done/failed — пакетными tombstone.
+MEGA_TASK_GROUP_COMMIT = _env_bool("MEGA_TASK_GROUP_COMMIT", "1")
+try:
+    MEGA_TASK_GROUP_WINDOW_MS = max(0, min(500, int(os.getenv("MEGA_TASK_GROUP_WINDOW_MS", "30") or "30")))
+except Exception:
+    MEGA_TASK_GROUP_WINDOW_MS = 30
+try:
+    MEGA_TASK_GROUP_MAX = max(1, min(500, int(os.getenv("MEGA_TASK_GROUP_MAX", "64") or "64")))
+except Exception:
+    MEGA_TASK_GROUP_MAX = 64
+try:
+    MEGA_TASK_TOMBSTONE_WINDOW_MS = max(0, min(5000, int(os.getenv("MEGA_TASK_TOMBSTONE_WINDOW_MS", "250") or "250")))
+except Exception:
+    MEGA_TASK_TOMBSTONE_WINDOW_MS = 250
+try:
+    MEGA_TASK_TOMBSTONE_COMPACT_AT = max(4, min(500, int(os.getenv("MEGA_TASK_TOMBSTONE_COMPACT_AT", "24") or "24")))
+except Exception:
+    MEGA_TASK_TOMBSTONE_COMPACT_AT = 24
+
+# v199: локальный append-only WAL для durable update-задач. Свидетель записывается
+# на локальный диск (fsync) вместо MEGA в горячем пути; фоновый shipper отправляет
+# закрытые сегменты в MEGA group-commit сегментами. Включать только на постоянном
+# диске (Render persistent disk): ephemeral-диск теряет неотправленный хвост при деплое.
+DURABLE_WAL_ENABLED = _env_bool("DURABLE_WAL_ENABLED", "0")
+DURABLE_WAL_DIR = (os.getenv("DURABLE_WAL_DIR", "") or "").strip() or os.path.join(os.path.dirname(os.path.abspath(DB_FILE)), "durable_wal")
+try:
+    DURABLE_WAL_SEGMENT_BYTES = max(64 * 1024, min(64 * 1024 * 1024, int(os.getenv("DURABLE_WAL_SEGMENT_BYTES", str(1024 * 1024)) or str(1024 * 1024))))
+except Exception:
+    DURABLE_WAL_SEGMENT_BYTES = 1024 * 1024
+try:
+    DURABLE_WAL_SEAL_SECONDS = max(0.2, min(60.0, float(os.getenv("DURABLE_WAL_SEAL_SECONDS", "2") or "2")))
+except Exception:
+    DURABLE_WAL_SEAL_SECONDS = 2.0
+
+
+class DurableUpdateWAL:
+    """Segmented local write-ahead log for durable update witnesses.
+
+    Segment files are ``wal_<seq>.open`` while appended to and ``wal_<seq>.sealed``
+    once closed.  Every record is ``magic | length | crc32 | json`` and is fsync'd
+    before ``append`` returns.  Replay stops at the first torn/corrupt record and
+    truncates the tail.  Shipping is done by the caller: ``sealed_segments`` ->
+    ``read_segment`` -> upload -> ``mark_shipped``.
+    """
+
+    MAGIC = b"DWAL"
+    HEADER = struct.Struct(">4sII")
+
+    def __init__(self, directory: str, segment_bytes: int = 1024 * 1024, seal_seconds: float = 2.0, enabled: bool = True):
+        self.directory = str(directory)
+        self.segment_bytes = int(segment_bytes)
+        self.seal_seconds = float(seal_seconds)
+        self.enabled = bool(enabled)
+        self._lock = threading.RLock()
+        self._fd = None
+        self._active_seq = 0
+        self._active_size = 0
+        self._active_opened = 0.0
+        self._next_seq = 1
+        self._opened = False
+        # key -> {"seq", "offset", "state"}: задачи, ещё не отправленные в MEGA.
+        self._tasks = {}
+        # key -> (seq, state): последний неотправленный переход состояния.
+        self._states = {}
+        # seq -> (size, first_record_wall_ts) для неотправленных сегментов.
+        self._segments = {}
+        self._counters = defaultdict(int)
+        self._last_error = ""
+
+    # --- files -------------------------------------------------------------------------
+    def _path(self, seq: int, suffix: str) -> str:
+        return os.path.join(self.directory, f"wal_{int(seq):012d}.{suffix}")
+
+    def segment_path(self, seq: int) -> str:
+        sealed = self._path(seq, "sealed")
+        return sealed if os.path.exists(sealed) else self._path(seq, "open")
+
+    def _fsync_dir(self):
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except Exception:
+            return
+        try:
+            os.fsync(fd)
+        except Exception:
+            pass
+        finally:
+            os.close(fd)
+
+    def _scan(self) -> list:
+        rows = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return rows
+        for name in names:
+            match = re.fullmatch(r"wal_(\d{12})\.(open|sealed)", name)
+            if match:
+                rows.append((int(match.group(1)), match.group(2)))
+        rows.sort()
+        return rows
+
+    @classmethod
+    def encode(cls, record: dict) -> bytes:
+        body = json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+        return cls.HEADER.pack(cls.MAGIC, len(body), zlib.crc32(body) & 0xFFFFFFFF) + body
+
+    def read_segment(self, seq: int) -> tuple[list, int, bool]:
+        """(records, valid_bytes, torn). Each record gets ``_offset``."""
+        records = []
+        valid = 0
+        torn = False
+        try:
+            with open(self.segment_path(seq), "rb") as fh:
+                blob = fh.read()
+        except FileNotFoundError:
+            return records, 0, False
+        size = self.HEADER.size
+        while valid < len(blob):
+            if len(blob) - valid < size:
+                torn = True
+                break
+            magic, length, crc = self.HEADER.unpack_from(blob, valid)
+            body = blob[valid + size: valid + size + length]
+            if magic != self.MAGIC or len(body) != length or (zlib.crc32(body) & 0xFFFFFFFF) != crc:
+                torn = True
+                break
+            try:
+                record = json.loads(body.decode("utf-8"))
+            except Exception:
+                torn = True
+                break
+            if isinstance(record, dict):
+                record["_offset"] = valid
+                records.append(record)
+            valid += size + length
+        return records, valid, torn
+
+    def _index_record_locked(self, seq: int, record: dict):
+        key = str(record.get("key") or "")
+        if not key:
+            return
+        if record.get("type") == "task":
+            self._tasks[key] = {"seq": int(seq), "offset": int(record.get("_offset", 0)), "state": "pending"}
+        elif record.get("type") == "state":
+            state = str(record.get("state") or "")
+            self._states[key] = (int(seq), state)
+            if key in self._tasks:
+                self._tasks[key]["state"] = state
+
+    # --- lifecycle -----------------------------------------------------------------------
+    def open(self) -> dict:
+        """Boot: validate every segment, truncate torn tails, seal leftovers, rebuild the index."""
+        with self._lock:
+            if self._opened:
+                return self.stats()
+            os.makedirs(self.directory, exist_ok=True)
+            self._tasks.clear()
+            self._states.clear()
+            self._segments.clear()
+            for seq, suffix in self._scan():
+                records, valid, torn = self.read_segment(seq)
+                path = self._path(seq, suffix)
+                if torn:
+                    self._counters["torn_tails"] += 1
+                    with open(path, "r+b") as fh:
+                        fh.truncate(valid)
+                        fh.flush()
+                        os.fsync(fh.fileno())
+                if suffix == "open":
+                    os.replace(path, self._path(seq, "sealed"))
+                    self._fsync_dir()
+                if not records:
+                    os.remove(self._path(seq, "sealed"))
+                    continue
+                first_ts = float(records[0].get("ts") or os.path.getmtime(self._path(seq, "sealed")))
+                self._segments[seq] = (valid, first_ts)
+                for record in records:
+                    self._index_record_locked(seq, record)
+                self._counters["replayed_records"] += len(records)
+                self._next_seq = max(self._next_seq, seq + 1)
+            self._opened = True
+            return self.stats()
+
+    def append(self, record_type: str, key, body: dict | None = None, state: str = "") -> int:
+        """Durably append one record; returns the segment seq."""
+        record = {"type": str(record_type), "key": str(key), "ts": time.time()}
+        if body is not None:
+            record["task"] = body
+        if state:
+            record["state"] = str(state)
+        blob = self.encode(record)
+        with self._lock:
+            if not self._opened:
+                self.open()
+            if self._fd is not None and self._active_size and self._active_size + len(blob) > self.segment_bytes:
+                self._seal_locked()
+            if self._fd is None:
+                self._active_seq = self._next_seq
+                self._next_seq += 1
+                self._fd = os.open(self._path(self._active_seq, "open"), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+                self._active_size = 0
+                self._active_opened = time.monotonic()
+                self._fsync_dir()
+            started = time.perf_counter()
+            offset = self._active_size
+            view = memoryview(blob)
+            while view:
+                written = os.write(self._fd, view)
+                view = view[written:]
+            os.fsync(self._fd)
+            self._active_size += len(blob)
+            size, first_ts = self._segments.get(self._active_seq, (0, record["ts"]))
+            self._segments[self._active_seq] = (self._active_size, first_ts)
+            record["_offset"] = offset
+            self._index_record_locked(self._active_seq, record)
+            self._counters["appended"] += 1
+            self._counters["appended_bytes"] += len(blob)
+            self._counters["fsync_us_total"] += int((time.perf_counter() - started) * 1_000_000)
+            return self._active_seq
+
+    def _seal_locked(self):
+        if self._fd is None:
+            return
+        try:
+            os.fsync(self._fd)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+        os.replace(self._path(self._active_seq, "open"), self._path(self._active_seq, "sealed"))
+        self._fsync_dir()
+        self._counters["sealed"] += 1
+
+    def seal_due(self, force: bool = False) -> bool:
+        with self._lock:
+            if self._fd is None or not self._active_size:
+                return False
+            if force or self._active_size >= self.segment_bytes or time.monotonic() - self._active_opened >= self.seal_seconds:
+                self._seal_locked()
+                return True
+            return False
+
+    def sealed_segments(self) -> list:
+        with self._lock:
+            return sorted(seq for seq in self._segments if seq != self._active_seq or self._fd is None)
+
+    def mark_shipped(self, seq: int):
+        with self._lock:
+            seq = int(seq)
+            try:
+                os.remove(self._path(seq, "sealed"))
+            except FileNotFoundError:
+                pass
+            self._fsync_dir()
+            self._segments.pop(seq, None)
+            for key in [key for key, row in self._tasks.items() if row.get("seq") == seq]:
+                self._tasks.pop(key, None)
+            for key in [key for key, row in self._states.items() if row[0] == seq]:
+                self._states.pop(key, None)
+            self._counters["shipped_segments"] += 1
+
+    # --- lookups -------------------------------------------------------------------------
+    def task(self, key) -> dict:
+        """Unshipped task card (None once shipped or unknown)."""
+        with self._lock:
+            row = self._tasks.get(str(key))
+            if not row:
+                return None
+            try:
+                with open(self.segment_path(int(row["seq"])), "rb") as fh:
+                    fh.seek(int(row["offset"]))
+                    magic, length, crc = self.HEADER.unpack(fh.read(self.HEADER.size))
+                    body = fh.read(length)
+                if magic != self.MAGIC or (zlib.crc32(body) & 0xFFFFFFFF) != crc:
+                    return None
+                return dict(json.loads(body.decode("utf-8")).get("task") or {})
+            except Exception as e:
+                self._last_error = str(e)[:300]
+                return None
+
+    def latest_state(self, key) -> str:
+        with self._lock:
+            key = str(key)
+            if key in self._states:
+                return self._states[key][1]
+            return str((self._tasks.get(key) or {}).get("state") or "")
+
+    def pending_rows(self) -> dict:
+        """{key: {"state", "seq", "task": bool}} for tasks/states not yet shipped."""
+        with self._lock:
+            rows = {key: {"state": st, "seq": seq, "task": False} for key, (seq, st) in self._states.items()}
+            for key, row in self._tasks.items():
+                rows[key] = {"state": row["state"], "seq": row["seq"], "task": True}
+            return rows
+
+    def note_error(self, error: str):
+        with self._lock:
+            self._last_error = str(error or "")[:300]
+            self._counters["ship_errors"] += 1
+
+    def count(self, name: str, value: int = 1):
+        with self._lock:
+            self._counters[name] += int(value)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lag_bytes = sum(size for size, _ts in self._segments.values())
+            oldest = min((ts for _size, ts in self._segments.values()), default=None)
+            appended = int(self._counters.get("appended", 0))
+            return {
+                "enabled": self.enabled,
+                "dir": self.directory,
+                "segments": len(self._segments),
+                "active_seq": self._active_seq if self._fd is not None else 0,
+                "unshipped_tasks": len(self._tasks),
+                "unshipped_states": len(self._states),
+                "lag_bytes": int(lag_bytes),
+                "lag_seconds": round(max(0.0, time.time() - oldest), 3) if oldest is not None else 0.0,
+                "avg_fsync_ms": round(self._counters.get("fsync_us_total", 0) / 1000.0 / appended, 3) if appended else 0.0,
+                "last_error": self._last_error,
+                **{k: int(v) for k, v in self._counters.items() if k != "fsync_us_total"},
+            }
+
+
+DURABLE_WAL = DurableUpdateWAL(DURABLE_WAL_DIR, DURABLE_WAL_SEGMENT_BYTES, DURABLE_WAL_SEAL_SECONDS, DURABLE_WAL_ENABLED)
 try:
     MEGA_TASK_PROCESSED_KEEP = max(100, min(5000, int(os.getenv("MEGA_TASK_PROCESSED_KEEP", "500") or "500")))
 except Exception:
@@ -985,9 +1847,7 @@ except Exception:
 RESTORE_GUARD_ACTIVE = False
 RESTORE_GUARD_REASON = ""
 MEGA_GLOBAL_BACKUP_LOCK = threading.RLock()
-MEGA_COMMAND_LOCK = threading.RLock()
 CRITICAL_DELTA_LOCK = threading.RLock()
-forward_map = {}
 backup_flags = {
     "channel": True,
 }
@@ -1002,6 +1862,23 @@ FORWARD_MEDIA_GROUP_DELAY = 0.8
 _FORWARD_OUTCOME_LOCK = threading.RLock()
 _FORWARD_OUTCOMES = {}
 _FORWARD_OUTCOME_MAX = 800
+# v199: 800 записей в RAM — только горячий кеш. Полный индекс исходов пишется в SQLite
+# forward_outcomes с меткой текущего процесса: после рестарта старые строки не считаются
+# "живым" доказательством и лишь ждут TTL.
+_FORWARD_OUTCOME_BOOT = f"{os.getpid()}-{time.time_ns()}"
+try:
+    FORWARD_OUTCOME_TTL_HOURS = max(1.0, float(os.getenv("FORWARD_OUTCOME_TTL_HOURS", "72") or 72))
+except Exception:
+    FORWARD_OUTCOME_TTL_HOURS = 72.0
+try:
+    # 0 — связи копий не истекают.
+    FORWARD_MAP_TTL_DAYS = max(0.0, float(os.getenv("FORWARD_MAP_TTL_DAYS", "180") or 180))
+except Exception:
+    FORWARD_MAP_TTL_DAYS = 180.0
+try:
+    FORWARD_MAP_PRUNE_INTERVAL_SECONDS = max(60.0, float(os.getenv("FORWARD_MAP_PRUNE_INTERVAL_SECONDS", "3600") or 3600))
+except Exception:
+    FORWARD_MAP_PRUNE_INTERVAL_SECONDS = 3600.0
 
 def _forward_outcome_key(source_chat_id: int, source_msg_id: int):
     return (int(source_chat_id), int(source_msg_id))
@@ -1034,6 +1911,9 @@ def _forward_outcome_update(source_chat_id: int, source_msg_id: int, state: str
                     target["error"] = str(error)[:500]
             item["updated_at"] = time.time()
             _forward_outcome_prune_locked()
+            store = globals().get("SQLITE")
+            if store is not None:
+                store.forward_outcome_put(key[0], key[1], _FORWARD_OUTCOME_BOOT, item)
     except Exception:
         pass
 
@@ -1041,7 +1921,16 @@ def _forward_outcome_snapshot(source_chat_id: int, source_msg_id: int) -> dict:
     try:
         key = _forward_outcome_key(source_chat_id, source_msg_id)
         with _FORWARD_OUTCOME_LOCK:
-            return copy.deepcopy(_FORWARD_OUTCOMES.get(key) or {})
+            item = _FORWARD_OUTCOMES.get(key)
+            if item is not None:
+                return copy.deepcopy(item)
+        # Вытесненный из RAM исход этого процесса берём с диска (ключи targets там строковые).
+        store = globals().get("SQLITE")
+        item = store.forward_outcome_get(key[0], key[1], _FORWARD_OUTCOME_BOOT) if store is not None else None
+        if not isinstance(item, dict):
+            return {}
+        item["targets"] = {int(dst): info for dst, info in (item.get("targets") or {}).items()}
+        return item
     except Exception:
         return {}
 
@@ -1053,7 +1942,6 @@ def _forward_outcome_skip(source_chat_id: int, msg, reason: str):
             bot_journal("forward_not_expected", source_chat_id, f"msg={mid} reason={reason}")
     except Exception:
         pass
-_forward_state_timer = None
 _owner_json_restore_prompts = {}
 _owner_json_restore_prompt_lock = threading.RLock()
 logging.basicConfig(
@@ -1069,16 +1957,225 @@ data = {}
 finance_active_chats = set()
 
 
-class SQLiteState:
-    def __init__(self, path: str):
-        self.path = path
-        self.lock = threading.RLock()
-        self.conn = sqlite3.connect(path, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
-        self._init_db()
+# Finance ledgers are stored row-per-record in finance_records; the *_daily_records
+# maps are derived from them on load and are never written to disk.
+FINANCE_ROW_LEDGERS = {"records": "active", "ars_records": "ars", "usd_records": "usd"}
+FINANCE_ROW_DAILY = {"daily_records": "records", "ars_daily_records": "ars_records", "usd_daily_records": "usd_records"}
 
-    def _init_db(self):
-        with self.lock:
+
+def _finance_row_digest(payload: str) -> str:
+    return hashlib.blake2b(payload.encode("utf-8", errors="replace"), digest_size=8).hexdigest()
+
+
+def _finance_row_key(rec: dict, payload: str, seen: set) -> str:
+    """Stable row key inside one ledger: record_uid, content digest for legacy rows."""
+    uid = str(rec.get("record_uid") or "").strip().upper()
+    base = uid if re.fullmatch(r"[A-F0-9]{12}", uid) else "~" + _finance_row_digest(payload)
+    key = base; n = 1
+    while key in seen:
+        n += 1; key = f"{base}#{n}"
+    seen.add(key)
+    return key
+
+
+# v199: pos — разреженный ключ порядка внутри ledger (шаг FINANCE_ROW_POS_GAP). Вставка
+# задним числом получает pos в зазоре между соседями и не сдвигает все следующие строки.
+FINANCE_ROW_POS_GAP = 1 << 16
+
+
+def _finance_row_prepare(rec: dict, seen: set) -> tuple:
+    """(row_key, day_key, digest, payload) одной записи; считается до захвата SQLITE.lock."""
+    payload = json.dumps(rec, ensure_ascii=False, separators=(",", ":"))
+    return _finance_row_key(rec, payload, seen), str(rec.get("day_key") or "")[:10], _finance_row_digest(payload), payload
+
+
+def _finance_row_spread(count: int, last: int, pos) -> list:
+    """pos для ``count`` строк подряд между якорями ``last`` и ``pos`` (None — хвост ledger)."""
+    step = FINANCE_ROW_POS_GAP if pos is None else (pos - last) // (count + 1)
+    return [last + step * i for i in range(1, count + 1)]
+
+
+def _finance_row_positions(order: list, known: dict) -> dict:
+    """{row_key: новый pos} для строк ledger в порядке ``order``.
+
+    ``known`` — pos строк, которые могут остаться на месте: строка остаётся якорем, пока
+    её pos растёт вдоль списка. Остальные ложатся в зазор между якорями; если зазора
+    не хватает, следующий якорь переезжает вместе с ними.
+    """
+    out = {}; run = []; last = -1
+    for row_key in order:
+        pos = known.get(row_key)
+        if pos is None or pos - last <= len(run):
+            run.append(row_key)
+            continue
+        if run:
+            out.update(zip(run, _finance_row_spread(len(run), last, pos))); run = []
+        last = pos
+    if run:
+        out.update(zip(run, _finance_row_spread(len(run), last, None)))
+    return out
+
+
+def _finance_rows_plan(records, current: dict) -> dict:
+    """Полная сверка ledger с {row_key: (pos, digest)} на диске: что записать, сдвинуть и удалить.
+
+    Payload держится только для изменённых строк; ``placed`` — (запись, row_key, pos) всех строк.
+    """
+    seen = set(); order = []; known = {}; dirty = []; keyed = []
+    for rec in records or []:
+        if not isinstance(rec, dict):
+            continue
+        row_key, day_key, digest, payload = _finance_row_prepare(rec, seen)
+        order.append(row_key); keyed.append((rec, row_key))
+        old = current.get(row_key)
+        if old is not None and old[1] == digest:
+            known[row_key] = old[0]
+        else:
+            dirty.append((row_key, day_key, digest, payload, rec))
+    placed = _finance_row_positions(order, known)
+    return {
+        "upserts": [(k, placed[k], day_key, digest, payload, rec) for k, day_key, digest, payload, rec in dirty],
+        "moves": [(k, pos) for k, pos in placed.items() if k in known and known[k] != pos],
+        "deletes": [k for k in current if k not in seen],
+        "placed": [(rec, k, placed.get(k, known.get(k))) for rec, k in keyed],
+    }
+
+
+# Поля записи, по которым пересланные копии/исходники находят свою финансовую запись.
+FINANCE_MSG_FIELDS = ("forward_dst_msg_id", "source_msg_id", "origin_msg_id", "msg_id")
+
+
+def _finance_msg_fields(rec: dict) -> list:
+    """[(field, message_id)] записи для индекса message-id → запись."""
+    out = []
+    for field in FINANCE_MSG_FIELDS:
+        value = rec.get(field)
+        if value is None:
+            continue
+        try:
+            out.append((field, int(value)))
+        except Exception:
+            continue
+    return out
+
+
+def _sqlite_finance_cold_items(conn, chat_ids=None):
+    """(chat_id, ledger_key, records) from a state DB, both row-per-record and legacy blobs."""
+    wanted = {str(x) for x in chat_ids} if chat_ids is not None else None
+    tables = {str(r[0]) for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()}
+    out = {}
+    if "finance_records" in tables:
+        reverse = {v: k for k, v in FINANCE_ROW_LEDGERS.items()}
+        for cid, cur, raw in conn.execute("SELECT chat_id,currency,v FROM finance_records ORDER BY chat_id,currency,pos").fetchall():
+            key = reverse.get(str(cur))
+            if not key or (wanted is not None and str(cid) not in wanted):
+                continue
+            try: rec = json.loads(raw) if raw else None
+            except Exception: rec = None
+            if isinstance(rec, dict):
+                out.setdefault((str(cid), key), []).append(rec)
+    if "cold_fields" in tables:
+        marks = ",".join("?" for _ in FINANCE_ROW_LEDGERS)
+        for cid, key, raw in conn.execute(f"SELECT chat_id,k,v FROM cold_fields WHERE k IN ({marks})", tuple(FINANCE_ROW_LEDGERS)).fetchall():
+            if (wanted is not None and str(cid) not in wanted) or (str(cid), str(key)) in out:
+                continue
+            try: rows = json.loads(raw) if raw else []
+            except Exception: rows = []
+            out[(str(cid), str(key))] = rows if isinstance(rows, list) else []
+    for (cid, key), rows in out.items():
+        yield cid, key, rows
+
+
+# v199: root хранится секциями в root_sections — по строке на ключ верхнего уровня,
+# а ключи из ROOT_SPLIT_KEYS (настройки) — по строке на подключ. part='' — значение
+# целиком, part='.<подключ>' — одна запись разбитого словаря; pos сохраняет порядок ключей.
+ROOT_SPLIT_KEYS = ("_global_settings",)
+# v199: секция от ROOT_SECTION_TRACK_BYTES сериализуется, только если её пометил root_touch()
+# (место изменения / сохранения), заменён сам объект значения или идёт полная проверка
+# (full=True, каждое ROOT_SECTIONS_FULL_EVERY-е сохранение). Мелкие секции сравниваются по
+# digest на каждом сохранении — дёшево и ловит правки без пометки. 0 = всегда digest.
+ROOT_SECTION_TRACK_BYTES = _env_int("ROOT_SECTION_TRACK_BYTES", 32768, 0, 1 << 30)
+ROOT_SECTIONS_FULL_EVERY = _env_int("ROOT_SECTIONS_FULL_EVERY", 20, 0, 1000000)
+
+
+def _root_sections_split(root: dict):
+    """Yield (k, part, value) in key order; assembling them back gives an identical dict."""
+    for k, v in (root or {}).items():
+        k = str(k)
+        if k in ROOT_SPLIT_KEYS and isinstance(v, dict) and v:
+            for sub, sv in v.items():
+                yield k, "." + str(sub), sv
+        else:
+            yield k, "", v
+
+
+def _root_sections_join(rows) -> dict:
+    """Rows of (k, part, json) ordered by pos -> root dict."""
+    root = {}
+    for k, part, raw in rows:
+        try: value = json.loads(raw) if raw else None
+        except Exception: continue
+        if part:
+            bucket = root.get(str(k))
+            if not isinstance(bucket, dict):
+                bucket = root[str(k)] = {}
+            bucket[str(part)[1:]] = value
+        else:
+            root[str(k)] = value
+    return root
+
+
+def _sqlite_root_from_conn(conn):
+    """Root dict from any state DB: root_sections first, legacy kv['root'] as fallback."""
+    tables = {str(r[0]) for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()}
+    if "root_sections" in tables:
+        rows = conn.execute("SELECT k,part,v FROM root_sections ORDER BY pos").fetchall()
+        if rows:
+            return _root_sections_join(rows)
+    row = conn.execute("SELECT v FROM kv WHERE k='root'").fetchone()
+    if not row or not row[0]:
+        return None
+    try: return json.loads(row[0])
+    except Exception: return None
+
+
+def _sqlite_root_to_conn(conn, root: dict):
+    """Replace the whole root of a state DB (exports/filters); the caller commits."""
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS root_sections (k TEXT NOT NULL, part TEXT NOT NULL DEFAULT '', pos INTEGER NOT NULL, "
+        "digest TEXT NOT NULL, bytes INTEGER NOT NULL DEFAULT 0, v TEXT NOT NULL, updated_at TEXT NOT NULL DEFAULT '', "
+        "PRIMARY KEY(k, part))"
+    )
+    conn.execute("DELETE FROM root_sections")
+    conn.execute("DELETE FROM kv WHERE k='root'")
+    stamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    rows = []
+    for pos, (k, part, value) in enumerate(_root_sections_split(root)):
+        payload = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        rows.append((k, part, pos, _finance_row_digest(payload), len(payload.encode("utf-8", errors="replace")), payload, stamp))
+    if rows:
+        conn.executemany("INSERT INTO root_sections(k,part,pos,digest,bytes,v,updated_at) VALUES(?,?,?,?,?,?,?)", rows)
+    return len(rows)
+
+
+class SQLiteState:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self._root_stats_lock = threading.Lock()
+        self._root_stats = {"saves": 0, "written": 0, "moved": 0, "skipped": 0, "unserialized": 0, "full_checks": 0,
+                            "deleted": 0, "bytes_written": 0, "bytes_total": 0, "sections": {}}
+        # (k, part) → (объект значения, байт) на момент последней записи; помеченные root_touch.
+        self._root_seen = {}
+        self._root_dirty = set()
+        self._root_dirty_lock = threading.Lock()
+        self._root_saves = 0
+        self._init_db()
+
+    def _init_db(self):
+        with self.lock:
             cur = self.conn.cursor()
             cur.execute("PRAGMA journal_mode=WAL")
             cur.execute("PRAGMA synchronous=NORMAL")
@@ -1099,6 +2196,116 @@ class SQLiteState:
             cur.execute(
                 "CREATE TABLE IF NOT EXISTS cold_fields (chat_id TEXT NOT NULL, k TEXT NOT NULL, v TEXT NOT NULL, updated_at TEXT NOT NULL DEFAULT '', PRIMARY KEY(chat_id, k))"
             )
+            # v199: one row per finance record; a flush rewrites only rows whose digest/position changed.
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS finance_records (chat_id TEXT NOT NULL, currency TEXT NOT NULL, record_uid TEXT NOT NULL, "
+                "pos INTEGER NOT NULL, day_key TEXT NOT NULL DEFAULT '', digest TEXT NOT NULL, v TEXT NOT NULL, "
+                "updated_at TEXT NOT NULL DEFAULT '', PRIMARY KEY(chat_id, currency, record_uid))"
+            )
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_finance_records_day ON finance_records(chat_id, currency, day_key)")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_finance_records_pos ON finance_records(chat_id, currency, pos)")
+            # v199: вторичный индекс (message_id, field) → строка finance_records; ведётся тем же
+            # sync_finance_rows, что и сами строки, поэтому всегда в одной транзакции с ними.
+            msg_index_new = cur.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='finance_msg_index'").fetchone() is None
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS finance_msg_index (chat_id TEXT NOT NULL, msg_id INTEGER NOT NULL, currency TEXT NOT NULL, "
+                "record_uid TEXT NOT NULL, field TEXT NOT NULL, PRIMARY KEY(chat_id, msg_id, currency, record_uid, field)) WITHOUT ROWID"
+            )
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_finance_msg_index_row ON finance_msg_index(chat_id, currency, record_uid)")
+            if msg_index_new:
+                self._finance_msg_index_fill_locked()
+            # v199: карта пересланных копий живёт здесь, а не в root JSON. UNIQUE даёт индекс
+            # по источнику, idx_forward_links_dst — обратный поиск origin по копии.
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS forward_links (src_chat INTEGER NOT NULL, src_msg INTEGER NOT NULL, "
+                "dst_chat INTEGER NOT NULL, dst_msg INTEGER NOT NULL, updated_at REAL NOT NULL DEFAULT 0, "
+                "UNIQUE(src_chat, src_msg, dst_chat, dst_msg))"
+            )
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_forward_links_dst ON forward_links(dst_chat, dst_msg)")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_forward_links_ttl ON forward_links(updated_at)")
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS forward_outcomes (src_chat INTEGER NOT NULL, src_msg INTEGER NOT NULL, "
+                "boot TEXT NOT NULL, v TEXT NOT NULL, updated_at REAL NOT NULL DEFAULT 0, PRIMARY KEY(src_chat, src_msg))"
+            )
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_forward_outcomes_ttl ON forward_outcomes(updated_at)")
+            # v199: поденные итоги ARS/USD для FinanceBalanceIndex. balance_index.gen фиксирует
+            # поколение finance_records, из которого посчитаны итоги; при расхождении они не читаются.
+            cur.execute("CREATE TABLE IF NOT EXISTS finance_generations (chat_id TEXT PRIMARY KEY, gen INTEGER NOT NULL)")
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS balance_days (chat_id TEXT NOT NULL, currency TEXT NOT NULL, day_key TEXT NOT NULL, "
+                "units TEXT NOT NULL, n INTEGER NOT NULL, PRIMARY KEY(chat_id, currency, day_key))"
+            )
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS balance_index (chat_id TEXT NOT NULL, currency TEXT NOT NULL, gen INTEGER NOT NULL, "
+                "PRIMARY KEY(chat_id, currency))"
+            )
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS root_sections (k TEXT NOT NULL, part TEXT NOT NULL DEFAULT '', pos INTEGER NOT NULL, "
+                "digest TEXT NOT NULL, bytes INTEGER NOT NULL DEFAULT 0, v TEXT NOT NULL, updated_at TEXT NOT NULL DEFAULT '', "
+                "PRIMARY KEY(k, part))"
+            )
+            # v199: короткие callback-токены (catx:/fvcatx:/cbx:) переживают рестарт; TTL чистится по индексу.
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS callback_tokens (token TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID"
+            )
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_callback_tokens_ttl ON callback_tokens(expires_at)")
+            # v199: контентно-адресуемые медиа SECRET. secret_blobs — sha256 оригинала → файл в MEGA
+            # (уже сжатый), secret_blob_aliases — Telegram file_unique_id → sha256 (проверка без скачивания).
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS secret_blobs (sha256 TEXT PRIMARY KEY, path TEXT NOT NULL, bytes INTEGER NOT NULL DEFAULT 0, "
+                "quality TEXT NOT NULL DEFAULT '', updated_at REAL NOT NULL DEFAULT 0) WITHOUT ROWID"
+            )
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_secret_blobs_path ON secret_blobs(path)")
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS secret_blob_aliases (file_unique_id TEXT PRIMARY KEY, sha256 TEXT NOT NULL) WITHOUT ROWID"
+            )
+            # v199: семантическая сводка DATA CONSTITUTION по чату (число записей, суммы, дни, хэш ключей).
+            # gen — поколение finance_records, из которого она посчитана; устаревшая строка не читается.
+            cur.execute(
+                "CREATE TABLE IF NOT EXISTS constitution_chat_semantics (chat_id TEXT PRIMARY KEY, gen INTEGER NOT NULL, "
+                "leaf TEXT NOT NULL, v TEXT NOT NULL, updated_at REAL NOT NULL DEFAULT 0) WITHOUT ROWID"
+            )
+            self.conn.commit()
+            self._migrate_cold_finance_locked()
+
+    def _finance_msg_index_fill_locked(self, chat_id=None) -> int:
+        """(Пере)собрать finance_msg_index из строк finance_records (всех или одного чата)."""
+        sql = "SELECT chat_id,currency,record_uid,v FROM finance_records"
+        params = ()
+        if chat_id is not None:
+            sql += " WHERE chat_id=?"; params = (str(chat_id),)
+            self.conn.execute("DELETE FROM finance_msg_index WHERE chat_id=?", params)
+        else:
+            self.conn.execute("DELETE FROM finance_msg_index")
+        rows = []
+        for cid, currency, row_key, raw in self.conn.execute(sql, params).fetchall():
+            rec = self._load(raw, None)
+            if isinstance(rec, dict):
+                rows.extend((str(cid), mid, str(currency), str(row_key), field) for field, mid in _finance_msg_fields(rec))
+        if rows:
+            self.conn.executemany("INSERT OR IGNORE INTO finance_msg_index(chat_id,msg_id,currency,record_uid,field) VALUES(?,?,?,?,?)", rows)
+        return len(rows)
+
+    def _migrate_cold_finance_locked(self):
+        """Move legacy whole-list cold_fields blobs into finance_records (idempotent, per chat)."""
+        keys = tuple(FINANCE_ROW_LEDGERS) + tuple(FINANCE_ROW_DAILY)
+        marks = ",".join("?" for _ in keys)
+        chat_ids = [str(r[0]) for r in self.conn.execute(f"SELECT DISTINCT chat_id FROM cold_fields WHERE k IN ({marks})", keys).fetchall()]
+        for cid in chat_ids:
+            blobs = {str(k): self._load(v, None) for k, v in self.conn.execute(f"SELECT k,v FROM cold_fields WHERE chat_id=? AND k IN ({marks})", (cid, *keys)).fetchall()}
+            for rec_key, daily_key in (("records", "daily_records"), ("ars_records", "ars_daily_records"), ("usd_records", "usd_daily_records")):
+                records = blobs.get(rec_key)
+                if not isinstance(records, list) or not records:
+                    # Same fallback as normalize_chat_records(): an old chat may only have the daily map.
+                    daily = blobs.get(daily_key) if isinstance(blobs.get(daily_key), dict) else {}
+                    records = []
+                    for dk in sorted(daily):
+                        for rec in daily.get(dk) or []:
+                            if isinstance(rec, dict):
+                                rec.setdefault("day_key", dk); records.append(rec)
+                if records:
+                    self._sync_finance_rows_locked(cid, rec_key, records)
+            self.conn.execute(f"DELETE FROM cold_fields WHERE chat_id=? AND k IN ({marks})", (cid, *keys))
             self.conn.commit()
 
     def _dump(self, obj) -> str:
@@ -1121,72 +2328,772 @@ class SQLiteState:
         payload = self._dump(obj)
         with self.lock:
             self.conn.execute(
-                "INSERT INTO kv(k,v) VALUES(?,?) ON CONFLICT(k) DO UPDATE SET v=excluded.v",
-                (key, payload),
+                "INSERT INTO kv(k,v) VALUES(?,?) ON CONFLICT(k) DO UPDATE SET v=excluded.v",
+                (key, payload),
+            )
+            self.conn.commit()
+
+    def load_root(self):
+        with self.lock:
+            return _sqlite_root_from_conn(self.conn)
+
+    def root_touch(self, key: str, sub: str | None = None):
+        """Mark a root section changed: the next save_root serializes it even if it is large.
+
+        Call after the mutation (inside the lock that guards it), never before.
+        """
+        part = "" if sub is None else "." + str(sub)
+        with self._root_dirty_lock:
+            self._root_dirty.add((str(key), part))
+
+    def save_root(self, obj, full: bool = False):
+        """Write only the root sections whose digest or position changed since the last save.
+
+        Large sections that were not touched and are still the same object are skipped before
+        json.dumps; full=True or every ROOT_SECTIONS_FULL_EVERY-th save re-checks them by digest.
+        """
+        stamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        with self.lock:
+            with self._root_dirty_lock:
+                dirty, self._root_dirty = self._root_dirty, set()
+            self._root_saves += 1
+            check = bool(full or not ROOT_SECTION_TRACK_BYTES or
+                         (ROOT_SECTIONS_FULL_EVERY and (self._root_saves - 1) % ROOT_SECTIONS_FULL_EVERY == 0))
+            try:
+                current = {
+                    (str(r[0]), str(r[1])): (int(r[2]), str(r[3]))
+                    for r in self.conn.execute("SELECT k,part,pos,digest FROM root_sections").fetchall()
+                }
+                seen = set(); seen_new = {}; upserts = []; moves = []; sizes = {}; total = 0; pos = 0; unserialized = 0
+                for k, part, value in _root_sections_split(obj if isinstance(obj, dict) else {}):
+                    key = (k, part); seen.add(key)
+                    old = current.get(key)
+                    prev = self._root_seen.get(key)
+                    if (not check and old is not None and prev is not None and prev[0] is value
+                            and prev[1] >= ROOT_SECTION_TRACK_BYTES and key not in dirty):
+                        # Большая секция без пометки: тот же объект, json.dumps не нужен.
+                        unserialized += 1; total += prev[1]
+                        if old[0] != pos:
+                            moves.append((pos, k, part))
+                        pos += 1
+                        continue
+                    payload = self._dump(value)
+                    digest = _finance_row_digest(payload)
+                    size = len(payload.encode("utf-8", errors="replace"))
+                    total += size; seen_new[key] = (value, size)
+                    if old is None or old[1] != digest:
+                        upserts.append((k, part, pos, digest, size, payload, stamp)); sizes[k + part] = size
+                    elif old[0] != pos:
+                        moves.append((pos, k, part))
+                    pos += 1
+                stale = [key for key in current if key not in seen]
+                legacy = self.conn.execute("SELECT 1 FROM kv WHERE k='root'").fetchone() is not None
+                if upserts:
+                    self.conn.executemany(
+                        "INSERT INTO root_sections(k,part,pos,digest,bytes,v,updated_at) VALUES(?,?,?,?,?,?,?) "
+                        "ON CONFLICT(k,part) DO UPDATE SET pos=excluded.pos,digest=excluded.digest,bytes=excluded.bytes,"
+                        "v=excluded.v,updated_at=excluded.updated_at",
+                        upserts,
+                    )
+                if moves:
+                    self.conn.executemany("UPDATE root_sections SET pos=? WHERE k=? AND part=?", moves)
+                if stale:
+                    self.conn.executemany("DELETE FROM root_sections WHERE k=? AND part=?", stale)
+                if legacy:
+                    # Первое сохранение после обновления: единый kv['root'] больше не источник.
+                    self.conn.execute("DELETE FROM kv WHERE k='root'")
+                if upserts or moves or stale or legacy:
+                    self.conn.commit()
+            except Exception:
+                # Пометки не теряются: следующее сохранение сериализует эти секции снова.
+                with self._root_dirty_lock:
+                    self._root_dirty |= dirty
+                raise
+            for key in stale:
+                self._root_seen.pop(key, None)
+            self._root_seen.update(seen_new)
+        with self._root_stats_lock:
+            st = self._root_stats
+            st["saves"] += 1; st["written"] += len(upserts); st["moved"] += len(moves); st["deleted"] += len(stale)
+            st["skipped"] += pos - len(upserts) - len(moves); st["unserialized"] += unserialized; st["full_checks"] += int(check)
+            st["bytes_written"] += sum(sizes.values()); st["bytes_total"] += total
+            for name, size in sizes.items():
+                row = st["sections"].setdefault(name, {"writes": 0, "bytes": 0})
+                row["writes"] += 1; row["bytes"] += size
+        return {"sections": pos, "written": len(upserts), "moved": len(moves), "deleted": len(stale),
+                "unserialized": unserialized, "bytes": sum(sizes.values())}
+
+    def root_section_stats(self, top: int = 10) -> dict:
+        """Save counters plus the sections that were rewritten most (by bytes)."""
+        with self._root_stats_lock:
+            st = dict(self._root_stats); sections = dict(st.pop("sections"))
+        st["top_sections"] = [
+            {"section": name, **row}
+            for name, row in sorted(sections.items(), key=lambda kv: (-kv[1]["bytes"], kv[0]))[:max(0, int(top))]
+        ]
+        with self.lock:
+            st["rows"] = int(self.conn.execute("SELECT COUNT(*) FROM root_sections").fetchone()[0])
+        return st
+
+    def load_chats(self) -> dict:
+        with self.lock:
+            rows = self.conn.execute("SELECT chat_id, v FROM chats").fetchall()
+        out = {}
+        for row in rows:
+            val = self._load(row[1], {})
+            if isinstance(val, dict):
+                out[str(row[0])] = val
+        return out
+
+    def save_chats(self, chats: dict):
+        chats = chats or {}
+        with self.lock:
+            existing = {str(r[0]) for r in self.conn.execute("SELECT chat_id FROM chats").fetchall()}
+            for chat_id, payload in chats.items():
+                self.conn.execute(
+                    "INSERT INTO chats(chat_id,v) VALUES(?,?) ON CONFLICT(chat_id) DO UPDATE SET v=excluded.v",
+                    (str(chat_id), self._dump(payload)),
+                )
+            for stale in existing - {str(k) for k in chats.keys()}:
+                self.conn.execute("DELETE FROM chats WHERE chat_id=?", (stale,))
+            self.conn.commit()
+
+    def save_chat(self, chat_id, payload: dict):
+        """Точечно сохраняет только один изменившийся чат."""
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO chats(chat_id,v) VALUES(?,?) ON CONFLICT(chat_id) DO UPDATE SET v=excluded.v",
+                (str(chat_id), self._dump(payload or {})),
+            )
+            self.conn.commit()
+
+    def delete_chat(self, chat_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM chats WHERE chat_id=?", (str(chat_id),))
+            self.conn.commit()
+
+    def get_meta(self, kind: str, key: str, default=None):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT v FROM meta WHERE kind=? AND k=?", (kind, key)
+            ).fetchone()
+        return self._load(row[0], default) if row else default
+
+    def set_meta(self, kind: str, key: str, obj):
+        payload = self._dump(obj)
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO meta(kind,k,v) VALUES(?,?,?) ON CONFLICT(kind,k) DO UPDATE SET v=excluded.v",
+                (kind, key, payload),
+            )
+            self.conn.commit()
+
+    # v199 row-per-record finance ledgers ---------------------------------------
+    def get_finance_rows(self, chat_id, key: str, placed: list | None = None) -> list:
+        """Записи ledger в порядке pos; ``placed`` получает (запись, row_key, pos) для инкрементального flush."""
+        currency = FINANCE_ROW_LEDGERS[str(key)]
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT record_uid,pos,v FROM finance_records WHERE chat_id=? AND currency=? ORDER BY pos",
+                (str(chat_id), currency),
+            ).fetchall()
+        out = []
+        for row_key, pos, raw in rows:
+            rec = self._load(raw, None)
+            if isinstance(rec, dict):
+                out.append(rec)
+                if placed is not None:
+                    placed.append((rec, str(row_key), int(pos)))
+        return out
+
+    def get_finance_day_rows(self, chat_id, key: str, day_key: str) -> list:
+        currency = FINANCE_ROW_LEDGERS[str(key)]
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT v FROM finance_records WHERE chat_id=? AND currency=? AND day_key=? ORDER BY pos",
+                (str(chat_id), currency, str(day_key)[:10]),
+            ).fetchall()
+        return [rec for rec in (self._load(r[0], None) for r in rows) if isinstance(rec, dict)]
+
+    def get_finance_rows_page(self, chat_id, key: str, start_day: str = "", end_day: str = "", after=None, limit: int = 2000) -> list:
+        """Страница строк леджера в порядке (day_key, pos) для потокового экспорта.
+
+        ``after`` = (day_key, pos) последней строки прошлой страницы (keyset-курсор);
+        lock держится только на время одной страницы.
+        """
+        currency = FINANCE_ROW_LEDGERS[str(key)]
+        start_day = str(start_day or "")[:10]
+        if after is not None:
+            # Нижняя граница диапазона индекса = день курсора: OR ниже её не сужает,
+            # без этого каждая страница заново проходит весь леджер от start_day.
+            start_day = max(start_day, str(after[0]))
+        sql = "SELECT day_key,pos,v FROM finance_records WHERE chat_id=? AND currency=? AND day_key>=? AND day_key<=?"
+        params = [str(chat_id), currency, start_day, str(end_day or "9999-99-99")[:10]]
+        if after is not None:
+            sql += " AND (day_key>? OR (day_key=? AND pos>?))"
+            params += [str(after[0]), str(after[0]), int(after[1])]
+        sql += " ORDER BY day_key,pos LIMIT ?"
+        params.append(max(1, int(limit)))
+        with self.lock:
+            rows = self.conn.execute(sql, tuple(params)).fetchall()
+        out = []
+        for day_key, pos, raw in rows:
+            rec = self._load(raw, None)
+            out.append((str(day_key), int(pos), rec if isinstance(rec, dict) else None))
+        return out
+
+    def finance_day_range(self, chat_id, key: str) -> tuple:
+        """(первый, последний) day_key леджера по idx_finance_records_day; ("", "") для пустого."""
+        currency = FINANCE_ROW_LEDGERS[str(key)]
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MIN(day_key),MAX(day_key) FROM finance_records WHERE chat_id=? AND currency=? AND day_key<>''",
+                (str(chat_id), currency),
+            ).fetchone()
+        return (str(row[0] or ""), str(row[1] or "")) if row else ("", "")
+
+    def _finance_row_index_locked(self, cid: str, currency: str) -> dict:
+        return {
+            str(r[0]): (int(r[1]), str(r[2]))
+            for r in self.conn.execute(
+                "SELECT record_uid,pos,digest FROM finance_records WHERE chat_id=? AND currency=?", (cid, currency)
+            ).fetchall()
+        }
+
+    def finance_row_index(self, chat_id, key: str) -> dict:
+        """{row_key: (pos, digest)} строк ledger — для полной сверки flush с диском."""
+        with self.lock:
+            return self._finance_row_index_locked(str(chat_id), FINANCE_ROW_LEDGERS[str(key)])
+
+    def _write_finance_rows_locked(self, cid: str, currency: str, upserts, moves, deletes) -> bool:
+        """upserts — (row_key, pos, day_key, digest, payload, rec), moves — (row_key, pos), deletes — row_key."""
+        if not (upserts or moves or deletes):
+            return False
+        stamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self._bump_finance_generation_locked(cid)
+        if upserts:
+            self.conn.executemany(
+                "INSERT INTO finance_records(chat_id,currency,record_uid,pos,day_key,digest,v,updated_at) VALUES(?,?,?,?,?,?,?,?) "
+                "ON CONFLICT(chat_id,currency,record_uid) DO UPDATE SET pos=excluded.pos,day_key=excluded.day_key,"
+                "digest=excluded.digest,v=excluded.v,updated_at=excluded.updated_at",
+                [(cid, currency, k, pos, day_key, digest, payload, stamp) for k, pos, day_key, digest, payload, _rec in upserts],
+            )
+        if moves:
+            self.conn.executemany(
+                "UPDATE finance_records SET pos=? WHERE chat_id=? AND currency=? AND record_uid=?",
+                [(pos, cid, currency, k) for k, pos in moves],
+            )
+        if deletes:
+            self.conn.executemany(
+                "DELETE FROM finance_records WHERE chat_id=? AND currency=? AND record_uid=?", [(cid, currency, k) for k in deletes]
+            )
+        if upserts or deletes:
+            self.conn.executemany(
+                "DELETE FROM finance_msg_index WHERE chat_id=? AND currency=? AND record_uid=?",
+                [(cid, currency, row[0]) for row in upserts] + [(cid, currency, k) for k in deletes],
+            )
+            msg_rows = [(cid, mid, currency, row[0], field) for row in upserts for field, mid in _finance_msg_fields(row[5])]
+            if msg_rows:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO finance_msg_index(chat_id,msg_id,currency,record_uid,field) VALUES(?,?,?,?,?)", msg_rows
+                )
+        return True
+
+    def write_finance_rows(self, chat_id, key: str, upserts=(), moves=(), deletes=()) -> tuple:
+        """Записать уже сериализованные строки ledger одной транзакцией; (поколение до, после)."""
+        cid = str(chat_id)
+        with self.lock:
+            row = self.conn.execute("SELECT gen FROM finance_generations WHERE chat_id=?", (cid,)).fetchone()
+            before = int(row[0]) if row else 0
+            if not self._write_finance_rows_locked(cid, FINANCE_ROW_LEDGERS[str(key)], upserts, moves, deletes):
+                return before, before
+            self.conn.commit()
+        return before, before + 1
+
+    @staticmethod
+    def _finance_rows_result(plan: dict, generation=None) -> dict:
+        return {
+            "upserts": len(plan["upserts"]), "moves": len(plan["moves"]), "deletes": len(plan["deletes"]),
+            "rows": len(plan["placed"]), "changed": [row[5] for row in plan["upserts"]], "deleted": list(plan["deletes"]),
+            "placed": plan["placed"], "generation": generation,
+        }
+
+    def _sync_finance_rows_locked(self, chat_id, key: str, records) -> dict:
+        cid = str(chat_id); currency = FINANCE_ROW_LEDGERS[str(key)]
+        plan = _finance_rows_plan(records, self._finance_row_index_locked(cid, currency))
+        self._write_finance_rows_locked(cid, currency, plan["upserts"], plan["moves"], plan["deletes"])
+        return self._finance_rows_result(plan)
+
+    def sync_finance_rows(self, chat_id, key: str, records) -> dict:
+        """Full digest reconcile of one ledger; rows are serialized outside self.lock, only changed ones are written."""
+        plan = _finance_rows_plan(records, self.finance_row_index(chat_id, key))
+        generation = self.write_finance_rows(chat_id, key, plan["upserts"], plan["moves"], plan["deletes"])
+        return self._finance_rows_result(plan, generation)
+
+    def delete_finance_rows(self, chat_id=None, key: str | None = None):
+        sql = "DELETE FROM finance_records"; where = []; params = []
+        if chat_id is not None:
+            where.append("chat_id=?"); params.append(str(chat_id))
+        if key is not None:
+            where.append("currency=?"); params.append(FINANCE_ROW_LEDGERS[str(key)])
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self.lock:
+            self.conn.execute(sql, tuple(params))
+            self.conn.execute(sql.replace("finance_records", "finance_msg_index", 1), tuple(params))
+            if chat_id is not None:
+                self._bump_finance_generation_locked(str(chat_id))
+            else:
+                self.conn.execute("UPDATE finance_generations SET gen=gen+1")
+                self.conn.execute("DELETE FROM balance_index")
+            self.conn.commit()
+
+    def _bump_finance_generation_locked(self, chat_id: str):
+        self.conn.execute(
+            "INSERT INTO finance_generations(chat_id,gen) VALUES(?,1) ON CONFLICT(chat_id) DO UPDATE SET gen=gen+1",
+            (str(chat_id),),
+        )
+
+    def finance_msg_lookup(self, chat_id, msg_id) -> list:
+        """[(currency, record_uid, field)] строк чата, где одно из полей message-id равно ``msg_id``."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT currency,record_uid,field FROM finance_msg_index WHERE chat_id=? AND msg_id=?",
+                (str(chat_id), int(msg_id)),
+            ).fetchall()
+        return [(str(r[0]), str(r[1]), str(r[2])) for r in rows]
+
+    def finance_msg_index_check(self, chat_id, repair: bool = True) -> dict:
+        """Сверка finance_msg_index чата с его строками finance_records (и пересборка при расхождении)."""
+        cid = str(chat_id)
+        with self.lock:
+            expected = set()
+            for currency, row_key, raw in self.conn.execute(
+                "SELECT currency,record_uid,v FROM finance_records WHERE chat_id=?", (cid,)
+            ).fetchall():
+                rec = self._load(raw, None)
+                if isinstance(rec, dict):
+                    expected.update((mid, str(currency), str(row_key), field) for field, mid in _finance_msg_fields(rec))
+            actual = {
+                (int(r[0]), str(r[1]), str(r[2]), str(r[3]))
+                for r in self.conn.execute(
+                    "SELECT msg_id,currency,record_uid,field FROM finance_msg_index WHERE chat_id=?", (cid,)
+                ).fetchall()
+            }
+            missing = len(expected - actual); extra = len(actual - expected)
+            if repair and (missing or extra):
+                self._finance_msg_index_fill_locked(cid)
+                self.conn.commit()
+        return {"rows": len(expected), "missing": missing, "extra": extra}
+
+    def finance_generation(self, chat_id) -> int:
+        with self.lock:
+            row = self.conn.execute("SELECT gen FROM finance_generations WHERE chat_id=?", (str(chat_id),)).fetchone()
+        return int(row[0]) if row else 0
+
+    # v199 per-day balance index (see FinanceBalanceIndex) ------------------------
+    def balance_days_load(self, chat_id, currency: str):
+        """{day: (units, n)} if the stored index matches the current finance generation, else None."""
+        cid = str(chat_id); cur = str(currency)
+        with self.lock:
+            row = self.conn.execute("SELECT gen FROM balance_index WHERE chat_id=? AND currency=?", (cid, cur)).fetchone()
+            gen = self.conn.execute("SELECT gen FROM finance_generations WHERE chat_id=?", (cid,)).fetchone()
+            if row is None or int(row[0]) != (int(gen[0]) if gen else 0):
+                return None
+            rows = self.conn.execute(
+                "SELECT day_key,units,n FROM balance_days WHERE chat_id=? AND currency=?", (cid, cur)
+            ).fetchall()
+        out = {}
+        for day, units, n in rows:
+            try:
+                out[str(day)] = (int(units), int(n))
+            except Exception:
+                return None
+        return out
+
+    def balance_days_save(self, chat_id, currency: str, gen: int, days: dict, replace: bool = False):
+        """Writes changed days ({day: (units, n)} or None to delete) stamped with finance generation ``gen``."""
+        cid = str(chat_id); cur = str(currency)
+        upserts = [(cid, cur, str(d), str(int(v[0])), int(v[1])) for d, v in (days or {}).items() if v is not None]
+        gone = [(cid, cur, str(d)) for d, v in (days or {}).items() if v is None]
+        with self.lock:
+            if replace:
+                self.conn.execute("DELETE FROM balance_days WHERE chat_id=? AND currency=?", (cid, cur))
+            if upserts:
+                self.conn.executemany(
+                    "INSERT INTO balance_days(chat_id,currency,day_key,units,n) VALUES(?,?,?,?,?) "
+                    "ON CONFLICT(chat_id,currency,day_key) DO UPDATE SET units=excluded.units,n=excluded.n",
+                    upserts,
+                )
+            if gone:
+                self.conn.executemany("DELETE FROM balance_days WHERE chat_id=? AND currency=? AND day_key=?", gone)
+            self.conn.execute(
+                "INSERT INTO balance_index(chat_id,currency,gen) VALUES(?,?,?) ON CONFLICT(chat_id,currency) DO UPDATE SET gen=excluded.gen",
+                (cid, cur, int(gen)),
+            )
+            self.conn.commit()
+
+    def balance_days_drop(self, chat_id=None):
+        with self.lock:
+            if chat_id is None:
+                self.conn.execute("DELETE FROM balance_days")
+                self.conn.execute("DELETE FROM balance_index")
+            else:
+                self.conn.execute("DELETE FROM balance_days WHERE chat_id=?", (str(chat_id),))
+                self.conn.execute("DELETE FROM balance_index WHERE chat_id=?", (str(chat_id),))
+            self.conn.commit()
+
+    # v199 DATA CONSTITUTION per-chat semantics (see constitution_semantic_manifest_from_live) --
+    def finance_semantic_source(self, chat_id) -> tuple:
+        """(поколение, {records/ars_records/usd_records: строки}) чата, прочитанные под одним lock."""
+        cid = str(chat_id)
+        with self.lock:
+            row = self.conn.execute("SELECT gen FROM finance_generations WHERE chat_id=?", (cid,)).fetchone()
+            rows = defaultdict(list)
+            for currency, raw in self.conn.execute(
+                "SELECT currency,v FROM finance_records WHERE chat_id=? ORDER BY currency,pos", (cid,)
+            ).fetchall():
+                rows[str(currency)].append(raw)
+        out = {}
+        for key, currency in FINANCE_ROW_LEDGERS.items():
+            out[key] = [rec for rec in (self._load(raw, None) for raw in rows.get(currency, ())) if isinstance(rec, dict)]
+        return (int(row[0]) if row else 0), out
+
+    def constitution_semantics_state(self) -> dict:
+        """{chat_id: (текущее поколение, поколение сводки или None, leaf, v)} по всем чатам с финансами или сводкой."""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT g.chat_id,g.gen,s.gen,s.leaf,s.v FROM finance_generations g "
+                "LEFT JOIN constitution_chat_semantics s ON s.chat_id=g.chat_id "
+                "UNION ALL SELECT s.chat_id,0,s.gen,s.leaf,s.v FROM constitution_chat_semantics s "
+                "WHERE s.chat_id NOT IN (SELECT chat_id FROM finance_generations)"
+            ).fetchall()
+        return {
+            str(cid): (int(gen or 0), (None if sgen is None else int(sgen)), str(leaf or ""), self._load(raw, None) if raw else None)
+            for cid, gen, sgen, leaf, raw in rows
+        }
+
+    def constitution_semantics_put(self, chat_id, gen: int, leaf: str, row: dict):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO constitution_chat_semantics(chat_id,gen,leaf,v,updated_at) VALUES(?,?,?,?,?) "
+                "ON CONFLICT(chat_id) DO UPDATE SET gen=excluded.gen,leaf=excluded.leaf,v=excluded.v,updated_at=excluded.updated_at",
+                (str(chat_id), int(gen), str(leaf), self._dump(row), time.time()),
+            )
+            self.conn.commit()
+
+    def constitution_semantics_drop(self, chat_ids=None):
+        with self.lock:
+            if chat_ids is None:
+                self.conn.execute("DELETE FROM constitution_chat_semantics")
+            else:
+                self.conn.executemany("DELETE FROM constitution_chat_semantics WHERE chat_id=?", [(str(c),) for c in chat_ids])
+            self.conn.commit()
+
+    # v199 forward map: (src_chat, src_msg) <-> (dst_chat, dst_msg) ---------------
+    def forward_link_add(self, src_chat, src_msg, dst_chat, dst_msg) -> bool:
+        row = (int(src_chat), int(src_msg), int(dst_chat), int(dst_msg))
+        with self.lock:
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO forward_links(src_chat,src_msg,dst_chat,dst_msg,updated_at) VALUES(?,?,?,?,?)",
+                (*row, time.time()),
+            )
+            added = cur.rowcount > 0
+            if not added:
+                self.conn.execute(
+                    "UPDATE forward_links SET updated_at=? WHERE src_chat=? AND src_msg=? AND dst_chat=? AND dst_msg=?",
+                    (time.time(), *row),
+                )
+            self.conn.commit()
+        return added
+
+    def forward_links_for_source(self, src_chat, src_msg) -> list:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT dst_chat,dst_msg FROM forward_links WHERE src_chat=? AND src_msg=? ORDER BY rowid",
+                (int(src_chat), int(src_msg)),
+            ).fetchall()
+        return [(int(r[0]), int(r[1])) for r in rows]
+
+    def forward_origin_for_copy(self, dst_chat, dst_msg):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT src_chat,src_msg FROM forward_links WHERE dst_chat=? AND dst_msg=? ORDER BY rowid LIMIT 1",
+                (int(dst_chat), int(dst_msg)),
+            ).fetchone()
+        return (int(row[0]), int(row[1])) if row else (None, None)
+
+    def forward_link_replace(self, src_chat, src_msg, old_dst_chat, old_dst_msg, new_dst_chat, new_dst_msg):
+        """Подменяет копию на месте (rowid сохраняет порядок целей); без старой пары — добавляет новую."""
+        src = (int(src_chat), int(src_msg)); old = (int(old_dst_chat), int(old_dst_msg)); new = (int(new_dst_chat), int(new_dst_msg))
+        with self.lock:
+            cur = self.conn.execute(
+                "UPDATE OR IGNORE forward_links SET dst_chat=?,dst_msg=?,updated_at=? "
+                "WHERE src_chat=? AND src_msg=? AND dst_chat=? AND dst_msg=?",
+                (*new, time.time(), *src, *old),
+            )
+            if cur.rowcount <= 0:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO forward_links(src_chat,src_msg,dst_chat,dst_msg,updated_at) VALUES(?,?,?,?,?)",
+                    (*src, *new, time.time()),
+                )
+            if old != new:
+                self.conn.execute(
+                    "DELETE FROM forward_links WHERE src_chat=? AND src_msg=? AND dst_chat=? AND dst_msg=?", (*src, *old)
+                )
+            self.conn.commit()
+
+    def forward_links_delete_source(self, src_chat, src_msg) -> int:
+        with self.lock:
+            cur = self.conn.execute("DELETE FROM forward_links WHERE src_chat=? AND src_msg=?", (int(src_chat), int(src_msg)))
+            self.conn.commit()
+        return max(0, int(cur.rowcount or 0))
+
+    def forward_links_drop_chat(self, chat_id) -> list:
+        """Удаляет все связи, где чат — источник или цель; возвращает затронутые ключи источников."""
+        cid = int(chat_id)
+        with self.lock:
+            keys = sorted({(int(r[0]), int(r[1])) for r in self.conn.execute(
+                "SELECT src_chat,src_msg FROM forward_links WHERE src_chat=? UNION SELECT src_chat,src_msg FROM forward_links WHERE dst_chat=?",
+                (cid, cid),
+            ).fetchall()})
+            self.conn.execute("DELETE FROM forward_links WHERE src_chat=?", (cid,))
+            self.conn.execute("DELETE FROM forward_links WHERE dst_chat=?", (cid,))
+            self.conn.commit()
+        return keys
+
+    def forward_links_remap_chat(self, old_chat, new_chat) -> list:
+        """Миграция group→supergroup: переписывает chat_id в обеих сторонах связи; возвращает затронутые ключи."""
+        old = int(old_chat); new = int(new_chat)
+        with self.lock:
+            keys = {(int(r[0]), int(r[1])) for r in self.conn.execute(
+                "SELECT src_chat,src_msg FROM forward_links WHERE src_chat=? UNION SELECT src_chat,src_msg FROM forward_links WHERE dst_chat=?",
+                (old, old),
+            ).fetchall()}
+            for col in ("src_chat", "dst_chat"):
+                self.conn.execute(f"UPDATE OR IGNORE forward_links SET {col}=? WHERE {col}=?", (new, old))
+                # Оставшиеся строки — дубли уже существующих связей нового чата.
+                self.conn.execute(f"DELETE FROM forward_links WHERE {col}=?", (old,))
+            self.conn.commit()
+        return sorted(keys | {(new if src == old else src, mid) for src, mid in keys})
+
+    def forward_links_export(self, keys=None) -> dict:
+        """forward_index в формате универсального backup: {"src:msg": [{dst_chat_id, dst_msg_id, status}]}."""
+        with self.lock:
+            if keys is None:
+                rows = self.conn.execute(
+                    "SELECT src_chat,src_msg,dst_chat,dst_msg FROM forward_links ORDER BY src_chat,src_msg,rowid"
+                ).fetchall()
+            else:
+                rows = []
+                for src_chat, src_msg in keys:
+                    rows.extend(self.conn.execute(
+                        "SELECT src_chat,src_msg,dst_chat,dst_msg FROM forward_links WHERE src_chat=? AND src_msg=? ORDER BY rowid",
+                        (int(src_chat), int(src_msg)),
+                    ).fetchall())
+        out = {}
+        for src_chat, src_msg, dst_chat, dst_msg in rows:
+            out.setdefault(f"{int(src_chat)}:{int(src_msg)}", []).append(
+                {"dst_chat_id": int(dst_chat), "dst_msg_id": int(dst_msg), "status": "delivered"}
+            )
+        return out
+
+    def iter_forward_index(self):
+        """Потоковый forward_index для backup: (key, rows) по одному источнику.
+
+        Отдельное соединение читает WAL-снимок курсором и не держит self.lock всё время записи backup.
+        """
+        conn = sqlite3.connect(self.path)
+        try:
+            key = None; rows = []
+            for src_chat, src_msg, dst_chat, dst_msg in conn.execute(
+                "SELECT src_chat,src_msg,dst_chat,dst_msg FROM forward_links ORDER BY src_chat,src_msg,rowid"
+            ):
+                current = f"{int(src_chat)}:{int(src_msg)}"
+                if current != key:
+                    if rows:
+                        yield key, rows
+                    key = current; rows = []
+                rows.append({"dst_chat_id": int(dst_chat), "dst_msg_id": int(dst_msg), "status": "delivered"})
+            if rows:
+                yield key, rows
+        finally:
+            conn.close()
+
+    def forward_links_import(self, idx: dict | None, replace: bool = False, deletes=None) -> int:
+        """Загружает forward_index из backup/delta. Ключ из idx заменяет все копии этого источника."""
+        stamp = time.time(); rows = []; sources = []
+        for key, items in (idx or {}).items():
+            try:
+                src_chat_s, src_msg_s = str(key).split(":", 1)
+                src = (int(src_chat_s), int(src_msg_s))
+            except Exception:
+                continue
+            sources.append(src)
+            for item in items or []:
+                try:
+                    rows.append((*src, int(item.get("dst_chat_id")), int(item.get("dst_msg_id")), stamp))
+                except Exception:
+                    continue
+        for key in deletes or []:
+            try:
+                src_chat_s, src_msg_s = str(key).split(":", 1)
+                sources.append((int(src_chat_s), int(src_msg_s)))
+            except Exception:
+                continue
+        with self.lock:
+            if replace:
+                self.conn.execute("DELETE FROM forward_links")
+            else:
+                self.conn.executemany("DELETE FROM forward_links WHERE src_chat=? AND src_msg=?", sources)
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO forward_links(src_chat,src_msg,dst_chat,dst_msg,updated_at) VALUES(?,?,?,?,?)", rows
+            )
+            self.conn.commit()
+        return len(rows)
+
+    def forward_links_count(self) -> int:
+        with self.lock:
+            row = self.conn.execute("SELECT COUNT(*) FROM forward_links").fetchone()
+        return int(row[0] or 0) if row else 0
+
+    def forward_outcome_put(self, src_chat, src_msg, boot: str, item: dict):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO forward_outcomes(src_chat,src_msg,boot,v,updated_at) VALUES(?,?,?,?,?) "
+                "ON CONFLICT(src_chat,src_msg) DO UPDATE SET boot=excluded.boot,v=excluded.v,updated_at=excluded.updated_at",
+                (int(src_chat), int(src_msg), str(boot), self._dump(item or {}), float((item or {}).get("updated_at") or time.time())),
             )
             self.conn.commit()
 
-    def load_root(self):
-        return self.get_kv("root", None)
-
-    def save_root(self, obj):
-        self.set_kv("root", obj)
+    def forward_outcome_get(self, src_chat, src_msg, boot: str) -> dict | None:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT v FROM forward_outcomes WHERE src_chat=? AND src_msg=? AND boot=?",
+                (int(src_chat), int(src_msg), str(boot)),
+            ).fetchone()
+        return self._load(row[0], None) if row else None
 
-    def load_chats(self) -> dict:
+    def forward_outcome_count(self, boot: str | None = None) -> int:
+        sql = "SELECT COUNT(*) FROM forward_outcomes" + (" WHERE boot=?" if boot is not None else "")
         with self.lock:
-            rows = self.conn.execute("SELECT chat_id, v FROM chats").fetchall()
-        out = {}
-        for row in rows:
-            val = self._load(row[1], {})
-            if isinstance(val, dict):
-                out[str(row[0])] = val
-        return out
+            row = self.conn.execute(sql, (str(boot),) if boot is not None else ()).fetchone()
+        return int(row[0] or 0) if row else 0
 
-    def save_chats(self, chats: dict):
-        chats = chats or {}
+    def forward_prune(self, link_before: float | None, outcome_before: float | None) -> tuple[list, int]:
+        """TTL: удаляет связи/исходы, не обновлявшиеся с указанного момента (None — не трогать).
+
+        Возвращает ключи источников, потерявших хотя бы одну копию, и число удалённых исходов.
+        """
+        links = []; outcomes = 0
         with self.lock:
-            existing = {str(r[0]) for r in self.conn.execute("SELECT chat_id FROM chats").fetchall()}
-            for chat_id, payload in chats.items():
-                self.conn.execute(
-                    "INSERT INTO chats(chat_id,v) VALUES(?,?) ON CONFLICT(chat_id) DO UPDATE SET v=excluded.v",
-                    (str(chat_id), self._dump(payload)),
-                )
-            for stale in existing - {str(k) for k in chats.keys()}:
-                self.conn.execute("DELETE FROM chats WHERE chat_id=?", (stale,))
+            if link_before is not None:
+                links = sorted({(int(r[0]), int(r[1])) for r in self.conn.execute(
+                    "SELECT src_chat,src_msg FROM forward_links WHERE updated_at<?", (float(link_before),)
+                ).fetchall()})
+                self.conn.execute("DELETE FROM forward_links WHERE updated_at<?", (float(link_before),))
+            if outcome_before is not None:
+                outcomes = max(0, int(self.conn.execute("DELETE FROM forward_outcomes WHERE updated_at<?", (float(outcome_before),)).rowcount or 0))
             self.conn.commit()
+        return links, outcomes
 
-    def save_chat(self, chat_id, payload: dict):
-        """Точечно сохраняет только один изменившийся чат."""
+    # v199 callback tokens ------------------------------------------------------
+    def callback_token_get(self, token: str):
+        """(data, expires_at) of a short callback token or None."""
+        with self.lock:
+            row = self.conn.execute("SELECT data,expires_at FROM callback_tokens WHERE token=?", (str(token),)).fetchone()
+        return (str(row[0]), float(row[1])) if row else None
+
+    def callback_token_put(self, token: str, data_str: str, expires_at: float):
+        """Insert a token or extend its expiry; the caller checked that ``token`` maps to ``data_str``."""
         with self.lock:
             self.conn.execute(
-                "INSERT INTO chats(chat_id,v) VALUES(?,?) ON CONFLICT(chat_id) DO UPDATE SET v=excluded.v",
-                (str(chat_id), self._dump(payload or {})),
+                "INSERT INTO callback_tokens(token,data,expires_at) VALUES(?,?,?) "
+                "ON CONFLICT(token) DO UPDATE SET expires_at=MAX(expires_at, excluded.expires_at)",
+                (str(token), str(data_str), float(expires_at)),
             )
             self.conn.commit()
 
-    def delete_chat(self, chat_id):
+    def callback_tokens_sweep(self, now: float, limit: int = 5000) -> int:
+        """Delete up to ``limit`` expired tokens through idx_callback_tokens_ttl."""
         with self.lock:
-            self.conn.execute("DELETE FROM chats WHERE chat_id=?", (str(chat_id),))
+            cur = self.conn.execute(
+                "DELETE FROM callback_tokens WHERE token IN "
+                "(SELECT token FROM callback_tokens WHERE expires_at<? ORDER BY expires_at LIMIT ?)",
+                (float(now), max(1, int(limit))),
+            )
             self.conn.commit()
+        return max(0, int(cur.rowcount or 0))
 
-    def get_meta(self, kind: str, key: str, default=None):
+    def callback_tokens_count(self) -> int:
+        with self.lock:
+            row = self.conn.execute("SELECT COUNT(*) FROM callback_tokens").fetchone()
+        return int(row[0] or 0) if row else 0
+
+    # v199 secret media blobs ---------------------------------------------------
+    def secret_blob_get(self, sha256: str):
+        """(path, bytes, quality) of a stored blob or None."""
+        with self.lock:
+            row = self.conn.execute("SELECT path,bytes,quality FROM secret_blobs WHERE sha256=?", (str(sha256),)).fetchone()
+        return (str(row[0]), int(row[1] or 0), str(row[2] or "")) if row else None
+
+    def secret_blob_for_unique(self, file_unique_id: str):
+        """(sha256, path, bytes, quality) for a Telegram file_unique_id whose blob is stored, else None."""
         with self.lock:
             row = self.conn.execute(
-                "SELECT v FROM meta WHERE kind=? AND k=?", (kind, key)
+                "SELECT b.sha256,b.path,b.bytes,b.quality FROM secret_blob_aliases a JOIN secret_blobs b ON b.sha256=a.sha256 "
+                "WHERE a.file_unique_id=?",
+                (str(file_unique_id),),
             ).fetchone()
-        return self._load(row[0], default) if row else default
+        return (str(row[0]), str(row[1]), int(row[2] or 0), str(row[3] or "")) if row else None
 
-    def set_meta(self, kind: str, key: str, obj):
-        payload = self._dump(obj)
+    def secret_blob_put(self, sha256: str, path: str, size: int = 0, quality: str = "", unique_ids=()):
+        """Register an uploaded blob (and the file_unique_ids known to carry its bytes) in one transaction."""
         with self.lock:
             self.conn.execute(
-                "INSERT INTO meta(kind,k,v) VALUES(?,?,?) ON CONFLICT(kind,k) DO UPDATE SET v=excluded.v",
-                (kind, key, payload),
+                "INSERT INTO secret_blobs(sha256,path,bytes,quality,updated_at) VALUES(?,?,?,?,?) "
+                "ON CONFLICT(sha256) DO UPDATE SET path=excluded.path,bytes=excluded.bytes,quality=excluded.quality,updated_at=excluded.updated_at",
+                (str(sha256), str(path), int(size or 0), str(quality or ""), time.time()),
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO secret_blob_aliases(file_unique_id,sha256) VALUES(?,?)",
+                [(str(u), str(sha256)) for u in unique_ids if u],
             )
             self.conn.commit()
 
+    def secret_blob_alias(self, file_unique_id: str, sha256: str):
+        if not file_unique_id:
+            return
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO secret_blob_aliases(file_unique_id,sha256) VALUES(?,?)",
+                              (str(file_unique_id), str(sha256)))
+            self.conn.commit()
+
+    def secret_blob_drop_path(self, path: str) -> int:
+        """Forget the blob stored at ``path`` together with its aliases."""
+        with self.lock:
+            rows = self.conn.execute("SELECT sha256 FROM secret_blobs WHERE path=?", (str(path),)).fetchall()
+            for (sha,) in rows:
+                self.conn.execute("DELETE FROM secret_blob_aliases WHERE sha256=?", (sha,))
+                self.conn.execute("DELETE FROM secret_blobs WHERE sha256=?", (sha,))
+            self.conn.commit()
+        return len(rows)
+
+    def secret_blobs_count(self) -> tuple:
+        with self.lock:
+            blobs = self.conn.execute("SELECT COUNT(*),COALESCE(SUM(bytes),0) FROM secret_blobs").fetchone()
+            aliases = self.conn.execute("SELECT COUNT(*) FROM secret_blob_aliases").fetchone()
+        return int(blobs[0] or 0), int(blobs[1] or 0), int(aliases[0] or 0)
+
     # v114 LOW-RAM cold storage -------------------------------------------------
     def get_cold(self, chat_id, key: str, default=None):
+        key = str(key)
+        if key in FINANCE_ROW_LEDGERS:
+            rows = self.get_finance_rows(chat_id, key)
+            return rows if rows or default is None else default
+        if key in FINANCE_ROW_DAILY:
+            rows = self.get_finance_rows(chat_id, FINANCE_ROW_DAILY[key])
+            return _lowram_rebuild_daily(rows) if rows or default is None else default
         with self.lock:
             row = self.conn.execute(
                 "SELECT v FROM cold_fields WHERE chat_id=? AND k=?",
@@ -1195,6 +3102,11 @@ class SQLiteState:
         return self._load(row[0], default) if row else default
 
     def set_cold(self, chat_id, key: str, obj):
+        if str(key) in FINANCE_ROW_LEDGERS:
+            self.sync_finance_rows(chat_id, str(key), obj if isinstance(obj, list) else [])
+            return
+        if str(key) in FINANCE_ROW_DAILY:
+            return  # derived from the ledger rows on load
         payload = self._dump(obj)
         stamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
         with self.lock:
@@ -1206,6 +3118,9 @@ class SQLiteState:
             self.conn.commit()
 
     def delete_cold(self, chat_id, key: str):
+        if str(key) in FINANCE_ROW_LEDGERS:
+            self.delete_finance_rows(chat_id, str(key))
+            return
         with self.lock:
             self.conn.execute("DELETE FROM cold_fields WHERE chat_id=? AND k=?", (str(chat_id), str(key)))
             self.conn.commit()
@@ -1220,14 +3135,33 @@ class SQLiteState:
             where.append("k=?"); params.append(str(key))
         if where:
             sql += " WHERE " + " AND ".join(where)
+        # A finance ledger counts as one cold field, exactly like its former blob row.
+        fsql = "SELECT COUNT(*) FROM (SELECT DISTINCT chat_id,currency FROM finance_records"
+        fwhere = []; fparams = []
+        if chat_id is not None:
+            fwhere.append("chat_id=?"); fparams.append(str(chat_id))
+        if key is not None:
+            fwhere.append("currency=?"); fparams.append(FINANCE_ROW_LEDGERS.get(str(key), ""))
+        if fwhere:
+            fsql += " WHERE " + " AND ".join(fwhere)
+        fsql += ")"
         with self.lock:
             row = self.conn.execute(sql, tuple(params)).fetchone()
+            frow = self.conn.execute(fsql, tuple(fparams)).fetchone()
+        return (int(row[0] or 0) if row else 0) + (int(frow[0] or 0) if frow else 0)
+
+    def finance_row_count(self, chat_id=None) -> int:
+        sql = "SELECT COUNT(*) FROM finance_records" + (" WHERE chat_id=?" if chat_id is not None else "")
+        with self.lock:
+            row = self.conn.execute(sql, (str(chat_id),) if chat_id is not None else ()).fetchone()
         return int(row[0] or 0) if row else 0
 
     def cold_keys_for_chat(self, chat_id) -> list[str]:
+        reverse = {v: k for k, v in FINANCE_ROW_LEDGERS.items()}
         with self.lock:
             rows = self.conn.execute("SELECT k FROM cold_fields WHERE chat_id=?", (str(chat_id),)).fetchall()
-        return [str(r[0]) for r in rows]
+            frows = self.conn.execute("SELECT DISTINCT currency FROM finance_records WHERE chat_id=?", (str(chat_id),)).fetchall()
+        return [str(r[0]) for r in rows] + [reverse[str(r[0])] for r in frows if str(r[0]) in reverse]
 
     def backup_to(self, target_path: str):
         """Consistent on-disk SQLite snapshot without materializing bot state in Python RAM."""
@@ -1271,6 +3205,416 @@ class SQLiteState:
 SQLITE = SQLiteState(DB_FILE)
 
 
+# ─────────────────────────────────────────────────────────────
+# v199 FINANCE BALANCE INDEX
+# Поденные итоги и ленивые префиксные суммы по (чат, валюта): остаток на начало дня,
+# на конец дня и за месяц — bisect по отсортированным дням вместо пересортировки ledger.
+# Суммы ведутся в целых единицах 2**-1074: любое конечное float — целое кратное этой
+# единицы, поэтому итог точен и не зависит от порядка сложения (= math.fsum полного прохода).
+# ─────────────────────────────────────────────────────────────
+FINANCE_BALANCE_UNITS_SHIFT = 1074
+FINANCE_BALANCE_INDEX_ENABLED = _env_bool("FINANCE_BALANCE_INDEX_ENABLED", "1")
+try:
+    FINANCE_BALANCE_VERIFY_EVERY = max(0, int(os.getenv("FINANCE_BALANCE_VERIFY_EVERY", "200") or "200"))
+except Exception:
+    FINANCE_BALANCE_VERIFY_EVERY = 200
+
+
+def balance_units(value) -> int:
+    """float → точные целые единицы 2**-1074 (нечисло/inf → 0, как _v151_float)."""
+    try:
+        x = float(value or 0)
+    except Exception:
+        return 0
+    if not math.isfinite(x):
+        return 0
+    n, d = x.as_integer_ratio()
+    return n << (FINANCE_BALANCE_UNITS_SHIFT - (d.bit_length() - 1))
+
+
+def balance_from_units(units: int) -> float:
+    """Корректно округлённый float точной суммы."""
+    return int(units) / (1 << FINANCE_BALANCE_UNITS_SHIFT)
+
+
+class _BalanceLedger:
+    """Одна валюта одного чата: дни по возрастанию, итог/число записей дня, префиксы."""
+
+    __slots__ = ("days", "units", "counts", "prefix", "valid", "rows", "total", "sig", "contrib", "ambiguous", "dirty", "replace", "updates", "source")
+
+    def __init__(self, day_rows: dict, rows: int, contrib: dict | None = None, ambiguous: set | None = None, source: str = "scan"):
+        self.units = {d: int(v[0]) for d, v in day_rows.items()}
+        self.counts = {d: int(v[1]) for d, v in day_rows.items()}
+        self.days = sorted(self.units)
+        self.prefix = [0] * (len(self.days) + 1)
+        self.valid = 0           # prefix[0..valid] посчитаны
+        self.rows = int(rows)    # строк в authority (для дешёвой сверки с длиной ledger)
+        self.total = None        # ARS: units всех строк (и без дня) — сверка с точной суммой ledger; None — неизвестно
+        self.sig = None          # USD: длины исходных списков на момент сборки
+        self.contrib = contrib   # key -> (day, units); None — нет построчной карты (USD / загружено из SQLite)
+        self.ambiguous = ambiguous or set()
+        self.dirty = set()
+        self.replace = True      # следующий persist переписывает все дни
+        self.updates = 0
+        self.source = source
+
+    def before(self, pos: int) -> int:
+        if pos > self.valid:
+            prefix, days, units = self.prefix, self.days, self.units
+            for j in range(self.valid, pos):
+                prefix[j + 1] = prefix[j] + units[days[j]]
+            self.valid = pos
+        return self.prefix[pos]
+
+    def add(self, day: str, du: int, dn: int):
+        if not day:
+            return
+        days = self.days
+        pos = bisect.bisect_left(days, day)
+        if pos < len(days) and days[pos] == day:
+            self.units[day] += du
+            self.counts[day] += dn
+            if self.counts[day] <= 0:
+                days.pop(pos); self.prefix.pop(pos + 1)
+                self.units.pop(day, None); self.counts.pop(day, None)
+        elif dn > 0:
+            days.insert(pos, day); self.prefix.insert(pos + 1, 0)
+            self.units[day] = du; self.counts[day] = dn
+        self.valid = min(self.valid, pos)
+        self.dirty.add(day)
+
+    def snapshot(self) -> dict:
+        return {d: (self.units[d], self.counts[d]) for d in self.days}
+
+
+class FinanceBalanceIndex:
+    """Opening/day/month balances per (chat, currency) in O(log days), kept up to date incrementally.
+
+    Callables supplied by the export layer (the full-scan authority lives there):
+      rows_fn(chat_id, currency) -> iterable of (key, day, amount) for every canonical ledger row;
+      row_fn(rec) -> the same tuple for one raw record of the ARS ledger;
+      ledger_fn(chat_id, ledger) -> "ars" / "usd" / None: which canonical ledger a stored list feeds;
+      size_fn(chat_id, currency) -> cheap shape of the source lists when they are already in RAM
+        (ARS: row count, or (row count, exact total units) when the caller knows the ledger total;
+        USD: list lengths), else None; a mismatch forces a rebuild.
+
+    ARS is maintained row by row from the record mutation hooks (delta_track_*) and persisted
+    in SQLite. The canonical USD stream is derived from both ledgers (clone filtering against
+    ARS rows, de-duplication by source), so every finance change in a chat drops its USD entry
+    and the next USD lookup rebuilds it with one scan.
+    """
+
+    def __init__(self, sqlite, rows_fn, row_fn, ledger_fn, size_fn=None, verify_every: int = 200,
+                 persist: bool = True, log_fn=None):
+        self.sqlite = sqlite
+        self.rows_fn = rows_fn
+        self.row_fn = row_fn
+        self.ledger_fn = ledger_fn
+        self.size_fn = size_fn
+        self.verify_every = int(verify_every or 0)
+        self.persist_enabled = bool(persist)
+        self.log_fn = log_fn
+        self.lock = threading.RLock()
+        self._ledgers = {}
+        self._gen = defaultdict(int)   # (chat_id, currency) -> счётчик изменений в этом процессе
+        self.stats = {
+            "lookups": 0, "builds": 0, "loads": 0, "incremental": 0, "invalidations": 0,
+            "guard_rebuilds": 0, "verify_runs": 0, "verify_mismatches": 0, "persisted_days": 0,
+            "build_rows": 0, "build_seconds": 0.0,
+        }
+
+    # mutation side ----------------------------------------------------------------
+    def generation(self, chat_id) -> int:
+        """Счётчик изменений ledger чата в этом процессе (ключ для зависимых кэшей)."""
+        cid = int(chat_id)
+        with self.lock:
+            return int(self._gen[(cid, "ars")]) + int(self._gen[(cid, "usd")])
+
+    def _drop_locked(self, cid: int, cur: str):
+        self._gen[(cid, cur)] += 1
+        if self._ledgers.pop((cid, cur), None) is not None:
+            self.stats["invalidations"] += 1
+
+    def invalidate(self, chat_id=None, currency: str | None = None, reason: str = ""):
+        with self.lock:
+            if chat_id is None:
+                for key in list(self._gen):
+                    self._gen[key] += 1
+                self.stats["invalidations"] += len(self._ledgers)
+                self._ledgers.clear()
+                return
+            cid = int(chat_id)
+            for cur in ((currency,) if currency else ("ars", "usd")):
+                self._drop_locked(cid, str(cur))
+
+    def note_record(self, chat_id, rec: dict | None, ledger: str = "records", deleted: bool = False, key: str | None = None) -> bool:
+        """One finance record was added/edited/deleted in ``ledger``; returns True if ARS totals changed."""
+        cid = int(chat_id)
+        cur = self.ledger_fn(cid, ledger)
+        if cur is None:
+            return False
+        new = None if rec is None or deleted else self.row_fn(rec)
+        rkey = str(key or (new[0] if new else ""))
+        with self.lock:
+            self._drop_locked(cid, "usd")
+            if cur != "ars":
+                return False
+            led = self._ledgers.get((cid, "ars"))
+            if led is None:
+                self._gen[(cid, "ars")] += 1
+                return True
+            if led.contrib is None or not rkey or rkey in led.ambiguous:
+                self._drop_locked(cid, "ars")
+                return True
+            old = led.contrib.get(rkey)
+            if new is None and old is None:
+                # Удаление строки, которой индекс не знает: надёжнее пересобрать.
+                self._drop_locked(cid, "ars")
+                return True
+            new_c = None if new is None else (str(new[1] or ""), balance_units(new[2]))
+            if old == new_c:
+                return False
+            self._gen[(cid, "ars")] += 1
+            if old is not None:
+                led.add(old[0], -old[1], -1); led.rows -= 1
+                led.contrib.pop(rkey, None)
+            if new_c is not None:
+                led.add(new_c[0], new_c[1], 1); led.rows += 1
+                led.contrib[rkey] = new_c
+            if led.total is not None:
+                led.total += (new_c[1] if new_c is not None else 0) - (old[1] if old is not None else 0)
+            led.updates += 1
+            self.stats["incremental"] += 1
+            return True
+
+    def rekey_record(self, chat_id, old_key: str, rec: dict):
+        """A record's identity changed in place (uid assigned, id renumbered); the following
+        note_record() for the same record then applies only the value difference."""
+        cid = int(chat_id)
+        if self.ledger_fn(cid, "records") != "ars":
+            return
+        new_key = self.row_fn(rec)[0]
+        with self.lock:
+            led = self._ledgers.get((cid, "ars"))
+            if led is None or led.contrib is None or str(old_key) == new_key:
+                return
+            if str(old_key) in led.ambiguous or new_key in led.contrib or new_key in led.ambiguous:
+                self._drop_locked(cid, "ars")
+                return
+            entry = led.contrib.pop(str(old_key), None)
+            if entry is not None:
+                led.contrib[new_key] = entry
+
+    # lookup side ------------------------------------------------------------------
+    def _build(self, cid: int, cur: str) -> _BalanceLedger:
+        with self.lock:
+            gen = self._gen[(cid, cur)]
+        sig = self._shape(cid, cur) if cur != "ars" else None
+        started = time.perf_counter()
+        day_rows = {}; contrib = {}; ambiguous = set(); rows = 0; total = 0
+        for rkey, day, amount in self.rows_fn(cid, cur) or []:
+            rows += 1
+            units = balance_units(amount)
+            total += units
+            day = str(day or "")
+            if day:
+                u, n = day_rows.get(day, (0, 0))
+                day_rows[day] = (u + units, n + 1)
+            if rkey in contrib:
+                ambiguous.add(rkey)
+            contrib[rkey] = (day, units)
+        led = _BalanceLedger(day_rows, rows, contrib if cur == "ars" else None, ambiguous)
+        led.sig = sig
+        if cur == "ars":
+            led.total = total
+        with self.lock:
+            self.stats["builds"] += 1
+            self.stats["build_rows"] += rows
+            self.stats["build_seconds"] += time.perf_counter() - started
+            # Изменение во время прохода: результат годен для этого вызова, но не кэшируется.
+            if self._gen[(cid, cur)] == gen:
+                self._ledgers[(cid, cur)] = led
+        return led
+
+    def _load(self, cid: int, cur: str):
+        """ARS-итоги из SQLite годятся, только пока в этом процессе ledger чата не менялся."""
+        if not self.persist_enabled or cur != "ars":
+            return None
+        with self.lock:
+            if self._gen[(cid, cur)]:
+                return None
+        try:
+            day_rows = self.sqlite.balance_days_load(cid, cur)
+        except Exception:
+            return None
+        if day_rows is None:
+            return None
+        led = _BalanceLedger(day_rows, sum(n for _u, n in day_rows.values()), None, source="sqlite")
+        led.replace = False
+        with self.lock:
+            if self._gen[(cid, cur)]:
+                return None
+            self._ledgers[(cid, cur)] = led
+            self.stats["loads"] += 1
+        self._verify_soon(cid, cur)
+        return led
+
+    def _verify_soon(self, cid: int, cur: str):
+        """Загруженные с диска итоги один раз сверяются с полным проходом в фоне."""
+        pool = globals().get("GENERAL_TASK_POOL")
+        submit_unique = getattr(pool, "submit_unique", None) if pool is not None else None
+        if callable(submit_unique):
+            try:
+                submit_unique(f"balance-verify:{cid}:{cur}", lambda: self.verify(cid, cur))
+            except Exception:
+                pass
+
+    def _shape(self, cid: int, cur: str):
+        if self.size_fn is None:
+            return None
+        try:
+            return self.size_fn(cid, cur)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _stale(led: _BalanceLedger, cur: str, shape) -> bool:
+        if shape is None:
+            return False
+        if cur != "ars":
+            return shape != led.sig
+        rows, units = shape if isinstance(shape, tuple) else (shape, None)
+        # v199: одна длина не видит правку суммы на месте; точная сумма ledger — видит.
+        return rows != led.rows or (units is not None and led.total is not None and units != led.total)
+
+    def _ledger(self, chat_id, currency: str) -> _BalanceLedger:
+        # Без self.lock: сборка читает chat store (data_lock), а хуки зовут индекс под data_lock.
+        cid = int(chat_id)
+        cur = "usd" if str(currency or "ars").strip().lower() == "usd" else "ars"
+        with self.lock:
+            self.stats["lookups"] += 1
+            led = self._ledgers.get((cid, cur))
+        if led is not None:
+            if self._stale(led, cur, self._shape(cid, cur)):
+                with self.lock:
+                    self.stats["guard_rebuilds"] += 1
+                    if self._ledgers.get((cid, cur)) is led:
+                        self._drop_locked(cid, cur)
+                led = None
+        if led is not None and self.verify_every and led.updates >= self.verify_every:
+            self.verify(cid, cur)
+            with self.lock:
+                led = self._ledgers.get((cid, cur)) or led
+        if led is None:
+            led = self._load(cid, cur) or self._build(cid, cur)
+        return led
+
+    def opening(self, chat_id, currency: str, day_key: str) -> float:
+        """Остаток до начала дня: сумма всех записей с day < day_key."""
+        led = self._ledger(chat_id, currency)
+        with self.lock:
+            return balance_from_units(led.before(bisect.bisect_left(led.days, str(day_key or "")[:10])))
+
+    def through(self, chat_id, currency: str, day_key: str) -> float:
+        """Остаток на конец дня: сумма всех записей с day <= day_key."""
+        led = self._ledger(chat_id, currency)
+        with self.lock:
+            return balance_from_units(led.before(bisect.bisect_right(led.days, str(day_key or "")[:10])))
+
+    def day_total(self, chat_id, currency: str, day_key: str) -> float:
+        led = self._ledger(chat_id, currency)
+        with self.lock:
+            return balance_from_units(led.units.get(str(day_key or "")[:10], 0))
+
+    def month(self, chat_id, currency: str, month_key: str) -> dict:
+        """{"opening", "total", "closing", "days"} за месяц YYYY-MM."""
+        month_key = str(month_key or "")[:7]
+        led = self._ledger(chat_id, currency)
+        with self.lock:
+            lo = bisect.bisect_left(led.days, month_key)
+            hi = bisect.bisect_left(led.days, month_key + "~")
+            opening = led.before(lo); closing = led.before(hi)
+            return {"opening": balance_from_units(opening), "total": balance_from_units(closing - opening),
+                    "closing": balance_from_units(closing), "days": hi - lo}
+
+    def total(self, chat_id, currency: str) -> float:
+        led = self._ledger(chat_id, currency)
+        with self.lock:
+            return balance_from_units(led.before(len(led.days)))
+
+    # upkeep -----------------------------------------------------------------------
+    def verify(self, chat_id, currency: str) -> dict:
+        """Сверяет поддерживаемые итоги с полным проходом; при расхождении индекс заменяется."""
+        cid = int(chat_id)
+        cur = "usd" if str(currency or "ars").strip().lower() == "usd" else "ars"
+        out = {"chat_id": cid, "currency": cur, "checked": False, "days": 0, "mismatched_days": []}
+        with self.lock:
+            current = self._ledgers.get((cid, cur))
+            gen = self._gen[(cid, cur)]
+            self.stats["verify_runs"] += 1
+        if current is None:
+            return out
+        fresh = self._build(cid, cur)
+        with self.lock:
+            if self._gen[(cid, cur)] != gen:
+                return out
+            expected = fresh.snapshot()
+            got = current.snapshot()
+            bad = sorted(d for d in set(expected) | set(got) if expected.get(d) != got.get(d))
+            if current.rows != fresh.rows and not bad:
+                bad = ["*rows"]
+            if bad:
+                self.stats["verify_mismatches"] += 1
+            else:
+                # Совпало: прежний объект остаётся (его dirty/persist-состояние), карта строк — свежая.
+                current.contrib = fresh.contrib; current.ambiguous = fresh.ambiguous; current.total = fresh.total
+                self._ledgers[(cid, cur)] = current
+            current.updates = 0
+        if bad and callable(self.log_fn):
+            try: self.log_fn(f"finance balance index {cid}/{cur}: {len(bad)} day(s) differ from full scan, rebuilt: {bad[:5]}")
+            except Exception: pass
+        out.update(checked=True, days=len(expected), mismatched_days=bad)
+        return out
+
+    def persist(self, chat_id, since_generation: int | None = None) -> int:
+        """Пишет изменённые ARS-дни в SQLite со штампом поколения finance_records (после flush чата)."""
+        if not self.persist_enabled:
+            return 0
+        cid = int(chat_id)
+        try:
+            gen = self.sqlite.finance_generation(cid)
+        except Exception:
+            return 0
+        with self.lock:
+            led = self._ledgers.get((cid, "ars"))
+            if since_generation is not None and self._gen[(cid, "ars")] != int(since_generation):
+                return 0  # в ledger успели внести изменение, которое ещё не сброшено на диск
+            if led is None or (not led.dirty and not led.replace):
+                return 0
+            days = led.snapshot() if led.replace else {d: ((led.units[d], led.counts[d]) if d in led.counts else None) for d in led.dirty}
+            try:
+                self.sqlite.balance_days_save(cid, "ars", gen, days, replace=led.replace)
+            except Exception as exc:
+                if callable(self.log_fn):
+                    try: self.log_fn(f"finance balance index persist {cid}: {exc}")
+                    except Exception: pass
+                return 0
+            led.dirty.clear(); led.replace = False
+            self.stats["persisted_days"] += len(days)
+        return len(days)
+
+    def persist_generation(self, chat_id) -> int:
+        with self.lock:
+            return int(self._gen[(int(chat_id), "ars")])
+
+    def snapshot_stats(self) -> dict:
+        with self.lock:
+            out = dict(self.stats)
+            out["ledgers"] = len(self._ledgers)
+            out["days"] = sum(len(led.days) for led in self._ledgers.values())
+        return out
+
+
 # ─────────────────────────────────────────────────────────────
 # v114 LOW-RAM CORE
 # RAM = active working set; SQLite = disposable working state; MEGA = durable state.
@@ -1293,6 +3637,8 @@ _LOWRAM_DB_RESTORE_DETAIL = ""
 _LOWRAM_LOCK = threading.RLock()
 _LOWRAM_STATS = {
     "cold_loads": 0, "cold_saves": 0, "cold_evictions": 0,
+    "row_upserts": 0, "row_deletes": 0, "row_moves": 0,
+    "row_sync_clean": 0, "row_sync_incremental": 0, "row_sync_full": 0, "row_serialized": 0, "row_checks": 0, "row_check_drift": 0,
     "db_snapshots": 0, "db_snapshot_errors": 0, "db_restores": 0,
     "last_snapshot_at": "", "last_restore_at": "", "last_error": "",
 }
@@ -1323,6 +3669,25 @@ class ColdChatStore(dict):
         if dict.__contains__(self, key):
             _lowram_touch(self._chat_id, key)
             return
+        if key in FINANCE_ROW_DAILY:
+            # Share record objects with the ledger list, as normalize/flush always did.
+            self._ensure_cold(FINANCE_ROW_DAILY[key])
+            dict.__setitem__(self, key, _lowram_rebuild_daily(dict.__getitem__(self, FINANCE_ROW_DAILY[key]) or []))
+            self._cold_loaded.add(key)
+            _lowram_touch(self._chat_id, key)
+            return
+        if key in FINANCE_ROW_LEDGERS:
+            # Раскладка (row_key, pos) запоминается сразу: следующий flush пишет только правки.
+            placed = []
+            gen = SQLITE.finance_generation(self._chat_id)
+            value = SQLITE.get_finance_rows(self._chat_id, key, placed=placed)
+            dict.__setitem__(self, key, value)
+            _finance_rows_seed(self._chat_id, key, value, placed, gen)
+            self._cold_loaded.add(key)
+            with _LOWRAM_LOCK:
+                _LOWRAM_STATS["cold_loads"] += 1
+            _lowram_touch(self._chat_id, key)
+            return
         value = SQLITE.get_cold(self._chat_id, key, _lowram_default_for_key(key))
         if value is None:
             value = _lowram_default_for_key(key)
@@ -1381,6 +3746,219 @@ def _lowram_rebuild_daily(records):
             daily.setdefault(str(dk), []).append(rec)
     return daily
 
+# v199: flush ledger без прохода по всей истории. Для загруженного ledger помним
+# id(запись) → (row_key, pos); delta_track_record помечает записи, правленые на месте.
+# Flush сериализует только помеченные и новые записи (до захвата SQLITE.lock), удалённые
+# находит по пропавшим id, а порядок держит разреженный pos. Правки мимо delta_track_record
+# ловит полная сверка по digest — при выгрузке чата и раз в FINANCE_ROW_SYNC_FULL_EVERY flush,
+# а раньше — сверка отпечатков строк на flush финализации чата (finance_rows_check): проход
+# без сериализации (~1 мкс/строка), для ledger больше FINANCE_ROW_CHECK_MAX_ROWS — не чаще
+# раза в FINANCE_ROW_CHECK_SECONDS.
+FINANCE_ROW_SYNC_INCREMENTAL = _env_bool("FINANCE_ROW_SYNC_INCREMENTAL", "1")
+FINANCE_ROW_SYNC_FULL_EVERY = _env_int("FINANCE_ROW_SYNC_FULL_EVERY", 200, 0, 1000000)
+FINANCE_ROW_CHECK_MAX_ROWS = _env_int("FINANCE_ROW_CHECK_MAX_ROWS", 20000, 0, 100000000)
+FINANCE_ROW_CHECK_SECONDS = _env_int("FINANCE_ROW_CHECK_SECONDS", 30, 0, 86400)
+_FINANCE_ROW_LOCK = threading.RLock()
+_FINANCE_ROW_STATE = {}
+_FINANCE_ROW_LOCAL = threading.local()
+
+
+def _finance_row_fp(rec: dict) -> int:
+    """Отпечаток содержимого записи без сериализации: сверка строк на финализации."""
+    try:
+        return hash(tuple(rec.values()))
+    except TypeError:
+        # Вложенный список/словарь: json только для такой строки.
+        return hash(json.dumps(rec, ensure_ascii=False, separators=(",", ":"), default=str))
+
+
+def _finance_rows_seed(chat_id: int, key: str, records, placed, gen: int):
+    """Запомнить раскладку ledger, совпадающую с диском поколения ``gen`` (после загрузки или полной сверки)."""
+    if not FINANCE_ROW_SYNC_INCREMENTAL or not isinstance(records, list):
+        return
+    state = {
+        "records": records, "n": len(records),
+        "rows": {id(rec): (row_key, pos, rec, _finance_row_fp(rec)) for rec, row_key, pos in placed},
+        "keys": {row_key for _rec, row_key, _pos in placed}, "dirty": {}, "touched": False, "flushes": 0, "gen": int(gen),
+        "check": False, "checked_at": 0.0,
+    }
+    with _FINANCE_ROW_LOCK:
+        _FINANCE_ROW_STATE[(int(chat_id), str(key))] = state
+
+
+def _finance_rows_advance(cid: int, generation) -> None:
+    """Своя запись подняла поколение: раскладки ledger чата, верные до неё, верны и после."""
+    before, after = generation
+    if before == after:
+        return
+    with _FINANCE_ROW_LOCK:
+        for name in FINANCE_ROW_LEDGERS:
+            state = _FINANCE_ROW_STATE.get((cid, name))
+            if state is not None and state["gen"] == before:
+                state["gen"] = after
+
+
+def finance_rows_note(chat_id: int, rec=None, ledger: str = "records", deleted: bool = False, key=None):
+    """Хук delta_track_record: запись изменена на месте (помечается во всех ledger чата — объекты бывают общими)."""
+    if getattr(_FINANCE_ROW_LOCAL, "quiet", False):
+        return
+    try:
+        cid = int(chat_id)
+    except Exception:
+        return
+    with _FINANCE_ROW_LOCK:
+        for name in FINANCE_ROW_LEDGERS:
+            state = _FINANCE_ROW_STATE.get((cid, name))
+            if state is None:
+                continue
+            if isinstance(rec, dict) and not deleted:
+                state["dirty"][id(rec)] = rec
+            else:
+                state["touched"] = True
+
+
+def finance_rows_check(chat_id: int) -> None:
+    """Финализация чата: следующий flush его ledger сверяет отпечатки строк с RAM."""
+    try:
+        cid = int(chat_id)
+    except Exception:
+        return
+    with _FINANCE_ROW_LOCK:
+        for name in FINANCE_ROW_LEDGERS:
+            state = _FINANCE_ROW_STATE.get((cid, name))
+            if state is not None:
+                state["check"] = True
+
+
+def finance_rows_release(chat_id=None):
+    """Забыть раскладку: следующий flush чата — полная сверка по digest."""
+    if getattr(_FINANCE_ROW_LOCAL, "quiet", False):
+        return
+    with _FINANCE_ROW_LOCK:
+        if chat_id is None:
+            _FINANCE_ROW_STATE.clear()
+            return
+        try:
+            cid = int(chat_id)
+        except Exception:
+            return
+        for name in FINANCE_ROW_LEDGERS:
+            _FINANCE_ROW_STATE.pop((cid, name), None)
+
+
+def _finance_rows_full(cid: int, key: str, records: list) -> dict:
+    result = SQLITE.sync_finance_rows(cid, key, records)
+    generation = result.pop("generation")
+    _finance_rows_advance(cid, generation)
+    _finance_rows_seed(cid, key, records, result.pop("placed"), generation[1])
+    with _LOWRAM_LOCK:
+        _LOWRAM_STATS["row_sync_full"] += 1
+        _LOWRAM_STATS["row_serialized"] += result["rows"]
+    return result
+
+
+def _finance_rows_flush(chat_id: int, key: str, records, full: bool = False) -> dict:
+    """Сбросить ledger в finance_records: по меткам и id записей либо полной сверкой по digest."""
+    cid = int(chat_id); skey = (cid, str(key))
+    records = records if isinstance(records, list) else []
+    gen = SQLITE.finance_generation(cid) if not full else None
+    with _FINANCE_ROW_LOCK:
+        state = _FINANCE_ROW_STATE.get(skey) if not full else None
+        if state is not None and state["gen"] != gen:
+            # finance_records писал кто-то ещё (set_cold, delete_finance_rows, restore): pos в памяти устарели.
+            state = None
+        if state is not None:
+            state["flushes"] += 1
+            if FINANCE_ROW_SYNC_FULL_EVERY and state["flushes"] % FINANCE_ROW_SYNC_FULL_EVERY == 0:
+                state = None
+        if state is not None:
+            # Пересобранный список (полный normalize) из тех же объектов проходится по id.
+            dirty = state["dirty"]; touched = state["touched"] or state["records"] is not records
+            state["dirty"] = {}; state["touched"] = False; state["records"] = records
+            check = state["check"]; state["check"] = False
+    if state is None:
+        return _finance_rows_full(cid, key, records)
+    if check and (len(records) <= FINANCE_ROW_CHECK_MAX_ROWS or time.monotonic() - state["checked_at"] >= FINANCE_ROW_CHECK_SECONDS):
+        # Правка на месте мимо delta_track_record: отпечаток строки разошёлся с записанным.
+        state["checked_at"] = time.monotonic()
+        rows = state["rows"]; drift = 0
+        for rec in records:
+            entry = rows.get(id(rec))
+            if entry is not None and entry[2] is rec and id(rec) not in dirty and entry[3] != _finance_row_fp(rec):
+                dirty[id(rec)] = rec; drift += 1
+        with _LOWRAM_LOCK:
+            _LOWRAM_STATS["row_checks"] += 1
+            _LOWRAM_STATS["row_check_drift"] += drift
+    if not dirty and not touched and len(records) == state["n"]:
+        with _LOWRAM_LOCK:
+            _LOWRAM_STATS["row_sync_clean"] += 1
+        return {"upserts": 0, "moves": 0, "deletes": 0, "rows": state["n"], "changed": [], "deleted": []}
+    try:
+        rows = state["rows"]; keys = state["keys"]
+        # Один проход по id без сериализации: строка с растущим pos остаётся на месте,
+        # новые/помеченные/переставленные ложатся в зазор между соседями.
+        last = -1; run = []; placed = []; found = 0; shuffled = False
+        for rec in records:
+            entry = rows.get(id(rec))
+            if entry is None or entry[2] is not rec:
+                if isinstance(rec, dict):
+                    run.append(rec)
+                continue
+            found += 1
+            pos = entry[1]
+            if pos - last <= len(run) or (dirty and id(rec) in dirty):
+                shuffled = shuffled or pos <= last
+                run.append(rec)
+                continue
+            if run:
+                placed.extend(zip(run, _finance_row_spread(len(run), last, pos))); run = []
+            last = pos
+        if run:
+            placed.extend(zip(run, _finance_row_spread(len(run), last, None)))
+        if len(placed) > 64 and len(placed) * 2 > len(records):
+            # Список подменён новыми объектами (restore/import): сверка по digest пишет меньше строк.
+            return _finance_rows_full(cid, key, records)
+        present = None; gone = []
+        if shuffled or found < len(rows):
+            present = {id(rec) for rec in records}
+            if shuffled and len(present) != len(records):
+                # Один объект дважды в списке: ключи "#n" раздаёт только полная сверка.
+                return _finance_rows_full(cid, key, records)
+            gone = [rid for rid in rows if rid not in present]
+        released = [rows[rid][0] for rid in gone]
+        keys.difference_update(released)
+        upserts = []; moves = []; updates = []
+        for rec, pos in placed:
+            entry = rows.get(id(rec))
+            if entry is not None and entry[2] is rec and id(rec) not in dirty:
+                moves.append((entry[0], pos)); updates.append((rec, entry[0], pos, entry[3]))
+                continue
+            if entry is not None and entry[2] is rec:
+                keys.discard(entry[0]); released.append(entry[0])
+            row_key, day_key, digest, payload = _finance_row_prepare(rec, keys)
+            upserts.append((row_key, pos, day_key, digest, payload, rec)); updates.append((rec, row_key, pos, _finance_row_fp(rec)))
+        deletes = [k for k in released if k not in keys]
+        generation = SQLITE.write_finance_rows(cid, key, upserts, moves, deletes)
+    except Exception:
+        with _FINANCE_ROW_LOCK:
+            _FINANCE_ROW_STATE.pop(skey, None)
+        return _finance_rows_full(cid, key, records)
+    _finance_rows_advance(cid, generation)
+    with _FINANCE_ROW_LOCK:
+        for rid in gone:
+            rows.pop(rid, None)
+        for rec, row_key, pos, fp in updates:
+            rows[id(rec)] = (row_key, pos, rec, fp)
+        state["n"] = len(records)
+    with _LOWRAM_LOCK:
+        _LOWRAM_STATS["row_sync_incremental"] += 1
+        _LOWRAM_STATS["row_serialized"] += len(upserts)
+    return {
+        "upserts": len(upserts), "moves": len(moves), "deletes": len(deletes), "rows": found + len(placed) - len(moves),
+        "changed": [row[5] for row in upserts], "deleted": deletes,
+    }
+
+
 def _lowram_flush_chat(chat_id: int, store: dict | None = None, evict: bool = False):
     if not LOWRAM_ENABLED:
         return
@@ -1391,18 +3969,56 @@ def _lowram_flush_chat(chat_id: int, store: dict | None = None, evict: bool = Fa
     store = store if isinstance(store, dict) else ((data.get("chats", {}) or {}).get(str(cid)) if isinstance(data, dict) else None)
     if not isinstance(store, dict):
         return
+    balance_index = globals().get("FINANCE_BALANCE_INDEX")
+    balance_gen = balance_index.persist_generation(cid) if balance_index is not None else None
+    order_clean = globals().get("finance_records_order_clean")
     # Keep records/daily consistent without loading a field that was never touched.
     for rec_key, daily_key in (("records","daily_records"),("ars_records","ars_daily_records"),("usd_records","usd_daily_records")):
         if dict.__contains__(store, rec_key):
             records = dict.__getitem__(store, rec_key) or []
+            if rec_key == "records" and order_clean is not None and order_clean(cid, records, dict.get(store, daily_key)):
+                # v199: инкрементальный normalize уже держит daily в согласии с records.
+                continue
             daily = _lowram_rebuild_daily(records)
             dict.__setitem__(store, daily_key, daily)
             if isinstance(store, ColdChatStore): store._cold_loaded.add(daily_key)
     for key in LOWRAM_COLD_KEYS:
-        if dict.__contains__(store, key):
-            SQLITE.set_cold(cid, key, dict.__getitem__(store, key))
+        if key in FINANCE_ROW_DAILY or not dict.__contains__(store, key):
+            continue
+        value = dict.__getitem__(store, key)
+        if key in FINANCE_ROW_LEDGERS:
+            # Выгрузка чата — всегда полная сверка: правки мимо delta_track_record не теряются.
+            res = _finance_rows_flush(cid, key, value, full=evict)
             with _LOWRAM_LOCK:
-                _LOWRAM_STATS["cold_saves"] += 1
+                _LOWRAM_STATS["row_upserts"] += res["upserts"]
+                _LOWRAM_STATS["row_deletes"] += res["deletes"]
+                _LOWRAM_STATS["row_moves"] += res["moves"]
+                if res["upserts"] or res["deletes"] or res["moves"]:
+                    _LOWRAM_STATS["cold_saves"] += 1
+            feed = globals().get("_delta_feed_finance_rows")
+            if callable(feed) and (res["changed"] or res["deleted"]):
+                # Обратная подача в delta_track_record не должна снова помечать эти же строки.
+                _FINANCE_ROW_LOCAL.quiet = True
+                try:
+                    feed(cid, key, res)
+                finally:
+                    _FINANCE_ROW_LOCAL.quiet = False
+            continue
+        SQLITE.set_cold(cid, key, value)
+        with _LOWRAM_LOCK:
+            _LOWRAM_STATS["cold_saves"] += 1
+    if balance_index is not None:
+        # Поденные итоги пишутся со штампом только что сброшенного поколения finance_records.
+        balance_index.persist(cid, since_generation=balance_gen)
+    order_stamp = globals().get("finance_records_order_stamp")
+    if order_stamp is not None and dict.__contains__(store, "records"):
+        # Штамп в мете: следующая загрузка этих же строк доверяет их порядку без полного normalize.
+        stamp = order_stamp(cid, dict.__getitem__(store, "records"))
+        if stamp:
+            stamp["gen"] = SQLITE.finance_generation(cid)
+            dict.__setitem__(store, "_v199_records_order", stamp)
+        else:
+            dict.pop(store, "_v199_records_order", None)
     if evict:
         removed = 0
         for key in list(LOWRAM_COLD_KEYS):
@@ -1410,6 +4026,13 @@ def _lowram_flush_chat(chat_id: int, store: dict | None = None, evict: bool = Fa
                 dict.pop(store, key, None); removed += 1
         if isinstance(store, ColdChatStore):
             store._cold_loaded.clear()
+        order_release = globals().get("finance_records_order_release")
+        if order_release is not None:
+            order_release(cid)
+        msg_release = globals().get("finance_msg_index_release")
+        if msg_release is not None:
+            msg_release(cid)
+        finance_rows_release(cid)
         if removed:
             with _LOWRAM_LOCK:
                 _LOWRAM_STATS["cold_evictions"] += 1
@@ -1497,12 +4120,13 @@ def _lowram_flush_all_hot(evict: bool = False):
                 meta_chats[str(cid)] = _lowram_store_meta_payload(store)
         if meta_chats:
             SQLITE.save_chats(meta_chats)
-        SQLITE.save_root(_sqlite_pack_root(data))
+        SQLITE.save_root(_sqlite_pack_root(data), full=True)
 
 def lowram_status_text() -> str:
     mem = _lowram_memory_snapshot()
     with _LOWRAM_LOCK:
         st = dict(_LOWRAM_STATS)
+    rs = SQLITE.root_section_stats(top=0)
     loaded = 0
     try:
         for store in ((data or {}).get("chats", {}) or {}).values():
@@ -1513,13 +4137,17 @@ def lowram_status_text() -> str:
     return (
         f"LOW-RAM: {'ВКЛ' if LOWRAM_ENABLED else 'ВЫКЛ'} | RAM {mem.get('rss_mb','?')} MB\n"
         f"Cold fields loaded now: {loaded}; loads={st.get('cold_loads',0)} saves={st.get('cold_saves',0)} evictions={st.get('cold_evictions',0)}\n"
+        f"Finance rows: {SQLITE.finance_row_count()}; upserts={st.get('row_upserts',0)} deletes={st.get('row_deletes',0)} moves={st.get('row_moves',0)}\n"
+        f"Row flush: clean={st.get('row_sync_clean',0)} incremental={st.get('row_sync_incremental',0)} full={st.get('row_sync_full',0)} serialized={st.get('row_serialized',0)} checks={st.get('row_checks',0)} check_drift={st.get('row_check_drift',0)}\n"
+        f"Root sections: saves={rs.get('saves',0)} written={rs.get('written',0)} skipped={rs.get('skipped',0)} unserialized={rs.get('unserialized',0)} full_checks={rs.get('full_checks',0)} bytes={rs.get('bytes_written',0)}/{rs.get('bytes_total',0)}\n"
         f"SQLite cold rows: {SQLITE.cold_count()} | DB snapshots={st.get('db_snapshots',0)} restores={st.get('db_restores',0)}\n"
         f"Последний DB snapshot: {st.get('last_snapshot_at') or '—'}; restore: {st.get('last_restore_at') or '—'}\n"
         f"Ошибка: {st.get('last_error') or 'нет'}"
     )
 
 def _sqlite_pack_root(d: dict) -> dict:
-    return {k: v for k, v in (d or {}).items() if k != "chats"}
+    # v199: forward_index живёт в таблице forward_links и в root больше не пишется.
+    return {k: v for k, v in (d or {}).items() if k not in {"chats", "forward_index"}}
 
 
 def _sqlite_unpack_data(root: dict | None, chats: dict | None) -> dict:
@@ -1541,8 +4169,10 @@ def _import_legacy_global_json_to_db(path: str = DATA_FILE, force: bool = False)
     if not isinstance(payload, dict):
         return False
 
-    SQLITE.save_root(_sqlite_pack_root(payload))
+    SQLITE.save_root(_sqlite_pack_root(payload), full=True)
     SQLITE.save_chats(payload.get("chats", {}) or {})
+    if isinstance(payload.get("forward_index"), dict):
+        SQLITE.forward_links_import(payload.get("forward_index"), replace=True)
 
     legacy_csv_meta = _load_json(CSV_META_FILE, None)
     if isinstance(legacy_csv_meta, dict):
@@ -2032,6 +4662,7 @@ def save_version_mode_snapshot(profile_key: str | None = None):
             settings = store.setdefault("settings", {})
             snap["chats"][str(cid)] = {name: settings.get(name) for name in chat_fields if name in settings}
         snapshots[key] = snap
+        SQLITE.root_touch("_global_settings", "version_mode_snapshots")
     except Exception as e:
         log_error(f"save_version_mode_snapshot: {e}")
 
@@ -2962,7 +5593,7 @@ def build_all_processes_toast(chat_id=None) -> str:
         ("Фин", FINANCE_TASK_POOL), ("ФинПерес", FIN_FORWARD_TASK_POOL), ("Перес", FORWARD_TASK_POOL),
         ("Восст", RECOVERY_TASK_POOL), ("Напом", REMINDER_TASK_POOL),
         ("Бэкап", BACKUP_TASK_POOL), ("MEGAΔ", DELTA_TASK_POOL),
-        ("Экспорт", EXPORT_TASK_POOL), ("Общие", GENERAL_TASK_POOL),
+        ("Экспорт", EXPORT_TASK_POOL), ("Сжатие", TRANSCODE_TASK_POOL), ("Общие", GENERAL_TASK_POOL),
         ("Сервис", MAINTENANCE_TASK_POOL), ("Журнал", JOURNAL_TASK_POOL),
         ("Таймер", DELAYED_TASK_POOL),
         ("Дозвон", DOZVON_TASK_POOL),
@@ -7812,10 +10443,8 @@ def _find_forward_origin_by_copied_message(chat_id: int, msg_id: int):
     которое бот ранее переслал из другого чата.
     """
     try:
-        for (src_chat_id, src_msg_id), pairs in forward_map.items():
-            for pair_chat_id, pair_msg_id in pairs:
-                if int(pair_chat_id) == int(chat_id) and int(pair_msg_id) == int(msg_id):
-                    return int(src_chat_id), int(src_msg_id)
+        # v199: индекс (dst_chat, dst_msg) в SQLite вместо полного прохода по карте.
+        return SQLITE.forward_origin_for_copy(int(chat_id), int(msg_id))
     except Exception:
         pass
     return None, None
@@ -7864,14 +10493,153 @@ def resolve_reply_target_message_id(source_chat_id: int, reply_to_message_id: in
     return None
 
 
-_telegram_send_last_ts = {}
-_telegram_send_rate_lock = threading.RLock()
-_telegram_global_rate_lock = threading.RLock()
-_telegram_global_last_ts = 0.0
 try:
     TELEGRAM_GLOBAL_MIN_GAP = max(0.01, float(os.getenv("TELEGRAM_GLOBAL_MIN_GAP", "0.04") or "0.04"))
 except Exception:
     TELEGRAM_GLOBAL_MIN_GAP = 0.04
+try:
+    TELEGRAM_GLOBAL_BURST = max(1, min(30, int(os.getenv("TELEGRAM_GLOBAL_BURST", "3") or "3")))
+except Exception:
+    TELEGRAM_GLOBAL_BURST = 3
+try:
+    TELEGRAM_CHAT_BURST = max(1, min(20, int(os.getenv("TELEGRAM_CHAT_BURST", "1") or "1")))
+except Exception:
+    TELEGRAM_CHAT_BURST = 1
+try:
+    TELEGRAM_CHAT_BUCKETS_MAX = max(100, int(os.getenv("TELEGRAM_CHAT_BUCKETS_MAX", "5000") or "5000"))
+except Exception:
+    TELEGRAM_CHAT_BUCKETS_MAX = 5000
+
+
+class TelegramRateScheduler:
+    """
+    v199: неблокирующий token-bucket лимитер Telegram API.
+
+    Раньше _telegram_rate_limit_chat/_global спали внутри общего lock-а, и
+    пауза 0.35 с одного чата задерживала отправку во все остальные чаты.
+    Теперь вызов под коротким lock-ом только резервирует слот (GCRA: у каждого
+    bucket хранится теоретическое время освобождения), а спит уже без lock-а.
+    Слоты одного чата выдаются строго по очереди, поэтому порядок пересылок
+    сохраняется, а разные чаты ждут независимо друг от друга.
+    retry_after из 429 блокирует только свой чат (или глобальный bucket, если
+    чат неизвестен).
+    """
+
+    def __init__(self, global_gap: float, global_burst: int = 1, chat_burst: int = 1, max_chats: int = 5000):
+        self.global_gap = float(global_gap)
+        self.global_burst = max(1, int(global_burst))
+        self.chat_burst = max(1, int(chat_burst))
+        self.max_chats = max(100, int(max_chats))
+        self._lock = threading.Lock()
+        self._global_tat = 0.0
+        self._global_blocked_until = 0.0
+        # chat_id -> [tat, blocked_until, last_seen]
+        self._chats = {}
+        self._hist = {"chat": LatencyHistogram(), "global": LatencyHistogram(), "ui": LatencyHistogram(), "retry_after": LatencyHistogram()}
+        self._stats = {"reserved": 0, "waited": 0, "retry_after_chat": 0, "retry_after_global": 0, "evicted": 0}
+
+    @staticmethod
+    def _bucket_ready(tat: float, gap: float, burst: int, now_ts: float) -> float:
+        # GCRA: запрос допустим, когда tat - t <= (burst - 1) * gap.
+        return max(now_ts, float(tat) - (burst - 1) * float(gap))
+
+    def _evict_locked(self, now_ts: float):
+        if len(self._chats) <= self.max_chats:
+            return
+        idle = [cid for cid, st in self._chats.items() if st[0] <= now_ts and st[1] <= now_ts]
+        idle.sort(key=lambda cid: self._chats[cid][2])
+        for cid in idle[: max(1, len(self._chats) - self.max_chats)]:
+            self._chats.pop(cid, None)
+            self._stats["evicted"] += 1
+
+    def reserve_chat(self, chat_id, chat_gap: float = 0.35) -> float:
+        """Резервирует слот чата и возвращает момент (time.monotonic), когда можно слать."""
+        now_ts = time.monotonic()
+        with self._lock:
+            st = self._chats.get(chat_id)
+            if st is None:
+                st = [0.0, 0.0, now_ts]
+                self._chats[chat_id] = st
+                self._evict_locked(now_ts)
+            slot = max(st[1], self._bucket_ready(st[0], chat_gap, self.chat_burst, now_ts))
+            st[0] = max(st[0], slot) + float(chat_gap)
+            st[2] = now_ts
+            self._stats["reserved"] += 1
+        return slot
+
+    def reserve_global(self) -> float:
+        # Глобальный слот берётся только в момент фактической отправки: будущие
+        # слоты загруженного чата не должны сдвигать очередь остальных чатов.
+        now_ts = time.monotonic()
+        with self._lock:
+            slot = max(self._global_blocked_until, self._bucket_ready(self._global_tat, self.global_gap, self.global_burst, now_ts))
+            self._global_tat = max(self._global_tat, slot) + self.global_gap
+        return slot
+
+    def _sleep_until(self, slot: float, hist_name: str) -> float:
+        wait = slot - time.monotonic()
+        if wait > 0:
+            with self._lock:
+                self._stats["waited"] += 1
+            time.sleep(wait)
+        else:
+            wait = 0.0
+        self._hist[hist_name].observe(wait)
+        return wait
+
+    def acquire(self, chat_id=None, chat_gap: float = 0.35, kind: str = "chat") -> float:
+        waited = 0.0
+        if chat_id is not None:
+            waited += self._sleep_until(self.reserve_chat(chat_id, chat_gap=chat_gap), kind if kind in self._hist else "chat")
+        waited += self._sleep_until(self.reserve_global(), "global")
+        return waited
+
+    def note_retry_after(self, chat_id, seconds: float):
+        until = time.monotonic() + max(0.0, float(seconds or 0))
+        with self._lock:
+            if chat_id is None:
+                self._global_blocked_until = max(self._global_blocked_until, until)
+                self._stats["retry_after_global"] += 1
+                return
+            st = self._chats.setdefault(chat_id, [0.0, 0.0, time.monotonic()])
+            st[1] = max(st[1], until)
+            self._stats["retry_after_chat"] += 1
+        self._hist["retry_after"].observe(seconds)
+
+    def blocked_chats(self) -> int:
+        now_ts = time.monotonic()
+        with self._lock:
+            return sum(1 for st in self._chats.values() if st[1] > now_ts)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["chats"] = len(self._chats)
+        out["blocked_chats"] = self.blocked_chats()
+        out["wait"] = {name: h.snapshot() for name, h in self._hist.items()}
+        return out
+
+    def status_lines(self) -> list:
+        st = self.stats()
+        lines = [
+            f"Telegram limiter: слотов {st['reserved']}, ждали {st['waited']}, чатов {st['chats']}, "
+            f"в retry_after {st['blocked_chats']} (429 чат/глоб: {st['retry_after_chat']}/{st['retry_after_global']})",
+        ]
+        for name in ("chat", "ui", "global", "retry_after"):
+            lines.append(f"  ожидание {name}: {self._hist[name].short_text()}")
+        return lines
+
+
+TELEGRAM_RATE_SCHEDULER = TelegramRateScheduler(
+    TELEGRAM_GLOBAL_MIN_GAP,
+    global_burst=TELEGRAM_GLOBAL_BURST,
+    chat_burst=TELEGRAM_CHAT_BURST,
+    max_chats=TELEGRAM_CHAT_BUCKETS_MAX,
+)
+
+
+def telegram_rate_stats() -> dict:
+    return TELEGRAM_RATE_SCHEDULER.stats()
 
 
 def _telegram_retry_after_seconds(err: Exception):
@@ -7911,30 +10679,18 @@ def _is_fast_ui_purpose(purpose: str) -> bool:
     return any(x in p for x in fast_marks)
 
 
-def _telegram_rate_limit_chat(chat_id, min_gap: float = 0.35):
-    """Мягкий лимит отправки в один чат, чтобы реже получать 429 при шквале пересылок."""
+def _telegram_rate_limit_chat(chat_id, min_gap: float = 0.35, kind: str = "chat"):
+    """Мягкий лимит отправки в один чат (+ общий bucket), чтобы реже получать 429 при шквале пересылок."""
     try:
         cid = int(chat_id)
     except Exception:
-        return
-    with _telegram_send_rate_lock:
-        now_ts = time.time()
-        prev_ts = float(_telegram_send_last_ts.get(cid, 0) or 0)
-        wait = float(min_gap) - (now_ts - prev_ts)
-        if wait > 0:
-            time.sleep(wait)
-        _telegram_send_last_ts[cid] = time.time()
+        return _telegram_rate_limit_global()
+    return TELEGRAM_RATE_SCHEDULER.acquire(cid, chat_gap=float(min_gap), kind=kind)
 
 
 def _telegram_rate_limit_global():
     """Общий лимитер Telegram API для всех чатов, чтобы не ловить шквал 429."""
-    global _telegram_global_last_ts
-    with _telegram_global_rate_lock:
-        now_ts = time.time()
-        wait = TELEGRAM_GLOBAL_MIN_GAP - (now_ts - _telegram_global_last_ts)
-        if wait > 0:
-            time.sleep(wait)
-        _telegram_global_last_ts = time.time()
+    return TELEGRAM_RATE_SCHEDULER.acquire(None, kind="global")
 
 
 def _tg_first_chat_id(args, kwargs):
@@ -7954,11 +10710,14 @@ def _tg_call_retry(func, *args, attempts: int = 7, purpose: str = "telegram", **
     for attempt in range(1, int(attempts) + 1):
         try:
             chat_id = _tg_first_chat_id(args, kwargs)
-            _telegram_rate_limit_global()
             if chat_id is not None:
                 # UI-кнопки уже имеют собственный debounce. Не добавляем к ним ещё 0.35 с ожидания.
-                ui_gap = effective_fast_telegram_gap() if _is_fast_ui_purpose(purpose) else 0.35
-                _telegram_rate_limit_chat(chat_id, min_gap=ui_gap)
+                fast_ui = _is_fast_ui_purpose(purpose)
+                ui_gap = effective_fast_telegram_gap() if fast_ui else 0.35
+                # v199: один слот сразу в per-chat и глобальном bucket; сон без общего lock-а.
+                _telegram_rate_limit_chat(chat_id, min_gap=ui_gap, kind="ui" if fast_ui else "chat")
+            else:
+                _telegram_rate_limit_global()
             try:
                 if verbose_telegram_journal_enabled():
                     bot_journal("telegram_api_call", chat_id, f"{purpose}: {getattr(func, '__name__', str(func))} attempt={attempt}/{attempts}")
@@ -7996,6 +10755,15 @@ def _tg_call_retry(func, *args, attempts: int = 7, purpose: str = "telegram", **
                     pass
                 raise
             wait = max(1, int(retry_after)) + 1
+            try:
+                # v199: retry_after блокирует только этот чат; соседние чаты продолжают слать.
+                try:
+                    _retry_cid = int(_tg_first_chat_id(args, kwargs))
+                except Exception:
+                    _retry_cid = None
+                TELEGRAM_RATE_SCHEDULER.note_retry_after(_retry_cid, wait)
+            except Exception:
+                pass
             log_info(f"[TG 429 RETRY] {purpose}: attempt={attempt}/{attempts}, wait={wait}s, error={str(e)[:220]}")
             try:
                 bot_journal("telegram_429_retry", chat_id if 'chat_id' in locals() else None, f"{purpose}: attempt={attempt}/{attempts}, wait={wait}s, error={str(e)[:220]}", "WARN")
@@ -8007,7 +10775,7 @@ def _tg_call_retry(func, *args, attempts: int = 7, purpose: str = "telegram", **
                 raise e
             if attempt >= int(attempts):
                 break
-            time.sleep(wait)
+            # Ожидание retry_after делает limiter при следующем резервировании слота.
     raise last_err
 
 
@@ -8319,7 +11087,10 @@ def _load_json(path: str, default):
     if not os.path.exists(path):
         return default
     try:
-        with open(path, "r", encoding="utf-8") as f:
+        # v199: universal backup может быть записан сразу в gzip-поток (*.json.gz).
+        with open(path, "rb") as probe:
+            opener = gzip.open if probe.read(2) == b"\x1f\x8b" else open
+        with opener(path, "rt", encoding="utf-8") as f:
             return json.load(f)
     except Exception as e:
         log_error(f"JSON load error {path}: {e}")
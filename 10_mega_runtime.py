@@ -4,6 +4,8 @@
 # mega-login / mega-mkdir / mega-put / mega-get / mega-whoami.
 # ─────────────────────────────────────────────────────────────
 def mega_is_configured() -> bool:
+    if MEGA_BACKEND == "local":
+        return bool(MEGA_ENABLED and MEGA_LOCAL_BACKEND_DIR)
     return bool(MEGA_ENABLED and MEGA_EMAIL and MEGA_PASSWORD)
 
 
@@ -17,7 +19,14 @@ def _mega_required_commands():
 
 
 def mega_missing_commands():
-    return [cmd for cmd in _mega_required_commands() if shutil.which(cmd) is None]
+    return [cmd for cmd in _mega_required_commands() if not mega_command_available(cmd)]
+
+
+def mega_command_available(cmd: str) -> bool:
+    try:
+        return bool(MEGA_SESSION.backend.available(cmd))
+    except Exception:
+        return shutil.which(cmd) is not None
 
 
 def _mega_memory_safe_args(cmd: str, args) -> list[str]:
@@ -44,11 +53,6 @@ def _mega_memory_safe_args(cmd: str, args) -> list[str]:
     return out
 
 
-_V178_MEGA_PRIORITY_CV = threading.Condition(threading.RLock())
-_V178_MEGA_PRIORITY_WAITING = {0: 0, 1: 0, 2: 0, 3: 0}
-_V178_MEGA_PRIORITY_ACTIVE = False
-
-
 def _v178_mega_priority(cmd: str, args) -> int:
     text = " ".join(str(x or "") for x in (args or [])).casefold()
     # v190: 0 = only the tiny write-before-execute witness / finance ledger.
@@ -66,51 +70,386 @@ def _v178_mega_priority(cmd: str, args) -> int:
     return 1
 
 
-def _v178_mega_gate_enter(priority: int) -> None:
-    global _V178_MEGA_PRIORITY_ACTIVE
-    priority = max(0, min(3, int(priority)))
-    with _V178_MEGA_PRIORITY_CV:
-        _V178_MEGA_PRIORITY_WAITING[priority] += 1
+# ─────────────────────────────────────────────────────────────
+# v199: долгоживущая MEGA storage session
+# ─────────────────────────────────────────────────────────────
+# Раньше каждый mega-* шёл строго по одному за MEGA_COMMAND_LOCK: durable task,
+# delta, runtime snapshot и журнал ждали друг друга целиком. MEGAcmd уже держит
+# единственное авторизованное соединение в mega-cmd-server, поэтому сессия
+# направляет команды прямо в него (mega-exec, без shell-обёртки mega-*) и держит
+# до MEGA_SESSION_INFLIGHT команд в полёте. Классы приоритета v178 сохранены:
+# пока ждёт более важный класс, менее важный не стартует; runtime/journal
+# (класс 3) занимает не больше одного слота; команды над одним remote path
+# не идут параллельно; login/logout выполняются эксклюзивно.
+try:
+    MEGA_SESSION_INFLIGHT = max(1, min(8, int(os.getenv("MEGA_SESSION_INFLIGHT", "3") or "3")))
+except Exception:
+    MEGA_SESSION_INFLIGHT = 3
+MEGA_SESSION_DIRECT_EXEC = _env_bool("MEGA_SESSION_DIRECT_EXEC", "1")
+try:
+    MEGA_LOCAL_BACKEND_LATENCY_MS = max(0, min(60000, int(os.getenv("MEGA_LOCAL_BACKEND_LATENCY_MS", "0") or "0")))
+except Exception:
+    MEGA_LOCAL_BACKEND_LATENCY_MS = 0
+
+_MEGA_SESSION_EXCLUSIVE = {"mega-login", "mega-logout"}
+
+
+def _mega_norm_remote(path) -> str:
+    text = "/" + str(path or "").strip().strip("/")
+    return text.rstrip("/") or "/"
+
+
+def _mega_split_flags(args):
+    flags, positional = [], []
+    for value in list(args or []):
+        text = str(value)
+        (flags if text.startswith("-") and len(text) > 1 else positional).append(text)
+    return flags, positional
+
+
+def _mega_session_paths(cmd: str, args) -> set:
+    """Remote-пути, которые команда читает/меняет: по ним сериализуются конфликты."""
+    _flags, pos = _mega_split_flags(args)
+    cmd = str(cmd or "")
+    if cmd == "mega-put" and len(pos) >= 2:
+        dst = _mega_norm_remote(pos[-1])
+        return {dst} | {dst.rstrip("/") + "/" + os.path.basename(str(src)) for src in pos[:-1]}
+    if cmd in {"mega-mv", "mega-cp"}:
+        return {_mega_norm_remote(x) for x in pos[:2]}
+    if cmd in {"mega-rm", "mega-mkdir"}:
+        return {_mega_norm_remote(x) for x in pos}
+    if cmd == "mega-get" and pos:
+        return {_mega_norm_remote(pos[0])}
+    return set()
+
+
+class MegaCmdBackend:
+    """Настоящий MEGA: команды уходят в mega-cmd-server через mega-exec."""
+
+    name = "megacmd"
+
+    def __init__(self, direct_exec: bool = True):
+        self.direct_exec = bool(direct_exec)
+        self._lock = threading.Lock()
+        self._which = {}
+
+    def _resolve(self, exe: str):
+        with self._lock:
+            if exe not in self._which:
+                self._which[exe] = shutil.which(exe)
+            return self._which[exe]
+
+    def forget(self):
+        with self._lock:
+            self._which.clear()
+
+    def available(self, cmd: str) -> bool:
+        return self._resolve(str(cmd)) is not None
+
+    def argv(self, cmd: str, args) -> list:
+        cmd = str(cmd or "")
+        if self.direct_exec and cmd.startswith("mega-") and cmd != "mega-exec":
+            runner = self._resolve("mega-exec")
+            if runner:
+                return [runner, cmd[len("mega-"):]] + list(args or [])
+        exe = self._resolve(cmd)
+        if not exe:
+            raise RuntimeError(f"MEGAcmd command not found: {cmd}")
+        return [exe] + list(args or [])
+
+    def run(self, cmd: str, args, timeout: float):
         try:
-            while _V178_MEGA_PRIORITY_ACTIVE or any(_V178_MEGA_PRIORITY_WAITING[p] > 0 for p in range(priority)):
-                _V178_MEGA_PRIORITY_CV.wait(timeout=0.5)
-            _V178_MEGA_PRIORITY_ACTIVE = True
+            return subprocess.run(self.argv(cmd, args), capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise RuntimeError(f"{cmd} timeout after {timeout}s")
+
+
+class LocalDirMegaBackend:
+    """
+    Offline-заменитель MEGA: remote-дерево лежит в локальной папке.
+    Повторяет поведение MEGAcmd, на которое опирается бот (put в папку или под
+    новым именем, get, rm, mv, mkdir, find --pattern/--type, whoami) и тексты
+    ошибок ("Couldn't find ...", "already exists"), чтобы self-heal и restore
+    шли по тем же веткам. MEGA_LOCAL_BACKEND_LATENCY_MS имитирует сеть.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str, latency_ms: int = 0, email: str = ""):
+        self.root = os.path.abspath(str(root))
+        self.latency = max(0, int(latency_ms or 0)) / 1000.0
+        self.email = str(email or "local@offline")
+        os.makedirs(self.root, exist_ok=True)
+        self._handlers = {
+            "mega-login": self._login, "mega-logout": self._login, "mega-whoami": self._whoami,
+            "mega-mkdir": self._mkdir, "mega-put": self._put, "mega-get": self._get,
+            "mega-rm": self._rm, "mega-mv": self._mv, "mega-find": self._find, "mega-ls": self._ls,
+        }
+
+    def forget(self):
+        return None
+
+    def available(self, cmd: str) -> bool:
+        return str(cmd) in self._handlers
+
+    def _local(self, remote) -> str:
+        rel = _mega_norm_remote(remote).lstrip("/")
+        path = os.path.abspath(os.path.join(self.root, rel))
+        if path != self.root and not path.startswith(self.root + os.sep):
+            raise ValueError(f"path escapes local MEGA root: {remote}")
+        return path
+
+    def _remote(self, local: str) -> str:
+        rel = os.path.relpath(local, self.root).replace(os.sep, "/")
+        return "/" if rel == "." else "/" + rel
+
+    def run(self, cmd: str, args, timeout: float):
+        handler = self._handlers.get(str(cmd))
+        if handler is None:
+            raise RuntimeError(f"MEGAcmd command not found: {cmd}")
+        if self.latency:
+            time.sleep(self.latency)
+        flags, pos = _mega_split_flags(args)
+        try:
+            code, out, err = handler(set(flags), pos)
+        except Exception as exc:
+            code, out, err = 1, "", f"{cmd}: {exc}"
+        return subprocess.CompletedProcess([cmd] + list(args or []), code, out, err)
+
+    def _login(self, flags, pos):
+        return 0, "", ""
+
+    def _whoami(self, flags, pos):
+        return 0, f"Account e-mail: {self.email}\n", ""
+
+    def _mkdir(self, flags, pos):
+        for remote in pos:
+            path = self._local(remote)
+            if os.path.isdir(path):
+                return 1, "", f"Folder already exists: {_mega_norm_remote(remote)}"
+            if "-p" not in flags and not os.path.isdir(os.path.dirname(path)):
+                return 1, "", f"Couldn't find destination folder: {_mega_norm_remote(remote)}"
+            os.makedirs(path, exist_ok=True)
+        return 0, "", ""
+
+    def _copy_atomic(self, src: str, dst: str):
+        tmp = f"{dst}.part-{os.getpid()}-{threading.get_ident()}"
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+
+    def _put(self, flags, pos):
+        if len(pos) < 2:
+            return 1, "", "put: missing destination"
+        target = self._local(pos[-1])
+        sources = pos[:-1]
+        into_dir = os.path.isdir(target) or str(pos[-1]).endswith("/") or len(sources) > 1
+        folder = target if into_dir else os.path.dirname(target)
+        if not os.path.isdir(folder):
+            if "-c" not in flags:
+                return 1, "", f"Couldn't find destination folder: {self._remote(folder)}"
+            os.makedirs(folder, exist_ok=True)
+        for src in sources:
+            if not os.path.isfile(src):
+                return 1, "", f"Couldn't find local file: {src}"
+            dst = os.path.join(folder, os.path.basename(src)) if into_dir else target
+            self._copy_atomic(src, dst)
+        return 0, "", ""
+
+    def _get(self, flags, pos):
+        if not pos:
+            return 1, "", "get: missing source"
+        src = self._local(pos[0])
+        if not os.path.exists(src):
+            return 1, "", f"Couldn't find {_mega_norm_remote(pos[0])}"
+        dest = pos[1] if len(pos) > 1 else os.getcwd()
+        if os.path.isdir(dest):
+            dest = os.path.join(dest, os.path.basename(src))
+        if os.path.isdir(src):
+            shutil.copytree(src, dest, dirs_exist_ok=True)
+        else:
+            self._copy_atomic(src, dest)
+        return 0, "", ""
+
+    def _rm(self, flags, pos):
+        for remote in pos:
+            path = self._local(remote)
+            if not os.path.exists(path):
+                if "-f" in flags:
+                    continue
+                return 1, "", f"Couldn't find {_mega_norm_remote(remote)}"
+            if os.path.isdir(path):
+                if "-r" not in flags:
+                    return 1, "", f"Unable to delete folder without -r: {_mega_norm_remote(remote)}"
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        return 0, "", ""
+
+    def _mv(self, flags, pos):
+        if len(pos) < 2:
+            return 1, "", "mv: missing destination"
+        src, dst = self._local(pos[0]), self._local(pos[1])
+        if not os.path.exists(src):
+            return 1, "", f"Couldn't find {_mega_norm_remote(pos[0])}"
+        if os.path.isdir(dst):
+            dst = os.path.join(dst, os.path.basename(src))
+        elif not os.path.isdir(os.path.dirname(dst)):
+            return 1, "", f"Destination must be a valid folder: {_mega_norm_remote(pos[1])}"
+        os.replace(src, dst)
+        return 0, "", ""
+
+    def _find(self, flags, pos):
+        import fnmatch
+        pattern, kind = "*", ""
+        for flag in flags:
+            if flag.startswith("--pattern="):
+                pattern = flag.split("=", 1)[1] or "*"
+            elif flag.startswith("--type="):
+                kind = flag.split("=", 1)[1]
+        base = self._local(pos[0] if pos else "/")
+        if not os.path.exists(base):
+            return 1, "", f"Couldn't find {_mega_norm_remote(pos[0] if pos else '/')}"
+        rows = []
+        for folder, dirs, files in os.walk(base):
+            names = (files if kind == "f" else dirs if kind == "d" else files + dirs)
+            for name in names:
+                if ".part-" not in name and fnmatch.fnmatch(name, pattern):
+                    rows.append(self._remote(os.path.join(folder, name)))
+        return 0, "".join(row + "\n" for row in sorted(rows)), ""
+
+    def _ls(self, flags, pos):
+        base = self._local(pos[0] if pos else "/")
+        if not os.path.exists(base):
+            return 1, "", f"Couldn't find {_mega_norm_remote(pos[0] if pos else '/')}"
+        if os.path.isfile(base):
+            return 0, os.path.basename(base) + "\n", ""
+        return 0, "".join(name + "\n" for name in sorted(os.listdir(base)) if ".part-" not in name), ""
+
+
+class MegaStorageSession:
+    """Один на процесс: приоритетный допуск команд к backend и статистика."""
+
+    def __init__(self, backend, inflight: int = 3):
+        self.backend = backend
+        self.inflight = max(1, int(inflight))
+        self._cv = threading.Condition(threading.Lock())
+        self._waiting = {0: 0, 1: 0, 2: 0, 3: 0}
+        self._active = 0
+        self._active_low = 0
+        self._exclusive = False
+        self._exclusive_waiting = 0
+        self._paths = defaultdict(int)
+        self._stats = {"commands": 0, "errors": 0, "peak_inflight": 0, "path_waits": 0, "by_cmd": defaultdict(int)}
+        self._wait_hist = {p: LatencyHistogram() for p in range(4)}
+        self._run_hist = {p: LatencyHistogram() for p in range(4)}
+
+    def _can_start_locked(self, priority: int, exclusive: bool, paths: set) -> bool:
+        if self._exclusive or any(self._waiting[p] > 0 for p in range(priority)):
+            return False
+        if exclusive:
+            return self._active == 0
+        if self._exclusive_waiting or self._active >= self.inflight or (priority >= 3 and self._active_low >= 1):
+            return False
+        return not any(self._paths.get(path) for path in paths)
+
+    def run(self, cmd: str, args=None, timeout: float | None = None, priority: int | None = None):
+        args = list(args or [])
+        if priority is None:
+            priority = _v178_mega_priority(cmd, args)
+        priority = max(0, min(3, int(priority)))
+        exclusive = str(cmd) in _MEGA_SESSION_EXCLUSIVE
+        paths = _mega_session_paths(cmd, args)
+        queued = time.monotonic()
+        with self._cv:
+            self._waiting[priority] += 1
+            self._exclusive_waiting += 1 if exclusive else 0
+            try:
+                blocked_by_path = False
+                while not self._can_start_locked(priority, exclusive, paths):
+                    if not blocked_by_path and any(self._paths.get(path) for path in paths):
+                        blocked_by_path = True
+                        self._stats["path_waits"] += 1
+                    self._cv.wait(timeout=0.5)
+            finally:
+                self._waiting[priority] = max(0, self._waiting[priority] - 1)
+                self._exclusive_waiting -= 1 if exclusive else 0
+            self._active += 1
+            self._active_low += 1 if priority >= 3 else 0
+            self._exclusive = exclusive
+            for path in paths:
+                self._paths[path] += 1
+            self._stats["peak_inflight"] = max(self._stats["peak_inflight"], self._active)
+        started = time.monotonic()
+        self._wait_hist[priority].observe(started - queued)
+        ok = False
+        try:
+            res = self.backend.run(cmd, args, timeout or MEGA_TIMEOUT)
+            ok = getattr(res, "returncode", 1) == 0
+            return res
         finally:
-            _V178_MEGA_PRIORITY_WAITING[priority] = max(0, _V178_MEGA_PRIORITY_WAITING[priority] - 1)
+            self._run_hist[priority].observe(time.monotonic() - started)
+            with self._cv:
+                self._active -= 1
+                self._active_low -= 1 if priority >= 3 else 0
+                if exclusive:
+                    self._exclusive = False
+                for path in paths:
+                    self._paths[path] -= 1
+                    if self._paths[path] <= 0:
+                        self._paths.pop(path, None)
+                self._stats["commands"] += 1
+                self._stats["by_cmd"][str(cmd)] += 1
+                if not ok:
+                    self._stats["errors"] += 1
+                self._cv.notify_all()
+
+    def stats(self) -> dict:
+        with self._cv:
+            out = {k: (dict(v) if isinstance(v, dict) else v) for k, v in self._stats.items()}
+            out["active"] = self._active
+            out["waiting"] = dict(self._waiting)
+        out["backend"] = getattr(self.backend, "name", "?")
+        out["inflight"] = self.inflight
+        out["wait"] = {p: h.snapshot() for p, h in self._wait_hist.items()}
+        out["run"] = {p: h.snapshot() for p, h in self._run_hist.items()}
+        return out
+
+    def status_lines(self) -> list:
+        st = self.stats()
+        lines = [
+            f"MEGA session: {st['backend']}, в полёте {st['active']}/{st['inflight']} (пик {st['peak_inflight']}), "
+            f"команд {st['commands']}, ошибок {st['errors']}, ожиданий по пути {st['path_waits']}"
+        ]
+        for p in range(4):
+            if self._run_hist[p].snapshot()["count"]:
+                lines.append(f"  класс {p}: ожидание {self._wait_hist[p].short_text()}; выполнение {self._run_hist[p].short_text()}")
+        return lines
+
+
+def _mega_build_backend():
+    if MEGA_BACKEND == "local":
+        root = MEGA_LOCAL_BACKEND_DIR or os.path.join(MEGA_LOCAL_TMP_DIR, "mega_local_backend")
+        return LocalDirMegaBackend(root, latency_ms=MEGA_LOCAL_BACKEND_LATENCY_MS, email=MEGA_EMAIL)
+    return MegaCmdBackend(direct_exec=MEGA_SESSION_DIRECT_EXEC)
+
 
+MEGA_SESSION = MegaStorageSession(_mega_build_backend(), inflight=MEGA_SESSION_INFLIGHT)
 
-def _v178_mega_gate_exit() -> None:
-    global _V178_MEGA_PRIORITY_ACTIVE
-    with _V178_MEGA_PRIORITY_CV:
-        _V178_MEGA_PRIORITY_ACTIVE = False
-        _V178_MEGA_PRIORITY_CV.notify_all()
+
+def mega_session_stats() -> dict:
+    return MEGA_SESSION.stats()
 
 
 def _v177_legacy_0063_mega_run(cmd: str, args=None, timeout: int | None = None, check: bool = True):
-    """One MEGAcmd command at a time; v178 gives durable business writes priority over diagnostics."""
+    """MEGA command through the shared storage session; v178 priority classes still order admission."""
     args = list(args or [])
-    exe = shutil.which(cmd)
-    if not exe:
+    if not mega_command_available(cmd):
         raise RuntimeError(f"MEGAcmd command not found: {cmd}")
 
     def _execute_once():
         mem_ctx = globals().get("memory_operation")
         def _run_command():
-            priority = _v178_mega_priority(cmd, args)
-            _v178_mega_gate_enter(priority)
-            try:
-                with MEGA_COMMAND_LOCK:
-                    try:
-                        return subprocess.run(
-                            [exe] + args,
-                            capture_output=True,
-                            text=True,
-                            timeout=timeout or MEGA_TIMEOUT,
-                        )
-                    except subprocess.TimeoutExpired:
-                        raise RuntimeError(f"{cmd} timeout after {timeout or MEGA_TIMEOUT}s")
-            finally:
-                _v178_mega_gate_exit()
+            return MEGA_SESSION.run(cmd, args, timeout=timeout or MEGA_TIMEOUT)
         if callable(mem_ctx):
             safe_args = _mega_memory_safe_args(cmd, args)
             with mem_ctx(f"mega:{cmd}", {"args": safe_args}, heavy=cmd in {"mega-find", "mega-get", "mega-put"}, quiet=True):
@@ -204,8 +543,7 @@ def _v190_recreate_remote_path_uncached(remote_dir: str) -> bool:
     """Recreate a MEGA directory tree without trusting the process-lifetime cache."""
     remote_dir = str(remote_dir or MEGA_BACKUP_DIR).strip() or MEGA_BACKUP_DIR
     _v190_invalidate_mega_path_cache(remote_dir)
-    exe = shutil.which("mega-mkdir")
-    if not exe:
+    if not mega_command_available("mega-mkdir"):
         return False
     parts = [p for p in remote_dir.strip("/").split("/") if p]
     current = ""
@@ -214,12 +552,7 @@ def _v190_recreate_remote_path_uncached(remote_dir: str) -> bool:
     for part in parts:
         current += "/" + part
         priority = 0 if current.startswith(str(MEGA_BACKUP_DIR).rstrip("/")) else 2
-        _v178_mega_gate_enter(priority)
-        try:
-            with MEGA_COMMAND_LOCK:
-                res = subprocess.run([exe, current], capture_output=True, text=True, timeout=30)
-        finally:
-            _v178_mega_gate_exit()
+        res = MEGA_SESSION.run("mega-mkdir", [current], timeout=30, priority=priority)
         text = ((res.stderr or "") + "\n" + (res.stdout or "")).casefold()
         ok = res.returncode == 0 or "already exists" in text or "exists" in text
         if not ok:
@@ -355,7 +688,7 @@ def _mega_remote_missing_error(raw: str) -> bool:
 
 def _mega_find_remote_files(remote_dir: str, pattern: str, limit: int | None = None) -> list[str]:
     """Список удалённых файлов MEGA. Имена v90 содержат sortable timestamp."""
-    if not mega_is_configured() or shutil.which("mega-find") is None:
+    if not mega_is_configured() or not mega_command_available("mega-find"):
         return []
     try:
         res = _mega_run(
@@ -552,6 +885,9 @@ def ensure_mega_task_dirs(force: bool = False) -> bool:
         mega_ensure_remote_path(mega_task_remote_root())
         for state in ("pending", "running", "done", "failed"):
             mega_ensure_remote_path(mega_task_remote_dir(state))
+        if MEGA_TASK_GROUP_COMMIT:
+            mega_ensure_remote_path(mega_task_segment_dir())
+            mega_ensure_remote_path(mega_task_tombstone_dir())
         with _MEGA_TASK_LOCK:
             _mega_task_dirs_ready = True
         return True
@@ -567,6 +903,19 @@ def mega_task_remote_dir(state: str) -> str:
     return f"{mega_task_remote_root().rstrip('/')}/{state}"
 
 
+def mega_task_segment_dir() -> str:
+    return f"{mega_task_remote_root().rstrip('/')}/segments"
+
+
+def mega_task_tombstone_dir() -> str:
+    return f"{mega_task_remote_root().rstrip('/')}/tombstones"
+
+
+def _mega_task_is_segment_path(remote_path) -> bool:
+    text = str(remote_path or "").replace("\\", "/")
+    return "/segments/" in text and os.path.basename(text).startswith("seg_")
+
+
 def _mega_task_id(update_id) -> str:
     try:
         return str(int(update_id))
@@ -586,11 +935,16 @@ def mega_task_remote_path(update_id, state: str) -> str:
 def _mega_task_update_registry(update_id, state: str, path: str | None = None):
     key = _mega_task_id(update_id)
     with _MEGA_TASK_LOCK:
-        _mega_task_registry[key] = {
+        row = {
             "state": str(state),
             "path": path or mega_task_remote_path(key, state),
             "loaded_at": now_local().isoformat(timespec="seconds"),
         }
+        if _mega_task_is_segment_path(row["path"]):
+            row["segment"] = True
+        elif str(row["path"]).startswith("wal://"):
+            row["wal"] = True
+        _mega_task_registry[key] = row
 
 
 def mega_task_known_state(update_id) -> str:
@@ -1274,10 +1628,8 @@ def _durable_apply_live_forward_outcome(payload: dict, expected: dict | None) ->
                 continue
             current = {int(d): int(m) for d, m in get_forward_links(int(source_chat_id), int(source_msg_id))}
             if int(current.get(dst) or 0) != dst_msg_id:
-                _store_forward_link(int(source_chat_id), int(source_msg_id), dst, dst_msg_id)
                 try:
-                    _persist_forward_index_in_data(data)
-                    save_data(data, root_only=True)
+                    _store_forward_link(int(source_chat_id), int(source_msg_id), dst, dst_msg_id)
                 except Exception as e:
                     log_error(f"[FORWARD OUTCOME LINK REPAIR] {source_chat_id}:{source_msg_id}->{dst}:{dst_msg_id}: {e}")
         except Exception as e:
@@ -2379,6 +2731,486 @@ def restore_mega_task_context(task: dict):
         log_error(f"restore_mega_task_context task={task.get('task_id')}: {e}")
 
 
+# ─────────────────────────────────────────────────────────────
+# v199: group commit durable witnesses
+# ─────────────────────────────────────────────────────────────
+# Шквал из 30 финансовых сообщений раньше давал 30 mega-put pending + 30 mega-mv
+# done. Теперь первый поток становится лидером, ждёт MEGA_TASK_GROUP_WINDOW_MS и
+# пишет все накопившиеся pending-задачи одним segment-файлом:
+#   tasks/segments/seg_<stamp>_<n>.json = {manifest: {task_ids, sha256}, tasks: {id: payload}}
+# Каждый вызывающий поток по-прежнему получает ответ только после подтверждённого
+# put, т.е. write-before-execute сохраняется. Переходы done/failed/pending для
+# задач из сегментов пишутся пакетными tombstone-файлами tasks/tombstones/tomb_*.json;
+# при чтении tombstone применяются по порядку имени, последний выигрывает.
+_MEGA_TASK_SEGMENT_LOCK = threading.RLock()
+_mega_task_segment_index = {}       # segment remote path -> [task ids] (из manifest)
+_mega_task_segment_cache = {}       # segment remote path -> {task id: payload}, несколько последних
+_mega_task_tombstone_cache = {}     # tombstone remote path -> {task id: state row}
+_MEGA_TASK_SEGMENT_CACHE_MAX = 4
+_mega_task_group_seq = 0
+
+
+class MegaTaskGroupCommitter:
+    """Leader/follower group commit: один flush на всех, кто пришёл в пределах окна."""
+
+    def __init__(self, name: str, window_ms: int, max_items: int, flush):
+        self.name = str(name)
+        self.window = max(0, int(window_ms)) / 1000.0
+        self.max_items = max(1, int(max_items))
+        self._flush = flush
+        self._cv = threading.Condition(threading.Lock())
+        self._queue = []
+        self._leader = False
+        self._stats = {"batches": 0, "items": 0, "max_batch": 0, "errors": 0, "timeouts": 0}
+        self._latency = LatencyHistogram()
+
+    def submit(self, key: str, item, timeout: float = 120.0) -> bool:
+        entry = {"key": str(key), "item": item, "done": False, "ok": False, "taken": False}
+        started = time.monotonic()
+        deadline = started + max(1.0, float(timeout))
+        with self._cv:
+            self._queue.append(entry)
+            while not entry["done"] and self._leader:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 and not entry["taken"]:
+                    self._queue.remove(entry)
+                    self._stats["timeouts"] += 1
+                    return False
+                self._cv.wait(timeout=max(0.05, min(0.5, remaining)))
+            if entry["done"]:
+                self._latency.observe(time.monotonic() - started)
+                return bool(entry["ok"])
+            self._leader = True
+        try:
+            while not entry["done"]:
+                self._lead_once()
+        finally:
+            with self._cv:
+                self._leader = False
+                self._cv.notify_all()
+        self._latency.observe(time.monotonic() - started)
+        return bool(entry["ok"])
+
+    def _lead_once(self):
+        if self.window:
+            time.sleep(self.window)
+        with self._cv:
+            batch = self._queue[: self.max_items]
+            del self._queue[: len(batch)]
+            for entry in batch:
+                entry["taken"] = True
+        if not batch:
+            return
+        ok = False
+        try:
+            ok = bool(self._flush([(entry["key"], entry["item"]) for entry in batch]))
+        except Exception as e:
+            log_error(f"[MEGA TASK GROUP {self.name}] flush of {len(batch)}: {e}")
+        with self._cv:
+            for entry in batch:
+                entry["ok"] = ok
+                entry["done"] = True
+            self._stats["batches"] += 1
+            self._stats["items"] += len(batch)
+            self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+            if not ok:
+                self._stats["errors"] += 1
+            self._cv.notify_all()
+
+    def stats(self) -> dict:
+        with self._cv:
+            out = dict(self._stats)
+            out["queued"] = len(self._queue)
+        out["latency"] = self._latency.snapshot()
+        return out
+
+
+def _mega_task_group_name(prefix: str, count: int) -> str:
+    global _mega_task_group_seq
+    with _MEGA_TASK_SEGMENT_LOCK:
+        _mega_task_group_seq += 1
+        seq = _mega_task_group_seq
+    return f"{prefix}_{now_local().strftime('%Y%m%d_%H%M%S_%f')}_{os.getpid()}_{seq:06d}_{int(count)}.json"
+
+
+def _mega_task_put_group_file(name: str, payload: dict, remote_dir: str) -> str:
+    os.makedirs(MEGA_LOCAL_TMP_DIR, exist_ok=True)
+    local_path = os.path.join(MEGA_LOCAL_TMP_DIR, name)
+    try:
+        with open(local_path, "w", encoding="utf-8") as fh:
+            json.dump(payload, fh, ensure_ascii=False, separators=(",", ":"), default=str)
+        _mega_run("mega-put", [local_path, remote_dir], check=True, timeout=MEGA_TIMEOUT)
+        return f"{remote_dir.rstrip('/')}/{name}"
+    finally:
+        try:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+        except Exception:
+            pass
+
+
+def _mega_task_segment_digest(task_payload) -> str:
+    raw = json.dumps(task_payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _mega_task_cache_segment(remote_path: str, tasks: dict):
+    with _MEGA_TASK_SEGMENT_LOCK:
+        _mega_task_segment_index[remote_path] = sorted(tasks.keys())
+        _mega_task_segment_cache.pop(remote_path, None)
+        _mega_task_segment_cache[remote_path] = tasks
+        while len(_mega_task_segment_cache) > _MEGA_TASK_SEGMENT_CACHE_MAX:
+            _mega_task_segment_cache.pop(next(iter(_mega_task_segment_cache)), None)
+
+
+def _mega_task_flush_segment(items) -> bool:
+    tasks = {}
+    for key, task_payload in items:
+        tasks[str(key)] = task_payload
+    if not ensure_mega_task_dirs():
+        raise RuntimeError("MEGA task directories unavailable")
+    name = _mega_task_group_name("seg", len(tasks))
+    segment = {
+        "kind": "telegram_bot_durable_task_segment",
+        "schema_version": 1,
+        "bot_version": VERSION,
+        "segment_id": name[:-5],
+        "created_at": now_local().isoformat(timespec="microseconds"),
+        "manifest": {
+            "count": len(tasks),
+            "task_ids": sorted(tasks.keys()),
+            "sha256": {key: _mega_task_segment_digest(value) for key, value in tasks.items()},
+        },
+        "tasks": tasks,
+    }
+    remote = _mega_task_put_group_file(name, segment, mega_task_segment_dir())
+    _mega_task_cache_segment(remote, tasks)
+    for key in tasks:
+        _mega_task_update_registry(key, "pending", remote)
+    return True
+
+
+def _mega_task_flush_tombstones(items) -> bool:
+    states = {}
+    compact = False
+    for key, row in items:
+        if isinstance(row, dict) and row.get("compact"):
+            compact = True
+            continue
+        states[str(key)] = dict(row)
+    if compact:
+        # Сжатие: текущее состояние всех задач живых сегментов одной записью.
+        # Выполняется внутри лидера, поэтому учитывает все уже записанные tombstone.
+        with _MEGA_TASK_SEGMENT_LOCK:
+            live = {key for keys in _mega_task_segment_index.values() for key in keys}
+        with _MEGA_TASK_LOCK:
+            base = {
+                key: {"state": str(row.get("state")), "from": "compact"}
+                for key, row in _mega_task_registry.items()
+                if key in live and row.get("segment") and str(row.get("state")) != "pending"
+            }
+        base.update(states)
+        states = base
+    if not ensure_mega_task_dirs():
+        raise RuntimeError("MEGA task directories unavailable")
+    at = now_local().isoformat(timespec="microseconds")
+    for row in states.values():
+        row.setdefault("at", at)
+    name = _mega_task_group_name("tomb", len(states))
+    remote = _mega_task_put_group_file(name, {
+        "kind": "telegram_bot_durable_task_tombstones",
+        "schema_version": 1,
+        "bot_version": VERSION,
+        "created_at": at,
+        "compact": bool(compact),
+        "states": states,
+    }, mega_task_tombstone_dir())
+    with _MEGA_TASK_SEGMENT_LOCK:
+        _mega_task_tombstone_cache[remote] = states
+    with _MEGA_TASK_LOCK:
+        for key, row in states.items():
+            current = _mega_task_registry.get(key) or {}
+            _mega_task_update_registry(key, str(row.get("state")), current.get("path"))
+    return True
+
+
+_MEGA_TASK_PENDING_COMMITTER = MegaTaskGroupCommitter(
+    "pending", MEGA_TASK_GROUP_WINDOW_MS, MEGA_TASK_GROUP_MAX, _mega_task_flush_segment,
+)
+_MEGA_TASK_TOMBSTONE_COMMITTER = MegaTaskGroupCommitter(
+    "tombstones", MEGA_TASK_TOMBSTONE_WINDOW_MS, max(MEGA_TASK_GROUP_MAX, 256), _mega_task_flush_tombstones,
+)
+
+
+def mega_task_group_stats() -> dict:
+    with _MEGA_TASK_SEGMENT_LOCK:
+        segments = len(_mega_task_segment_index)
+        tombstones = len(_mega_task_tombstone_cache)
+    return {
+        "enabled": bool(MEGA_TASK_GROUP_COMMIT),
+        "segments": segments,
+        "tombstone_files": tombstones,
+        "pending": _MEGA_TASK_PENDING_COMMITTER.stats(),
+        "tombstones": _MEGA_TASK_TOMBSTONE_COMMITTER.stats(),
+    }
+
+
+def _mega_task_download_json(remote_path: str) -> dict:
+    local = _mega_download_remote_path(remote_path)
+    try:
+        return _load_json(local, {}) if local else {}
+    finally:
+        if local:
+            shutil.rmtree(os.path.dirname(local), ignore_errors=True)
+
+
+def _mega_task_segment_tasks(remote_path: str) -> dict | None:
+    """Задачи сегмента с проверкой manifest; None, если сегмент недоступен/битый."""
+    with _MEGA_TASK_SEGMENT_LOCK:
+        cached = _mega_task_segment_cache.get(remote_path)
+    if cached is not None:
+        return cached
+    segment = _mega_task_download_json(remote_path)
+    tasks = (segment or {}).get("tasks")
+    manifest = (segment or {}).get("manifest") or {}
+    if str((segment or {}).get("kind")) != "telegram_bot_durable_task_segment" or not isinstance(tasks, dict):
+        log_error(f"[MEGA TASK SEGMENT] unreadable {remote_path}")
+        return None
+    digests = manifest.get("sha256") or {}
+    bad = [key for key in (manifest.get("task_ids") or []) if key not in tasks or digests.get(key) != _mega_task_segment_digest(tasks.get(key))]
+    if bad or len(tasks) != len(manifest.get("task_ids") or []):
+        try:
+            bot_journal("mega_task_segment_manifest_mismatch_v199", None, f"segment={os.path.basename(remote_path)} bad={bad[:10]}", "WARN")
+        except Exception:
+            pass
+        tasks = {key: value for key, value in tasks.items() if key not in bad}
+    _mega_task_cache_segment(remote_path, tasks)
+    return tasks
+
+
+def mega_task_load_remote(update_id, remote_path: str) -> dict:
+    """Task card from a legacy task_<id>.json or from its v199 segment."""
+    key = _mega_task_id(update_id)
+    if str(remote_path or "").startswith("wal://"):
+        task = DURABLE_WAL.task(key)
+        if task is not None:
+            return task
+        # Сегмент уже отправлен shipper'ом: карточка теперь в MEGA.
+        with _MEGA_TASK_LOCK:
+            remote_path = str((_mega_task_registry.get(key) or {}).get("path") or "")
+        if not remote_path or remote_path.startswith("wal://"):
+            return {}
+    if _mega_task_is_segment_path(remote_path):
+        tasks = _mega_task_segment_tasks(remote_path) or {}
+        return dict(tasks.get(key) or {})
+    return _mega_task_download_json(remote_path)
+
+
+def _mega_task_segment_registry(root_rows_loaded_at: str) -> dict:
+    """Registry rows for segment tasks: manifest ids + tombstones applied in name order."""
+    seg_rows = _mega_find_remote_files(mega_task_segment_dir(), "seg_*.json", limit=None)
+    live = set(seg_rows)
+    for remote in seg_rows:
+        with _MEGA_TASK_SEGMENT_LOCK:
+            known = remote in _mega_task_segment_index
+        if not known:
+            _mega_task_segment_tasks(remote)
+    with _MEGA_TASK_SEGMENT_LOCK:
+        for remote in list(_mega_task_segment_index):
+            if remote not in live:
+                _mega_task_segment_index.pop(remote, None)
+                _mega_task_segment_cache.pop(remote, None)
+        index = {remote: list(keys) for remote, keys in _mega_task_segment_index.items()}
+    rows = {}
+    for remote in sorted(index):
+        for key in index[remote]:
+            rows[key] = {"state": "pending", "path": remote, "segment": True, "loaded_at": root_rows_loaded_at}
+    tomb_rows = sorted(_mega_find_remote_files(mega_task_tombstone_dir(), "tomb_*.json", limit=None))
+    live_tombs = set(tomb_rows)
+    for remote in tomb_rows:
+        with _MEGA_TASK_SEGMENT_LOCK:
+            states = _mega_task_tombstone_cache.get(remote)
+        if states is None:
+            states = (_mega_task_download_json(remote) or {}).get("states") or {}
+            with _MEGA_TASK_SEGMENT_LOCK:
+                _mega_task_tombstone_cache[remote] = states
+        for key, row in states.items():
+            state = str((row or {}).get("state") or "")
+            if key in rows and state in {"pending", "running", "done", "failed"}:
+                rows[key]["state"] = state
+    with _MEGA_TASK_SEGMENT_LOCK:
+        for remote in list(_mega_task_tombstone_cache):
+            if remote not in live_tombs:
+                _mega_task_tombstone_cache.pop(remote, None)
+    return rows
+
+
+def _mega_task_prune_segments():
+    """Удаляет сегменты, где все задачи done, и сжимает накопившиеся tombstone."""
+    with _MEGA_TASK_SEGMENT_LOCK:
+        index = {remote: list(keys) for remote, keys in _mega_task_segment_index.items()}
+    with _MEGA_TASK_LOCK:
+        states = {key: str((row or {}).get("state") or "") for key, row in _mega_task_registry.items()}
+        processing = set(_mega_task_processing)
+    done_segments = sorted(
+        remote for remote, keys in index.items()
+        if keys and all(states.get(key) == "done" and key not in processing for key in keys)
+    )
+    # Пара последних завершённых сегментов остаётся для диагностики, как MEGA_TASK_DONE_KEEP у task_*.json.
+    removed = 0
+    for remote in done_segments[:-2]:
+        res = _mega_run("mega-rm", [remote], check=False, timeout=30)
+        if res.returncode == 0 or _mega_remote_missing_error(res.stderr or res.stdout or ""):
+            removed += 1
+            with _MEGA_TASK_SEGMENT_LOCK:
+                keys = _mega_task_segment_index.pop(remote, [])
+                _mega_task_segment_cache.pop(remote, None)
+            with _MEGA_TASK_LOCK:
+                for key in keys:
+                    if states.get(key) == "done" and (_mega_task_registry.get(key) or {}).get("path") == remote:
+                        _mega_task_registry.pop(key, None)
+    with _MEGA_TASK_SEGMENT_LOCK:
+        old_tombs = sorted(_mega_task_tombstone_cache)
+    if len(old_tombs) >= MEGA_TASK_TOMBSTONE_COMPACT_AT:
+        if _MEGA_TASK_TOMBSTONE_COMMITTER.submit("__compact__", {"compact": True}, timeout=MEGA_TIMEOUT):
+            for remote in old_tombs:
+                _mega_run("mega-rm", [remote], check=False, timeout=30)
+                with _MEGA_TASK_SEGMENT_LOCK:
+                    _mega_task_tombstone_cache.pop(remote, None)
+    if removed:
+        bot_journal("mega_task_segments_pruned_v199", None, f"segments={removed} tombstones={len(old_tombs)}")
+    return removed
+
+
+# v199: локальный WAL durable-задач -> MEGA. Горячий путь пишет свидетель в
+# DURABLE_WAL (fsync), shipper отправляет закрытые сегменты одним seg_*.json и
+# переходы состояний одним tomb_*.json. Пока сегмент не отправлен, реестр хранит
+# путь wal://<seq>, а карточка задачи читается из локального файла.
+_DURABLE_WAL_SHIP_LOCK = threading.Lock()
+_durable_wal_shipper_started = False
+
+
+def durable_wal_active() -> bool:
+    return bool(DURABLE_WAL.enabled) and mega_tasks_active()
+
+
+def _durable_wal_path(seq) -> str:
+    return f"wal://{int(seq):012d}"
+
+
+def _durable_wal_is_path(path) -> bool:
+    return str(path or "").startswith("wal://")
+
+
+def _durable_wal_overlay_registry(registry: dict):
+    """Неотправленные WAL-записи новее MEGA: накладываются поверх загруженного реестра."""
+    if not DURABLE_WAL.enabled:
+        return
+    loaded_at = now_local().isoformat(timespec="seconds")
+    for key, row in DURABLE_WAL.pending_rows().items():
+        if row.get("task"):
+            registry[key] = {"state": row["state"], "path": _durable_wal_path(row["seq"]), "wal": True, "loaded_at": loaded_at}
+        elif key in registry and row.get("state"):
+            registry[key] = dict(registry[key], state=row["state"])
+
+
+def _durable_wal_ship_segment(seq: int) -> dict:
+    records, _valid, torn = DURABLE_WAL.read_segment(seq)
+    if torn:
+        DURABLE_WAL.count("ship_torn_segments")
+        bot_journal("durable_wal_torn_segment_v199", None, f"seq={seq} records={len(records)}", "WARN")
+    tasks = {}
+    states = {}
+    for record in records:
+        key = str(record.get("key") or "")
+        if not key:
+            continue
+        if record.get("type") == "task" and isinstance(record.get("task"), dict):
+            tasks[key] = record["task"]
+        elif record.get("type") == "state":
+            states[key] = {"state": str(record.get("state") or ""), "from": "wal"}
+    # Задача, завершённая до отправки, в MEGA не нужна: processed-marker уже есть.
+    skipped = {key for key in tasks if DURABLE_WAL.latest_state(key) == "done"}
+    for key in skipped:
+        tasks.pop(key, None)
+        states.pop(key, None)
+    if tasks:
+        _mega_task_flush_segment(list(tasks.items()))
+    if states:
+        _mega_task_flush_tombstones(list(states.items()))
+    DURABLE_WAL.mark_shipped(seq)
+    # Переходы из ещё не отправленных сегментов остаются последним словом в реестре.
+    with _MEGA_TASK_LOCK:
+        for key in set(tasks) | set(states):
+            state = DURABLE_WAL.latest_state(key)
+            current = _mega_task_registry.get(key) or {}
+            if state and current and state != current.get("state"):
+                _mega_task_update_registry(key, state, current.get("path"))
+    DURABLE_WAL.count("shipped_tasks", len(tasks))
+    DURABLE_WAL.count("shipped_states", len(states))
+    DURABLE_WAL.count("skipped_done", len(skipped))
+    return {"tasks": len(tasks), "states": len(states), "skipped": len(skipped)}
+
+
+def durable_wal_ship_once(force_seal: bool = False) -> dict:
+    """Seal the active segment if due and ship every sealed segment in order."""
+    if not durable_wal_active():
+        return DURABLE_WAL.stats()
+    with _DURABLE_WAL_SHIP_LOCK:
+        DURABLE_WAL.seal_due(force_seal)
+        for seq in DURABLE_WAL.sealed_segments():
+            try:
+                _durable_wal_ship_segment(seq)
+            except Exception as e:
+                # Порядок сегментов важен для tombstone: следующий не отправляем раньше.
+                DURABLE_WAL.note_error(str(e))
+                log_error(f"[DURABLE WAL SHIP] seq={seq}: {e}")
+                break
+    return DURABLE_WAL.stats()
+
+
+def _durable_wal_shipper_loop():
+    while True:
+        time.sleep(max(0.2, DURABLE_WAL_SEAL_SECONDS / 2.0))
+        try:
+            durable_wal_ship_once()
+        except Exception as e:
+            log_error(f"durable_wal_shipper: {e}")
+
+
+def durable_wal_start_shipper():
+    global _durable_wal_shipper_started
+    with _DURABLE_WAL_SHIP_LOCK:
+        if _durable_wal_shipper_started or not DURABLE_WAL.enabled:
+            return
+        _durable_wal_shipper_started = True
+    threading.Thread(target=_durable_wal_shipper_loop, name="durable-wal-shipper", daemon=True).start()
+
+
+def durable_wal_replay_blocking() -> dict:
+    """BOOT: проверить CRC сегментов, обрезать рваный хвост и отправить всё до recovery."""
+    if not DURABLE_WAL.enabled:
+        return DURABLE_WAL.stats()
+    started = time.monotonic()
+    try:
+        before = DURABLE_WAL.open()
+    except Exception as e:
+        DURABLE_WAL.note_error(str(e))
+        log_error(f"[DURABLE WAL REPLAY] open {DURABLE_WAL.directory}: {e}")
+        return DURABLE_WAL.stats()
+    after = durable_wal_ship_once(force_seal=True)
+    durable_wal_start_shipper()
+    if before.get("segments") or before.get("torn_tails"):
+        bot_journal(
+            "durable_wal_replay_v199", None,
+            f"segments={before.get('segments', 0)} tasks={before.get('unshipped_tasks', 0)} "
+            f"torn={before.get('torn_tails', 0)} left={after.get('segments', 0)} "
+            f"elapsed={time.monotonic() - started:.3f}s",
+            "WARN" if after.get("segments") else "INFO",
+        )
+    return after
+
+
 def _mega_task_upload_new_pending(update_id, task_payload: dict) -> bool:
     """v190 write-before-execute witness: one MEGA put, no candidate+rename round-trip.
 
@@ -2400,6 +3232,40 @@ def _mega_task_upload_new_pending(update_id, task_payload: dict) -> bool:
     known = mega_task_known_state(key)
     if known in {"pending", "running", "done"}:
         return True
+    if durable_wal_active():
+        try:
+            seq = DURABLE_WAL.append("task", key, task_payload)
+            _mega_task_update_registry(key, "pending", _durable_wal_path(seq))
+            try:
+                if "operation_step" in globals():
+                    operation_step(operation_for_update(key), "saved_to_wal", _durable_wal_path(seq), persist=False)
+            except Exception:
+                pass
+            with _MEGA_TASK_LOCK:
+                _mega_task_counters["persisted"] += 1
+            bot_journal("mega_task_timing", None, f"phase=persist_v199_wal update={key} elapsed={time.monotonic()-_timing_started:.3f}s")
+            return True
+        except Exception as e:
+            # Локальный диск недоступен — свидетель уходит прямо в MEGA, как без WAL.
+            DURABLE_WAL.note_error(str(e))
+            log_error(f"[DURABLE WAL APPEND] update={key}: {e}")
+    if MEGA_TASK_GROUP_COMMIT:
+        ok = _MEGA_TASK_PENDING_COMMITTER.submit(key, task_payload, timeout=MEGA_TIMEOUT)
+        if not ok:
+            with _MEGA_TASK_LOCK:
+                _mega_task_counters["persist_errors"] += 1
+            _mega_task_last_error = f"group commit failed for {key}"
+            log_error(f"[MEGA TASK PERSIST] update={key}: group commit failed")
+            return False
+        try:
+            if "operation_step" in globals():
+                operation_step(operation_for_update(key), "saved_to_mega", str((_mega_task_registry.get(key) or {}).get("path") or ""), persist=False)
+        except Exception:
+            pass
+        with _MEGA_TASK_LOCK:
+            _mega_task_counters["persisted"] += 1
+        bot_journal("mega_task_timing", None, f"phase=persist_v199_group update={key} elapsed={time.monotonic()-_timing_started:.3f}s")
+        return True
     local_path = None
     try:
         remote_dir = mega_task_remote_dir("pending")
@@ -2447,6 +3313,31 @@ def _mega_task_move(update_id, from_state: str, to_state: str) -> bool:
     if not mega_tasks_active():
         return False
     key = _mega_task_id(update_id)
+    with _MEGA_TASK_LOCK:
+        row = dict(_mega_task_registry.get(key) or {})
+        in_segment = bool(row.get("segment"))
+    if row.get("wal"):
+        # v199: задача ещё в локальном WAL — переход пишется туда же; shipper отправит его tombstone.
+        try:
+            DURABLE_WAL.append("state", key, state=str(to_state))
+            with _MEGA_TASK_LOCK:
+                _mega_task_update_registry(key, to_state, (_mega_task_registry.get(key) or {}).get("path"))
+            bot_journal("mega_task_timing", None, f"phase=wal_state update={key} {from_state}->{to_state} elapsed={time.monotonic()-_timing_started:.3f}s")
+            return True
+        except Exception as e:
+            _mega_task_last_error = str(e)[:500]
+            DURABLE_WAL.note_error(str(e))
+            log_error(f"[MEGA TASK MOVE] update={key} {from_state}->{to_state}: WAL append failed: {e}")
+            return False
+    if in_segment:
+        # v199: у задачи из сегмента нет своего файла — переход пишется пакетным tombstone.
+        ok = _MEGA_TASK_TOMBSTONE_COMMITTER.submit(key, {"state": str(to_state), "from": str(from_state)}, timeout=MEGA_TIMEOUT)
+        if not ok:
+            _mega_task_last_error = f"tombstone {from_state}->{to_state} failed for {key}"
+            log_error(f"[MEGA TASK MOVE] update={key} {from_state}->{to_state}: tombstone commit failed")
+        else:
+            bot_journal("mega_task_timing", None, f"phase=tombstone update={key} {from_state}->{to_state} elapsed={time.monotonic()-_timing_started:.3f}s")
+        return ok
     try:
         src = mega_task_remote_path(key, from_state)
         dst_dir = mega_task_remote_dir(to_state)
@@ -2529,6 +3420,11 @@ def _mega_task_prune_done_async():
                         _mega_task_registry.pop(key, None)
         except Exception as e:
             log_error(f"_mega_task_prune_done_async: {e}")
+        if MEGA_TASK_GROUP_COMMIT or DURABLE_WAL.enabled:
+            try:
+                _mega_task_prune_segments()
+            except Exception as e:
+                log_error(f"_mega_task_prune_segments: {e}")
     BACKUP_TASK_POOL.submit("mega-task-prune", _job)
 
 
@@ -2625,6 +3521,15 @@ def mega_task_refresh_registry() -> dict:
             old = new_registry.get(key)
             if old is None or rank[state] >= rank.get(old.get("state"), 0):
                 new_registry[key] = {"state": state, "path": path, "loaded_at": now_local().isoformat(timespec="seconds")}
+        # v199: tasks written by group commit live in segments + tombstones.
+        loaded_now = now_local().isoformat(timespec="seconds")
+        for key, row in _mega_task_segment_registry(loaded_now).items():
+            rank = {"failed": 1, "pending": 2, "running": 3, "done": 4}
+            old = new_registry.get(key)
+            if old is None or rank.get(row["state"], 0) >= rank.get(old.get("state"), 0):
+                new_registry[key] = row
+        # v199: неотправленный хвост локального WAL новее того, что видно в MEGA.
+        _durable_wal_overlay_registry(new_registry)
         # Keep in-process entries not yet visible in recursive find for a short race window.
         with _MEGA_TASK_LOCK:
             for key, row in _mega_task_registry.items():
@@ -2637,6 +3542,9 @@ def mega_task_refresh_registry() -> dict:
     except Exception as e:
         _mega_task_last_error = str(e)[:500]
         log_error(f"mega_task_refresh_registry: {e}")
+        # MEGA недоступна, но WAL-задачи восстанавливаются из локального диска.
+        with _MEGA_TASK_LOCK:
+            _durable_wal_overlay_registry(_mega_task_registry)
         return mega_task_registry_stats()
 
 
@@ -2825,10 +3733,9 @@ def _mega_task_recover_one(update_id, state: str, remote_path: str):
         return
     try:
         path = remote_path
-        if state == "pending":
+        if state == "pending" and not (_mega_task_is_segment_path(remote_path) or _durable_wal_is_path(remote_path)):
             path = mega_task_remote_path(key, "running")
-        local = _mega_download_remote_path(path)
-        task = _load_json(local, {}) if local else {}
+        task = mega_task_load_remote(key, path)
         payload = (task or {}).get("payload") or {}
         if not isinstance(payload, dict) or not payload:
             raise RuntimeError("task payload is empty")
@@ -2935,8 +3842,7 @@ def schedule_safe_failed_task_repairs(delay: float = 6.0, limit: int = 20):
             for key, remote_path in rows:
                 local = None
                 try:
-                    local = _mega_download_remote_path(remote_path or mega_task_remote_path(key, "failed"))
-                    task = _load_json(local, {}) if local else {}
+                    task = mega_task_load_remote(key, remote_path or mega_task_remote_path(key, "failed"))
                     payload = (task or {}).get("payload") or {}
                     if not isinstance(payload, dict) or not payload:
                         continue
@@ -3095,10 +4001,7 @@ def schedule_restored_secret_media_recovery(delay: float = 3.0):
         try:
             for cid in secret_chats():
                 try:
-                    pending_media = any(
-                        isinstance(r, dict) and r.get("file_id") and not r.get("mega_media_path")
-                        for r in _secret_records(cid)
-                    )
+                    pending_media = any(_secret_media_missing(r) for r in _secret_records(cid))
                     if pending_media:
                         if not BACKUP_TASK_POOL.submit(f"secret-media-recover:{cid}", upload_chat_secrets_to_mega, cid):
                             schedule_secret_mega_upload(cid, BACKUP_BUSY_RETRY_SECONDS)
@@ -3498,6 +4401,23 @@ _global_snapshot_last_success_at = ""
 _global_snapshot_last_change_monotonic = 0.0
 _global_snapshot_capture_generation = 0
 
+# v199: record-level change tracking. Finance handlers and the SQLite row flush report
+# touched records, so a chat's delta hashes only those keys instead of its whole history.
+MEGA_DELTA_INCREMENTAL = _env_bool("MEGA_DELTA_INCREMENTAL", "1")
+try:
+    MEGA_DELTA_VERIFY_EVERY = max(0, int(os.getenv("MEGA_DELTA_VERIFY_EVERY", "25") or "25"))
+except Exception:
+    MEGA_DELTA_VERIFY_EVERY = 25
+_delta_dirty_seq = 0
+_delta_dirty_records: dict[int, dict[str, tuple[int, dict | None]]] = defaultdict(dict)
+_delta_dirty_full: dict[int, int] = {}
+_delta_build_count = 0
+_DELTA_TRACK_STATS = {
+    "tracked_upserts": 0, "tracked_deletes": 0, "full_marks": 0,
+    "incremental_chats": 0, "full_chats": 0, "hashed_records": 0,
+    "verify_runs": 0, "verify_mismatches": 0, "last_mismatch": "",
+}
+
 _DELTA_VOLATILE_CHAT_KEYS = {
     "active_windows", "edit_wait", "edit_target", "categories_msg_id", "report_window_id",
     "info_msg_id", "command_window_id", "total_msg_id", "balance_panel_id", "secret_wait",
@@ -3571,6 +4491,129 @@ def _delta_record_key(rec: dict) -> str:
     )
 
 
+def delta_track_record(chat_id: int, rec: dict | None, ledger: str = "records", deleted: bool = False, key: str | None = None):
+    """Report one mutated finance record to the delta builder (only the active ledger is carried by deltas)."""
+    index = globals().get("FINANCE_BALANCE_INDEX")
+    if index is not None and (rec is not None or key):
+        try: index.note_record(chat_id, rec, ledger, deleted, key)
+        except Exception: pass
+    bump = globals().get("finance_ledger_bump")
+    if bump is not None and (rec is not None or key):
+        try: bump(chat_id)
+        except Exception: pass
+    msg_note = globals().get("finance_msg_index_note")
+    if msg_note is not None and (rec is not None or key):
+        try: msg_note(chat_id, rec, ledger, deleted, key)
+        except Exception: pass
+    rows_note = globals().get("finance_rows_note")
+    if rows_note is not None and (rec is not None or key):
+        try: rows_note(chat_id, rec, ledger, deleted, key)
+        except Exception: pass
+    if str(ledger) != "records" or (rec is None and not key):
+        return
+    note = globals().get("finance_records_order_note")
+    if note is not None:
+        note(chat_id, rec, deleted)
+    global _delta_dirty_seq
+    try:
+        cid = int(chat_id)
+        rkey = str(key or _delta_record_key(rec))
+        with _delta_state_lock:
+            _delta_dirty_seq += 1
+            _delta_dirty_records[cid][rkey] = (_delta_dirty_seq, None if deleted else rec)
+            _DELTA_TRACK_STATS["tracked_deletes" if deleted else "tracked_upserts"] += 1
+    except Exception:
+        pass
+
+
+def delta_track_record_rekey(chat_id: int, old_key: str, rec: dict):
+    """A record's delta key changed in place (uid assigned, id renumbered)."""
+    index = globals().get("FINANCE_BALANCE_INDEX")
+    if index is not None:
+        try: index.rekey_record(chat_id, old_key, rec)
+        except Exception: pass
+    try:
+        if str(old_key) != _delta_record_key(rec):
+            with _delta_state_lock:
+                known = str(old_key) in (_delta_record_baseline.get(int(chat_id)) or {})
+            if known:
+                delta_track_chat_full(chat_id, "record_rekey")
+        delta_track_record(chat_id, rec)
+    except Exception:
+        pass
+
+
+def delta_track_chat_full(chat_id: int, reason: str = ""):
+    """The active ledger was replaced wholesale: the next delta for this chat uses the full scan."""
+    global _delta_dirty_seq
+    index = globals().get("FINANCE_BALANCE_INDEX")
+    if index is not None:
+        try: index.invalidate(chat_id, reason=reason)
+        except Exception: pass
+    release = globals().get("finance_records_order_release")
+    if release is not None:
+        release(chat_id)
+    msg_release = globals().get("finance_msg_index_release")
+    if msg_release is not None:
+        msg_release(chat_id)
+    rows_release = globals().get("finance_rows_release")
+    if rows_release is not None:
+        rows_release(chat_id)
+    bump = globals().get("finance_ledger_bump")
+    if bump is not None:
+        try: bump(chat_id)
+        except Exception: pass
+    try:
+        cid = int(chat_id)
+        with _delta_state_lock:
+            _delta_dirty_seq += 1
+            _delta_dirty_full[cid] = _delta_dirty_seq
+            _DELTA_TRACK_STATS["full_marks"] += 1
+    except Exception:
+        pass
+
+
+def _delta_feed_finance_rows(chat_id: int, ledger: str, result: dict):
+    """Row diff from _lowram_flush_chat: catches renumbering and other side effects of a mutation."""
+    if not isinstance(result, dict):
+        return
+    index = globals().get("FINANCE_BALANCE_INDEX")
+    if str(ledger) != "records":
+        # ars_records/usd_records не идут в delta, но питают канонические ledgers индекса остатков.
+        msg_note = globals().get("finance_msg_index_note")
+        if msg_note is not None:
+            for rec in result.get("changed") or []:
+                msg_note(chat_id, rec, ledger)
+            for row_key in result.get("deleted") or []:
+                msg_note(chat_id, None, ledger, True, f"uid:{row_key}")
+        if index is not None:
+            try:
+                for rec in result.get("changed") or []:
+                    index.note_record(chat_id, rec, ledger)
+                for row_key in result.get("deleted") or []:
+                    if re.fullmatch(r"[A-F0-9]{12}", str(row_key)):
+                        index.note_record(chat_id, None, ledger, deleted=True, key=f"uid:{row_key}")
+                    else:
+                        index.invalidate(chat_id, reason="untracked_row_delete")
+            except Exception:
+                pass
+        return
+    for rec in result.get("changed") or []:
+        delta_track_record(chat_id, rec)
+    for row_key in result.get("deleted") or []:
+        if re.fullmatch(r"[A-F0-9]{12}", str(row_key)):
+            delta_track_record(chat_id, None, deleted=True, key=f"uid:{row_key}")
+        else:
+            # Legacy rows without record_uid have no stable delta key to delete by.
+            delta_track_chat_full(chat_id, "untracked_row_delete")
+
+
+def _delta_clear_tracking():
+    with _delta_state_lock:
+        _delta_dirty_records.clear()
+        _delta_dirty_full.clear()
+
+
 def _delta_chat_meta(store: dict) -> dict:
     """Only compact chat metadata; finance arrays are carried by record upserts/deletes."""
     out = {}
@@ -3593,6 +4636,8 @@ def _delta_root_patch(payload: dict) -> dict:
         for k, v in (payload or {}).items()
         if k not in _DELTA_VOLATILE_ROOT_KEYS
         and k not in {"_universal_backup", "_backup_meta", "_runtime_snapshot", "_delta_restore_meta"}
+        # v199: связи копий едут в delta по отметкам forward_links, а не через сигнатуры root.
+        and k != "forward_index"
     }
     gs = out.get("_global_settings")
     source_gs = (payload or {}).get("_global_settings") or {}
@@ -3654,27 +4699,94 @@ def _delta_baseline_from_payload(payload: dict) -> tuple[dict[int, dict[str, str
     root_baseline = _delta_root_signature_state(root)
     return rec_baseline, meta_baseline, root_baseline
 
-def initialize_delta_baseline(payload: dict | None = None):
-    """Начальная точка delta. Ничего не загружает и не создаёт бэкап."""
+def initialize_delta_baseline(payload: dict | None = None, signatures: tuple | None = None):
+    """Начальная точка delta. Ничего не загружает и не создаёт бэкап.
+
+    signatures — готовые (records, meta, root) подписи, собранные потоковым writer'ом backup.
+    """
     global _delta_record_baseline, _delta_meta_baseline, _delta_root_baseline
-    snapshot = payload
-    if snapshot is None:
-        with data_lock:
-            _persist_forward_index_in_data(data)
-            # v114: do not deep-clone all chat history. ColdChatStore histories live in SQLite.
-            snapshot = data or {}
-    recs, metas, root_sig = _delta_baseline_from_payload(snapshot or {})
+    if signatures is not None:
+        recs, metas, root_sig = signatures
+    else:
+        snapshot = payload
+        if snapshot is None:
+            with data_lock:
+                # v114: do not deep-clone all chat history. ColdChatStore histories live in SQLite.
+                snapshot = data or {}
+        recs, metas, root_sig = _delta_baseline_from_payload(snapshot or {})
     with _delta_state_lock:
         _delta_record_baseline = recs
         _delta_meta_baseline = metas
         _delta_root_baseline = dict(root_sig or {})
+        _delta_dirty_records.clear()
+        _delta_dirty_full.clear()
+
+
+def _delta_chat_meta_source(chat_id: int, store: dict) -> dict:
+    """Same fields as _lowram_materialize_chat_snapshot minus the finance arrays deltas never carry."""
+    snap = _lowram_store_meta_payload(store) if LOWRAM_ENABLED else {str(k): v for k, v in dict.items(store) if k not in _DELTA_DERIVED_CHAT_KEYS}
+    if LOWRAM_ENABLED:
+        for key in LOWRAM_COLD_KEYS - _DELTA_DERIVED_CHAT_KEYS:
+            value = dict.__getitem__(store, key) if dict.__contains__(store, key) else SQLITE.get_cold(int(chat_id), key, _lowram_default_for_key(key))
+            if value not in (None, [], {}):
+                snap[key] = value
+    return snap
+
+
+def _delta_chat_meta_change(store: dict, previous_meta_sigs: dict) -> tuple[dict, dict, list, list]:
+    meta = _delta_chat_meta(store)
+    current_meta_sigs = {str(key): _delta_hash(value) for key, value in meta.items()}
+    changed = [key for key, sig in current_meta_sigs.items() if previous_meta_sigs.get(key) != sig]
+    deleted = [key for key in previous_meta_sigs if key not in current_meta_sigs]
+    return meta, current_meta_sigs, changed, deleted
+
+
+def _delta_chat_change_full(cid: int, store: dict, previous_sigs: dict, previous_meta_sigs: dict):
+    current_records = {
+        _delta_record_key(rec): rec
+        for rec in (store.get("records", []) or [])
+        if isinstance(rec, dict)
+    }
+    current_sigs = {key: _delta_hash(rec) for key, rec in current_records.items()}
+    upserts = {key: current_records[key] for key, sig in current_sigs.items() if previous_sigs.get(key) != sig}
+    deletes = [key for key in previous_sigs if key not in current_sigs]
+    meta, meta_sigs, changed_meta, deleted_meta = _delta_chat_meta_change(store, previous_meta_sigs)
+    with _delta_state_lock:
+        _DELTA_TRACK_STATS["hashed_records"] += len(current_sigs)
+    return upserts, deletes, current_sigs, meta, meta_sigs, changed_meta, deleted_meta
+
+
+def _delta_chat_change_incremental(cid: int, touched: dict, meta_store: dict, previous_sigs: dict, previous_meta_sigs: dict):
+    """touched: delta key -> cloned record or None (deleted). Returns a sig patch instead of a full map."""
+    upserts = {}; deletes = []; patch = {}
+    for key, rec in touched.items():
+        if rec is None:
+            if key in previous_sigs:
+                deletes.append(key); patch[key] = None
+            continue
+        sig = _delta_hash(rec)
+        if previous_sigs.get(key) != sig:
+            upserts[key] = rec; patch[key] = sig
+    meta, meta_sigs, changed_meta, deleted_meta = _delta_chat_meta_change(meta_store, previous_meta_sigs)
+    with _delta_state_lock:
+        _DELTA_TRACK_STATS["hashed_records"] += sum(1 for rec in touched.values() if rec is not None)
+    return upserts, deletes, patch, meta, meta_sigs, changed_meta, deleted_meta
 
 
 def _build_delta_payload(chat_ids: list[int], generation_map: dict[int, int]) -> tuple[dict | None, dict]:
     """Строит только изменившиеся записи и поля настроек относительно подтверждённого delta/full."""
+    global _delta_build_count
     requested_ids = sorted({int(x) for x in chat_ids})
+    with _delta_state_lock:
+        _delta_build_count += 1
+        verify = bool(MEGA_DELTA_VERIFY_EVERY) and _delta_build_count % MEGA_DELTA_VERIFY_EVERY == 0
+        incremental_ids = set()
+        if MEGA_DELTA_INCREMENTAL and LOWRAM_ENABLED:
+            incremental_ids = {cid for cid in requested_ids if cid not in _delta_dirty_full and cid in _delta_record_baseline}
+        full_marks = {cid: _delta_dirty_full[cid] for cid in requested_ids if cid in _delta_dirty_full}
+    touched_by_chat = {}
+    dirty_marks = {}
     with data_lock:
-        _persist_forward_index_in_data(data)
         # Не копируем все чаты для маленького delta: только root и реально изменившиеся чаты.
         state = {
             str(key): _delta_json_clone(value)
@@ -3682,59 +4794,116 @@ def _build_delta_payload(chat_ids: list[int], generation_map: dict[int, int]) ->
             if key != "chats"
         }
         all_chats = (data or {}).get("chats", {}) or {}
+        full_ids = [cid for cid in requested_ids if cid not in incremental_ids or verify]
         if LOWRAM_ENABLED:
             state["chats"] = {
                 str(cid): _delta_json_clone(_lowram_materialize_chat_snapshot(cid, all_chats.get(str(cid), {}) or {}))
-                for cid in requested_ids
+                for cid in full_ids
             }
         else:
             state["chats"] = {
                 str(cid): _delta_json_clone(all_chats.get(str(cid), {}) or {})
-                for cid in requested_ids
+                for cid in full_ids
             }
+        meta_sources = {}
+        with _delta_state_lock:
+            for cid in requested_ids:
+                marks = dict(_delta_dirty_records.get(cid) or {})
+                dirty_marks[cid] = {key: seq for key, (seq, _rec) in marks.items()}
+                if cid in incremental_ids:
+                    touched_by_chat[cid] = {key: rec for key, (_seq, rec) in marks.items()}
+        fallback_ids = set()
+        for cid in sorted(incremental_ids):
+            touched = {}
+            for key, rec in (touched_by_chat.get(cid) or {}).items():
+                clone = _delta_json_clone(rec) if isinstance(rec, dict) else None
+                if clone is not None and _delta_record_key(clone) != key:
+                    # The record's identity changed after it was tracked (e.g. uid assigned):
+                    # the old key can only be resolved by the full scan.
+                    fallback_ids.add(cid)
+                    break
+                touched[key] = clone
+            else:
+                touched_by_chat[cid] = touched
+                meta_sources[cid] = _delta_json_clone(_delta_chat_meta_source(cid, all_chats.get(str(cid), {}) or {}))
+        incremental_ids -= fallback_ids
+        for cid in fallback_ids:
+            touched_by_chat.pop(cid, None)
+            if str(cid) not in state["chats"]:
+                state["chats"][str(cid)] = _delta_json_clone(_lowram_materialize_chat_snapshot(cid, all_chats.get(str(cid), {}) or {}))
 
     with _delta_state_lock:
-        old_records = {int(cid): dict(sigs or {}) for cid, sigs in _delta_record_baseline.items()}
+        old_records = {int(cid): dict(_delta_record_baseline.get(cid) or {}) for cid in requested_ids if cid not in incremental_ids or verify}
+        for cid in incremental_ids:
+            # Read-only view; incremental chats never copy their full signature map.
+            old_records.setdefault(int(cid), _delta_record_baseline.get(cid) or {})
         old_meta = {int(cid): dict(sigs or {}) for cid, sigs in _delta_meta_baseline.items()}
         old_root = dict(_delta_root_baseline or {})
 
     chat_changes = {}
     next_record_sigs = {}
+    record_sig_patches = {}
     next_meta_sigs = {}
     event_count = 0
     chats = state.get("chats", {}) or {}
     for cid in requested_ids:
-        store = chats.get(str(cid)) or {}
-        if not isinstance(store, dict):
-            continue
-        current_records = {
-            _delta_record_key(rec): rec
-            for rec in (store.get("records", []) or [])
-            if isinstance(rec, dict)
-        }
-        current_sigs = {key: _delta_hash(rec) for key, rec in current_records.items()}
         previous_sigs = old_records.get(cid, {}) or {}
-        upsert_keys = [key for key, sig in current_sigs.items() if previous_sigs.get(key) != sig]
-        delete_keys = [key for key in previous_sigs if key not in current_sigs]
-
-        meta = _delta_chat_meta(store)
-        current_meta_sigs = {str(key): _delta_hash(value) for key, value in meta.items()}
         previous_meta_sigs = old_meta.get(cid, {}) or {}
-        changed_meta_keys = [key for key, sig in current_meta_sigs.items() if previous_meta_sigs.get(key) != sig]
-        deleted_meta_keys = [key for key in previous_meta_sigs if key not in current_meta_sigs]
+        full_result = None
+        if cid not in incremental_ids or verify:
+            store = chats.get(str(cid)) or {}
+            if not isinstance(store, dict):
+                continue
+            full_result = _delta_chat_change_full(cid, store, previous_sigs, previous_meta_sigs)
+        if cid in incremental_ids:
+            inc = _delta_chat_change_incremental(cid, touched_by_chat.get(cid) or {}, meta_sources.get(cid) or {}, previous_sigs, previous_meta_sigs)
+            upserts, deletes, patch, meta, meta_sigs, changed_meta, deleted_meta = inc
+            if full_result is not None:
+                with _delta_state_lock:
+                    _DELTA_TRACK_STATS["verify_runs"] += 1
+                f_upserts, f_deletes = full_result[0], full_result[1]
+                same = (
+                    {k: _delta_hash(v) for k, v in upserts.items()} == {k: _delta_hash(v) for k, v in f_upserts.items()}
+                    and sorted(deletes) == sorted(f_deletes)
+                    and sorted(changed_meta) == sorted(full_result[5]) and sorted(deleted_meta) == sorted(full_result[6])
+                )
+                if not same:
+                    detail = (
+                        f"chat={cid} inc_upserts={len(upserts)} full_upserts={len(f_upserts)} "
+                        f"inc_deletes={len(deletes)} full_deletes={len(f_deletes)}"
+                    )
+                    with _delta_state_lock:
+                        _DELTA_TRACK_STATS["verify_mismatches"] += 1
+                        _DELTA_TRACK_STATS["last_mismatch"] = detail
+                    log_error(f"[MEGA DELTA VERIFY] incremental/full mismatch: {detail}; full scan used")
+                    try: bot_journal("delta_incremental_mismatch_v199", cid, detail, "WARN")
+                    except Exception: pass
+                    inc = None
+            if inc is not None:
+                record_sig_patches[cid] = patch
+                with _delta_state_lock:
+                    _DELTA_TRACK_STATS["incremental_chats"] += 1
+        else:
+            inc = None
+        if inc is None:
+            if full_result is None:
+                continue
+            upserts, deletes, current_sigs, meta, meta_sigs, changed_meta, deleted_meta = full_result
+            next_record_sigs[cid] = current_sigs
+            with _delta_state_lock:
+                _DELTA_TRACK_STATS["full_chats"] += 1
 
-        if upsert_keys or delete_keys or changed_meta_keys or deleted_meta_keys:
+        if upserts or deletes or changed_meta or deleted_meta:
             row = {
                 "chat_id": cid,
-                "upserts": [{"key": key, "record": current_records[key]} for key in upsert_keys],
-                "deletes": delete_keys,
-                "chat_meta_patch": {key: meta[key] for key in changed_meta_keys},
-                "chat_meta_deletes": deleted_meta_keys,
+                "upserts": [{"key": key, "record": rec} for key, rec in upserts.items()],
+                "deletes": deletes,
+                "chat_meta_patch": {key: meta[key] for key in changed_meta},
+                "chat_meta_deletes": deleted_meta,
             }
             chat_changes[str(cid)] = row
-            event_count += len(upsert_keys) + len(delete_keys) + len(changed_meta_keys) + len(deleted_meta_keys)
-        next_record_sigs[cid] = current_sigs
-        next_meta_sigs[cid] = current_meta_sigs
+            event_count += len(upserts) + len(deletes) + len(changed_meta) + len(deleted_meta)
+        next_meta_sigs[cid] = meta_sigs
 
     root = _delta_root_patch(state)
     current_root_sigs = _delta_root_signature_state(root)
@@ -3761,12 +4930,24 @@ def _build_delta_payload(chat_ids: list[int], generation_map: dict[int, int]) ->
         if key not in current_root_sigs:
             root_deletes.append(key)
             event_count += 1
+    forward_marks = _forward_index_dirty_marks()
+    if forward_marks:
+        forward_rows, forward_gone = _forward_index_delta_rows(forward_marks)
+        if forward_rows:
+            root_map_patches["forward_index"] = forward_rows
+        if forward_gone:
+            root_map_deletes["forward_index"] = forward_gone
+        event_count += len(forward_rows) + len(forward_gone)
 
     baseline = {
         "record_sigs": next_record_sigs,
+        "record_sig_patches": record_sig_patches,
         "meta_sigs": next_meta_sigs,
         "root_sigs": current_root_sigs,
         "generation_map": generation_map,
+        "dirty_marks": dirty_marks,
+        "full_marks": full_marks,
+        "forward_marks": forward_marks,
     }
     if event_count <= 0:
         return None, baseline
@@ -3794,10 +4975,32 @@ def _commit_delta_baseline(baseline: dict):
     with _delta_state_lock:
         for cid, sigs in (baseline.get("record_sigs") or {}).items():
             _delta_record_baseline[int(cid)] = dict(sigs or {})
+        for cid, patch in (baseline.get("record_sig_patches") or {}).items():
+            target = _delta_record_baseline.setdefault(int(cid), {})
+            for key, sig in (patch or {}).items():
+                if sig is None:
+                    target.pop(key, None)
+                else:
+                    target[key] = sig
+        # Drop only the marks this delta consumed; a record touched again meanwhile stays dirty.
+        for cid, marks in (baseline.get("dirty_marks") or {}).items():
+            current = _delta_dirty_records.get(int(cid))
+            if not current:
+                continue
+            for key, seq in (marks or {}).items():
+                if key in current and current[key][0] == seq:
+                    current.pop(key, None)
+            if not current:
+                _delta_dirty_records.pop(int(cid), None)
+        for cid, seq in (baseline.get("full_marks") or {}).items():
+            if _delta_dirty_full.get(int(cid)) == seq:
+                _delta_dirty_full.pop(int(cid), None)
         for cid, sigs in (baseline.get("meta_sigs") or {}).items():
             _delta_meta_baseline[int(cid)] = dict(sigs or {})
         if "root_sigs" in baseline:
             _delta_root_baseline = dict(baseline.get("root_sigs") or {})
+    if baseline.get("forward_marks"):
+        _forward_index_commit_marks(baseline.get("forward_marks"))
 
 def _delta_upload_payload(payload: dict) -> tuple[bool, str]:
     """Canonical compact-delta uploader. Soft warn 512 KiB; hard stop 1 MiB."""
@@ -4156,6 +5359,8 @@ def delta_status_text() -> str:
         pending = len(_delta_pending_chats)
         global_pending = _global_snapshot_pending
         since_full = max(0, int(time.monotonic() - _global_snapshot_last_success_monotonic))
+        track = dict(_DELTA_TRACK_STATS)
+        dirty = sum(len(v) for v in _delta_dirty_records.values())
     return (
         "🧩 Delta / snapshots v91\n"
         f"Ожидают чаты: {pending}\n"
@@ -4163,6 +5368,9 @@ def delta_status_text() -> str:
         f"Событий в нём: {_delta_last_event_count}\n"
         f"Файл: {_delta_last_file or '-'}\n"
         f"Ошибка: {_delta_last_error or '-'}\n"
+        f"Incremental: {'ВКЛ' if MEGA_DELTA_INCREMENTAL else 'ВЫКЛ'}; чаты inc/full={track['incremental_chats']}/{track['full_chats']}; "
+        f"хэшировано записей={track['hashed_records']}; dirty={dirty}\n"
+        f"Verify каждые {MEGA_DELTA_VERIFY_EVERY or '—'}: прогонов={track['verify_runs']} расхождений={track['verify_mismatches']}\n"
         f"SQLite snapshot ожидается: {'да' if global_pending else 'нет'}\n"
         f"После последнего full: {since_full} сек.\n"
         f"Тишина для SQLite snapshot: {int(MEGA_GLOBAL_QUIET_SECONDS)} сек.; максимум: {int(MEGA_GLOBAL_MAX_INTERVAL_SECONDS)} сек."
@@ -4184,10 +5392,9 @@ def _snapshot_runtime_state_for_backup(payload: dict) -> dict:
 def _v177_legacy_0077_make_global_backup_payload() -> dict:
     """Универсальный полный JSON: данные, настройки и индекс старых пересланных сообщений."""
     with data_lock:
-        # Важно снять актуальный forward_map ДО копирования. Иначе свежие связи старых/новых
-        # сообщений могли отсутствовать в latest_global.json до срабатывания debounce.
-        _persist_forward_index_in_data(data)
         payload = json.loads(json.dumps(data or {}, ensure_ascii=False, default=str))
+    # v199: forward_index больше не живёт в root — берём актуальную карту из SQLite forward_links.
+    _persist_forward_index_in_data(payload)
     payload.setdefault("chats", {})
     payload.setdefault("forward_rules", data.get("forward_rules", {}) if isinstance(data, dict) else {})
     payload.setdefault("forward_finance", data.get("forward_finance", {}) if isinstance(data, dict) else {})
@@ -4230,18 +5437,187 @@ except Exception: pass
 make_global_backup_payload = _v177_legacy_0077_make_global_backup_payload
 
 
-def save_global_backup_snapshot(path: str) -> str:
-    """Атомарно создаёт локальный universal snapshot."""
-    payload = make_global_backup_payload()
+# v199: streaming universal backup. Полный state больше не собирается в один dict: root
+# копируется целиком (он мал), чаты материализуются из SQLite по одному, forward_index
+# читается курсором. Текст совпадает с json.dump(make_global_backup_payload(), indent=2)
+# для тех же данных, поэтому reader schema 11 (_load_json/restore) читает его без изменений.
+_GLOBAL_BACKUP_STREAM_LAST = {}
+
+
+def _global_backup_json_chunk(value, level: int) -> str:
+    """Значение на глубине level в том же виде, в каком его пишет json.dump(indent=2) целиком."""
+    text = json.dumps(value, ensure_ascii=False, indent=2, default=str)
+    return text.replace("\n", "\n" + "  " * level) if level else text
+
+
+def _global_backup_stream_map(out, items, level: int) -> int:
+    """Пишет объект из итератора пар (key, value) на глубине level; возвращает число пар."""
+    pad = "  " * (level + 1); count = 0
+    for key, value in items:
+        out.write(("{\n" if count == 0 else ",\n") + pad + json.dumps(str(key), ensure_ascii=False) + ": " + _global_backup_json_chunk(value, level + 1))
+        count += 1
+    out.write("{}" if count == 0 else "\n" + "  " * level + "}")
+    return count
+
+
+def _global_backup_chat_snapshot(cid_s: str, baseline: dict | None = None) -> dict | None:
+    """Один чат для universal backup: cold-поля из SQLite, даты DD:MM:YY как в make_global_backup_payload.
+
+    baseline получает delta-подписи этого чата (как _delta_baseline_from_payload) до разметки дат.
+    """
+    with data_lock:
+        store = ((data or {}).get("chats", {}) or {}).get(cid_s)
+        if not isinstance(store, dict):
+            return _delta_json_clone(store) if store is not None else None
+        try:
+            snap = _lowram_materialize_chat_snapshot(int(cid_s), store) if LOWRAM_ENABLED else store
+        except (TypeError, ValueError):
+            snap = store
+        snap = _delta_json_clone(snap)
+    if baseline is not None and isinstance(snap, dict):
+        try:
+            cid = int(cid_s)
+            baseline["records"][cid] = {
+                _delta_record_key(rec): _delta_hash(rec) for rec in (snap.get("records") or []) if isinstance(rec, dict)
+            }
+            meta = _delta_chat_meta(_lowram_store_meta_payload(snap) if LOWRAM_ENABLED else snap)
+            baseline["meta"][cid] = {str(key): _delta_hash(value) for key, value in meta.items()}
+        except (TypeError, ValueError):
+            pass
+    try:
+        snap["records"] = backup_records_list(snap.get("records", []))
+        snap["daily_records_by_date"] = {fmt_date_backup(k): backup_records_list(v) for k, v in (snap.get("daily_records", {}) or {}).items()}
+    except Exception as e:
+        log_error(f"make_global_backup_payload date annotate: {e}")
+    return snap
+
+
+def write_global_backup_stream(path: str, baseline: dict | None = None) -> dict:
+    """Пишет universal backup чат за чатом; *.gz — сразу в gzip-поток. Возвращает _global_payload_stats.
+
+    Если передан baseline (dict), в него кладутся delta-подписи записанного состояния:
+    baseline["signatures"] = (records, meta, root) для initialize_delta_baseline().
+    """
+    sanitize = globals().get("v153_sanitize")
+    clean = sanitize if callable(sanitize) else (lambda value, key="": value)
+    with data_lock:
+        root_keys = [str(k) for k in (data or {}).keys()]
+        root = {str(k): _delta_json_clone(v) for k, v in (data or {}).items() if k != "chats"}
+        chat_ids = [str(k) for k in ((data or {}).get("chats", {}) or {}).keys()]
+    for key in ("chats", "forward_rules", "forward_finance"):
+        if key not in root_keys:
+            root_keys.append(key)
+            root.setdefault(key, {})
+    counts = {"chat_count": 0, "nonempty_chats": 0, "record_count": 0, "forward_index_count": 0}
+    sigs = {"records": {}, "meta": {}} if baseline is not None else None
+
+    def chat_items():
+        for cid_s in chat_ids:
+            snap = _global_backup_chat_snapshot(cid_s, sigs)
+            recs = snap.get("records") if isinstance(snap, dict) else None
+            if isinstance(recs, list):
+                counts["record_count"] += len(recs)
+                counts["nonempty_chats"] += 1 if recs else 0
+            counts["chat_count"] += 1
+            yield cid_s, clean(snap, cid_s)
+
+    def forward_items(count: bool):
+        for key, rows in SQLITE.iter_forward_index():
+            if count:
+                counts["forward_index_count"] += 1
+            yield key, clean(rows, key)
+
+    created_at = now_local().isoformat(timespec="seconds")
     tmp = path + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
-        f.flush()
+    with open(tmp, "wb") as raw:
+        zipped = gzip.GzipFile(filename="", mode="wb", fileobj=raw, compresslevel=5) if str(path).endswith(".gz") else None
+        out = io.TextIOWrapper(zipped or raw, encoding="utf-8", newline="\n")
+        try:
+            first = True
+            for key in root_keys + ["forward_index", "_universal_backup", "_runtime_snapshot", "_backup_meta"]:
+                if key in {"forward_index", "_universal_backup", "_runtime_snapshot", "_backup_meta"} and key in root:
+                    continue
+                out.write(("{\n" if first else ",\n") + "  " + json.dumps(key, ensure_ascii=False) + ": ")
+                first = False
+                if key == "chats":
+                    _global_backup_stream_map(out, chat_items(), 1)
+                elif key == "forward_index":
+                    _global_backup_stream_map(out, forward_items(True), 1)
+                elif key == "_universal_backup":
+                    out.write(_global_backup_json_chunk(clean({
+                        "kind": UNIVERSAL_BACKUP_KIND,
+                        "schema_version": UNIVERSAL_BACKUP_SCHEMA_VERSION,
+                        "bot_version": VERSION,
+                        "created_at": created_at,
+                        "restore_mode": "replace_full_state",
+                        "contains": [
+                            "all_chats", "records", "settings", "global_settings", "forward_rules",
+                            "forward_finance", "forward_index", "secret_messages", "backup_metadata"
+                        ],
+                    }, key), 1))
+                elif key == "_runtime_snapshot":
+                    runtime = (
+                        ("backup_flags", root.get("backup_flags", {}) or {}),
+                        ("finance_active_chats", root.get("finance_active_chats", {}) or {}),
+                        ("forward_index", None),
+                        ("global_settings", root.get("_global_settings", {}) or {}),
+                        ("csv_meta", root.get("csv_meta", {}) or {}),
+                        ("chat_backup_meta", root.get("chat_backup_meta", {}) or {}),
+                    )
+                    out.write("{")
+                    for i, (name, value) in enumerate(runtime):
+                        out.write(("\n" if i == 0 else ",\n") + "    " + json.dumps(name) + ": ")
+                        if value is None:
+                            _global_backup_stream_map(out, forward_items(False), 2)
+                        else:
+                            out.write(_global_backup_json_chunk(clean(value, name), 2))
+                    out.write("\n  }")
+                elif key == "_backup_meta":
+                    out.write(_global_backup_json_chunk(clean({
+                        "kind": "mega_latest_global",
+                        "version": VERSION,
+                        "schema_version": UNIVERSAL_BACKUP_SCHEMA_VERSION,
+                        "created_at": created_at,
+                        "chat_count": counts["chat_count"],
+                        "finance_active_chats": root.get("finance_active_chats", {}),
+                        "forward_rules_count": sum(len(v or {}) for v in (root.get("forward_rules", {}) or {}).values()),
+                        "forward_finance_count": sum(len(v or {}) for v in (root.get("forward_finance", {}) or {}).values()),
+                        "forward_index_count": counts["forward_index_count"],
+                        "note": "Универсальный полный JSON: все чаты, записи, настройки, секреты, пересылка и индекс сообщений.",
+                    }, key), 1))
+                else:
+                    out.write(_global_backup_json_chunk(clean(root.get(key), key), 1))
+            out.write("\n}")
+            out.flush()
+        finally:
+            out.detach()
+            if zipped is not None:
+                zipped.close()
+        raw.flush()
         try:
-            os.fsync(f.fileno())
+            os.fsync(raw.fileno())
         except Exception:
             pass
     os.replace(tmp, path)
+    stats = {
+        "size_bytes": int(os.path.getsize(path)),
+        "chat_count": counts["chat_count"],
+        "nonempty_chats": counts["nonempty_chats"],
+        "record_count": counts["record_count"],
+        "schema_version": int(UNIVERSAL_BACKUP_SCHEMA_VERSION),
+        "created_at": created_at,
+        "is_universal": True,
+    }
+    if baseline is not None:
+        baseline["signatures"] = (sigs["records"], sigs["meta"], _delta_root_signature_state(_delta_root_patch(root)))
+    _GLOBAL_BACKUP_STREAM_LAST.clear()
+    _GLOBAL_BACKUP_STREAM_LAST.update(stats, path=str(path), forward_index_count=counts["forward_index_count"], finished_at=time.time())
+    return stats
+
+
+def save_global_backup_snapshot(path: str) -> str:
+    """Атомарно создаёт локальный universal snapshot (потоково; *.gz — сжатый)."""
+    write_global_backup_stream(path)
     return path
 
 
@@ -4404,8 +5780,7 @@ def mega_download_latest_global_backup() -> str | None:
 
 def _mega_history_candidates(limit: int = 20) -> list[str]:
     """Возвращает последние immutable global snapshots из MEGA history."""
-    exe = shutil.which("mega-find")
-    if not exe or not mega_is_configured():
+    if not mega_command_available("mega-find") or not mega_is_configured():
         return []
     try:
         mega_ensure_remote_path(mega_history_remote_dir())
@@ -4817,7 +6192,7 @@ def _runtime_pool_stats() -> dict:
     pools = (
         WEBHOOK_TASK_POOL, UI_TASK_POOL, CALLBACK_ACK_TASK_POOL, RECOVERY_TASK_POOL, REMINDER_TASK_POOL,
         FINANCE_TASK_POOL, FIN_FORWARD_TASK_POOL, FORWARD_TASK_POOL, DELTA_TASK_POOL,
-        BACKUP_TASK_POOL, EXPORT_TASK_POOL, GENERAL_TASK_POOL, MAINTENANCE_TASK_POOL, JOURNAL_TASK_POOL,
+        BACKUP_TASK_POOL, EXPORT_TASK_POOL, TRANSCODE_TASK_POOL, GENERAL_TASK_POOL, MAINTENANCE_TASK_POOL, JOURNAL_TASK_POOL,
         DELAYED_TASK_POOL, DOZVON_TASK_POOL,
     )
     return {p.name: p.stats() for p in pools}
@@ -4849,12 +6224,14 @@ def runtime_snapshot(extra: dict | None = None) -> dict:
         "delayed": DELAYED_SCHEDULER.stats(),
         "callback_ack_delayed": CALLBACK_ACK_SCHEDULER.stats(),
         "mega_tasks": mega_task_registry_stats() if "mega_task_registry_stats" in globals() else {},
+        "wal": DURABLE_WAL.stats() if "DURABLE_WAL" in globals() else {},
         "delta": {
             "pending_chats": len(_delta_pending_chats) if "_delta_pending_chats" in globals() else 0,
             "last_success_at": globals().get("_delta_last_success_at", ""),
             "last_file": globals().get("_delta_last_file", ""),
             "last_event_count": globals().get("_delta_last_event_count", 0),
             "last_error": globals().get("_delta_last_error", ""),
+            "tracking": dict(globals().get("_DELTA_TRACK_STATS") or {}),
         },
         "keep_alive": dict(KEEP_ALIVE_STATE) if "KEEP_ALIVE_STATE" in globals() else {},
         "memory_guard": _runtime_memory_pressure(),
@@ -5734,8 +7111,21 @@ def runtime_graceful_shutdown(signal_name: str = "SIGTERM"):
             save_data(data, full=True)
         except Exception as e:
             runtime_event("shutdown_local_save_error", str(e), "ERROR")
+        wal_ok = True
+        if durable_wal_active():
+            # Хвост WAL отправляется до выхода: после деплоя диск может не сохраниться.
+            wal = durable_wal_ship_once(force_seal=True)
+            wal_ok = not wal.get("segments")
+            runtime_event("shutdown_wal", f"ok={wal_ok}; lag_bytes={wal.get('lag_bytes', 0)}", "INFO" if wal_ok else "ERROR")
+        ledger_wal = globals().get("CONSTITUTION_LEDGER_WAL")
+        if ledger_wal is not None and ledger_wal.enabled and mega_is_configured():
+            # Сегмент финансового леджера тоже не должен остаться только на локальном диске.
+            ledger = constitution_ledger_ship_once(force_seal=True)
+            runtime_event("shutdown_ledger_segments", f"ok={not ledger.get('segments')}; lag_bytes={ledger.get('lag_bytes', 0)}",
+                          "INFO" if not ledger.get("segments") else "ERROR")
         delta_ok = _runtime_force_delta_flush()
         with _RUNTIME_LOCK:
+            _RUNTIME_STATE["shutdown_wal_ok"] = bool(wal_ok)
             _RUNTIME_STATE["shutdown_delta_ok"] = bool(delta_ok)
             _RUNTIME_STATE["phase"] = "shutdown_complete"
             _RUNTIME_STATE["shutdown_finished_at"] = now_local().isoformat(timespec="seconds")
@@ -5836,7 +7226,20 @@ def build_runtime_watcher_text() -> str:
     proc = snap.get("process") or {}
     disk = snap.get("disk") or {}
     mega = snap.get("mega_tasks") or {}
+    wal = snap.get("wal") or {}
     audit = snap.get("audit_metrics") or {}
+    lwal = audit.get("constitution_ledger") if isinstance(audit.get("constitution_ledger"), dict) else {}
+    fcache = audit.get("finance_cache") if isinstance(audit.get("finance_cache"), dict) else {}
+    rdl = audit.get("reminder_deadlines") if isinstance(audit.get("reminder_deadlines"), dict) else {}
+    rjit = rdl.get("jitter") or {}
+    mix = audit.get("msg_index") if isinstance(audit.get("msg_index"), dict) else {}
+    tpoll = audit.get("telegram_polling") if isinstance(audit.get("telegram_polling"), dict) else {}
+    wsrv = audit.get("web_server") if isinstance(audit.get("web_server"), dict) else {}
+    wroutes = wsrv.get("routes") or {}
+    gsync = audit.get("google_sheets") if isinstance(audit.get("google_sheets"), dict) else {}
+    xstream = audit.get("export_stream") if isinstance(audit.get("export_stream"), dict) else {}
+    smedia = audit.get("secret_media") if isinstance(audit.get("secret_media"), dict) else {}
+    csem = audit.get("constitution_semantics") if isinstance(audit.get("constitution_semantics"), dict) else {}
     memrt = snap.get("memory_runtime") or {}
     memquick = memrt.get("quick") or {}
     memstate = memrt.get("state") or {}
@@ -5874,27 +7277,55 @@ def build_runtime_watcher_text() -> str:
         f"Потоков Python: {proc.get('threads')}",
         f"Runtime объекты: операции {audit.get('operation_items','—')} | integrity {audit.get('integrity_events','—')} | "
         f"forward outcomes {audit.get('forward_outcomes','—')} | fin batches {audit.get('finance_forward_batches','—')}",
-        f"Кэши/буферы: finance {audit.get('finance_cache_entries','—')} | expense {audit.get('expense_drafts','—')} | "
+        f"Кэши/буферы: finance {audit.get('finance_cache_entries','—')} (hit {fcache.get('hits','—')}/miss {fcache.get('misses','—')}/evict {fcache.get('evictions','—')}) | expense {audit.get('expense_drafts','—')} | "
         f"journal {audit.get('journal_buffer_rows','—')} | reminder mode {audit.get('reminder_mode','—')}",
+        f"Напоминалки: сроков {rdl.get('armed','—')} | ждут {rdl.get('pending','—')} | циклов {rdl.get('batches','—')} (полных {rdl.get('full_batches','—')}) | "
+        f"опоздание p50/p95/p99 {rjit.get('p50_ms','—')}/{rjit.get('p95_ms','—')}/{rjit.get('p99_ms','—')} ms",
+        f"Индекс message-id: чатов {mix.get('chats','—')} | записей {mix.get('rows','—')} | попаданий {mix.get('hits','—')} | сборок {mix.get('builds','—')} | "
+        f"правок {mix.get('updates','—')} | сверок {mix.get('verify_runs','—')} (расхождений {mix.get('verify_drift','—')})",
         "",
         "BOOT / Telegram gate:",
+        f"Приём update: {tpoll.get('mode') or 'webhook'}"
+        + (f" | пачек {tpoll.get('batches', 0)} | update {tpoll.get('updates', 0)} | подтверждено {tpoll.get('confirmed', 0)} | "
+           f"ждут повтора {tpoll.get('held', 0)} | ошибок {tpoll.get('errors', 0)} | offset {tpoll.get('offset') or '—'}"
+           if tpoll.get("mode") == "polling" else ""),
+        f"HTTP: {wsrv.get('mode') or 'flask'} | отказов 503 {wsrv.get('rejected', 0)} | очередь {wsrv.get('pending', '—')} | "
+        + " · ".join(f"{route} p95 {snap.get('p95_ms', '—')} ms (n={snap.get('count', 0)})" for route, snap in sorted(wroutes.items())),
+        f"Google Sheets: {'инкрементально' if gsync.get('enabled', True) else 'полная перезапись'} | сессий {gsync.get('sessions', 0)} | "
+        f"full {gsync.get('full', 0)} · delta {gsync.get('delta', 0)} · без изменений {gsync.get('noop', 0)} | "
+        f"строк записано {gsync.get('rows_written', 0)}, пропущено {gsync.get('rows_skipped', 0)} | HTTP {gsync.get('http_requests', 0)}",
+        f"Экспорт: {'потоковый' if xstream.get('enabled', True) else 'списками'} | CSV {xstream.get('csv', 0)} · XLSX {xstream.get('xlsx', 0)} · "
+        f"глобальный {xstream.get('global_csv', 0)} | записей {xstream.get('records', 0)} | страниц SQLite {xstream.get('sqlite_pages', 0)} | "
+        f"последний {xstream.get('last_ms', '—')} ms",
+        f"SECRET медиа: blob {smedia.get('blobs', 0)} ({round(int(smedia.get('blob_bytes', 0) or 0) / 1048576, 1)} MB) | "
+        f"совпадения id {smedia.get('unique_hits', 0)} · хэш {smedia.get('hash_hits', 0)} | скачано {smedia.get('downloads', 0)} · "
+        f"загружено {smedia.get('uploads', 0)} | сжатие ok {smedia.get('transcode_ok', 0)}/ориг. {smedia.get('transcode_fallback', 0)}/"
+        f"отказ {smedia.get('transcode_rejected', 0)} · в работе {smedia.get('transcoding', 0)}",
+        f"Манифест: {'инкр.' if csem.get('incremental') else 'полный'} сборок {csem.get('builds', 0)} | чатов пересчитано "
+        f"{csem.get('chats_recomputed', 0)} · из сводки {csem.get('chats_cached', 0)} · в памяти {csem.get('chats_hot', 0)} | "
+        f"merkle листов {csem.get('merkle_leaves', 0)} | verify {csem.get('verify_runs', 0)}/расх. {csem.get('verify_mismatches', 0)}",
         f"Restore: attempted={st.get('restore_attempted')} ok={st.get('restore_ok')} | {str(st.get('restore_detail') or '—')[:220]}",
         f"Recovery: start {st.get('task_recovery_started_at') or '—'} | finish {st.get('task_recovery_finished_at') or '—'} | осталось {st.get('task_recovery_remaining', 0)}",
         f"Webhook получено: {st.get('webhook_received', 0)}",
         f"Последний: {st.get('last_webhook_at') or '—'} | {st.get('last_webhook_type') or '—'} | update {st.get('last_webhook_update_id') or '—'} | chat {st.get('last_webhook_chat_id') or '—'}",
         f"Отклонено BOOT: {st.get('webhook_blocked_boot', 0)} | SHUTDOWN: {st.get('webhook_blocked_shutdown', 0)}",
         "",
-        "Очереди P/A | done err rej | max wait:",
+        "Очереди P/A | done err rej | max wait | wait p50/p95/p99 | run p95 | borrow:",
     ]
     for name in (
         "content", "ui", "callback-ack", "recovery", "reminder",
         "finance", "fin-forward", "forward", "delta", "backup", "export",
-        "general", "maintenance", "journal", "delayed", "dozvon",
+        "background", "scheduler", "dozvon",
     ):
         q = queues.get(name) or {}
+        slo = ""
+        if q.get("slo_wait_ms"):
+            slo = f" | SLO {q.get('slo_wait_ms'):.0f}мс {'ok' if q.get('slo_ok') else 'НАРУШЕН'}"
         lines.append(
             f"{name}: {q.get('pending', 0)}/{q.get('active', 0)} | "
-            f"{q.get('completed', 0)} {q.get('failed', 0)} {q.get('rejected', 0)} | {q.get('max_wait', 0)}с"
+            f"{q.get('completed', 0)} {q.get('failed', 0)} {q.get('rejected', 0)} | {q.get('max_wait', 0)}с | "
+            f"{q.get('wait_p50_ms', 0):.0f}/{q.get('wait_p95_ms', 0):.0f}/{q.get('wait_p99_ms', 0):.0f}мс | "
+            f"{q.get('run_p95_ms', 0):.0f}мс | +{q.get('borrowed', 0)}/-{q.get('lent', 0)}{slo}"
         )
     ack_delayed = snap.get("callback_ack_delayed") or {}
     lines.append(
@@ -5910,6 +7341,13 @@ def build_runtime_watcher_text() -> str:
         f"tasks: pending {mega.get('pending', 0)} | running {mega.get('running', 0)} | failed {mega.get('failed', 0)} | done {mega.get('done', 0)} | processing {mega.get('processing', 0)}",
         f"task counters: saved {mega.get('persisted', 0)} | recovered {mega.get('recovered', 0)} | done {mega.get('completed', 0)} | skip {mega.get('skipped_done', 0)} | save err {mega.get('persist_errors', 0)} | final err {mega.get('finalize_errors', 0)}",
         f"task last error: {str(mega.get('last_error') or 'нет')[:220]}",
+        f"WAL: {'on' if wal.get('enabled') else 'off'} | lag {wal.get('lag_bytes', 0)} B / {wal.get('lag_seconds', 0)} с | "
+        f"segments {wal.get('segments', 0)} | unshipped {wal.get('unshipped_tasks', 0)} | appended {wal.get('appended', 0)} | "
+        f"shipped {wal.get('shipped_segments', 0)} | fsync avg {wal.get('avg_fsync_ms', 0)} мс | torn {wal.get('torn_tails', 0)} | "
+        f"err {wal.get('ship_errors', 0)}",
+        f"Леджер: {'сегменты' if lwal.get('enabled') else 'по файлу'} | lag {lwal.get('lag_bytes', 0)} B / {lwal.get('lag_seconds', 0)} с | "
+        f"событий {lwal.get('appended', 0)} → сегментов {lwal.get('segment_puts', 0)} (индекс {lwal.get('index_puts', 0)}) | "
+        f"в индексе {lwal.get('indexed_segments', 0)}/{lwal.get('indexed_events', 0)} | err {lwal.get('ship_errors', 0)}",
         f"delta: pending chats {delta.get('pending_chats', 0)} | last {delta.get('last_success_at') or '—'} | events {delta.get('last_event_count', 0)}",
         f"delta file: {os.path.basename(str(delta.get('last_file') or '—'))}",
         f"delta error: {str(delta.get('last_error') or 'нет')[:220]}",
@@ -5917,7 +7355,7 @@ def build_runtime_watcher_text() -> str:
         "",
         "SHUTDOWN:",
         f"start {st.get('shutdown_started_at') or '—'} | finish {st.get('shutdown_finished_at') or '—'} | signal {st.get('shutdown_signal') or '—'}",
-        f"drain={st.get('shutdown_drain_ok')} | final delta={st.get('shutdown_delta_ok')}",
+        f"drain={st.get('shutdown_drain_ok')} | final WAL={st.get('shutdown_wal_ok')} | final delta={st.get('shutdown_delta_ok')}",
         "",
         "Предыдущий запуск:",
         f"Классификация: {st.get('previous_reason') or '—'}",
@@ -6154,10 +7592,14 @@ def _lowram_apply_delta_to_live_state(delta: dict):
     for key, value in (delta.get("root_patch") or {}).items():
         if key not in _DELTA_VOLATILE_ROOT_KEYS: data[str(key)] = _delta_json_clone(value)
     for key, entries in (delta.get("root_map_patches") or {}).items():
+        if str(key) == "forward_index":
+            SQLITE.forward_links_import(entries or {}); continue
         target = data.setdefault(str(key), {})
         if not isinstance(target, dict): target = {}; data[str(key)] = target
         for entry, value in (entries or {}).items(): target[str(entry)] = _delta_json_clone(value)
     for key, entries in (delta.get("root_map_deletes") or {}).items():
+        if str(key) == "forward_index":
+            SQLITE.forward_links_import({}, deletes=entries or []); continue
         target = data.get(str(key))
         if isinstance(target, dict):
             for entry in entries or []: target.pop(str(entry), None)
@@ -6190,7 +7632,7 @@ def _lowram_apply_delta_to_live_state(delta: dict):
         dict.__setitem__(store, "balance", sum(float(r.get("amount",0) or 0) for r in records if isinstance(r,dict)))
         SQLITE.save_chat(cid, _lowram_store_meta_payload(store)); changed.append(cid)
         records = current = None
-    SQLITE.save_root(_sqlite_pack_root(data))
+    SQLITE.save_root(_sqlite_pack_root(data), full=True)
 
 def _v177_download_remote_json_batch(remote_paths: list[str], batch_threshold: int = 6) -> tuple[dict, list[str]]:
     """Download many MEGA files by parent directory instead of one mega-get per delta.
@@ -6277,9 +7719,9 @@ def mega_upload_latest_global_backup(force: bool = False) -> bool:
             stamp = now_local().strftime("%Y%m%d_%H%M%S_%f")
             candidate_name = f"candidate_global_{stamp}.json"
             candidate_path = os.path.join(MEGA_LOCAL_TMP_DIR, candidate_name)
-            save_global_backup_snapshot(candidate_path)
-            candidate_payload = _load_json(candidate_path, {}) or {}
-            candidate_stats = _global_payload_stats(candidate_payload, candidate_path)
+            # v199: статистика кандидата собирается при потоковой записи — файл не перечитывается в RAM.
+            candidate_baseline = {}
+            candidate_stats = write_global_backup_stream(candidate_path, candidate_baseline)
 
             current_path = mega_download_latest_global_backup()
             current_payload = _load_json(current_path, {}) if current_path else {}
@@ -6314,7 +7756,7 @@ def mega_upload_latest_global_backup(force: bool = False) -> bool:
                 raise RuntimeError("cannot activate latest_global.json in MEGA")
             # Полный снимок успешно активирован: фиксируем baseline именно из candidate,
             # а не из более нового live-state, который мог измениться во время загрузки.
-            initialize_delta_baseline(candidate_payload)
+            initialize_delta_baseline(signatures=candidate_baseline.get("signatures"))
             global _global_snapshot_pending, _global_snapshot_last_success_monotonic, _global_snapshot_last_success_at
             with _delta_state_lock:
                 newer_changes_exist = int(_delta_generation) > int(snapshot_capture_generation)
@@ -6413,7 +7855,7 @@ def _mega_discover_global_candidates(limit: int = 60) -> list[str]:
     Это восстанавливает ситуацию, когда latest_global.json был временно перемещён в history,
     остался candidate_global_*.json после прерванной ротации или файл лежит глубже в каталоге.
     """
-    if not mega_is_configured() or shutil.which("mega-find") is None:
+    if not mega_is_configured() or not mega_command_available("mega-find"):
         return []
     rows = []
     try:
@@ -6807,7 +8249,6 @@ def default_data():
         "finance_active_chats": {},
         "forward_rules": {},
         "forward_finance": {},
-        "forward_index": {},
         "bot_errors": [],
         "csv_meta": {},
         "chat_backup_meta": {},
@@ -6903,6 +8344,14 @@ def IB(text, *args, **kwargs):
 
 def _v177_legacy_0087_load_data():
     _import_legacy_global_json_to_db(DATA_FILE, force=False)
+    if globals().get("FINANCE_BALANCE_INDEX") is not None:
+        FINANCE_BALANCE_INDEX.invalidate()
+    if "finance_records_order_release" in globals():
+        finance_records_order_release()
+    if "finance_msg_index_release" in globals():
+        finance_msg_index_release()
+    if "finance_ledger_bump" in globals():
+        finance_ledger_bump()
 
     root = SQLITE.load_root()
     chats = SQLITE.load_chats()
@@ -6939,10 +8388,11 @@ def _v177_legacy_0087_load_data():
     # v114: migrate/wrap large chat history into SQLite cold_fields before any startup scan.
     _lowram_prepare_loaded_data(d, migrate_existing=True)
     try:
+        # v199: legacy root с forward_index переносится в SQLite forward_links и из root уходит.
         _load_forward_index_from_data(d)
         # Rebuild from finance history only when the persisted index is missing. The low-RAM
         # implementation scans one SQLite chat at a time and releases it immediately.
-        if not (d.get("forward_index") or {}):
+        if not SQLITE.forward_links_count():
             _rebuild_forward_index_from_finance_records(d)
     except Exception as e:
         log_error(f"load_data forward_index: {e}")
@@ -6968,11 +8418,7 @@ def save_data(d, chat_ids=None, full: bool = False, root_only: bool = False):
             "drive": bool(backup_flags.get("drive", True)),
             "channel": bool(backup_flags.get("channel", True)),
         }
-        try:
-            _persist_forward_index_in_data(d)
-        except Exception as e:
-            log_error(f"save_data forward_index: {e}")
-        SQLITE.save_root(_sqlite_pack_root(d))
+        SQLITE.save_root(_sqlite_pack_root(d), full=full)
         if root_only:
             return
 
@@ -8301,6 +9747,11 @@ def save_chat_xlsx(chat_id: int, path: str | None = None, store: dict | None = N
     try:
         store = store or data.get("chats", {}).get(str(chat_id)) or get_chat_store(chat_id)
         path = path or chat_xlsx_file(chat_id)
+        stream_rows = globals().get("export_stream_simple_rows") if globals().get("EXPORT_STREAMING") else None
+        if callable(stream_rows) and excel_table_style(int(chat_id)) == "old":
+            # v199: the all-time OLD workbook comes straight from the ledger stream.
+            _write_simple_xlsx(path, stream_rows(int(chat_id), {}), sheet_name="Данные")
+            return path
         rows = [["Дата", "Описание", "Приход", "Расход"]]
         daily = store.get("daily_records", {}) or {}
         for dk in sorted(daily.keys()):
@@ -8490,8 +9941,8 @@ def _restore_runtime_state_from_data(restored: dict):
     backup_flags["drive"] = bool(flags.get("drive", True))
     backup_flags["channel"] = bool(flags.get("channel", True))
 
-    # Критически важно: сначала восстановить forward_map. Иначе save_data() запишет
-    # пустой индекс поверх загруженного JSON, и правки старых сообщений не найдут копии.
+    # Критически важно: сначала восстановить forward_links из JSON, иначе правки старых
+    # сообщений не найдут копии.
     _load_forward_index_from_data(restored)
     _rebuild_forward_index_from_finance_records(restored)
 
@@ -8817,10 +10268,22 @@ def _v186_clear_chat_scope_before_restore(chat_id: int) -> None:
     try:
         with SQLITE.lock:
             SQLITE.conn.execute("DELETE FROM cold_fields WHERE chat_id=?", (cs,))
+            SQLITE.conn.execute("DELETE FROM finance_records WHERE chat_id=?", (cs,))
+            SQLITE.conn.execute("DELETE FROM finance_msg_index WHERE chat_id=?", (cs,))
+            SQLITE.conn.execute("DELETE FROM balance_days WHERE chat_id=?", (cs,))
+            SQLITE.conn.execute("DELETE FROM balance_index WHERE chat_id=?", (cs,))
             SQLITE.conn.execute("DELETE FROM chats WHERE chat_id=?", (cs,))
             SQLITE.conn.commit()
     except Exception as exc:
         raise RuntimeError(f"Не удалось очистить SQLite scope чата {cid}: {exc}")
+    if globals().get("FINANCE_BALANCE_INDEX") is not None:
+        FINANCE_BALANCE_INDEX.invalidate(cid, reason="chat_scope_restore")
+    if "finance_records_order_release" in globals():
+        finance_records_order_release(cid)
+    if "finance_msg_index_release" in globals():
+        finance_msg_index_release(cid)
+    if "finance_ledger_bump" in globals():
+        finance_ledger_bump(cid)
     try: data.setdefault("active_messages", {}).pop(cs, None)
     except Exception: pass
     try:
@@ -8841,7 +10304,7 @@ def _v186_clear_chat_scope_before_restore(chat_id: int) -> None:
         data["finance_active_chats"] = {str(x): True for x in sorted(finance_active_chats)}
     except Exception: pass
     # Derived indexes/navigation must not retain references to removed live records/windows.
-    try: data["forward_index"] = {}
+    try: _cleanup_forward_storage_for_chat(cid)
     except Exception: pass
     try:
         hist = globals().get("_WINDOW_NAV_HISTORY")
@@ -8905,6 +10368,7 @@ def _v184_restore_per_chat_payload(chat_id: int, payload: dict, *, platform_owne
 
     store["records"] = [_v184_copy(r) for r in backup_records if isinstance(r, dict)]
     store["daily_records"] = {}
+    delta_track_chat_full(int(chat_id), "chat_file_restore")
     store["info"] = _v184_copy(payload.get("info") or {}) if isinstance(payload.get("info"), dict) else {}
     store["known_chats"] = _v184_copy(payload.get("known_chats") or {}) if isinstance(payload.get("known_chats"), dict) else {}
 
@@ -8962,6 +10426,8 @@ def restore_from_json(chat_id: int, path: str, *, actor_user_id: int | None = No
         try:
             with SQLITE.lock:
                 SQLITE.conn.execute("DELETE FROM cold_fields")
+                SQLITE.conn.execute("DELETE FROM finance_records")
+                SQLITE.conn.execute("DELETE FROM finance_msg_index")
                 SQLITE.conn.execute("DELETE FROM chats")
                 SQLITE.conn.commit()
         except Exception as exc:
@@ -9023,6 +10489,7 @@ def restore_from_csv(chat_id: int, path: str):
 
     store["daily_records"] = daily
     store["records"] = records
+    delta_track_chat_full(int(chat_id), "csv_restore")
 
     renumber_chat_records(chat_id)
     recalc_balance(chat_id)
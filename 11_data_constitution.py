@@ -13,6 +13,12 @@ DATA_CONSTITUTION_LOCK = threading.RLock()
 DATA_CONSTITUTION_LEDGER_LOCK = threading.RLock()
 DATA_CONSTITUTION_MANIFEST_CACHE = {"at": 0.0, "value": None}
 DATA_CONSTITUTION_GENERATION_KEEP_MIN = 24
+# v199: live-манифест собирается из сводок constitution_chat_semantics (пересчёт только чатов,
+# чьё поколение finance_records сменилось); 0 = прежний полный проход по всем чатам.
+DATA_CONSTITUTION_INCREMENTAL = _env_bool("DATA_CONSTITUTION_INCREMENTAL", "1")
+_CONSTITUTION_SEMANTIC_LOCK = threading.RLock()
+_CONSTITUTION_MERKLE = {"ids": (), "levels": []}
+_CONSTITUTION_SEMANTIC_STATS = defaultdict(int)
 try:
     LOWRAM_DB_HISTORY_KEEP = max(int(LOWRAM_DB_HISTORY_KEEP), DATA_CONSTITUTION_GENERATION_KEEP_MIN)
 except Exception:
@@ -194,7 +200,68 @@ def _constitution_ledger_highwater() -> dict:
         return {}
 
 
-def constitution_semantic_manifest_from_live() -> dict:
+def _constitution_hash_json(value) -> str:
+    return hashlib.sha256(json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")).hexdigest()
+
+
+def _constitution_chat_order(cid):
+    text = str(cid)
+    return (0, int(text), "") if text.lstrip("-").isdigit() else (1, 0, text)
+
+
+def _constitution_merkle_levels(leaves: list) -> list:
+    """Уровни дерева снизу вверх: узел = sha256(левый+правый), непарный узел поднимается как есть."""
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        below = levels[-1]
+        levels.append([
+            hashlib.sha256(below[i] + below[i + 1]).digest() if i + 1 < len(below) else below[i]
+            for i in range(0, len(below), 2)
+        ])
+    return levels
+
+
+def _constitution_merkle_hex(levels: list) -> str:
+    top = levels[-1] if levels else []
+    return top[0].hex() if top else hashlib.sha256(b"").hexdigest()
+
+
+def _constitution_merkle_root(ids: tuple, leaves: list) -> str:
+    """Корень по листьям чатов; при том же наборе чатов пересчитываются только пути изменившихся листьев."""
+    with _CONSTITUTION_SEMANTIC_LOCK:
+        levels = _CONSTITUTION_MERKLE.get("levels") or []
+        if _CONSTITUTION_MERKLE.get("ids") != ids or not levels:
+            levels = _constitution_merkle_levels(leaves)
+            _CONSTITUTION_MERKLE["ids"] = ids; _CONSTITUTION_MERKLE["levels"] = levels
+            _CONSTITUTION_SEMANTIC_STATS["merkle_rebuilds"] += 1
+            return _constitution_merkle_hex(levels)
+        for i, leaf in enumerate(leaves):
+            if levels[0][i] == leaf:
+                continue
+            levels[0][i] = leaf; idx = i
+            for depth in range(1, len(levels)):
+                idx //= 2
+                below = levels[depth - 1]
+                left = 2 * idx
+                levels[depth][idx] = hashlib.sha256(below[left] + below[left + 1]).digest() if left + 1 < len(below) else below[left]
+            _CONSTITUTION_SEMANTIC_STATS["merkle_leaf_updates"] += 1
+        return _constitution_merkle_hex(levels)
+
+
+def _constitution_manifest_seal(manifest: dict, merkle_root: str | None = None) -> dict:
+    """chats_merkle_root + semantic_hash: хэш смысла (без created_at/bot_version), одинаковый у полного и инкрементального пути."""
+    chats = manifest.get("chats") or {}
+    if merkle_root is None:
+        ids = sorted(chats, key=_constitution_chat_order)
+        merkle_root = _constitution_merkle_hex(_constitution_merkle_levels([bytes.fromhex(_constitution_hash_json(chats[c])) for c in ids]))
+    manifest["chats_merkle_root"] = merkle_root
+    head = {k: v for k, v in manifest.items() if k not in ("chats", "created_at", "bot_version", "semantic_hash")}
+    manifest["semantic_hash"] = _constitution_hash_json(head)
+    return manifest
+
+
+def constitution_semantic_manifest_full_scan() -> dict:
+    """Эталон: все чаты через get_chat_store (cold-поля загружаются в память). Для verify и LOWRAM=0."""
     chats_out = {}
     chat_ids = set()
     try:
@@ -231,8 +298,142 @@ def constitution_semantic_manifest_from_live() -> dict:
         "ledger_highwater_seq": int(high.get("seq") or 0),
         "ledger_highwater_hash": str(high.get("hash") or ""),
     }
-    manifest["semantic_hash"] = hashlib.sha256(json.dumps(manifest, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")).hexdigest()
-    return manifest
+    return _constitution_manifest_seal(manifest)
+
+
+def constitution_semantic_manifest_incremental() -> dict:
+    """Live-манифест за O(изменённых чатов).
+
+    Сводка чата берётся из constitution_chat_semantics, пока её gen совпадает с поколением
+    finance_records (его поднимает каждая запись/удаление строк). Устаревшие чаты пересчитываются
+    из строк SQLite без загрузки в ColdChatStore; чаты с загруженными в память леджерами считаются
+    по памяти (там могут быть ещё не сброшенные правки) и в таблицу не пишутся.
+    """
+    chats_mem = data.get("chats", {}) or {}
+    state = SQLITE.constitution_semantics_state()
+    ids = set(state)
+    for raw_cid in list(chats_mem.keys()):
+        try: ids.add(str(int(raw_cid)))
+        except Exception: pass
+    chats_out = {}; leaves = {}; total = 0
+    recomputed = cached = hot = 0
+    for cid in sorted(ids, key=_constitution_chat_order):
+        try:
+            store = chats_mem.get(cid)
+            gen, stored_gen, leaf, row = state.get(cid, (0, None, "", None))
+            loaded = {}
+            if isinstance(store, dict):
+                with data_lock:
+                    for key in FINANCE_ROW_LEDGERS:
+                        if dict.__contains__(store, key):
+                            loaded[key] = list(dict.__getitem__(store, key) or [])
+            if loaded:
+                if len(loaded) < len(FINANCE_ROW_LEDGERS):
+                    _gen, source = SQLITE.finance_semantic_source(cid)
+                    for key, rows in source.items():
+                        loaded.setdefault(key, rows)
+                row = _constitution_chat_semantics(cid, loaded)
+                leaf = _constitution_hash_json(row); hot += 1
+            elif not isinstance(row, dict) or stored_gen != gen or not leaf:
+                gen, source = SQLITE.finance_semantic_source(cid)
+                row = _constitution_chat_semantics(cid, source)
+                leaf = _constitution_hash_json(row)
+                SQLITE.constitution_semantics_put(cid, gen, leaf, row); recomputed += 1
+            else:
+                cached += 1
+            finance_on = bool(store.get("finance_mode", False)) if isinstance(store, dict) else False
+            if int(row.get("record_count") or 0) or finance_on:
+                chats_out[cid] = row; leaves[cid] = bytes.fromhex(leaf)
+                total += int(row.get("record_count") or 0)
+        except Exception as exc:
+            try: log_error(f"constitution incremental manifest chat {cid}: {exc}")
+            except Exception: pass
+    order = tuple(chats_out)
+    root = _constitution_merkle_root(order, [leaves[c] for c in order])
+    with _CONSTITUTION_SEMANTIC_LOCK:
+        _CONSTITUTION_SEMANTIC_STATS["builds"] += 1
+        _CONSTITUTION_SEMANTIC_STATS["chats_recomputed"] += recomputed
+        _CONSTITUTION_SEMANTIC_STATS["chats_cached"] += cached
+        _CONSTITUTION_SEMANTIC_STATS["chats_hot"] += hot
+    seq, anchor = _constitution_integrity_state()
+    high = _constitution_ledger_highwater()
+    manifest = {
+        "kind": "telegram_bot_data_constitution_manifest",
+        "schema_version": DATA_CONSTITUTION_SCHEMA,
+        "bot_version": VERSION,
+        "created_at": now_local().isoformat(timespec="microseconds"),
+        "total_records": int(total),
+        "finance_chat_count": len(chats_out),
+        "chats": chats_out,
+        "integrity_seq": int(seq),
+        "integrity_anchor": anchor,
+        "ledger_highwater_seq": int(high.get("seq") or 0),
+        "ledger_highwater_hash": str(high.get("hash") or ""),
+    }
+    return _constitution_manifest_seal(manifest, root)
+
+
+def constitution_semantic_manifest_from_live() -> dict:
+    if DATA_CONSTITUTION_INCREMENTAL and LOWRAM_ENABLED:
+        try:
+            return constitution_semantic_manifest_incremental()
+        except Exception as exc:
+            with _CONSTITUTION_SEMANTIC_LOCK:
+                _CONSTITUTION_SEMANTIC_STATS["fallback_full_scan"] += 1
+            try: log_error(f"constitution incremental manifest: {exc}")
+            except Exception: pass
+    return constitution_semantic_manifest_full_scan()
+
+
+def constitution_semantic_manifest_diff(full: dict, incremental: dict) -> list[str]:
+    """Расхождения инкрементального манифеста с полным проходом (пустой список = совпадают)."""
+    out = []
+    for key in ("total_records", "finance_chat_count", "integrity_seq", "ledger_highwater_seq", "chats_merkle_root", "semantic_hash"):
+        if (full or {}).get(key) != (incremental or {}).get(key):
+            out.append(f"{key}: full={(full or {}).get(key)} incremental={(incremental or {}).get(key)}")
+    full_chats = (full or {}).get("chats") or {}; inc_chats = (incremental or {}).get("chats") or {}
+    for cid in sorted(set(full_chats) | set(inc_chats), key=_constitution_chat_order):
+        a = full_chats.get(cid); b = inc_chats.get(cid)
+        if a is None or b is None:
+            out.append(f"chat {cid}: {'нет в incremental' if b is None else 'нет в full scan'}")
+            continue
+        fields = [k for k in sorted(set(a) | set(b)) if a.get(k) != b.get(k)]
+        if fields:
+            out.append(f"chat {cid}: " + ", ".join(f"{k} {a.get(k)}≠{b.get(k)}" for k in fields))
+    return out
+
+
+def constitution_verify_incremental_manifest(repair: bool = True) -> dict:
+    """Полный проход против инкрементального манифеста; сводки расходящихся чатов сбрасываются и пересчитываются."""
+    incremental = constitution_semantic_manifest_incremental()
+    full = constitution_semantic_manifest_full_scan()
+    diff = constitution_semantic_manifest_diff(full, incremental)
+    repaired = False
+    if diff and repair:
+        full_chats = full.get("chats") or {}; inc_chats = incremental.get("chats") or {}
+        bad = [cid for cid in set(full_chats) | set(inc_chats) if full_chats.get(cid) != inc_chats.get(cid)]
+        SQLITE.constitution_semantics_drop(bad or None)
+        with _CONSTITUTION_SEMANTIC_LOCK:
+            _CONSTITUTION_MERKLE["ids"] = (); _CONSTITUTION_MERKLE["levels"] = []
+        repaired = not constitution_semantic_manifest_diff(full, constitution_semantic_manifest_incremental())
+    with _CONSTITUTION_SEMANTIC_LOCK:
+        _CONSTITUTION_SEMANTIC_STATS["verify_runs"] += 1
+        if diff:
+            _CONSTITUTION_SEMANTIC_STATS["verify_mismatches"] += 1
+    result = {"ok": not diff, "diff": diff, "repaired": repaired, "full": full, "incremental": incremental}
+    try:
+        runtime_event("data_constitution_manifest_verify", f"ok={not diff}; diffs={len(diff)}; repaired={repaired}; records={full.get('total_records')}", "INFO" if not diff else "WARN")
+    except Exception:
+        pass
+    return result
+
+
+def constitution_semantic_stats() -> dict:
+    with _CONSTITUTION_SEMANTIC_LOCK:
+        out = dict(_CONSTITUTION_SEMANTIC_STATS)
+        out["merkle_leaves"] = len(_CONSTITUTION_MERKLE.get("ids") or ())
+    out["incremental"] = bool(DATA_CONSTITUTION_INCREMENTAL and LOWRAM_ENABLED)
+    return out
 
 
 def constitution_semantic_manifest_from_sqlite(path: str) -> dict:
@@ -246,11 +447,8 @@ def constitution_semantic_manifest_from_sqlite(path: str) -> dict:
             try: chats_meta[str(cid)] = json.loads(raw) if raw else {}
             except Exception: chats_meta[str(cid)] = {}
         cold = defaultdict(dict)
-        for cid, key, raw in conn.execute("SELECT chat_id,k,v FROM cold_fields").fetchall():
-            if str(key) not in {"records", "ars_records", "usd_records"}:
-                continue
-            try: cold[str(cid)][str(key)] = json.loads(raw) if raw else []
-            except Exception: cold[str(cid)][str(key)] = []
+        for cid, key, rows in _sqlite_finance_cold_items(conn):
+            cold[str(cid)][str(key)] = rows
         chats_out = {}; total = 0
         for cid in sorted(set(chats_meta) | set(cold), key=lambda x: int(x) if str(x).lstrip("-").isdigit() else str(x)):
             store = dict(chats_meta.get(cid) or {})
@@ -261,8 +459,7 @@ def constitution_semantic_manifest_from_sqlite(path: str) -> dict:
                 chats_out[str(cid)] = row; total += int(row["record_count"])
         integrity_seq = 0; ledger_seq = 0; ledger_hash = ""; root = {}
         try:
-            root_raw = conn.execute("SELECT v FROM kv WHERE k='root'").fetchone()
-            root = json.loads(root_raw[0]) if root_raw and root_raw[0] else {}
+            root = _sqlite_root_from_conn(conn) or {}
             integ = ((root.get("_global_settings") or {}).get("finance_integrity_v141") or {})
             integrity_seq = int(integ.get("event_seq") or 0)
             root_high = ((root.get("_global_settings") or {}).get("data_constitution_ledger_highwater") or {})
@@ -288,8 +485,7 @@ def constitution_semantic_manifest_from_sqlite(path: str) -> dict:
             "ledger_highwater_seq": int(ledger_seq),
             "ledger_highwater_hash": ledger_hash,
         }
-        manifest["semantic_hash"] = hashlib.sha256(json.dumps(manifest, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str).encode("utf-8")).hexdigest()
-        return manifest
+        return _constitution_manifest_seal(manifest)
     finally:
         conn.close()
 
@@ -421,10 +617,30 @@ def _constitution_prune_bounded_history(active_manifest: dict) -> dict:
     # and current verified generations, the raw per-event witness may be removed.
     try:
         cutoff = int((active_manifest or {}).get("previous_ledger_highwater_seq") or 0)
+        removed = 0
+        if cutoff > 0:
+            # v199: сегменты удаляются по индексу диапазонов seq, без листинга каталогов.
+            index = _constitution_ledger_index()
+            keep = []
+            for row in index["segments"]:
+                if int(row.get("last_seq") or 0) <= cutoff:
+                    try:
+                        res = _mega_run("mega-rm", [constitution_ledger_segments_dir() + "/" + str(row.get("name") or "")], check=False, timeout=30)
+                        if res.returncode == 0:
+                            removed += 1
+                            continue
+                    except Exception:
+                        pass
+                keep.append(row)
+            if len(keep) != len(index["segments"]):
+                index["segments"] = keep
+                _constitution_ledger_publish_index(index)
         finder = globals().get("_mega_find_remote_files")
-        if cutoff > 0 and callable(finder):
+        legacy_done = CONSTITUTION_LEDGER_WAL.enabled and bool(SQLITE.get_meta("data_constitution", "legacy_ledger_pruned", False))
+        if cutoff > 0 and callable(finder) and not legacy_done:
+            # Файлы ledger_<seq>_*.json по одному на событие (до сегментов): листинг, пока они не кончатся.
             rows = finder(constitution_ledger_root(), "ledger_*.json")
-            removed = 0
+            left = 0
             for remote_path in rows:
                 name = os.path.basename(str(remote_path))
                 m = re.match(r"ledger_(\d+)_", name)
@@ -435,9 +651,13 @@ def _constitution_prune_bounded_history(active_manifest: dict) -> dict:
                         res = _mega_run("mega-rm", [remote_path], check=False, timeout=30)
                         if res.returncode == 0:
                             removed += 1
+                            continue
                     except Exception:
                         pass
-            result["ledger"] = removed
+                left += 1
+            if not left and CONSTITUTION_LEDGER_WAL.enabled:
+                SQLITE.set_meta("data_constitution", "legacy_ledger_pruned", True)
+        result["ledger"] = removed
     except Exception as exc:
         try: log_error(f"constitution ledger prune v190: {exc}")
         except Exception: pass
@@ -608,6 +828,14 @@ def constitution_boot_verify_after_restore() -> dict:
     full snapshot, keeping READY independent from MEGA metadata latency.
     """
     global DATA_CONSTITUTION_LAST_VERIFY
+    try:
+        # v199: неотправленные локальные сегменты уходят первыми; отставший highwater снимка
+        # догоняется по segments_index.json, а не листингом ledger/finance.
+        constitution_ledger_replay_blocking()
+        constitution_ledger_reconcile_index()
+    except Exception as exc:
+        try: log_error(f"[DATA CONSTITUTION LEDGER] boot replay: {exc}")
+        except Exception: pass
     live = constitution_semantic_manifest_from_live()
     local_baseline = {}
     baseline_source = ""
@@ -673,6 +901,27 @@ def constitution_boot_verify_after_restore() -> dict:
 _CONSTITUTION_LEDGER_ASYNC_LOCK = threading.RLock()
 _CONSTITUTION_LEDGER_ASYNC_STATE = {}
 
+# v199: события леджера пишутся в локальные сегменты (DurableUpdateWAL, fsync на каждую запись);
+# сегмент закрывается по размеру или возрасту и уходит в MEGA одним объектом с индексом seq.
+# Диапазоны отправленных сегментов — в SQLite meta и в ledger/finance/segments_index.json.
+CONSTITUTION_LEDGER_SEGMENTS = _env_bool("CONSTITUTION_LEDGER_SEGMENTS", "1")
+CONSTITUTION_LEDGER_DIR = (os.getenv("CONSTITUTION_LEDGER_DIR", "") or "").strip() or os.path.join(os.path.dirname(os.path.abspath(DB_FILE)), "constitution_ledger")
+CONSTITUTION_LEDGER_SEGMENT_BYTES = _env_int("CONSTITUTION_LEDGER_SEGMENT_BYTES", 512 * 1024, 16 * 1024, 16 * 1024 * 1024)
+try:
+    CONSTITUTION_LEDGER_SEAL_SECONDS = max(0.2, min(30.0, float(os.getenv("CONSTITUTION_LEDGER_SEAL_SECONDS", "1") or "1")))
+except Exception:
+    CONSTITUTION_LEDGER_SEAL_SECONDS = 1.0
+CONSTITUTION_LEDGER_WAL = DurableUpdateWAL(CONSTITUTION_LEDGER_DIR, CONSTITUTION_LEDGER_SEGMENT_BYTES, CONSTITUTION_LEDGER_SEAL_SECONDS, CONSTITUTION_LEDGER_SEGMENTS)
+_CONSTITUTION_LEDGER_SHIP_LOCK = threading.Lock()
+
+
+def constitution_ledger_segments_dir() -> str:
+    return constitution_ledger_root() + "/segments"
+
+
+def constitution_ledger_index_remote() -> str:
+    return constitution_ledger_root() + "/segments_index.json"
+
 
 def constitution_ledger_tokens_ready(tokens) -> tuple[bool, str]:
     """Used by the durable finalizer: a task stays recoverable until its ledger witness is in MEGA."""
@@ -729,6 +978,221 @@ def _constitution_upload_ledger_event(token: str, event: dict, name: str, remote
         shutil.rmtree(workdir, ignore_errors=True)
 
 
+def _constitution_ledger_set_highwater(high: dict):
+    SQLITE.set_meta("data_constitution", "ledger_highwater", high)
+    try:
+        _root_settings()["data_constitution_ledger_highwater"] = copy.deepcopy(high)
+        _root_save_coalesced("constitution_ledger_highwater", 0.5)
+    except Exception:
+        pass
+
+
+def _constitution_ledger_index() -> dict:
+    try:
+        value = SQLITE.get_meta("data_constitution", "ledger_segments", {}) or {}
+    except Exception:
+        value = {}
+    if not isinstance(value, dict) or not isinstance(value.get("segments"), list):
+        value = {"segments": []}
+    return value
+
+
+def _constitution_ledger_publish_index(index: dict) -> bool:
+    """Локальный индекс → SQLite meta, затем одна замена segments_index.json в MEGA."""
+    index = dict(index or {})
+    index.update({
+        "kind": "telegram_bot_finance_ledger_segment_index",
+        "schema_version": DATA_CONSTITUTION_SCHEMA,
+        "updated_at": now_local().isoformat(timespec="microseconds"),
+        "highwater": _constitution_ledger_highwater(),
+    })
+    SQLITE.set_meta("data_constitution", "ledger_segments", index)
+    workdir = tempfile.mkdtemp(prefix="constitution_ledger_index_")
+    try:
+        local = os.path.join(workdir, "segments_index.json")
+        _save_json(local, index)
+        ok = bool(mega_put_replace(local, constitution_ledger_root(), "segments_index.json", archive_previous=False))
+        CONSTITUTION_LEDGER_WAL.count("index_puts" if ok else "index_put_errors")
+        return ok
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _constitution_ledger_ship_segment(seq: int) -> dict:
+    """Один закрытый сегмент → ledger/finance/segments/ledger_seg_<first>_<last>_<hash>.json (один put)."""
+    records, _valid, torn = CONSTITUTION_LEDGER_WAL.read_segment(seq)
+    if torn:
+        CONSTITUTION_LEDGER_WAL.count("ship_torn_segments")
+        try: bot_journal("constitution_ledger_torn_segment_v199", None, f"seq={seq} records={len(records)}", "WARN")
+        except Exception: pass
+    events = []; tokens = []
+    for record in records:
+        event = record.get("task")
+        if record.get("type") == "ledger" and isinstance(event, dict):
+            events.append(event); tokens.append(str(record.get("key") or ""))
+    if not events:
+        CONSTITUTION_LEDGER_WAL.mark_shipped(seq)
+        return {"events": 0}
+    seqs = [int(ev.get("seq") or 0) for ev in events]
+    segment = {
+        "kind": "telegram_bot_finance_ledger_segment",
+        "schema_version": DATA_CONSTITUTION_SCHEMA,
+        "bot_version": VERSION,
+        "first_seq": min(seqs),
+        "last_seq": max(seqs),
+        "count": len(events),
+        "at": now_local().isoformat(timespec="microseconds"),
+        "index": [[int(ev.get("seq") or 0), int(ev.get("chat_id") or 0), str(ev.get("action") or ""), str(ev.get("event_hash") or "")] for ev in events],
+        "events": events,
+    }
+    segment["segment_hash"] = hashlib.sha256("\n".join(str(ev.get("event_hash") or "") for ev in events).encode("utf-8")).hexdigest()
+    name = f"ledger_seg_{segment['first_seq']:010d}_{segment['last_seq']:010d}_{segment['segment_hash'][:16]}.json"
+    remote_dir = constitution_ledger_segments_dir()
+    workdir = tempfile.mkdtemp(prefix="constitution_ledger_segment_")
+    try:
+        local = os.path.join(workdir, name)
+        with open(local, "w", encoding="utf-8") as fh:
+            json.dump(segment, fh, ensure_ascii=False, separators=(",", ":"), default=str)
+        with DATA_CONSTITUTION_LEDGER_LOCK:
+            mega_ensure_remote_path(remote_dir)
+            _mega_run("mega-put", [local, remote_dir], check=True, timeout=MEGA_TIMEOUT)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    CONSTITUTION_LEDGER_WAL.count("segment_puts")
+    newest = max(events, key=lambda ev: int(ev.get("seq") or 0))
+    old_high = _constitution_ledger_highwater()
+    if int(newest.get("seq") or 0) >= int(old_high.get("seq") or 0):
+        _constitution_ledger_set_highwater({
+            "seq": int(newest.get("seq") or 0),
+            "hash": str(newest.get("event_hash") or ""),
+            "integrity_hash": str(newest.get("integrity_hash") or ""),
+            "at": str(newest.get("at") or ""),
+            "remote": remote_dir + "/" + name,
+        })
+    index = _constitution_ledger_index()
+    index["segments"] = [row for row in index["segments"] if row.get("name") != name] + [{
+        "name": name, "first_seq": segment["first_seq"], "last_seq": segment["last_seq"], "count": len(events),
+        "segment_hash": segment["segment_hash"], "last_event_hash": str(newest.get("event_hash") or ""), "at": segment["at"],
+    }]
+    SQLITE.set_meta("data_constitution", "ledger_segments", index)
+    CONSTITUTION_LEDGER_WAL.mark_shipped(seq)
+    with _CONSTITUTION_LEDGER_ASYNC_LOCK:
+        for token in tokens:
+            _CONSTITUTION_LEDGER_ASYNC_STATE[token] = {"state": "done", "at": time.monotonic()}
+    CONSTITUTION_LEDGER_WAL.count("shipped_events", len(events))
+    try: bot_journal("constitution_ledger_segment_v199", None, f"seq={segment['first_seq']}..{segment['last_seq']} events={len(events)}")
+    except Exception: pass
+    return {"events": len(events), "name": name, "index": index}
+
+
+def constitution_ledger_ship_once(force_seal: bool = False) -> dict:
+    """Закрыть активный сегмент, если пора, и отправить все закрытые по порядку; индекс — один раз за проход."""
+    with _CONSTITUTION_LEDGER_SHIP_LOCK:
+        CONSTITUTION_LEDGER_WAL.seal_due(force_seal)
+        index = None
+        for seq in CONSTITUTION_LEDGER_WAL.sealed_segments():
+            try:
+                res = _constitution_ledger_ship_segment(seq)
+                index = res.get("index") or index
+            except Exception as exc:
+                # Как и прежде: незаписанное свидетельство = карантин. Сегмент остаётся на диске
+                # и уйдёт следующим проходом; порядок сегментов не нарушается.
+                CONSTITUTION_LEDGER_WAL.note_error(str(exc))
+                records, _valid, _torn = CONSTITUTION_LEDGER_WAL.read_segment(seq)
+                with _CONSTITUTION_LEDGER_ASYNC_LOCK:
+                    for record in records:
+                        _CONSTITUTION_LEDGER_ASYNC_STATE[str(record.get("key") or "")] = {"state": "failed", "error": str(exc)[:300], "at": time.monotonic()}
+                constitution_set_quarantine(f"immutable finance ledger segment write failed seq={seq}: {exc}")
+                try: log_error(f"[DATA CONSTITUTION LEDGER] segment {seq}: {exc}")
+                except Exception: pass
+                break
+        if index is not None:
+            try:
+                _constitution_ledger_publish_index(index)
+            except Exception as exc:
+                CONSTITUTION_LEDGER_WAL.note_error(f"index: {exc}")
+                log_error(f"[DATA CONSTITUTION LEDGER] index: {exc}")
+    stats = CONSTITUTION_LEDGER_WAL.stats()
+    if stats.get("segments"):
+        _constitution_ledger_schedule_ship()
+    return stats
+
+
+def _constitution_ledger_schedule_ship(delay: float | None = None):
+    """Один таймер на возраст сегмента; уже взведённый не сдвигается (иначе поток событий откладывал бы отправку)."""
+    if DELAYED_SCHEDULER.deadline("constitution-ledger-ship") is not None:
+        return
+
+    def _submit():
+        if not RECOVERY_TASK_POOL.submit_unique("constitution-ledger-ship", constitution_ledger_ship_once):
+            _constitution_ledger_schedule_ship()
+    DELAYED_SCHEDULER.schedule("constitution-ledger-ship", CONSTITUTION_LEDGER_SEAL_SECONDS if delay is None else delay, _submit)
+
+
+def constitution_ledger_replay_blocking() -> dict:
+    """BOOT: проверить локальные сегменты, обрезать рваный хвост и отправить всё до проверки манифеста."""
+    if not CONSTITUTION_LEDGER_WAL.enabled:
+        return CONSTITUTION_LEDGER_WAL.stats()
+    try:
+        before = CONSTITUTION_LEDGER_WAL.open()
+    except Exception as exc:
+        CONSTITUTION_LEDGER_WAL.note_error(str(exc))
+        log_error(f"[DATA CONSTITUTION LEDGER] open {CONSTITUTION_LEDGER_WAL.directory}: {exc}")
+        return CONSTITUTION_LEDGER_WAL.stats()
+    if not before.get("segments") or not mega_is_configured():
+        return before
+    after = constitution_ledger_ship_once(force_seal=True)
+    try:
+        bot_journal("constitution_ledger_replay_v199", None, f"segments={before.get('segments', 0)} torn={before.get('torn_tails', 0)} left={after.get('segments', 0)}",
+                    "WARN" if after.get("segments") else "INFO")
+    except Exception:
+        pass
+    return after
+
+
+def constitution_ledger_reconcile_index() -> dict:
+    """Если highwater из снимка отстаёт от integrity seq, поднять его по segments_index.json (один get, без листинга)."""
+    seq, _anchor = _constitution_integrity_state()
+    high = _constitution_ledger_highwater()
+    if int(high.get("seq") or 0) >= seq or not mega_is_configured():
+        return high
+    path = _mega_download_remote_path(constitution_ledger_index_remote())
+    try:
+        remote = _load_json(path, None) if path else None
+    finally:
+        if path:
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+    if not isinstance(remote, dict) or not isinstance(remote.get("segments"), list):
+        return high
+    CONSTITUTION_LEDGER_WAL.count("index_reads")
+    local = _constitution_ledger_index()
+    names = {row.get("name") for row in local["segments"]}
+    merged = local["segments"] + [row for row in remote["segments"] if isinstance(row, dict) and row.get("name") not in names]
+    local["segments"] = sorted(merged, key=lambda row: (int(row.get("first_seq") or 0), str(row.get("name") or "")))
+    SQLITE.set_meta("data_constitution", "ledger_segments", local)
+    remote_high = remote.get("highwater") if isinstance(remote.get("highwater"), dict) else {}
+    best = max(local["segments"], key=lambda row: int(row.get("last_seq") or 0), default=None)
+    if int(remote_high.get("seq") or 0) > int(high.get("seq") or 0):
+        high = dict(remote_high)
+    elif best and int(best.get("last_seq") or 0) > int(high.get("seq") or 0):
+        high = {"seq": int(best["last_seq"]), "hash": str(best.get("last_event_hash") or ""), "at": str(best.get("at") or ""),
+                "remote": constitution_ledger_segments_dir() + "/" + str(best.get("name") or "")}
+    else:
+        return high
+    _constitution_ledger_set_highwater(high)
+    try: bot_journal("constitution_ledger_index_reconciled_v199", None, f"highwater={high.get('seq')} integrity={seq}")
+    except Exception: pass
+    return high
+
+
+def constitution_ledger_stats() -> dict:
+    out = CONSTITUTION_LEDGER_WAL.stats()
+    segments = _constitution_ledger_index().get("segments") or []
+    out["indexed_segments"] = len(segments)
+    out["indexed_events"] = sum(int(row.get("count") or 0) for row in segments)
+    return out
+
+
 def constitution_ledger_append(chat_id: int, action: str, record: dict | None, details: dict | None, integrity_hash: str, seq: int) -> bool:
     """v190 immutable ledger: local transaction now, MEGA upload outside the user worker when safe.
 
@@ -759,6 +1223,8 @@ def constitution_ledger_append(chat_id: int, action: str, record: dict | None, d
     remote_dir = constitution_ledger_root() + "/" + day
     name = f"ledger_{int(seq):010d}_{int(chat_id)}_{event['event_hash'][:16]}.json"
     token = name
+    if CONSTITUTION_LEDGER_WAL.enabled:
+        return _constitution_ledger_append_segment(token, event)
     SQLITE.set_meta("data_constitution_pending", name, event)
 
     # If this mutation is protected by a Telegram durable task, upload asynchronously.
@@ -801,6 +1267,46 @@ def constitution_ledger_append(chat_id: int, action: str, record: dict | None, d
     return bool(_constitution_upload_ledger_event(token, event, name, remote_dir))
 
 
+def _constitution_ledger_append_segment(token: str, event: dict) -> bool:
+    """Событие → локальный сегмент (fsync). Под durable-задачей отправка идёт сегментом позже
+    (финализатор ждёт токен); без неё сегмент закрывается и отправляется сразу."""
+    try:
+        CONSTITUTION_LEDGER_WAL.append("ledger", token, event)
+    except Exception as exc:
+        CONSTITUTION_LEDGER_WAL.note_error(str(exc))
+        constitution_set_quarantine(f"immutable finance ledger local append failed seq={event.get('seq')}: {exc}")
+        return False
+    with _CONSTITUTION_LEDGER_ASYNC_LOCK:
+        _CONSTITUTION_LEDGER_ASYNC_STATE[token] = {"state": "pending", "seq": int(event.get("seq") or 0), "at": time.monotonic()}
+    ctx = {}
+    try:
+        fn = globals().get("_current_telegram_update_context")
+        if callable(fn):
+            ctx = fn() or {}
+    except Exception:
+        ctx = {}
+    update_id = ctx.get("update_id")
+    durable_state = ""
+    try:
+        state_fn = globals().get("mega_task_known_state")
+        if update_id is not None and callable(state_fn):
+            durable_state = str(state_fn(update_id) or "")
+    except Exception:
+        durable_state = ""
+    if update_id is not None and durable_state in {"pending", "running"}:
+        try:
+            raw_ctx = getattr(globals().get("_TELEGRAM_UPDATE_CONTEXT"), "value", None)
+            if isinstance(raw_ctx, dict):
+                raw_ctx.setdefault("constitution_ledger_tokens", []).append(token)
+        except Exception:
+            pass
+        _constitution_ledger_schedule_ship()
+        return True
+    constitution_ledger_ship_once(force_seal=True)
+    ready, _detail = constitution_ledger_tokens_ready([token])
+    return bool(ready)
+
+
 def constitution_status_text() -> str:
     active = constitution_load_active_manifest_remote(force=False) or {}
     live = constitution_semantic_manifest_from_live()
@@ -812,11 +1318,28 @@ def constitution_status_text() -> str:
         f"Active generation records: {active.get('total_records','—')}\n"
         f"Integrity seq: {live.get('integrity_seq',0)}\n"
         f"Ledger highwater: {live.get('ledger_highwater_seq',0)}\n"
+        f"Semantic hash: {str(live.get('semantic_hash') or '')[:16]} (merkle {str(live.get('chats_merkle_root') or '')[:16]})\n"
         f"Active generation: {active.get('generation','—')}\n"
         f"MEGA root: {constitution_root()}"
     )
 
 
+def constitution_verify_text() -> str:
+    res = constitution_verify_incremental_manifest(repair=True)
+    full = res.get("full") or {}
+    lines = [
+        "🏛 КОНСТИТУЦИЯ: сверка манифеста",
+        f"Полный проход: {full.get('total_records', 0)} записей, {full.get('finance_chat_count', 0)} чатов, hash {str(full.get('semantic_hash') or '')[:16]}",
+        f"Инкрементальный: hash {str((res.get('incremental') or {}).get('semantic_hash') or '')[:16]}",
+    ]
+    if res.get("ok"):
+        lines.append("✅ Совпадает")
+    else:
+        lines.append(f"🚨 Расхождений: {len(res.get('diff') or [])}; после пересчёта сводок {'совпадает' if res.get('repaired') else 'НЕ совпадает'}")
+        lines.extend("• " + str(x)[:300] for x in (res.get("diff") or [])[:20])
+    return "\n".join(lines)
+
+
 @bot.message_handler(commands=["data_constitution", "constitution"])
 def cmd_data_constitution(msg):
     try:
@@ -826,7 +1349,9 @@ def cmd_data_constitution(msg):
     except Exception:
         return
     try:
-        send_and_auto_delete(int(OWNER_ID), constitution_status_text(), 180)
+        args = str(getattr(msg, "text", "") or "").split()[1:]
+        text = constitution_verify_text() if args and args[0].lower() == "verify" else constitution_status_text()
+        send_and_auto_delete(int(OWNER_ID), text, 180)
     except Exception as exc:
         try:
             if OWNER_ID:
@@ -843,6 +1368,7 @@ DATA_CONSTITUTION_PROTECTED_SYMBOLS = (
     "constitution_ledger_append",
     "constitution_semantic_manifest_from_live",
     "constitution_semantic_manifest_from_sqlite",
+    "constitution_semantic_manifest_full_scan",
 )
 DATA_CONSTITUTION_PROTECTED_IDS = {name: id(globals().get(name)) for name in DATA_CONSTITUTION_PROTECTED_SYMBOLS}
 
@@ -11,7 +11,15 @@ _OPERATION_RECENT_KEEP = 100
 _FINANCE_INTEGRITY_KEEP = 2000
 _EXPENSE_DRAFT_KEEP = 300
 _PROCESS_RECENT_KEEP = 80
-_FINANCE_VIEW_CACHE = {}
+# v199: LRU представлений по ключу (вид, chat_id, поколение ledger, ...). Поколение растёт
+# на каждой мутации ledger чата, поэтому устаревшие ключи просто не находятся.
+try: FINANCE_VIEW_CACHE_MAX = max(16, int(os.getenv("FINANCE_VIEW_CACHE_MAX", "400")))
+except Exception: FINANCE_VIEW_CACHE_MAX = 400
+_FINANCE_VIEW_CACHE = OrderedDict()
+_FINANCE_VIEW_CACHE_BY_CHAT = defaultdict(set)
+_FINANCE_LEDGER_GEN = defaultdict(int)   # chat_id -> поколение; ключ None — общее для всех чатов
+_FINANCE_STORE_CHAT = {}                 # id(store) -> chat_id, проверяется по data["chats"]
+_FINANCE_CACHE_STATS = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidated": 0, "bumps": 0}
 _PROCESS_RUNTIME = {"active": {}, "recent": deque(maxlen=_PROCESS_RECENT_KEEP)}
 _SECURITY_BREAKERS = {}
 _IPHONE_ENDPOINT_RUNTIME = defaultdict(deque)
@@ -23,6 +31,14 @@ def _root_settings() -> dict:
     return data.setdefault("_global_settings", {})
 
 
+def _root_touch(name: str) -> None:
+    """v199: подключ _global_settings изменён — save_root сериализует его, даже если он большой."""
+    try:
+        SQLITE.root_touch("_global_settings", name)
+    except Exception:
+        pass
+
+
 def _root_save(reason: str = "settings") -> None:
     try:
         save_data(data, root_only=True)
@@ -385,6 +401,7 @@ def operation_begin(kind: str, chat_id=None, target: str = "", payload: dict | N
         root.setdefault("items", {})[op_id] = row
         root.setdefault("order", []).append(op_id)
         _operation_trim_locked(root)
+        _root_touch("operation_ledger_v141")
     process_register(op_id, row["kind"], row.get("chat_id"), phase="создано", cancellable=False)
     _root_save_coalesced("operation_begin")
     return op_id
@@ -403,6 +420,7 @@ def operation_step(op_id: str, step: str, details: str = "", persist: bool = Tru
         })
         if len(row["steps"]) > 12:
             row["steps"] = row["steps"][-12:]
+        _root_touch("operation_ledger_v141")
     process_update(str(op_id), phase=str(step or "running"), details=details)
     if persist:
         _root_save_coalesced("operation_step")
@@ -420,6 +438,7 @@ def operation_complete(op_id: str, details: str = "") -> bool:
         row["updated_at"] = row["completed_at"]
         row["error"] = ""
         row.setdefault("steps", []).append({"name": "completed", "details": str(details or "")[:500], "at": row["completed_at"]})
+        _root_touch("operation_ledger_v141")
     process_finish(str(op_id), ok=True, details=details)
     _root_save_coalesced("operation_complete")
     return True
@@ -435,6 +454,7 @@ def operation_review(op_id: str, reason: str = "") -> bool:
         row["error"] = str(reason or "")[:1000]
         row["updated_at"] = now_local().isoformat(timespec="microseconds")
         row.setdefault("steps", []).append({"name": "needs_review", "details": row["error"], "at": row["updated_at"]})
+        _root_touch("operation_ledger_v141")
     process_finish(str(op_id), ok=None, details=reason)
     _root_save_coalesced("operation_review")
     return True
@@ -450,6 +470,7 @@ def operation_fail(op_id: str, error: str = "") -> bool:
         row["error"] = str(error or "")[:1000]
         row["updated_at"] = now_local().isoformat(timespec="microseconds")
         row.setdefault("steps", []).append({"name": "failed", "details": row["error"], "at": row["updated_at"]})
+        _root_touch("operation_ledger_v141")
     process_finish(str(op_id), ok=False, details=error)
     _root_save_coalesced("operation_fail")
     return True
@@ -572,7 +593,7 @@ def _pool_process_rows() -> list[dict]:
     rows = []
     for name in (
         "UI_TASK_POOL", "CONTENT_TASK_POOL", "FINANCE_TASK_POOL", "FIN_FORWARD_TASK_POOL", "FORWARD_TASK_POOL",
-        "EXPORT_TASK_POOL", "BACKUP_TASK_POOL", "DELTA_TASK_POOL", "RECOVERY_TASK_POOL",
+        "EXPORT_TASK_POOL", "TRANSCODE_TASK_POOL", "BACKUP_TASK_POOL", "DELTA_TASK_POOL", "RECOVERY_TASK_POOL",
         "REMINDER_TASK_POOL", "GENERAL_TASK_POOL", "MAINTENANCE_TASK_POOL",
     ):
         pool = globals().get(name)
@@ -631,6 +652,10 @@ def build_process_center_text(viewer_chat_id: int) -> str:
         lines.append(f"{idx}. {row.get('label')} — {row.get('phase') or 'выполняется'} · {int(elapsed)}с")
     if len(rows) > 30:
         lines.append(f"…ещё {len(rows)-30}")
+    if is_owner_chat(int(viewer_chat_id)):
+        fc = finance_cache_stats()
+        lines += ["", f"Кэш финансовых окон: {fc['entries']}/{fc['max_entries']} · hit {fc['hits']} · miss {fc['misses']} "
+                      f"({int(fc['hit_rate'] * 100)}%) · evict {fc['evictions']} · invalidated {fc['invalidated']}"]
     return "\n".join(lines)
 
 
@@ -964,15 +989,75 @@ def _evening_reconciliation_loop():
 # ─────────────────────────────────────────────────────────────
 # 11–12: coalesced backup + cache тяжёлых представлений
 # ─────────────────────────────────────────────────────────────
-def finance_cache_invalidate(chat_id: int | None = None, reason: str = ""):
+class _FrozenView(dict):
+    """Read-only dict shared by every cache hit; copy()/deepcopy()/pickle give a plain dict."""
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("finance view cache values are read-only; copy() before changing")
+
+    __setitem__ = __delitem__ = __ior__ = setdefault = pop = popitem = clear = update = _readonly
+
+    def copy(self):
+        return dict(self)
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+def _finance_cache_freeze(value, memo=None):
+    """One snapshot at store time: lists -> tuples, dicts -> _FrozenView; hits are zero-copy."""
+    memo = {} if memo is None else memo
+    if isinstance(value, (list, tuple)):
+        return tuple(_finance_cache_freeze(x, memo) for x in value)
+    if isinstance(value, dict) and not isinstance(value, _FrozenView):
+        frozen = memo.get(id(value))
+        if frozen is None:
+            frozen = memo[id(value)] = _FrozenView((k, _finance_cache_freeze(v, memo)) for k, v in value.items())
+        return frozen
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+
+def finance_ledger_generation(chat_id) -> int:
     with _FINANCE_CACHE_LOCK:
+        return int(_FINANCE_LEDGER_GEN[int(chat_id)]) + int(_FINANCE_LEDGER_GEN[None])
+
+
+def _finance_cache_drop_locked(key) -> None:
+    if _FINANCE_VIEW_CACHE.pop(key, None) is not None and isinstance(key, tuple) and len(key) > 1:
+        keys = _FINANCE_VIEW_CACHE_BY_CHAT.get(key[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                _FINANCE_VIEW_CACHE_BY_CHAT.pop(key[1], None)
+
+
+def finance_ledger_bump(chat_id: int | None = None) -> None:
+    """Ledger of ``chat_id`` (None: every chat) changed: new generation, its cached views are dropped."""
+    with _FINANCE_CACHE_LOCK:
+        _FINANCE_CACHE_STATS["bumps"] += 1
         if chat_id is None:
-            _FINANCE_VIEW_CACHE.clear()
-        else:
-            cid = int(chat_id)
-            for key in list(_FINANCE_VIEW_CACHE.keys()):
-                if isinstance(key, tuple) and cid in key:
-                    _FINANCE_VIEW_CACHE.pop(key, None)
+            _FINANCE_LEDGER_GEN[None] += 1
+            _FINANCE_CACHE_STATS["invalidated"] += len(_FINANCE_VIEW_CACHE)
+            _FINANCE_VIEW_CACHE.clear(); _FINANCE_VIEW_CACHE_BY_CHAT.clear(); _FINANCE_STORE_CHAT.clear()
+            return
+        cid = int(chat_id)
+        _FINANCE_LEDGER_GEN[cid] += 1
+        for key in list(_FINANCE_VIEW_CACHE_BY_CHAT.pop(cid, ())):
+            if _FINANCE_VIEW_CACHE.pop(key, None) is not None:
+                _FINANCE_CACHE_STATS["invalidated"] += 1
+
+
+def finance_cache_invalidate(chat_id: int | None = None, reason: str = ""):
+    finance_ledger_bump(chat_id)
     try:
         if reason:
             bot_journal("finance_cache_invalidated", chat_id, reason)
@@ -980,42 +1065,86 @@ def finance_cache_invalidate(chat_id: int | None = None, reason: str = ""):
         pass
 
 
+def _finance_store_chat_id(store) -> int | None:
+    """chat_id of a store from data["chats"] (remembered by identity), None for detached stores."""
+    if not isinstance(store, dict):
+        return None
+    chats = (data or {}).get("chats", {}) if isinstance(data, dict) else {}
+    cid = _FINANCE_STORE_CHAT.get(id(store))
+    if cid is not None and chats.get(str(cid)) is store:
+        return cid
+    for raw_cid, row in list(chats.items()):
+        if row is store:
+            try: cid = int(raw_cid)
+            except Exception: return None
+            with _FINANCE_CACHE_LOCK:
+                _FINANCE_STORE_CHAT[id(store)] = cid
+            return cid
+    return None
+
+
+def finance_view_key(kind: str, chat_id, store: dict | None = None, *parts) -> tuple:
+    """(kind, chat_id, generation, records len, next_id, *parts) — O(1), the ledger is not copied.
+
+    Длина ledger и next_id остаются в ключе как страховка для путей, которые меняют
+    список без delta_track_*; правки таких путей на месте ограничены TTL."""
+    cid = int(chat_id)
+    records = store.get("records") if isinstance(store, dict) else None
+    shape = (len(records) if isinstance(records, list) else -1, int((store or {}).get("next_id", 0) or 0) if isinstance(store, dict) else 0)
+    return (str(kind), cid, finance_ledger_generation(cid)) + shape + tuple(parts)
+
+
 def finance_cache_get(key, builder, ttl: float = 20.0):
     now_m = time.monotonic()
     with _FINANCE_CACHE_LOCK:
         row = _FINANCE_VIEW_CACHE.get(key)
-        if row and now_m - float(row.get("created") or 0) <= float(ttl):
-            return copy.deepcopy(row.get("value"))
-    value = builder()
+        if row is not None:
+            if now_m - row[0] <= float(ttl):
+                _FINANCE_VIEW_CACHE.move_to_end(key)
+                _FINANCE_CACHE_STATS["hits"] += 1
+                return row[1]
+            _finance_cache_drop_locked(key)
+            _FINANCE_CACHE_STATS["expired"] += 1
+        _FINANCE_CACHE_STATS["misses"] += 1
+    value = _finance_cache_freeze(builder())
     with _FINANCE_CACHE_LOCK:
-        _FINANCE_VIEW_CACHE[key] = {"created": now_m, "value": copy.deepcopy(value)}
-        if len(_FINANCE_VIEW_CACHE) > 400:
-            oldest = sorted(_FINANCE_VIEW_CACHE.items(), key=lambda x: float((x[1] or {}).get("created") or 0))[:100]
-            for old_key, _ in oldest:
-                _FINANCE_VIEW_CACHE.pop(old_key, None)
+        _finance_cache_drop_locked(key)
+        _FINANCE_VIEW_CACHE[key] = (now_m, value)
+        if isinstance(key, tuple) and len(key) > 1 and isinstance(key[1], int):
+            _FINANCE_VIEW_CACHE_BY_CHAT[key[1]].add(key)
+        while len(_FINANCE_VIEW_CACHE) > FINANCE_VIEW_CACHE_MAX:
+            _finance_cache_drop_locked(next(iter(_FINANCE_VIEW_CACHE)))
+            _FINANCE_CACHE_STATS["evictions"] += 1
     return value
 
 
+def finance_cache_stats() -> dict:
+    with _FINANCE_CACHE_LOCK:
+        st = dict(_FINANCE_CACHE_STATS)
+        st.update(entries=len(_FINANCE_VIEW_CACHE), max_entries=FINANCE_VIEW_CACHE_MAX, chats=len(_FINANCE_VIEW_CACHE_BY_CHAT))
+    lookups = st["hits"] + st["misses"]
+    st["hit_rate"] = round(st["hits"] / lookups, 3) if lookups else 0.0
+    return st
+
+
 _ORIGINAL_MONTH_RECORDS_FOR_CHAT = globals().get("month_records_for_chat")
 if callable(_ORIGINAL_MONTH_RECORDS_FOR_CHAT):
     def month_records_for_chat(store: dict, month_key: str) -> list[dict]:
-        records = list((store or {}).get("records", []) or [])
-        fingerprint = (
-            id(store), str(month_key), len(records), int((store or {}).get("next_id", 0) or 0),
-            str((records[-1] or {}).get("timestamp") or "") if records else "",
-        )
-        return finance_cache_get(("month_records",) + fingerprint, lambda: _ORIGINAL_MONTH_RECORDS_FOR_CHAT(store, month_key), ttl=30.0)
+        cid = _finance_store_chat_id(store)
+        if cid is None:
+            return _ORIGINAL_MONTH_RECORDS_FOR_CHAT(store, month_key)
+        key = finance_view_key("month_records", cid, store, str(month_key))
+        return finance_cache_get(key, lambda: _ORIGINAL_MONTH_RECORDS_FOR_CHAT(store, month_key), ttl=30.0)
 
 
 _ORIGINAL_CALC_CATEGORIES_RANGE = globals().get("calc_categories_for_record_range")
 if callable(_ORIGINAL_CALC_CATEGORIES_RANGE):
     def calc_categories_for_record_range(store: dict, start_day: str, start_rid: int, end_day: str, end_rid: int) -> dict:
-        records = list((store or {}).get("records", []) or [])
-        fingerprint = (
-            id(store), str(start_day), int(start_rid), str(end_day), int(end_rid),
-            len(records), int((store or {}).get("next_id", 0) or 0),
-        )
-        return finance_cache_get(("cat_range",) + fingerprint, lambda: _ORIGINAL_CALC_CATEGORIES_RANGE(store, start_day, start_rid, end_day, end_rid), ttl=20.0)
+        cid = _finance_store_chat_id(store)
+        if cid is None:
+            return _ORIGINAL_CALC_CATEGORIES_RANGE(store, start_day, start_rid, end_day, end_rid)
+        key = finance_view_key("cat_range", cid, store, str(start_day), int(start_rid), str(end_day), int(end_rid))
+        return finance_cache_get(key, lambda: _ORIGINAL_CALC_CATEGORIES_RANGE(store, start_day, start_rid, end_day, end_rid), ttl=20.0)
 
 
 _ORIGINAL_SCHEDULE_FULL_BACKUP_ONLY = globals().get("schedule_full_backup_only")
@@ -1103,6 +1232,7 @@ def finance_integrity_append(chat_id: int, action: str, record: dict | None = No
         if seq % 50 == 0:
             anchor = {"seq": seq, "chat_id": cid, "hash": digest, "at": payload["at"]}
             root["anchor"] = dict(anchor)
+        _root_touch("finance_integrity_v141")
     _root_save_coalesced("finance_integrity", 1.0)
     # v185 DATA CONSTITUTION: every financial mutation gets an immutable external ledger event.
     try:
@@ -1169,7 +1299,23 @@ def runtime_audit_metrics() -> dict:
             "integrity_anchor": dict(integ.get("anchor") or {}),
             "expense_drafts": len(inbox.get("items") or {}),
             "finance_cache_entries": len(_FINANCE_VIEW_CACHE),
+            "finance_cache": finance_cache_stats(),
+            "callback_tokens": short_callback_stats() if "short_callback_stats" in globals() else {},
+            "reminder_deadlines": reminder_deadline_stats() if "reminder_deadline_stats" in globals() else {},
+            "msg_index": finance_msg_index_stats() if "finance_msg_index_stats" in globals() else {},
+            "telegram_polling": telegram_polling_stats() if "telegram_polling_stats" in globals() else {},
+            "web_server": web_server_stats() if "web_server_stats" in globals() else {},
+            "google_sheets": google_sheets_sync_stats() if "google_sheets_sync_stats" in globals() else {},
+            "export_stream": export_stream_stats() if "export_stream_stats" in globals() else {},
+            "secret_media": secret_media_store_stats() if "secret_media_store_stats" in globals() else {},
+            "constitution_semantics": constitution_semantic_stats() if "constitution_semantic_stats" in globals() else {},
+            "constitution_ledger": constitution_ledger_stats() if "constitution_ledger_stats" in globals() else {},
             "forward_outcomes": forward_outcomes,
+            "forward_outcomes_disk": SQLITE.forward_outcome_count(globals().get("_FORWARD_OUTCOME_BOOT")),
+            "forward_links": SQLITE.forward_links_count(),
+            "balance_index": FINANCE_BALANCE_INDEX.snapshot_stats() if globals().get("FINANCE_BALANCE_INDEX") is not None else {},
+            "records_order": finance_records_order_stats() if "finance_records_order_stats" in globals() else {},
+            "root_sections": SQLITE.root_section_stats(top=5),
             "finance_forward_batches": batches,
             "reminder_mode": reminder_ui_mode() if "reminder_ui_mode" in globals() else "",
             "reminder_groups": len((_reminder_group_state_root() if "_reminder_group_state_root" in globals() else {}) or {}),
@@ -7,9 +7,22 @@
 # Здесь длинная команда кладётся во временную карту, а в кнопку идёт короткий токен.
 # ─────────────────────────────────────────────────────────────
 _short_callback_lock = threading.RLock()
-_short_callback_store = {}
-_short_callback_counter = 0
-SHORT_CALLBACK_TTL_SECONDS = 6 * 60 * 60
+# v199: токен = хэш содержимого, поэтому одна и та же длинная команда всегда получает
+# тот же токен (и после рестарта). Таблица callback_tokens в SQLite — источник истины,
+# _short_callback_store — LRU-фронт token -> (data, expires_at).
+_short_callback_store = OrderedDict()
+try: SHORT_CALLBACK_TTL_SECONDS = max(600, int(os.getenv("SHORT_CALLBACK_TTL_SECONDS", str(7 * 24 * 3600))))
+except Exception: SHORT_CALLBACK_TTL_SECONDS = 7 * 24 * 3600
+try: SHORT_CALLBACK_LRU_SIZE = max(64, int(os.getenv("SHORT_CALLBACK_LRU_SIZE", "4096")))
+except Exception: SHORT_CALLBACK_LRU_SIZE = 4096
+try: SHORT_CALLBACK_SWEEP_INTERVAL_SECONDS = max(30, int(os.getenv("SHORT_CALLBACK_SWEEP_INTERVAL_SECONDS", "600")))
+except Exception: SHORT_CALLBACK_SWEEP_INTERVAL_SECONDS = 600
+SHORT_CALLBACK_PERSIST = _env_bool("SHORT_CALLBACK_PERSIST", "1")
+SHORT_CALLBACK_TOKEN_LEN = 10   # base36, ~51 бит; при коллизии берётся следующий хэш той же строки
+_SHORT_CALLBACK_PREFIXES = ("catx:", "fvcatx:", "cbx:")
+_short_callback_last_sweep = 0.0
+_SHORT_CALLBACK_STATS = {"made": 0, "reused": 0, "writes": 0, "collisions": 0, "resolves": 0,
+                         "lru_hits": 0, "db_hits": 0, "misses": 0, "expired": 0, "swept": 0, "errors": 0}
 
 
 def base36(num: int) -> str:
@@ -29,8 +42,67 @@ def base36(num: int) -> str:
     return ("-" if neg else "") + out
 
 
+def _short_callback_token(data_str: str, attempt: int = 0) -> str:
+    salt = f"\0{attempt}" if attempt else ""
+    digest = hashlib.blake2b((data_str + salt).encode("utf-8", errors="replace"), digest_size=8).digest()
+    return base36(int.from_bytes(digest, "big")).rjust(SHORT_CALLBACK_TOKEN_LEN, "0")[-SHORT_CALLBACK_TOKEN_LEN:]
+
+
+def _short_callback_remember(token: str, data_str: str, expires_at: float) -> None:
+    with _short_callback_lock:
+        _short_callback_store[token] = (data_str, float(expires_at))
+        _short_callback_store.move_to_end(token)
+        while len(_short_callback_store) > SHORT_CALLBACK_LRU_SIZE:
+            _short_callback_store.popitem(last=False)
+
+
+def _short_callback_lookup(token: str):
+    """(data, expires_at) from the LRU front, then SQLite; expired entries count as missing."""
+    now = time.time()
+    with _short_callback_lock:
+        item = _short_callback_store.get(token)
+        if item is not None:
+            _short_callback_store.move_to_end(token)
+            _SHORT_CALLBACK_STATS["lru_hits"] += 1
+    if item is None and SHORT_CALLBACK_PERSIST:
+        try:
+            item = SQLITE.callback_token_get(token)
+        except Exception as exc:
+            _SHORT_CALLBACK_STATS["errors"] += 1
+            log_error(f"short callback lookup: {exc}")
+            item = None
+        if item is not None:
+            _SHORT_CALLBACK_STATS["db_hits"] += 1
+            _short_callback_remember(token, item[0], item[1])
+    if item is not None and item[1] < now:
+        _SHORT_CALLBACK_STATS["expired"] += 1
+        with _short_callback_lock:
+            _short_callback_store.pop(token, None)
+        return None
+    return item
+
+
+def _short_callback_maybe_sweep(force: bool = False) -> int:
+    global _short_callback_last_sweep
+    now = time.time()
+    if not force and now - _short_callback_last_sweep < SHORT_CALLBACK_SWEEP_INTERVAL_SECONDS:
+        return 0
+    _short_callback_last_sweep = now
+    removed = 0
+    with _short_callback_lock:
+        for token in [t for t, (_d, exp) in _short_callback_store.items() if exp < now]:
+            _short_callback_store.pop(token, None)
+    if SHORT_CALLBACK_PERSIST:
+        try:
+            removed = SQLITE.callback_tokens_sweep(now)
+        except Exception as exc:
+            _SHORT_CALLBACK_STATS["errors"] += 1
+            log_error(f"short callback sweep: {exc}")
+    _SHORT_CALLBACK_STATS["swept"] += removed
+    return removed
+
+
 def make_short_callback(data_str: str, prefix: str | None = None) -> str:
-    global _short_callback_counter
     data_str = str(data_str or "")
     try:
         if len(data_str.encode("utf-8")) <= 54:
@@ -44,32 +116,51 @@ def make_short_callback(data_str: str, prefix: str | None = None) -> str:
             prefix = "catx"
         else:
             prefix = "cbx"
-    with _short_callback_lock:
-        _short_callback_counter += 1
-        token = base36(_short_callback_counter) + base36(int(time.time() * 1000) % 46656)
-        _short_callback_store[token] = {
-            "data": data_str,
-            "ts": time.time(),
-        }
-        # Лёгкая чистка старых токенов, чтобы память не росла бесконечно.
-        if len(_short_callback_store) > 2000:
-            cutoff = time.time() - SHORT_CALLBACK_TTL_SECONDS
-            for k in list(_short_callback_store.keys())[:500]:
-                if _short_callback_store.get(k, {}).get("ts", 0) < cutoff:
-                    _short_callback_store.pop(k, None)
-    return f"{prefix}:{token}"
+    expires_at = time.time() + SHORT_CALLBACK_TTL_SECONDS
+    _SHORT_CALLBACK_STATS["made"] += 1
+    for attempt in range(8):
+        token = _short_callback_token(data_str, attempt)
+        item = _short_callback_lookup(token)
+        if item is not None and item[0] != data_str:
+            _SHORT_CALLBACK_STATS["collisions"] += 1
+            continue
+        if item is not None and item[1] - expires_at > -SHORT_CALLBACK_TTL_SECONDS / 2:
+            # Тот же токен уже живёт достаточно долго — ни записи, ни продления.
+            _SHORT_CALLBACK_STATS["reused"] += 1
+            return f"{prefix}:{token}"
+        if SHORT_CALLBACK_PERSIST:
+            try:
+                SQLITE.callback_token_put(token, data_str, expires_at)
+                _SHORT_CALLBACK_STATS["writes"] += 1
+            except Exception as exc:
+                _SHORT_CALLBACK_STATS["errors"] += 1
+                log_error(f"short callback persist: {exc}")
+        _short_callback_remember(token, data_str, expires_at)
+        _short_callback_maybe_sweep()
+        return f"{prefix}:{token}"
+    raise RuntimeError("short callback token space exhausted")
 
 
 def resolve_short_callback(data_str: str) -> str | None:
     data_str = str(data_str or "")
-    if not (data_str.startswith("catx:") or data_str.startswith("fvcatx:") or data_str.startswith("cbx:")):
+    if not data_str.startswith(_SHORT_CALLBACK_PREFIXES):
         return data_str
     token = data_str.split(":", 1)[1]
-    with _short_callback_lock:
-        item = _short_callback_store.get(token)
+    _SHORT_CALLBACK_STATS["resolves"] += 1
+    item = _short_callback_lookup(token)
     if not item:
+        _SHORT_CALLBACK_STATS["misses"] += 1
         return None
-    return str(item.get("data") or "")
+    return str(item[0] or "")
+
+
+def short_callback_stats() -> dict:
+    with _short_callback_lock:
+        st = dict(_SHORT_CALLBACK_STATS)
+        st["lru_entries"] = len(_short_callback_store)
+    try: st["stored"] = SQLITE.callback_tokens_count() if SHORT_CALLBACK_PERSIST else st["lru_entries"]
+    except Exception: st["stored"] = None
+    return st
 
 
 def cat_callback(data_str: str) -> str:
@@ -130,6 +130,18 @@ def _secret_file_id(msg):
         return None
 
 
+def _secret_file_unique_id(msg) -> str:
+    """file_unique_id того же размера, что выбирает _secret_file_id: одинаков у всех копий файла."""
+    try:
+        ct = getattr(msg, "content_type", "")
+        value = getattr(msg, ct, None)
+        if ct == "photo" and value:
+            value = value[0]
+        return str(getattr(value, "file_unique_id", "") or "")
+    except Exception:
+        return ""
+
+
 def _secret_content_payload(msg) -> dict:
     """JSON-описание сообщения, включая типы без файлового вложения."""
     ct = str(getattr(msg, "content_type", "text") or "text")
@@ -287,8 +299,41 @@ def _secret_media_remote_name(record: dict, telegram_path: str) -> str:
     )
 
 
+# v199: медиа SECRET хранятся по содержимому. Ключ — sha256 оригинала из Telegram,
+# файл в MEGA — secrets/blobs/<sha[:2]>/<sha><ext> (для видео уже сжатый). До скачивания
+# проверяется file_unique_id: известный файл просто связывается с записью, без
+# скачивания, ffmpeg и повторной загрузки. Сжатие идёт в TRANSCODE_TASK_POOL.
+SECRET_MEDIA_BLOBS = _env_bool("SECRET_MEDIA_BLOBS", "1")
+SECRET_TRANSCODE_THREADS = _env_int("SECRET_TRANSCODE_THREADS", 1, 1, 8)
+SECRET_TRANSCODE_MEM_MB = _env_int("SECRET_TRANSCODE_MEM_MB", 1024, 256, 8192)
+SECRET_TRANSCODE_CPU_SECONDS = _env_int("SECRET_TRANSCODE_CPU_SECONDS", 600, 30, 7200)
+SECRET_TRANSCODE_NICE = _env_int("SECRET_TRANSCODE_NICE", 10, 0, 19)
+SECRET_VIDEO_TYPES = {"video", "video_note", "animation"}
+SECRET_VIDEO_QUALITY = "low_640p_crf33"
+_SECRET_MEDIA_STATS = defaultdict(int)
+# sha256 → [(chat_id, record_id)] записей, ждущих сжатия этого файла; file_unique_id → sha256 тех же задач.
+_secret_transcode_waiters = {}
+_secret_transcode_unique = {}
+_secret_transcode_lock = threading.RLock()
+
+
+def _secret_transcode_limits():
+    """preexec_fn для ffmpeg: ниже приоритет, потолок памяти и CPU-времени."""
+    try:
+        os.nice(SECRET_TRANSCODE_NICE)
+        limit = SECRET_TRANSCODE_MEM_MB * 1024 * 1024
+        _memory_resource.setrlimit(_memory_resource.RLIMIT_AS, (limit, limit))
+        _memory_resource.setrlimit(_memory_resource.RLIMIT_CPU, (SECRET_TRANSCODE_CPU_SECONDS, SECRET_TRANSCODE_CPU_SECONDS))
+    except Exception:
+        pass
+
+
 def _compress_secret_video_low(input_path: str, output_path: str) -> bool:
-    """Сжимает секретное видео для MEGA, сохраняя пропорции и чётные размеры."""
+    """Сжимает секретное видео для MEGA, сохраняя пропорции и чётные размеры.
+
+    v199: ffmpeg ограничен по потокам, nice, адресному пространству и CPU-времени
+    (SECRET_TRANSCODE_*); при превышении лимита остаётся оригинал.
+    """
     if not shutil.which("ffmpeg"):
         return False
     try:
@@ -302,6 +347,7 @@ def _compress_secret_video_low(input_path: str, output_path: str) -> bool:
                 [
                     "ffmpeg", "-y", "-i", input_path,
                     "-vf", "scale='min(640,iw)':-2",
+                    "-threads", str(SECRET_TRANSCODE_THREADS),
                     "-c:v", "libx264", "-preset", "veryfast", "-crf", "33",
                     "-maxrate", "700k", "-bufsize", "1400k",
                     "-c:a", "aac", "-b:a", "64k",
@@ -312,6 +358,7 @@ def _compress_secret_video_low(input_path: str, output_path: str) -> bool:
                 stderr=subprocess.DEVNULL,
                 timeout=max(180, MEGA_TIMEOUT * 2),
                 check=False,
+                preexec_fn=_secret_transcode_limits if os.name == "posix" else None,
             )
         mem_ctx = globals().get("memory_operation")
         if callable(mem_ctx):
@@ -329,7 +376,8 @@ def _compress_secret_video_low(input_path: str, output_path: str) -> bool:
         return False
 
 
-def _upload_secret_record_media(chat_id: int, record: dict, remote_dir: str) -> bool:
+def _upload_secret_record_media_direct(chat_id: int, record: dict, remote_dir: str) -> bool:
+    """SECRET_MEDIA_BLOBS=0: прежняя загрузка в media/ чата с ffmpeg прямо в backup-линии."""
     file_id = record.get("file_id")
     if not file_id:
         return True
@@ -414,6 +462,275 @@ def _upload_secret_record_media(chat_id: int, record: dict, remote_dir: str) ->
                 pass
 
 
+def _secret_media_blob_dir(sha256: str) -> str:
+    return f"{MEGA_BACKUP_DIR.rstrip('/')}/secrets/blobs/{str(sha256)[:2]}"
+
+
+def _secret_media_is_blob_path(path: str) -> bool:
+    return f"{MEGA_BACKUP_DIR.rstrip('/')}/secrets/blobs/" in str(path or "")
+
+
+def _secret_media_missing(record: dict) -> bool:
+    """Нужно ли записи сохранить медиа: только такие записи трогает проход загрузки."""
+    if not isinstance(record, dict) or not record.get("file_id") or record.get("mega_media_skip_reason"):
+        return False
+    if not record.get("mega_media_path"):
+        return True
+    # Видео, загруженные до сжатия, пережимаются один раз, как раньше; неудачное сжатие
+    # (original_fallback) больше не повторяется на каждом проходе.
+    quality = str((record.get("content") or {}).get("quality") or "")
+    return (str(record.get("content_type") or "") in SECRET_VIDEO_TYPES and not record.get("media_sha256")
+            and quality not in {SECRET_VIDEO_QUALITY, "original_fallback"})
+
+
+def _secret_file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _secret_media_link(chat_id: int, record: dict, sha256: str, path: str, size: int, quality: str):
+    """Записать в запись ссылку на blob; прежний файл удаляется, как раньше."""
+    old_remote_path = str(record.get("mega_media_path") or "")
+    record["mega_media_path"] = path
+    record["media_sha256"] = sha256
+    record["mega_saved_at"] = now_local().isoformat(timespec="seconds")
+    record.pop("mega_media_error", None)
+    if str(record.get("content_type") or "") in SECRET_VIDEO_TYPES:
+        content = record.setdefault("content", {})
+        content["quality"] = quality or content.get("quality") or "original_fallback"
+        content["mega_file_size"] = int(size or 0)
+    if old_remote_path and old_remote_path != path:
+        # Общий blob переживёт удаление, пока на него ссылается другая запись.
+        BACKUP_TASK_POOL.submit(f"secret-media-delete:{chat_id}", _delete_secret_mega_media_paths, [old_remote_path])
+
+
+def _secret_blob_store(sha256: str, local_path: str, ext: str, quality: str, unique_ids=()) -> str:
+    """Загрузить blob (имя = sha256, содержимое неизменно) и зарегистрировать его; '' при ошибке."""
+    remote_dir = _secret_media_blob_dir(sha256)
+    name = f"{sha256}{str(ext or '.bin')[:10]}"
+    if not mega_put_replace(local_path, remote_dir, name, archive_previous=False):
+        return ""
+    size = os.path.getsize(local_path)
+    path = remote_dir.rstrip("/") + "/" + name
+    SQLITE.secret_blob_put(sha256, path, size, quality, unique_ids)
+    _SECRET_MEDIA_STATS["uploads"] += 1
+    _SECRET_MEDIA_STATS["bytes_uploaded"] += size
+    return path
+
+
+def _secret_transcode_key(sha256: str) -> str:
+    return f"secret-transcode:{sha256}"
+
+
+def _secret_transcode_drop_locked(sha256: str):
+    """Под _secret_transcode_lock: убрать список ждущих и file_unique_id задачи sha256."""
+    _secret_transcode_waiters.pop(sha256, None)
+    for u in [u for u, sha in _secret_transcode_unique.items() if sha == sha256]:
+        _secret_transcode_unique.pop(u, None)
+
+
+def _secret_transcode_release(sha256: str, path: str) -> list:
+    """Снять задачу сжатия: вернуть ждущие записи, file_unique_id присоединившихся — в алиасы blob-а."""
+    with _secret_transcode_lock:
+        waiters = _secret_transcode_waiters.pop(sha256, [])
+        unique_ids = [u for u, sha in _secret_transcode_unique.items() if sha == sha256]
+        for u in unique_ids:
+            _secret_transcode_unique.pop(u, None)
+    if path:
+        for u in unique_ids:
+            SQLITE.secret_blob_alias(u, sha256)
+    return waiters
+
+
+def _secret_transcode_job(sha256: str, local_dir: str, local_path: str, remote_name: str):
+    """TRANSCODE_TASK_POOL: сжать один файл, загрузить blob и связать все ждущие записи."""
+    chats = set()
+    try:
+        compressed_path = os.path.join(local_dir, os.path.splitext(remote_name)[0] + "_low.mp4")
+        if _compress_secret_video_low(local_path, compressed_path):
+            upload_path, ext, quality = compressed_path, ".mp4", SECRET_VIDEO_QUALITY
+            _SECRET_MEDIA_STATS["transcode_ok"] += 1
+        else:
+            upload_path, ext, quality = local_path, os.path.splitext(remote_name)[1], "original_fallback"
+            _SECRET_MEDIA_STATS["transcode_fallback"] += 1
+        path = _secret_blob_store(sha256, upload_path, ext, quality)
+        size = os.path.getsize(upload_path) if path else 0
+        # v199: пока ключ задачи активен, submit_unique того же sha256 вернёт False и запись
+        # присоединится к этой задаче — поэтому ждущих снимаем, пока список не опустеет.
+        while True:
+            waiters = _secret_transcode_release(sha256, path)
+            if not waiters:
+                break
+            for chat_id, record_id in waiters:
+                chats.add(chat_id)
+                if not path:
+                    continue
+                with _secret_mega_locks[chat_id]:
+                    record = next((r for r in _secret_records(chat_id) if isinstance(r, dict) and int(r.get("id") or 0) == record_id), None)
+                    if record is not None and _secret_media_missing(record):
+                        _secret_media_link(chat_id, record, sha256, path, size, quality)
+        if not path:
+            log_error(f"secret transcode upload failed: {sha256[:12]}")
+    except Exception as e:
+        log_error(f"_secret_transcode_job({sha256[:12]}): {e}")
+        chats.update(cid for cid, _rid in _secret_transcode_release(sha256, ""))
+    finally:
+        shutil.rmtree(local_dir, ignore_errors=True)
+    for chat_id in chats:
+        try:
+            save_data(data, chat_ids=[chat_id])
+        except Exception as e:
+            log_error(f"secret transcode save {chat_id}: {e}")
+        # Новый JSON чата (ссылки на blob) или повтор, если загрузка не удалась.
+        schedule_secret_mega_upload(chat_id)
+
+
+def _secret_transcode_wait(chat_id: int, record: dict, sha256: str = "", unique_id: str = "") -> bool:
+    """Присоединить запись к уже идущему сжатию того же файла (по sha256 или file_unique_id)."""
+    with _secret_transcode_lock:
+        sha256 = sha256 or _secret_transcode_unique.get(unique_id, "")
+        waiters = _secret_transcode_waiters.get(sha256) if sha256 else None
+        if waiters is None:
+            return False
+        status = TRANSCODE_TASK_POOL.key_status(_secret_transcode_key(sha256))
+        if not (status["active"] or status["queued"]):
+            # Задача уже завершилась, а список остался от записи, присоединившейся после
+            # последнего release: он ничей, запись запустит сжатие заново.
+            _secret_transcode_drop_locked(sha256)
+            return False
+        item = (int(chat_id), int(record.get("id") or 0))
+        if item not in waiters:
+            waiters.append(item)
+        if unique_id:
+            _secret_transcode_unique[unique_id] = sha256
+        _SECRET_MEDIA_STATS["transcode_joined"] += 1
+        return True
+
+
+def _upload_secret_record_media(chat_id: int, record: dict, remote_dir: str) -> bool:
+    """Сохранить медиа записи в хранилище blob-ов.
+
+    Порядок: file_unique_id → известный blob; иначе скачать, sha256 → известный blob;
+    иначе загрузить (фото и пр.) или передать файл в TRANSCODE_TASK_POOL (видео).
+    False — повторить позже (очередь сжатия полна, MEGA недоступна).
+    """
+    if not SECRET_MEDIA_BLOBS:
+        return _upload_secret_record_media_direct(chat_id, record, remote_dir)
+    file_id = record.get("file_id")
+    if not file_id or not _secret_media_missing(record):
+        return True
+    content_type = str(record.get("content_type") or "")
+    unique_id = str(record.get("file_unique_id") or "")
+    if unique_id:
+        hit = SQLITE.secret_blob_for_unique(unique_id)
+        if hit:
+            _SECRET_MEDIA_STATS["unique_hits"] += 1
+            _secret_media_link(chat_id, record, hit[0], hit[1], hit[2], hit[3])
+            return True
+        if content_type in SECRET_VIDEO_TYPES and _secret_transcode_wait(chat_id, record, unique_id=unique_id):
+            return True
+    try:
+        file_size = int((record.get("content") or {}).get("file_size") or 0)
+    except Exception:
+        file_size = 0
+    telegram_bot_download_limit = max(1, int(os.getenv("TELEGRAM_BOT_DOWNLOAD_LIMIT_BYTES", "19900000") or "19900000"))
+    if file_size > telegram_bot_download_limit:
+        record["mega_media_skip_reason"] = "telegram_bot_file_too_big"
+        record["mega_media_error"] = f"file is too big for Bot API download: {file_size} bytes"
+        record["mega_saved_at"] = now_local().isoformat(timespec="seconds")
+        bot_journal("secret_media_mega_skipped", chat_id, f"record={record.get('id')} size={file_size} reason=file_too_big")
+        return True
+    if content_type in SECRET_VIDEO_TYPES and TRANSCODE_TASK_POOL.stats().get("pending", 0) >= TRANSCODE_TASK_POOL.max_pending:
+        # Очередь сжатия полна: не скачиваем файл, который сейчас некуда отдать.
+        _SECRET_MEDIA_STATS["transcode_rejected"] += 1
+        return False
+    local_dir = None
+    try:
+        file_info = bot.get_file(file_id)
+        telegram_path = str(getattr(file_info, "file_path", "") or "")
+        remote_name = _secret_media_remote_name(record, telegram_path)
+        os.makedirs(MEGA_LOCAL_TMP_DIR, exist_ok=True)
+        local_dir = tempfile.mkdtemp(
+            prefix=f"secret_{chat_id}_{threading.get_ident()}_",
+            dir=MEGA_LOCAL_TMP_DIR,
+        )
+        local_path = os.path.join(local_dir, remote_name)
+        stream_fn = globals().get("telegram_download_to_file")
+        if callable(stream_fn):
+            stream_fn(telegram_path, local_path, max_bytes=telegram_bot_download_limit)
+        else:
+            raw = bot.download_file(telegram_path)
+            with open(local_path, "wb") as media_file:
+                media_file.write(raw)
+            raw = None
+        _SECRET_MEDIA_STATS["downloads"] += 1
+        sha256 = _secret_file_sha256(local_path)
+        SQLITE.secret_blob_alias(unique_id, sha256)
+        hit = SQLITE.secret_blob_get(sha256)
+        if hit:
+            _SECRET_MEDIA_STATS["hash_hits"] += 1
+            _secret_media_link(chat_id, record, sha256, hit[0], hit[1], hit[2])
+            return True
+        if content_type in SECRET_VIDEO_TYPES:
+            # Поиск ждущих, регистрация и submit — одна критическая секция: два чата с одним
+            # видео не перезапишут список друг друга. Порядок блокировок всегда этот lock →
+            # lock пула: пул не вызывает задачу под своим lock.
+            with _secret_transcode_lock:
+                if _secret_transcode_wait(chat_id, record, sha256=sha256, unique_id=unique_id):
+                    return True
+                _secret_transcode_waiters[sha256] = [(int(chat_id), int(record.get("id") or 0))]
+                if unique_id:
+                    _secret_transcode_unique[unique_id] = sha256
+                key = _secret_transcode_key(sha256)
+                if not TRANSCODE_TASK_POOL.submit_unique(key, _secret_transcode_job,
+                                                         sha256, local_dir, local_path, remote_name):
+                    status = TRANSCODE_TASK_POOL.key_status(key)
+                    if status["active"] or status["queued"]:
+                        # Задача этого файла ещё идёт (уже после своего release): её цикл
+                        # release подхватит запись. Свой файл не нужен — удалит finally.
+                        _SECRET_MEDIA_STATS["transcode_joined"] += 1
+                        return True
+                    _secret_transcode_drop_locked(sha256)
+                    _SECRET_MEDIA_STATS["transcode_rejected"] += 1
+                    return False
+            _SECRET_MEDIA_STATS["transcode_queued"] += 1
+            local_dir = None  # файл теперь принадлежит задаче сжатия
+            return True
+        path = _secret_blob_store(sha256, local_path, os.path.splitext(remote_name)[1], "", [unique_id])
+        if not path:
+            return False
+        _secret_media_link(chat_id, record, sha256, path, os.path.getsize(local_path), "")
+        return True
+    except Exception as e:
+        error_text = str(e)
+        record["mega_media_error"] = error_text[:300]
+        if "file is too big" in error_text.lower():
+            record["mega_media_skip_reason"] = "telegram_bot_file_too_big"
+            record["mega_saved_at"] = now_local().isoformat(timespec="seconds")
+            bot_journal("secret_media_mega_skipped", chat_id, f"record={record.get('id')} reason=file_too_big_api")
+            return True
+        log_error(f"_upload_secret_record_media({chat_id}): {e}")
+        return False
+    finally:
+        if local_dir:
+            shutil.rmtree(local_dir, ignore_errors=True)
+
+
+def secret_media_store_stats() -> dict:
+    row = dict(_SECRET_MEDIA_STATS)
+    row["enabled"] = bool(SECRET_MEDIA_BLOBS)
+    try:
+        row["blobs"], row["blob_bytes"], row["aliases"] = SQLITE.secret_blobs_count()
+    except Exception:
+        pass
+    with _secret_transcode_lock:
+        row["transcoding"] = len(_secret_transcode_waiters)
+    return row
+
+
 def upload_chat_secrets_to_mega(chat_id: int) -> bool:
     if not mega_is_configured():
         return False
@@ -427,9 +744,19 @@ def upload_chat_secrets_to_mega(chat_id: int) -> bool:
             remote_dir = f"{MEGA_BACKUP_DIR.rstrip('/')}/secrets/{slug}"
             media_dir = remote_dir.rstrip("/") + "/media"
             media_ok = True
-            for record in list(_secret_records(chat_id)):
-                if record.get("file_id"):
-                    media_ok = _upload_secret_record_media(chat_id, record, media_dir) and media_ok
+            # v199: только записи без сохранённого медиа; остальные не скачиваются и не проверяются.
+            if SECRET_MEDIA_BLOBS:
+                missing = [r for r in list(_secret_records(chat_id)) if _secret_media_missing(r)]
+            else:
+                missing = [r for r in list(_secret_records(chat_id)) if r.get("file_id")]
+            _SECRET_MEDIA_STATS["passes"] += 1
+            _SECRET_MEDIA_STATS["records_checked"] += len(missing)
+            rejected = _SECRET_MEDIA_STATS["transcode_rejected"]
+            for record in missing:
+                media_ok = _upload_secret_record_media(chat_id, record, media_dir) and media_ok
+            if _SECRET_MEDIA_STATS["transcode_rejected"] != rejected:
+                # Очередь сжатия была полна: эти видео ещё без файла, повторяем позже.
+                schedule_secret_mega_upload(chat_id, BACKUP_BUSY_RETRY_SECONDS)
             save_data(data)
             _save_json(path, _secret_chat_payload(chat_id))
             json_ok = bool(mega_put_replace(path, remote_dir, filename))
@@ -487,6 +814,7 @@ def save_secret_message(chat_id: int, msg, cleaned_text: str | None = None) -> d
         "text": _secret_message_text(msg, cleaned_text),
         "content_type": content_type,
         "file_id": _secret_file_id(msg),
+        "file_unique_id": _secret_file_unique_id(msg),
         "content": _secret_content_payload(msg),
         "source_msg_id": int(getattr(msg, "message_id", 0) or 0),
         "user_id": int(getattr(user, "id", 0) or 0),
@@ -527,6 +855,7 @@ def save_secret_bot_copy(chat_id: int, copied_message_id: int, source_msg) -> di
         "text": _secret_message_text(source_msg),
         "content_type": content_type,
         "file_id": _secret_file_id(source_msg),
+        "file_unique_id": _secret_file_unique_id(source_msg),
         "content": _secret_content_payload(source_msg),
         "source_msg_id": copied_message_id,
         "forward_source_msg_id": int(getattr(source_msg, "message_id", 0) or 0),
@@ -607,13 +936,21 @@ def sync_forwarded_secret_bot_copy_edit(chat_id: int, copied_message_id: int, so
         content_type = str(getattr(source_msg, "content_type", "text") or "text")
         record["text"] = _secret_message_text(source_msg)
         record["content_type"] = content_type
+        new_unique_id = _secret_file_unique_id(source_msg)
+        if new_unique_id != str(record.get("file_unique_id") or "") or not _secret_file_id(source_msg):
+            # Другой файл (или его больше нет): прежний blob к записи не относится.
+            for key in ("mega_media_path", "mega_saved_at", "media_sha256", "mega_media_error", "mega_media_skip_reason"):
+                record.pop(key, None)
         record["file_id"] = _secret_file_id(source_msg)
+        record["file_unique_id"] = new_unique_id
         record["content"] = _secret_content_payload(source_msg)
         record["forward_source_chat_id"] = source_chat_id
         record["forward_source_msg_id"] = source_msg_id
         record["source_msg_id"] = copied_message_id
         record["is_bot_copy"] = True
         record["edited_at"] = now_local().isoformat(timespec="seconds")
+        # v199: это не finance-ledger — delta_track_record здесь не нужен: secret_messages
+        # входят в мету чата, её подпись delta пересчитывает на каждой сборке.
         if content_type != "text" and not int(record.get("media_number") or 0):
             record["media_number"] = _next_secret_media_number(chat_id)
         settings = get_chat_store(chat_id).setdefault("settings", {})
@@ -761,9 +1098,13 @@ def handle_secret_edited_message(msg) -> bool:
     new_file_id = _secret_file_id(msg)
     record["file_id"] = new_file_id or previous_file_id
     record["content"] = _secret_content_payload(msg) or record.get("content", {})
-    if new_file_id and new_file_id != previous_file_id:
+    new_unique_id = _secret_file_unique_id(msg)
+    if new_file_id and new_file_id != previous_file_id and (not new_unique_id or new_unique_id != record.get("file_unique_id")):
         record.pop("mega_media_path", None)
         record.pop("mega_saved_at", None)
+        record.pop("media_sha256", None)
+    if new_unique_id:
+        record["file_unique_id"] = new_unique_id
     record["edited_at"] = now_local().isoformat(timespec="seconds")
     save_data(data)
     schedule_config_backup_for_chats(chat_id, delay=0.2)
@@ -1199,12 +1540,29 @@ def build_secret_delete_keyboard(
     return kb
 
 
+def _secret_media_referenced_paths(paths: set[str]) -> set[str]:
+    """Какие из blob-путей ещё нужны оставшимся SECRET-записям (любого чата)."""
+    used = set()
+    for cid in secret_chats():
+        for record in _secret_records(cid):
+            path = str((record or {}).get("mega_media_path") or "") if isinstance(record, dict) else ""
+            if path in paths:
+                used.add(path)
+    return used
+
+
 def _delete_secret_mega_media_paths(paths: list[str]):
     if not paths or not mega_is_configured():
         return
-    for remote_path in sorted(set(str(p) for p in paths if p)):
+    paths = set(str(p) for p in paths if p)
+    # v199: blob общий для всех записей с тем же содержимым — удаляется только последним.
+    shared = {p for p in paths if _secret_media_is_blob_path(p)}
+    keep = _secret_media_referenced_paths(shared) if shared else set()
+    for remote_path in sorted(paths - keep):
         try:
             _mega_run("mega-rm", [remote_path], check=False, timeout=30)
+            if remote_path in shared:
+                SQLITE.secret_blob_drop_path(remote_path)
         except Exception as e:
             log_error(f"delete secret mega media {remote_path}: {e}")
 
@@ -77,9 +77,21 @@ def _new_reminder_cfg() -> dict:
     }
 
 
+_REMINDER_CFG_KEYS = frozenset((
+    "enabled", "text", "chat_ids", "interval_minutes", "start_hour", "end_hour", "start_date",
+    "end_date", "next_run_at", "last_sent_at", "last_message_ids", "created_at", "updated_at",
+    "completed_at", "completion_reason",
+))
+# v199: (id(items), len(items)) последнего полного прохода нормализации в _reminders_root.
+_REMINDER_ROOT_NORMALIZED = (0, -1)
+
+
 def _normalize_reminder_cfg(cfg: dict) -> dict:
     if not isinstance(cfg, dict):
         cfg = {}
+    elif cfg.keys() >= _REMINDER_CFG_KEYS:
+        # v199: уже нормализована — без today_key()/isoformat() на каждый вызов.
+        return cfg
     cfg.setdefault("enabled", False)
     cfg.setdefault("text", "")
     cfg.setdefault("chat_ids", [])
@@ -100,6 +112,7 @@ def _normalize_reminder_cfg(cfg: dict) -> dict:
 
 def _reminders_root() -> dict:
     """v135: несколько независимых напоминалок + миграция одиночной v134 в №1."""
+    global _REMINDER_ROOT_NORMALIZED
     gs = data.setdefault("_global_settings", {})
     with _REMINDER_CONFIG_LOCK:
         root = gs.get("reminders_v2")
@@ -133,9 +146,14 @@ def _reminders_root() -> dict:
                 legacy["next_run_at"] = ""
                 legacy["migrated_to_reminders_v2"] = True
             root["migrated_v134"] = True
-        for rid in list(items.keys()):
-            if isinstance(items.get(rid), dict):
-                items[str(rid)] = _normalize_reminder_cfg(items[rid])
+        # v199: полный проход только когда набор напоминалок сменился; отдельные
+        # конфиги и так нормализуются в _reminder_cfg/_reminder_items.
+        sig = (id(items), len(items))
+        if sig != _REMINDER_ROOT_NORMALIZED:
+            for rid in list(items.keys()):
+                if isinstance(items.get(rid), dict):
+                    items[str(rid)] = _normalize_reminder_cfg(items[rid])
+            _REMINDER_ROOT_NORMALIZED = sig
         return root
 
 
@@ -317,11 +335,19 @@ def _reminder_save(reason: str = "reminder") -> None:
 
 def _reminder_touch(cfg: dict) -> None:
     cfg["updated_at"] = now_local().isoformat(timespec="seconds")
+    # v199: любая правка пересчитывает срок только этой напоминалки.
+    _reminder_deadline_note(cfg)
 
 
 def _reminder_parse_date(value: str):
+    raw = str(value or "")
+    if not raw:
+        return None
     try:
-        return datetime.strptime(str(value or ""), "%Y-%m-%d").date()
+        if len(raw) == 10 and raw[4] == "-" and raw[7] == "-":
+            # v199: быстрый путь для канонического YYYY-MM-DD (strptime в ~10 раз дороже).
+            return datetime.fromisoformat(raw).date()
+        return datetime.strptime(raw, "%Y-%m-%d").date()
     except Exception:
         return None
 
@@ -860,6 +886,309 @@ def _reminder_due_now(cfg: dict, now_dt=None) -> bool:
 
 
 
+# ─────────────────────────────────────────────────────────────
+# v199: индекс сроков напоминалок.
+# Вместо полного обхода всех конфигов каждые _REMINDER_CHECK_SECONDS у каждой
+# напоминалки свой таймер DELAYED_SCHEDULER ("reminder-due:<id>") на ближайший
+# момент, когда пакетному циклу есть что с ней делать: next_run_at, граница окна
+# дат/часов (меняется состав общего сообщения) или полночь после end_date.
+# Правка через _reminder_touch пересчитывает только свою напоминалку; пакетный
+# цикл получает сработавшие id и всех участников их чатов, а не весь список.
+# ─────────────────────────────────────────────────────────────
+REMINDER_DEADLINE_INDEX = _env_bool("REMINDER_DEADLINE_INDEX", "1")
+try: REMINDER_RECONCILE_SECONDS = max(60.0, float(os.getenv("REMINDER_RECONCILE_SECONDS", "600")))
+except Exception: REMINDER_RECONCILE_SECONDS = 600.0
+_REMINDER_DEADLINE_LOCK = threading.RLock()
+_REMINDER_DEADLINES = {}            # rid -> unix-время взведённого таймера
+_REMINDER_DEADLINE_CHATS = {}       # rid -> frozenset(chat_ids)
+_REMINDER_CHAT_MEMBERS = defaultdict(set)  # chat_id -> rids
+_REMINDER_CFG_RID = {}              # id(cfg) -> rid, для _reminder_touch(cfg)
+_REMINDER_DEADLINE_DUE = {}         # rid -> целевое время (None — правка), ждут пакетного цикла
+_REMINDER_DIRTY_CHATS = set()       # чаты, из которых ушла напоминалка
+_REMINDER_DEADLINE_READY = False
+_REMINDER_DEADLINE_ITEMS_ID = 0     # id(items), по которому собран индекс
+_REMINDER_RECONCILED_AT = 0.0
+_REMINDER_DEADLINE_LOCAL = threading.local()
+_REMINDER_JITTER = LatencyHistogram()
+_REMINDER_DEADLINE_STATS = {
+    "rebuilds": 0, "rebuild_ms": 0.0, "recomputed": 0, "fired": 0, "stale_timers": 0,
+    "edits": 0, "batches": 0, "full_batches": 0, "candidates": 0,
+}
+
+
+def _reminder_items_dict() -> dict | None:
+    root = (data.get("_global_settings") or {}).get("reminders_v2")
+    items = root.get("items") if isinstance(root, dict) else None
+    return items if isinstance(items, dict) else None
+
+
+def _reminder_chat_set(cfg: dict | None) -> frozenset:
+    out = set()
+    for raw in (cfg or {}).get("chat_ids") or []:
+        try:
+            out.add(int(raw))
+        except Exception:
+            continue
+    return frozenset(out)
+
+
+def _reminder_deadline_at(cfg: dict | None, now_dt: datetime):
+    """Ближайший момент, когда пакетному циклу нужно посмотреть на напоминалку, или None."""
+    if not isinstance(cfg, dict) or _reminder_is_completed(cfg):
+        return None
+    edges = []
+    end_date = _reminder_parse_date(cfg.get("end_date"))
+    if end_date:
+        # Пакетный цикл переводит напоминалку в завершённые на следующий день после end_date.
+        edges.append(datetime.combine(end_date + timedelta(days=1), datetime.min.time(), tzinfo=now_dt.tzinfo))
+    if cfg.get("enabled") and str(cfg.get("text") or "").strip() and (cfg.get("chat_ids") or []):
+        edges.append(_reminder_parse_dt(cfg.get("next_run_at")) or now_dt)
+        if _reminder_date_allowed(now_dt, cfg) and _reminder_time_allowed(now_dt, cfg):
+            day_start = datetime.combine(now_dt.date(), datetime.min.time(), tzinfo=now_dt.tzinfo)
+            edges.append(day_start + timedelta(hours=int(cfg["end_hour"]) + 1))
+        else:
+            next_dt = _reminder_next_valid_start(now_dt, cfg)
+            if next_dt is not None:
+                edges.append(next_dt)
+    return min(edges) if edges else None
+
+
+def _reminder_deadline_put_locked(rid: int, cfg: dict | None, now_dt: datetime, retry_at: float | None = None):
+    """Пересчитать срок одной напоминалки и перевзвести её таймер (O(1) в колесе)."""
+    _REMINDER_DEADLINE_STATS["recomputed"] += 1
+    chats = _reminder_chat_set(cfg) if isinstance(cfg, dict) and not _reminder_is_completed(cfg) else frozenset()
+    old_chats = _REMINDER_DEADLINE_CHATS.get(rid, frozenset())
+    if chats != old_chats:
+        for cid in old_chats - chats:
+            members = _REMINDER_CHAT_MEMBERS.get(cid)
+            if members is not None:
+                members.discard(rid)
+                if not members:
+                    _REMINDER_CHAT_MEMBERS.pop(cid, None)
+            _REMINDER_DIRTY_CHATS.add(cid)
+        for cid in chats - old_chats:
+            _REMINDER_CHAT_MEMBERS[cid].add(rid)
+        if chats:
+            _REMINDER_DEADLINE_CHATS[rid] = chats
+        else:
+            _REMINDER_DEADLINE_CHATS.pop(rid, None)
+    if isinstance(cfg, dict):
+        _REMINDER_CFG_RID[id(cfg)] = rid
+    key = f"reminder-due:{rid}"
+    at = _reminder_deadline_at(cfg, now_dt)
+    if at is None:
+        if _REMINDER_DEADLINES.pop(rid, None) is not None:
+            DELAYED_SCHEDULER.cancel(key)
+        return None
+    ts = at.timestamp()
+    if retry_at is not None and ts <= time.time():
+        # Цикл уже смотрел на неё, но срок не сдвинулся (ошибка отправки и т.п.):
+        # повтор с прежней частотой опроса, а не горячий цикл.
+        ts = retry_at
+    if _REMINDER_DEADLINES.get(rid) != ts:
+        _REMINDER_DEADLINES[rid] = ts
+        DELAYED_SCHEDULER.schedule(key, max(0.0, ts - time.time()), _reminder_deadline_fire, rid, ts)
+    return ts
+
+
+def _reminder_deadline_fresh() -> bool:
+    items = _reminder_items_dict()
+    return bool(_REMINDER_DEADLINE_READY and items is not None and id(items) == _REMINDER_DEADLINE_ITEMS_ID)
+
+
+def _reminder_deadline_rebuild(retry_past: bool = False) -> int:
+    """Полная сборка индекса: при старте, после полного цикла и раз в REMINDER_RECONCILE_SECONDS."""
+    global _REMINDER_DEADLINE_READY, _REMINDER_DEADLINE_ITEMS_ID, _REMINDER_RECONCILED_AT
+    started = time.perf_counter()
+    now_dt = now_local()
+    retry_at = time.time() + _REMINDER_CHECK_SECONDS if retry_past else None
+    with _REMINDER_CONFIG_LOCK:
+        items = _reminders_root().get("items") or {}
+        rows = []
+        for rid_raw, cfg in items.items():
+            try:
+                rows.append((int(rid_raw), cfg))
+            except Exception:
+                continue
+        with _REMINDER_DEADLINE_LOCK:
+            _REMINDER_CFG_RID.clear()
+            seen = set()
+            for rid, cfg in rows:
+                seen.add(rid)
+                try:
+                    _reminder_deadline_put_locked(rid, cfg if isinstance(cfg, dict) else None, now_dt, retry_at)
+                except Exception as exc:
+                    log_error(f"reminder {rid} deadline: {exc}")
+            for rid in (set(_REMINDER_DEADLINES) | set(_REMINDER_DEADLINE_CHATS)) - seen:
+                _reminder_deadline_put_locked(rid, None, now_dt)
+            _REMINDER_DEADLINE_READY = True
+            _REMINDER_DEADLINE_ITEMS_ID = id(items)
+            _REMINDER_RECONCILED_AT = time.monotonic()
+            _REMINDER_DEADLINE_STATS["rebuilds"] += 1
+            _REMINDER_DEADLINE_STATS["rebuild_ms"] = round((time.perf_counter() - started) * 1000.0, 2)
+            dirty = bool(_REMINDER_DIRTY_CHATS or _REMINDER_DEADLINE_DUE)
+    if dirty:
+        _reminder_deadline_kick()
+    return len(rows)
+
+
+def reminder_deadline_invalidate() -> None:
+    """Набор напоминалок заменён целиком (restore): следующий тик сделает полный цикл."""
+    global _REMINDER_DEADLINE_READY
+    with _REMINDER_DEADLINE_LOCK:
+        _REMINDER_DEADLINE_READY = False
+
+
+def _reminder_deadline_rid(cfg: dict) -> int | None:
+    items = _reminder_items_dict() or {}
+    rid = _REMINDER_CFG_RID.get(id(cfg))
+    if rid is not None and items.get(str(rid)) is cfg:
+        return rid
+    # Новая напоминалка ещё не в индексе; копии-снимки сюда не попадают.
+    for key, value in items.items():
+        if value is cfg:
+            try:
+                return int(key)
+            except Exception:
+                return None
+    return None
+
+
+def _reminder_deadline_note(cfg: dict) -> None:
+    if not REMINDER_DEADLINE_INDEX or not _REMINDER_DEADLINE_READY or not isinstance(cfg, dict):
+        return
+    try:
+        rid = _reminder_deadline_rid(cfg)
+        if rid is None:
+            return
+        batch = getattr(_REMINDER_DEADLINE_LOCAL, "batch", None)
+        if batch is not None:
+            # Внутри пакетного цикла: пересчёт один раз в его конце.
+            batch.add(rid)
+            return
+        with _REMINDER_DEADLINE_LOCK:
+            _reminder_deadline_put_locked(rid, cfg, now_local())
+            # Правка вне цикла (вкл/выкл, часы, чаты): состав общих сообщений сверяется
+            # сразу, как раньше на ближайшем 15-секундном обходе.
+            _REMINDER_DEADLINE_DUE.setdefault(rid, None)
+            _REMINDER_DEADLINE_STATS["edits"] += 1
+        _reminder_deadline_kick(0.3)
+    except Exception as exc:
+        log_error(f"reminder deadline note: {exc}")
+
+
+def _reminder_deadline_forget(reminder_id: int) -> None:
+    """Напоминалка удалена: снять таймер и сверить её бывшие чаты."""
+    if not REMINDER_DEADLINE_INDEX or not _REMINDER_DEADLINE_READY:
+        return
+    try:
+        with _REMINDER_DEADLINE_LOCK:
+            _reminder_deadline_put_locked(int(reminder_id), None, now_local())
+            _REMINDER_DEADLINE_DUE.pop(int(reminder_id), None)
+        _reminder_deadline_kick(0.3)
+    except Exception as exc:
+        log_error(f"reminder deadline forget: {exc}")
+
+
+def _reminder_deadline_fire(reminder_id: int, target_ts: float) -> None:
+    with _REMINDER_DEADLINE_LOCK:
+        if _REMINDER_DEADLINES.get(reminder_id) != target_ts:
+            _REMINDER_DEADLINE_STATS["stale_timers"] += 1
+            return
+        _REMINDER_DEADLINES.pop(reminder_id, None)
+        _REMINDER_DEADLINE_DUE[reminder_id] = target_ts
+        _REMINDER_DEADLINE_STATS["fired"] += 1
+    _reminder_deadline_kick()
+
+
+def _reminder_deadline_kick(delay: float = 0.0) -> None:
+    try: DELAYED_SCHEDULER.schedule("reminder-dispatch", delay, _reminder_deadline_dispatch)
+    except Exception as exc: log_error(f"reminder dispatch schedule: {exc}")
+
+
+def _reminder_deadline_dispatch() -> None:
+    """Отдать сработавшие сроки пакетному циклу (через _reminder_tick с его приоритетами)."""
+    try:
+        if runtime_is_ready() and (_REMINDER_DEADLINE_DUE or _REMINDER_DIRTY_CHATS):
+            _reminder_tick()
+    except Exception as exc:
+        log_error(f"reminder dispatch: {exc}")
+    finally:
+        # Если цикл отложен (приоритет финансов, процесс выключен), повтор с прежней частотой;
+        # успешный цикл сам забирает очередь и перезапускает раздачу при новых срабатываниях.
+        if _REMINDER_DEADLINE_DUE or _REMINDER_DIRTY_CHATS:
+            try: DELAYED_SCHEDULER.schedule("reminder-dispatch", _REMINDER_CHECK_SECONDS, _reminder_deadline_dispatch)
+            except Exception: pass
+
+
+def reminder_deadline_begin(force_chat_id: int | None = None):
+    """Начало пакетного цикла: (id кандидатов, чаты) или None, если нужен полный обход."""
+    if not REMINDER_DEADLINE_INDEX:
+        return None
+    _REMINDER_DEADLINE_LOCAL.batch = set()
+    with _REMINDER_DEADLINE_LOCK:
+        if not _reminder_deadline_fresh():
+            _REMINDER_DEADLINE_DUE.clear()
+            _REMINDER_DIRTY_CHATS.clear()
+            _REMINDER_DEADLINE_STATS["full_batches"] += 1
+            return None
+        if force_chat_id is not None:
+            chats = {int(force_chat_id)}
+        else:
+            now = time.time()
+            due = dict(_REMINDER_DEADLINE_DUE)
+            _REMINDER_DEADLINE_DUE.clear()
+            chats = set(_REMINDER_DIRTY_CHATS)
+            _REMINDER_DIRTY_CHATS.clear()
+            for rid, target in due.items():
+                chats.update(_REMINDER_DEADLINE_CHATS.get(rid, ()))
+                if target is not None:
+                    _REMINDER_JITTER.observe(now - target)
+            _REMINDER_DEADLINE_LOCAL.batch.update(due)
+        rids = set(_REMINDER_DEADLINE_LOCAL.batch)
+        for cid in chats:
+            rids.update(_REMINDER_CHAT_MEMBERS.get(cid, ()))
+        _REMINDER_DEADLINE_STATS["batches"] += 1
+        _REMINDER_DEADLINE_STATS["candidates"] += len(rids)
+    return rids, chats
+
+
+def reminder_deadline_end(full: bool = False) -> None:
+    """Конец пакетного цикла: пересчитать тронутые напоминалки (или весь индекс)."""
+    touched = getattr(_REMINDER_DEADLINE_LOCAL, "batch", None)
+    _REMINDER_DEADLINE_LOCAL.batch = None
+    if not REMINDER_DEADLINE_INDEX:
+        return
+    if full:
+        _reminder_deadline_rebuild(retry_past=True)
+        return
+    if touched:
+        now_dt = now_local()
+        retry_at = time.time() + _REMINDER_CHECK_SECONDS
+        items = _reminder_items_dict() or {}
+        with _REMINDER_CONFIG_LOCK, _REMINDER_DEADLINE_LOCK:
+            for rid in touched:
+                cfg = items.get(str(rid))
+                _reminder_deadline_put_locked(rid, cfg if isinstance(cfg, dict) else None, now_dt, retry_at)
+    if _REMINDER_DEADLINE_DUE or _REMINDER_DIRTY_CHATS:
+        _reminder_deadline_kick()
+
+
+def reminder_deadline_stats() -> dict:
+    with _REMINDER_DEADLINE_LOCK:
+        out = dict(_REMINDER_DEADLINE_STATS)
+        out.update({
+            "enabled": bool(REMINDER_DEADLINE_INDEX),
+            "ready": bool(_REMINDER_DEADLINE_READY),
+            "armed": len(_REMINDER_DEADLINES),
+            "pending": len(_REMINDER_DEADLINE_DUE),
+            "chats": len(_REMINDER_CHAT_MEMBERS),
+            "next_in_s": round(max(0.0, min(_REMINDER_DEADLINES.values()) - time.time()), 1) if _REMINDER_DEADLINES else None,
+        })
+    out["jitter"] = _REMINDER_JITTER.snapshot()
+    return out
+
+
 def _reminder_tick_job(reminder_id: int) -> None:
     """One reminder per keyed worker; completion also removes the last chat message."""
     reminder_id = int(reminder_id)
@@ -946,9 +1275,14 @@ _reminder_tick = _v177_legacy_0132_reminder_tick
 
 def _reminder_scheduler_tick() -> None:
     # v179: common delayed scheduler, no dedicated reminder thread.
+    # v199: при живом индексе сроков тик — O(1) проверка; полный цикл только пока индекс
+    # не собран/устарел, пересборка раз в REMINDER_RECONCILE_SECONDS как страховка.
     try:
         if runtime_is_ready():
-            _reminder_tick()
+            if not REMINDER_DEADLINE_INDEX or not _reminder_deadline_fresh():
+                _reminder_tick()
+            elif time.monotonic() - _REMINDER_RECONCILED_AT >= REMINDER_RECONCILE_SECONDS:
+                _reminder_deadline_rebuild()
     except Exception as exc:
         log_error(f"reminder scheduler: {exc}")
     finally:
@@ -1157,6 +1491,7 @@ def reminder_callback(call):
             cfg = _reminder_cfg(rid)
             if cfg: _reminder_delete_last_messages(cfg)
             root.setdefault("items", {}).pop(str(rid), None)
+            _reminder_deadline_forget(rid)
             _reminder_unbind(rid)
         _REMINDER_COMPLETED_DELETE_SELECTION[int(OWNER_ID or chat_id)].clear()
         _reminder_save("reminder_completed_bulk_delete")
@@ -1315,7 +1650,7 @@ def reminder_callback(call):
         rid = int(parts[2]); page = int(parts[3]); day_key = parts[4]
         root = _reminders_root(); cfg = _reminder_cfg(rid)
         if cfg: _reminder_delete_last_messages(cfg)
-        root.setdefault("items", {}).pop(str(rid), None); _reminder_unbind(rid); _reminder_save("reminder_delete")
+        root.setdefault("items", {}).pop(str(rid), None); _reminder_deadline_forget(rid); _reminder_unbind(rid); _reminder_save("reminder_delete")
         if str(day_key) == "completed":
             rows = _reminder_completed_items(); pages = max(1, (len(rows) + _REMINDER_COMPLETED_PAGE_SIZE - 1) // _REMINDER_COMPLETED_PAGE_SIZE); page = min(page, pages - 1)
             safe_edit(bot, call, build_completed_reminders_text(page), reply_markup=build_completed_reminders_keyboard(page)); return
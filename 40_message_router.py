@@ -270,6 +270,7 @@ def on_any_message(msg):
                             rec["usd_amount"] = float(amount)
                             rec["usd_note"] = str(note or rec.get("usd_note") or rec.get("note") or "")
                             rec["usd_only"] = bool(rec.get("usd_only", False) and not float(rec.get("amount", 0) or 0))
+                            delta_track_record(target_chat_id, rec)
                             _snapshot_active_currency_ledger(target_store, _ensure_currency_ledgers(target_store))
                             rebuild_month_short_ids(target_chat_id)
                             save_data(data, chat_ids=[target_chat_id])
@@ -669,6 +670,8 @@ def handle_finance_edit(msg):
         target["usd_amount"] = 0.0
         target["usd_note"] = ""
         target["usd_only"] = False
+    # v199: правка на месте — delta/индекс баланса/порядок/finance_rows узнают о ней только так.
+    delta_track_record(chat_id, target)
 
     for day, arr in store.get("daily_records", {}).items():
         for r in arr:
@@ -735,6 +738,7 @@ def sync_forwarded_finance_message(dst_chat_id: int, dst_msg_id: int, text: str,
                     existing["timestamp"] = message_timestamp_iso(source_msg)
                     if source_msg is not None:
                         existing["source_order_msg_id"] = getattr(source_msg, "message_id", existing.get("source_order_msg_id", 0))
+                    delta_track_record(dst_chat_id, existing)
                     entry_day = existing.get("day_key") or entry_day
                     rebuild_month_short_ids(dst_chat_id)
                     rebuild_global_records()
@@ -768,6 +772,7 @@ def sync_forwarded_finance_message(dst_chat_id: int, dst_msg_id: int, text: str,
             existing["usd_amount"] = 0.0
             existing["usd_note"] = ""
             existing["usd_only"] = False
+            delta_track_record(dst_chat_id, existing)
             entry_day = existing.get("day_key") or entry_day
             rebuild_month_short_ids(dst_chat_id)
             rebuild_global_records()
@@ -806,6 +811,12 @@ def export_global_csv(d: dict):
         with open(CSV_FILE, "w", newline="", encoding="utf-8") as f:
             w = csv.writer(f)
             w.writerow(["date", "amount", "note"])
+            stream_rows = globals().get("export_stream_global_rows") if globals().get("EXPORT_STREAMING") else None
+            if callable(stream_rows) and d is data:
+                # v199: k-way слияние поканальных потоков по настоящей дате, без загрузки
+                # холодных леджеров в RAM (старый sort шёл по строке DD.MM.YY).
+                write_csv_rows_with_day_gaps(w, stream_rows(d), 3)
+                return
             rows = []
             for cid, cdata in d.get("chats", {}).items():
                 for dk, records in (cdata.get("daily_records", {}) or {}).items():
@@ -303,6 +303,7 @@ def _hydrate_legacy_forward_copy_metadata(chat_id: int, rec: dict, msg_id: int,
             rec["forward_dst_chat_id"] = int(chat_id); changed = True
         if rec.get("forward_dst_msg_id") is None:
             rec["forward_dst_msg_id"] = int(msg_id); changed = True
+            finance_msg_index_touch(chat_id, rec)
         if src_chat_id is not None and rec.get("forward_source_chat_id") is None:
             rec["forward_source_chat_id"] = int(src_chat_id); changed = True
         if src_msg_id is not None and rec.get("forward_source_msg_id") is None:
@@ -470,7 +471,6 @@ def refresh_existing_forward_copy_ui(owner_chat_id: int, mode: str | None = None
         except Exception:
             pass
     try:
-        _persist_forward_index_in_data(data)
         save_data(data, root_only=True)
     except Exception:
         pass
@@ -522,9 +522,25 @@ def find_finance_record_by_uid(chat_id: int, record_uid: str):
     if not re.fullmatch(r"[A-F0-9]{12}", uid):
         return None
     try:
-        for _key, rec in _finance_record_lists(get_chat_store(int(chat_id))):
+        store = get_chat_store(int(chat_id))
+        if FINANCE_MSG_INDEX:
+            # v199: record_uid → запись из того же индекса, что и message-id.  Скан
+            # нужен, только пока в RAM есть записи без канонического uid.
+            with _FINANCE_MSG_LOCK:
+                state = _finance_msg_state(int(chat_id), store)
+                hits = [r for r in state["by_uid"].get(uid, ()) if str(r.get("record_uid") or "").strip().upper() == uid]
+                pending = state["pending_uid"]
+            if hits:
+                with _FINANCE_MSG_LOCK:
+                    return _finance_msg_ordered(store, state, hits)[0]
+            if not pending:
+                return None
+        for _key, rec in _finance_record_lists(store):
             if isinstance(rec, dict) and ensure_finance_record_uid(int(chat_id), rec) == uid:
+                finance_msg_index_release(int(chat_id))
                 return rec
+        if FINANCE_MSG_INDEX:
+            finance_msg_index_release(int(chat_id))
     except Exception:
         pass
     return None
@@ -1087,73 +1103,84 @@ def _forward_key(src_chat_id: int, src_msg_id: int) -> str:
     return f"{int(src_chat_id)}:{int(src_msg_id)}"
 
 
-def _schedule_persist_forward_state(delay: float = 0.25):
-    global _forward_state_timer
+# v199: карта копий хранится в SQLite forward_links (см. SQLiteState.forward_*), а не в root JSON.
+# Delta несёт только источники, чьи связи менялись с последней подтверждённой delta.
+_FORWARD_INDEX_DIRTY = {}
+_FORWARD_INDEX_DIRTY_SEQ = 0
+_FORWARD_INDEX_LAST_PRUNE = 0.0
 
-    def _job():
-        try:
-            # Индекс пересылки хранится в root SQLite; чаты повторно не переписываем.
-            save_data(data, root_only=True)
-        except Exception as e:
-            log_error(f"_schedule_persist_forward_state: {e}")
 
-    scheduler_key = "forward-state-save"
-    DELAYED_SCHEDULER.cancel(scheduler_key)
-    _forward_state_timer = DELAYED_SCHEDULER.schedule(scheduler_key, delay, _job)
+def _forward_index_mark_dirty(keys):
+    global _FORWARD_INDEX_DIRTY_SEQ
+    with forward_map_lock:
+        for src_chat_id, src_msg_id in keys or []:
+            _FORWARD_INDEX_DIRTY_SEQ += 1
+            _FORWARD_INDEX_DIRTY[_forward_key(src_chat_id, src_msg_id)] = _FORWARD_INDEX_DIRTY_SEQ
 
 
-def _persist_forward_index_in_data(d: dict):
+def _forward_index_dirty_marks() -> dict:
     with forward_map_lock:
-        idx = {}
-        for (src_chat_id, src_msg_id), pairs in forward_map.items():
-            rows = []
-            for pair in pairs:
-                if not isinstance(pair, (list, tuple)) or len(pair) < 2:
-                    continue
-                dst_chat_id, dst_msg_id = pair[0], pair[1]
-                rows.append({
-                    "dst_chat_id": int(dst_chat_id),
-                    "dst_msg_id": int(dst_msg_id),
-                    "status": "delivered",
-                })
-            if rows:
-                idx[_forward_key(src_chat_id, src_msg_id)] = rows
-        d["forward_index"] = idx
+        return dict(_FORWARD_INDEX_DIRTY)
 
 
-def _load_forward_index_from_data(d: dict):
+def _forward_index_commit_marks(marks: dict):
+    """Снимает только отметки, вошедшие в загруженную delta; повторно тронутый источник остаётся."""
     with forward_map_lock:
-        forward_map.clear()
-        idx = d.get("forward_index", {}) or {}
-        for key, rows in idx.items():
-            try:
-                src_chat_id_s, src_msg_id_s = str(key).split(":", 1)
-                src_chat_id = int(src_chat_id_s)
-                src_msg_id = int(src_msg_id_s)
-            except Exception:
-                continue
+        for key, seq in (marks or {}).items():
+            if _FORWARD_INDEX_DIRTY.get(key) == seq:
+                _FORWARD_INDEX_DIRTY.pop(key, None)
 
-            pairs = []
-            for row in rows or []:
-                try:
-                    dst_chat_id = int(row.get("dst_chat_id"))
-                    dst_msg_id = int(row.get("dst_msg_id"))
-                    pairs.append((dst_chat_id, dst_msg_id))
-                except Exception:
-                    continue
 
-            if pairs:
-                forward_map[(src_chat_id, src_msg_id)] = pairs
+def _forward_index_delta_rows(marks: dict) -> tuple[dict, list]:
+    """Для delta: актуальные строки изменившихся источников и источники, оставшиеся без копий."""
+    keys = []
+    for key in marks or {}:
+        try:
+            src_chat_s, src_msg_s = str(key).split(":", 1)
+            keys.append((int(src_chat_s), int(src_msg_s)))
+        except Exception:
+            continue
+    rows = SQLITE.forward_links_export(keys)
+    return rows, [key for key in marks or {} if key not in rows]
+
+
+def _forward_index_maybe_prune(force: bool = False) -> int:
+    global _FORWARD_INDEX_LAST_PRUNE
+    now = time.time()
+    if not force and now - _FORWARD_INDEX_LAST_PRUNE < FORWARD_MAP_PRUNE_INTERVAL_SECONDS:
+        return 0
+    _FORWARD_INDEX_LAST_PRUNE = now
+    try:
+        link_before = now - FORWARD_MAP_TTL_DAYS * 86400.0 if FORWARD_MAP_TTL_DAYS > 0 else None
+        keys, outcomes = SQLITE.forward_prune(link_before, now - FORWARD_OUTCOME_TTL_HOURS * 3600.0)
+        _forward_index_mark_dirty(keys)
+        if keys or outcomes:
+            log_info(f"[FORWARD INDEX TTL] pruned sources={len(keys)} outcomes={outcomes}")
+        return len(keys)
+    except Exception as e:
+        log_error(f"_forward_index_maybe_prune: {e}")
+        return 0
+
+
+def _persist_forward_index_in_data(d: dict):
+    """Кладёт экспорт forward_links в d — только для backup/export payload, не для живого root."""
+    d["forward_index"] = SQLITE.forward_links_export()
+
+
+def _load_forward_index_from_data(d: dict):
+    """forward_index из backup/restore или legacy root заменяет SQLite-карту; без ключа карта не трогается."""
+    idx = d.pop("forward_index", None)
+    if not isinstance(idx, dict):
+        return
+    with forward_map_lock:
+        SQLITE.forward_links_import(idx, replace=True)
 
 
 def _store_forward_link(src_chat_id: int, src_msg_id: int, dst_chat_id: int, dst_msg_id: int):
     with forward_map_lock:
-        key = (int(src_chat_id), int(src_msg_id))
-        pair = (int(dst_chat_id), int(dst_msg_id))
-        items = forward_map.setdefault(key, [])
-        if pair not in items:
-            items.append(pair)
-    _schedule_persist_forward_state()
+        SQLITE.forward_link_add(src_chat_id, src_msg_id, dst_chat_id, dst_msg_id)
+        _forward_index_mark_dirty([(src_chat_id, src_msg_id)])
+    _forward_index_maybe_prune()
 
 
 def _v177_legacy_0155_persist_forward_finance_delivery_now(src_chat_id: int, src_msg_id: int, dst_chat_id: int, dst_msg_id: int, rec: dict | None = None):
@@ -1174,7 +1201,6 @@ def _v177_legacy_0155_persist_forward_finance_delivery_now(src_chat_id: int, src
                 for rr in arr or []:
                     if isinstance(rr, dict) and rr.get("id") == rid:
                         rr.update(tags)
-        _persist_forward_index_in_data(data)
         save_data(data, chat_ids=[int(dst_chat_id)])
         # Для пересланной финансовой записи недостаточно debounce: deploy мог начаться сразу
         # после появления Telegram-сообщения. Ждём подтверждения immutable delta в MEGA.
@@ -1225,14 +1251,11 @@ def _rebuild_forward_index_from_finance_records(d: dict) -> int:
                         dst_msg = int(rec.get("forward_dst_msg_id") or rec.get("source_msg_id") or rec.get("msg_id"))
                     except Exception:
                         continue
-                    key = (src_chat, src_msg); pair = (dst_chat, dst_msg)
-                    rows_map = forward_map.setdefault(key, [])
-                    if pair not in rows_map:
-                        rows_map.append(pair); added += 1
+                    if SQLITE.forward_link_add(src_chat, src_msg, dst_chat, dst_msg):
+                        _forward_index_mark_dirty([(src_chat, src_msg)])
+                        added += 1
                 # rows becomes unreachable before the next chat.
                 rows = None
-            if added:
-                _persist_forward_index_in_data(d)
         if added:
             log_info(f"[FORWARD INDEX RECOVERY] rebuilt {added} links from SQLite finance records")
         return added
@@ -1242,14 +1265,12 @@ def _rebuild_forward_index_from_finance_records(d: dict) -> int:
 
 
 def get_forward_links(src_chat_id: int, src_msg_id: int):
-    with forward_map_lock:
-        return list(forward_map.get((int(src_chat_id), int(src_msg_id)), []))
+    return SQLITE.forward_links_for_source(int(src_chat_id), int(src_msg_id))
 
 
 def delete_forward_copies_for_source(src_chat_id: int, src_msg_id: int):
     key = (int(src_chat_id), int(src_msg_id))
-    with forward_map_lock:
-        links = list(forward_map.get(key, []))
+    links = get_forward_links(*key)
     for dst_chat_id, dst_msg_id in links:
         try:
             bot.delete_message(dst_chat_id, dst_msg_id)
@@ -1261,9 +1282,8 @@ def delete_forward_copies_for_source(src_chat_id: int, src_msg_id: int):
         except Exception as e:
             log_error(f"delete_forwarded_finance_record_by_msg_id {dst_chat_id}:{dst_msg_id}: {e}")
     with forward_map_lock:
-        if key in forward_map:
-            del forward_map[key]
-            _schedule_persist_forward_state()
+        if SQLITE.forward_links_delete_source(*key):
+            _forward_index_mark_dirty([key])
 
 
 def is_forward_delete_command(text: str) -> bool:
@@ -1302,14 +1322,297 @@ def _record_has_message_id(rec: dict, msg_id: int) -> bool:
     return False
 
 
+# ─────────────────────────────────────────────────────────────
+# v199: индекс message-id → финансовая запись.
+# find_record_by_message_id раньше проходил все записи всех ledgers на каждую
+# правку/удаление/перепривязку пересланной копии.  Теперь на чат держится
+# message_id → [записи] и record_uid → [записи]; индекс ведут хуки
+# delta_track_record/delta_track_chat_full, а если форма ledgers (объект списка,
+# длина) разошлась с ожидаемой — следующий поиск пересобирает его одним проходом.
+# В LOW-RAM невыгруженные ledgers отвечают через SQLite finance_msg_index, который
+# пишется в той же транзакции, что и строки finance_records.
+# ─────────────────────────────────────────────────────────────
+FINANCE_MSG_INDEX = _env_bool("FINANCE_MSG_INDEX", "1")
+try:
+    FINANCE_MSG_INDEX_VERIFY_EVERY = max(0, int(os.getenv("FINANCE_MSG_INDEX_VERIFY_EVERY", "2000") or "2000"))
+except Exception:
+    FINANCE_MSG_INDEX_VERIFY_EVERY = 2000
+_FINANCE_MSG_LEDGERS = ("records", "ars_records", "usd_records")
+_FINANCE_MSG_UID_RE = re.compile(r"[A-F0-9]{12}")
+_FINANCE_MSG_LOCK = threading.RLock()
+_FINANCE_MSG_STATE = {}
+_FINANCE_MSG_STATS = defaultdict(int)
+
+
+def _finance_msg_ledger(store, key):
+    """Ledger без ленивой подгрузки ColdChatStore; None — не в RAM или не список."""
+    arr = dict.get(store, key) if isinstance(store, dict) else None
+    return arr if isinstance(arr, list) else None
+
+
+def _finance_msg_shape(store) -> list:
+    out = []
+    for key in _FINANCE_MSG_LEDGERS:
+        arr = _finance_msg_ledger(store, key)
+        out.append((id(arr), len(arr)) if arr is not None else None)
+    return out
+
+
+def _finance_msg_put_locked(state: dict, rec: dict, rank: int):
+    mids = ()
+    for _field, mid in _finance_msg_fields(rec):
+        if mid not in mids:
+            mids += (mid,)
+    uid = rec.get("record_uid")
+    if type(uid) is not str or not _FINANCE_MSG_UID_RE.fullmatch(uid):
+        uid = str(uid or "").strip().upper()
+        if not _FINANCE_MSG_UID_RE.fullmatch(uid):
+            uid = ""
+            state["pending_uid"] += 1
+    # Сам rec держим в значении: id() не переиспользуется, пока запись в индексе.
+    state["keys"][id(rec)] = (mids, uid, rank, rec)
+    for mid in mids:
+        state["by_msg"].setdefault(mid, []).append(rec)
+    if uid:
+        state["by_uid"].setdefault(uid, []).append(rec)
+
+
+def _finance_msg_drop_locked(state: dict, rec: dict):
+    row = state["keys"].pop(id(rec), None)
+    if row is None:
+        return None
+    mids, uid, rank, _rec = row
+    for mid in mids:
+        bucket = state["by_msg"].get(mid)
+        if bucket is not None:
+            bucket[:] = [r for r in bucket if r is not rec]
+            if not bucket:
+                state["by_msg"].pop(mid, None)
+    if uid:
+        bucket = state["by_uid"].get(uid)
+        if bucket is not None:
+            bucket[:] = [r for r in bucket if r is not rec]
+            if not bucket:
+                state["by_uid"].pop(uid, None)
+    else:
+        state["pending_uid"] = max(0, state["pending_uid"] - 1)
+    return rank
+
+
+def _finance_msg_build(store) -> dict:
+    state = {"shape": _finance_msg_shape(store), "by_msg": {}, "by_uid": {}, "keys": {}, "pending_uid": 0, "updates": 0}
+    for rank, key in enumerate(_FINANCE_MSG_LEDGERS):
+        for rec in _finance_msg_ledger(store, key) or ():
+            if isinstance(rec, dict) and id(rec) not in state["keys"]:
+                _finance_msg_put_locked(state, rec, rank)
+    return state
+
+
+def _finance_msg_state(chat_id: int, store) -> dict:
+    cid = int(chat_id)
+    with _FINANCE_MSG_LOCK:
+        state = _FINANCE_MSG_STATE.get(cid)
+        if state is not None and state["shape"] == _finance_msg_shape(store):
+            _FINANCE_MSG_STATS["hits"] += 1
+            return state
+        started = time.perf_counter()
+        state = _finance_msg_build(store)
+        _FINANCE_MSG_STATE[cid] = state
+        _FINANCE_MSG_STATS["builds"] += 1
+        _FINANCE_MSG_STATS["build_rows"] += len(state["keys"])
+        _FINANCE_MSG_STATS["build_ms"] += int((time.perf_counter() - started) * 1000)
+        return state
+
+
+def _finance_msg_cold_load(chat_id: int, store, msg_id: int):
+    """LOW-RAM: невыгруженный ledger поднимаем, только если SQLite-индекс видит в нём этот message_id."""
+    if not LOWRAM_ENABLED or not isinstance(store, ColdChatStore):
+        return
+    cold = [key for key in _FINANCE_MSG_LEDGERS if _finance_msg_ledger(store, key) is None]
+    if not cold:
+        return
+    try:
+        currencies = {row[0] for row in SQLITE.finance_msg_lookup(chat_id, msg_id)}
+    except Exception as exc:
+        log_error(f"finance_msg_lookup {chat_id}:{msg_id}: {exc}")
+        currencies = {FINANCE_ROW_LEDGERS[key] for key in cold}
+    for key in cold:
+        if FINANCE_ROW_LEDGERS[key] in currencies:
+            store.get(key)
+            with _FINANCE_MSG_LOCK:
+                _FINANCE_MSG_STATS["cold_loads"] += 1
+
+
+def _finance_msg_ordered(store, state: dict, hits: list) -> list:
+    """Несколько совпадений: порядок прежнего скана — ledger, затем позиция в списке."""
+    if len(hits) < 2:
+        return hits
+    def _pos(rec):
+        rank = state["keys"].get(id(rec), ((), "", len(_FINANCE_MSG_LEDGERS), None))[2]
+        arr = _finance_msg_ledger(store, _FINANCE_MSG_LEDGERS[rank]) if rank < len(_FINANCE_MSG_LEDGERS) else None
+        for idx, item in enumerate(arr or ()):
+            if item is rec:
+                return (rank, idx)
+        return (rank, 1 << 60)
+    return sorted(hits, key=_pos)
+
+
+def finance_msg_index_note(chat_id: int, rec=None, ledger: str = "records", deleted: bool = False, key=None):
+    """Инкрементальная правка индекса после мутации записи (зовётся из delta_track_record)."""
+    if not FINANCE_MSG_INDEX:
+        return
+    try:
+        cid = int(chat_id)
+    except Exception:
+        return
+    verify = False
+    with _FINANCE_MSG_LOCK:
+        state = _FINANCE_MSG_STATE.get(cid)
+        if state is None:
+            return
+        if ledger not in _FINANCE_MSG_LEDGERS:
+            _FINANCE_MSG_STATE.pop(cid, None); _FINANCE_MSG_STATS["drops"] += 1
+            return
+        rank = _FINANCE_MSG_LEDGERS.index(ledger)
+        if not isinstance(rec, dict):
+            skey = str(key or "")
+            rows = state["by_uid"].get(skey[4:].upper(), []) if skey.startswith("uid:") else None
+            if rows is None or len(rows) > 1:
+                # "id:N" или неоднозначный uid — дешевле пересобрать при следующем поиске.
+                _FINANCE_MSG_STATE.pop(cid, None); _FINANCE_MSG_STATS["drops"] += 1
+                return
+            if not rows:
+                return
+            rec = rows[0]
+        old_rank = _finance_msg_drop_locked(state, rec)
+        if not deleted:
+            _finance_msg_put_locked(state, rec, rank)
+        expected = list(state["shape"])
+        if old_rank is not None and expected[old_rank] is not None:
+            expected[old_rank] = (expected[old_rank][0], expected[old_rank][1] - 1)
+        if not deleted and expected[rank] is not None:
+            expected[rank] = (expected[rank][0], expected[rank][1] + 1)
+        current = _finance_msg_shape((data.get("chats") or {}).get(str(cid)))
+        # Список ledger мог быть заменён (удаление пересобирает list) — принимаем,
+        # если длина сходится с объяснённой мутацией; иначе ждём пересборки.
+        if all(
+            (cur is None and exp is None) or (cur is not None and exp is not None and cur[1] == exp[1])
+            for cur, exp in zip(current, expected)
+        ):
+            state["shape"] = current
+            state["updates"] += 1
+            _FINANCE_MSG_STATS["updates"] += 1
+            verify = bool(FINANCE_MSG_INDEX_VERIFY_EVERY) and state["updates"] % FINANCE_MSG_INDEX_VERIFY_EVERY == 0
+        else:
+            _FINANCE_MSG_STATE.pop(cid, None); _FINANCE_MSG_STATS["drops"] += 1
+    if verify:
+        pool = globals().get("GENERAL_TASK_POOL")
+        if pool is not None:
+            pool.submit_unique(f"finance-msg-verify:{cid}", finance_msg_index_verify, cid)
+
+
+def finance_msg_index_touch(chat_id: int, rec: dict):
+    """Переиндексировать message-id поля записи, изменённые на месте (ledger не меняется)."""
+    if not FINANCE_MSG_INDEX or not isinstance(rec, dict):
+        return
+    try:
+        cid = int(chat_id)
+    except Exception:
+        return
+    with _FINANCE_MSG_LOCK:
+        state = _FINANCE_MSG_STATE.get(cid)
+        if state is None:
+            return
+        rank = _finance_msg_drop_locked(state, rec)
+        if rank is None:
+            _FINANCE_MSG_STATE.pop(cid, None); _FINANCE_MSG_STATS["drops"] += 1
+            return
+        _finance_msg_put_locked(state, rec, rank)
+        _FINANCE_MSG_STATS["updates"] += 1
+
+
+def finance_msg_index_release(chat_id=None):
+    with _FINANCE_MSG_LOCK:
+        if chat_id is None:
+            _FINANCE_MSG_STATE.clear()
+        else:
+            try:
+                _FINANCE_MSG_STATE.pop(int(chat_id), None)
+            except Exception:
+                pass
+
+
+def finance_msg_index_verify(chat_id=None) -> dict:
+    """Сверка: пересобрать индекс с нуля, сравнить с поддерживаемым и заменить при расхождении."""
+    with _FINANCE_MSG_LOCK:
+        cids = [int(chat_id)] if chat_id is not None else list(_FINANCE_MSG_STATE)
+    report = {"chats": 0, "drift": 0, "sqlite_missing": 0, "sqlite_extra": 0}
+    for cid in cids:
+        try:
+            with locked_chat(cid):
+                store = (data.get("chats") or {}).get(str(cid))
+                if not isinstance(store, dict):
+                    finance_msg_index_release(cid)
+                    continue
+                fresh = _finance_msg_build(store)
+                with _FINANCE_MSG_LOCK:
+                    state = _FINANCE_MSG_STATE.get(cid)
+                    drift = 0
+                    if state is not None and state["shape"] == fresh["shape"]:
+                        for name in ("by_msg", "by_uid"):
+                            have = {(k, id(r)) for k, rows in state[name].items() for r in rows}
+                            want = {(k, id(r)) for k, rows in fresh[name].items() for r in rows}
+                            drift += len(have ^ want)
+                    if drift:
+                        fresh["updates"] = state["updates"]
+                        _FINANCE_MSG_STATE[cid] = fresh
+                    _FINANCE_MSG_STATS["verify_runs"] += 1
+                    _FINANCE_MSG_STATS["verify_drift"] += drift
+                report["chats"] += 1
+                report["drift"] += drift
+                if drift:
+                    log_error(f"finance_msg_index drift chat {cid}: {drift} rows, index rebuilt")
+            if LOWRAM_ENABLED:
+                check = SQLITE.finance_msg_index_check(cid, repair=True)
+                report["sqlite_missing"] += int(check.get("missing") or 0)
+                report["sqlite_extra"] += int(check.get("extra") or 0)
+                if check.get("missing") or check.get("extra"):
+                    with _FINANCE_MSG_LOCK:
+                        _FINANCE_MSG_STATS["sqlite_repairs"] += 1
+                    log_error(f"finance_msg_index sqlite drift chat {cid}: {check}")
+        except Exception as exc:
+            log_error(f"finance_msg_index_verify {cid}: {exc}")
+    return report
+
+
+def finance_msg_index_stats() -> dict:
+    with _FINANCE_MSG_LOCK:
+        out = {k: int(v) for k, v in _FINANCE_MSG_STATS.items()}
+        out["chats"] = len(_FINANCE_MSG_STATE)
+        out["rows"] = sum(len(s["keys"]) for s in _FINANCE_MSG_STATE.values())
+    out["enabled"] = bool(FINANCE_MSG_INDEX)
+    return out
+
+
 def find_record_by_message_id(chat_id: int, msg_id: int):
     # v124: old records can be parked in ars_records/usd_records after a currency switch or
     # restored deploy.  Search all persistent ledgers, while keeping the active list first.
     store = get_chat_store(chat_id)
-    for _key, r in _finance_record_lists(store):
-        if _record_has_message_id(r, msg_id):
-            return r
-    return None
+    if not FINANCE_MSG_INDEX:
+        for _key, r in _finance_record_lists(store):
+            if _record_has_message_id(r, msg_id):
+                return r
+        return None
+    try:
+        mid = int(msg_id)
+    except Exception:
+        return None
+    _finance_msg_cold_load(int(chat_id), store, mid)
+    with _FINANCE_MSG_LOCK:
+        state = _finance_msg_state(int(chat_id), store)
+        hits = [r for r in state["by_msg"].get(mid, ()) if _record_has_message_id(r, mid)]
+        hits = _finance_msg_ordered(store, state, hits)
+    return hits[0] if hits else None
 
 
 def delete_forwarded_finance_record_by_msg_id(chat_id: int, msg_id: int) -> bool:
@@ -1330,6 +1633,7 @@ def rebind_forwarded_finance_record(chat_id: int, old_msg_id: int, new_msg_id: i
             rec["source_msg_id"] = new_msg_id
             rec["origin_msg_id"] = new_msg_id
             rec["msg_id"] = new_msg_id
+            finance_msg_index_touch(chat_id, rec)
 
             rec["source_finance_text"] = str(text or "").strip()
             if text and looks_like_amount(text):
@@ -1347,6 +1651,7 @@ def rebind_forwarded_finance_record(chat_id: int, old_msg_id: int, new_msg_id: i
                         rec["usd_only"] = False
                 except Exception:
                     pass
+            delta_track_record(chat_id, rec)
 
             rec_id = rec.get("id")
             for day, arr in store.get("daily_records", {}).items():
@@ -1368,20 +1673,8 @@ def rebind_forwarded_finance_record(chat_id: int, old_msg_id: int, new_msg_id: i
 
 def _replace_forward_link_pair(src_chat_id: int, src_msg_id: int, old_dst_chat_id: int, old_dst_msg_id: int, new_dst_chat_id: int, new_dst_msg_id: int):
     with forward_map_lock:
-        key = (int(src_chat_id), int(src_msg_id))
-        pairs = list(forward_map.get(key, []))
-        updated = []
-        replaced = False
-        for pair in pairs:
-            if int(pair[0]) == int(old_dst_chat_id) and int(pair[1]) == int(old_dst_msg_id):
-                updated.append((int(new_dst_chat_id), int(new_dst_msg_id)))
-                replaced = True
-            else:
-                updated.append(pair)
-        if not replaced:
-            updated.append((int(new_dst_chat_id), int(new_dst_msg_id)))
-        forward_map[key] = updated
-    _schedule_persist_forward_state()
+        SQLITE.forward_link_replace(src_chat_id, src_msg_id, old_dst_chat_id, old_dst_msg_id, new_dst_chat_id, new_dst_msg_id)
+        _forward_index_mark_dirty([(src_chat_id, src_msg_id)])
 
 
 def sync_edited_copy_to_target(source_chat_id: int, msg, dst_chat_id: int, dst_msg_id: int, finance_enabled: bool):
@@ -1483,19 +1776,8 @@ def sync_edited_copy_to_target(source_chat_id: int, msg, dst_chat_id: int, dst_m
 
 
 def _cleanup_forward_storage_for_chat(chat_id: int):
-    chat_id = int(chat_id)
     with forward_map_lock:
-        for key in list(forward_map.keys()):
-            src_chat_id, _ = key
-            if src_chat_id == chat_id:
-                del forward_map[key]
-                continue
-            pairs = [pair for pair in forward_map.get(key, []) if int(pair[0]) != chat_id]
-            if pairs:
-                forward_map[key] = pairs
-            elif key in forward_map:
-                del forward_map[key]
-    _schedule_persist_forward_state()
+        _forward_index_mark_dirty(SQLITE.forward_links_drop_chat(int(chat_id)))
 
 
 
@@ -1661,24 +1943,9 @@ def _v177_legacy_0156_migrate_chat_id_everywhere(old_chat_id: int, new_chat_id:
             if isinstance(fac, list):
                 data["finance_active_chats"] = [new_chat_id if int(x)==old_chat_id else x for x in fac]
 
-            # forward_map runtime: source keys и destination pairs.
+            # forward_links: source keys и destination pairs.
             with forward_map_lock:
-                rebuilt = {}
-                for (src, mid), pairs in list(forward_map.items()):
-                    nsrc = new_chat_id if int(src) == old_chat_id else int(src)
-                    npairs = []
-                    for dcid, dmid in pairs:
-                        ndcid = new_chat_id if int(dcid) == old_chat_id else int(dcid)
-                        pair = (ndcid, int(dmid))
-                        if pair not in npairs:
-                            npairs.append(pair)
-                    key = (nsrc, int(mid))
-                    rebuilt.setdefault(key, [])
-                    for pair in npairs:
-                        if pair not in rebuilt[key]:
-                            rebuilt[key].append(pair)
-                forward_map.clear(); forward_map.update(rebuilt)
-                _persist_forward_index_in_data(data)
+                _forward_index_mark_dirty(SQLITE.forward_links_remap_chat(old_chat_id, new_chat_id))
 
             # Сохраняем миграцию синхронно: следующий update уже должен видеть новый ID.
             save_data(data, full=True)
@@ -1886,11 +2153,6 @@ def _forward_single_to_target(source_chat_id: int, msg, dst_chat_id: int, financ
                     # Persist the Telegram link before finance work, matching the old safety order.
                     _store_forward_link(source_chat_id, msg.message_id, dst_chat_id, dst_msg_id)
                     _forward_outcome_update(source_chat_id, int(msg.message_id), dst_chat_id=int(dst_chat_id), dst_state="delivered", dst_msg_id=int(dst_msg_id))
-                    try:
-                        _persist_forward_index_in_data(data)
-                        save_data(data, root_only=True)
-                    except Exception as e:
-                        log_error(f"[FORWARD LINK DURABLE initial slash] {source_chat_id}:{msg.message_id}->{dst_chat_id}:{dst_msg_id}: {e}")
                     owner_id = msg.from_user.id if getattr(msg, "from_user", None) else 0
                     initial_slash_synced_rec = sync_forwarded_finance_message(
                         int(dst_chat_id), int(dst_msg_id), text_for_finance, owner_id, source_msg=msg
@@ -1972,12 +2234,7 @@ def _forward_single_to_target(source_chat_id: int, msg, dst_chat_id: int, financ
 
     _store_forward_link(source_chat_id, msg.message_id, dst_chat_id, dst_msg_id)
     _forward_outcome_update(source_chat_id, int(msg.message_id), dst_chat_id=int(dst_chat_id), dst_state="delivered", dst_msg_id=int(dst_msg_id))
-    # После успешной Telegram-доставки индекс фиксируем сразу, не ждём debounce 0.25с.
-    try:
-        _persist_forward_index_in_data(data)
-        save_data(data, root_only=True)
-    except Exception as e:
-        log_error(f"[FORWARD LINK DURABLE] {source_chat_id}:{msg.message_id}->{dst_chat_id}:{dst_msg_id}: {e}")
+    # v199: связь уже закоммичена в SQLite forward_links внутри _store_forward_link — root не переписываем.
     bump_quick_balance_recreate_counter(dst_chat_id)
 
     if finance_enabled and text_for_finance:
@@ -179,6 +179,8 @@ def _load_currency_ledger(store: dict, ledger: str) -> None:
     ledger = "usd" if str(ledger).lower() == "usd" else "ars"
     store["records"] = copy.deepcopy(store.get(f"{ledger}_records", []) or [])
     store["daily_records"] = copy.deepcopy(store.get(f"{ledger}_daily_records", {}) or {})
+    if getattr(store, "_chat_id", None) is not None:
+        delta_track_chat_full(store._chat_id, "currency_ledger_switch")
     store["balance"] = float(store.get(f"{ledger}_balance", 0) or 0)
     store["next_id"] = int(store.get(f"{ledger}_next_id", 1) or 1)
     store.setdefault("settings", {})["_active_currency_ledger"] = ledger
@@ -595,7 +597,11 @@ def build_remaining_text(chat_id: int, day_key: str, with_gomonk: bool | None =
         if callable(canonical_open) and callable(canonical_range) and callable(canonical_all):
             running = float(canonical_open(int(chat_id), "usd", str(day_key), 0, False))
             day_records = list(canonical_range(int(chat_id), "usd", str(day_key), str(day_key)) or [])
-            current_balance = sum(float(r.get("_v151_amount", 0) or 0) for r in (canonical_all(int(chat_id), "usd") or []))
+            canonical_total = globals().get("finance_balance_total")
+            if callable(canonical_total):
+                current_balance = float(canonical_total(int(chat_id), "usd"))
+            else:
+                current_balance = sum(float(r.get("_v151_amount", 0) or 0) for r in (canonical_all(int(chat_id), "usd") or []))
             canonical_mode = True
         else:
             running = 0.0
@@ -818,6 +824,7 @@ def ensure_usd_migration_for_chat(chat_id: int) -> int:
                 rec["usd_only"] = True
                 rec["source_finance_text"] = f"И {fmt_num_compact(abs(old_amount))}+к"
                 rec["amount"] = 0.0
+                delta_track_record(int(chat_id), rec)
                 changed += 1
                 continue
 
@@ -852,6 +859,7 @@ def ensure_usd_migration_for_chat(chat_id: int) -> int:
             # Если строка была только USD или парсер нашёл корректную отдельную ARS-часть, исправляем старое ARS-значение.
             rec["amount"] = float(comp.get("amount", 0) or 0)
             rec["note"] = str(comp.get("note") or rec.get("note") or "")
+            delta_track_record(int(chat_id), rec)
             changed += 1
 
         settings["usd_transactions_migrated_v93"] = True
@@ -872,11 +880,10 @@ def ensure_usd_migration_for_chat(chat_id: int) -> int:
 def usd_records_for_month(chat_id: int, month_key: str) -> list[dict]:
     ensure_usd_migration_for_chat(int(chat_id))
     store = get_chat_store(int(chat_id))
-    records = list(store.get("records", []) or [])
-    key = ("usd_month", int(chat_id), str(month_key)[:7], len(records), int(store.get("next_id", 0) or 0))
+    key = finance_view_key("usd_month", chat_id, store, str(month_key)[:7]) if "finance_view_key" in globals() else None
     def _build():
         rows = []
-        for rec in records:
+        for rec in list(store.get("records", []) or []):
             try:
                 if not _record_day_key(rec).startswith(str(month_key)[:7]):
                     continue
@@ -887,7 +894,7 @@ def usd_records_for_month(chat_id: int, month_key: str) -> list[dict]:
             except Exception:
                 continue
         return sorted(rows, key=record_sort_key)
-    return finance_cache_get(key, _build, ttl=30.0) if "finance_cache_get" in globals() else _build()
+    return finance_cache_get(key, _build, ttl=30.0) if key is not None else _build()
 
 
 def usd_balance_for_chat(chat_id: int) -> float:
@@ -904,11 +911,10 @@ def usd_balance_for_chat(chat_id: int) -> float:
 def usd_records_for_day(chat_id: int, day_key: str) -> list[dict]:
     ensure_usd_migration_for_chat(int(chat_id))
     store = get_chat_store(int(chat_id))
-    records = list(store.get("records", []) or [])
-    key = ("usd_day", int(chat_id), str(day_key), len(records), int(store.get("next_id", 0) or 0))
+    key = finance_view_key("usd_day", chat_id, store, str(day_key)) if "finance_view_key" in globals() else None
     def _build():
         return [r for r in financial_view_records_for_day_store(store, str(day_key)) if abs(float(r.get("usd_amount", 0) or 0)) > 0]
-    return finance_cache_get(key, _build, ttl=20.0) if "finance_cache_get" in globals() else _build()
+    return finance_cache_get(key, _build, ttl=20.0) if key is not None else _build()
 
 
 def render_usd_day_window(chat_id: int, day_key: str):
@@ -1829,16 +1835,27 @@ def _v177_legacy_0179_send_exact_range_export(recipient_chat_id: int, target_cha
         description_column = True if not custom_options else bool(custom_options.get("description_column"))
         annotations_enabled = bool(not custom_options or custom_options.get("comments") or custom_options.get("notes"))
         _file_job_progress("собираю данные", force=True)
-        rows = _exact_export_rows(target_chat_id, start_key, int(start_rid), end_key, int(end_rid))
-        if not rows:
-            send_and_auto_delete(recipient_chat_id, "Нет записей в выбранном точном диапазоне.", 10)
-            return True
         ext = "xlsx" if file_type in {"xlsx", "xlsxstat"} else "csv"
         tmp_name = os.path.join(
             MEGA_LOCAL_TMP_DIR,
             f"exact_export_{target_chat_id}_{int(time.time() * 1000)}.{ext}",
         )
-        if file_type == "xlsxstat":
+        # v199: CSV / OLD-style Excel stream straight from the ledger (export_stream_*).
+        stream_export = globals().get("export_stream_exact_file") if globals().get("EXPORT_STREAMING") else None
+        streamed = callable(stream_export) and (ext == "csv" or (file_type == "xlsx" and excel_style_override == "old" and not force_google))
+        if streamed:
+            info = stream_export(tmp_name, target_chat_id, start_key, int(start_rid), end_key, int(end_rid), ext)
+            if not info["records"]:
+                send_and_auto_delete(recipient_chat_id, "Нет записей в выбранном точном диапазоне.", 10)
+                return True
+        else:
+            rows = _exact_export_rows(target_chat_id, start_key, int(start_rid), end_key, int(end_rid))
+            if not rows:
+                send_and_auto_delete(recipient_chat_id, "Нет записей в выбранном точном диапазоне.", 10)
+                return True
+        if streamed:
+            pass
+        elif file_type == "xlsxstat":
             xlsx_rows = build_exact_category_stats_xlsx_rows(target_chat_id, start_key, int(start_rid), end_key, int(end_rid))
             annotations_override = None
             category_layout = True
@@ -1852,6 +1869,7 @@ def _v177_legacy_0179_send_exact_range_export(recipient_chat_id: int, target_cha
                     annotations_override=(annotations_override if annotations_enabled else {}),
                     include_annotations=annotations_enabled,
                     target_chat_id=target_chat_id,
+                    period_key=f"{start_key}#{int(start_rid)}–{end_key}#{int(end_rid)}",
                 )
                 bot.send_message(recipient_chat_id, f"📊 Google Таблица — статьи, точный период\n\n{sheet_url}", disable_web_page_preview=True)
                 try: file_job_mark_external_delivery("Google Sheets", sheet_url)
@@ -1878,6 +1896,7 @@ def _v177_legacy_0179_send_exact_range_export(recipient_chat_id: int, target_cha
                     annotations_override=(annotations_override if annotations_enabled else {}),
                     include_annotations=annotations_enabled,
                     target_chat_id=target_chat_id,
+                    period_key=f"{start_key}#{int(start_rid)}–{end_key}#{int(end_rid)}",
                 )
                 bot.send_message(recipient_chat_id, f"📊 Google Таблица — точный период\n\n{sheet_url}", disable_web_page_preview=True)
                 try: file_job_mark_external_delivery("Google Sheets", sheet_url)
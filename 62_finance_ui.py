@@ -342,10 +342,12 @@ def delete_selected_usd_records(chat_id: int, day_key: str) -> int:
             deleted += 1
             if abs(float(rec.get("amount", 0) or 0)) <= 0 and bool(rec.get("usd_only", False)):
                 remove_ids.add(rid)
+                delta_track_record(chat_id, None, deleted=True, key=_delta_record_key(rec))
             else:
                 rec["usd_amount"] = 0.0
                 rec["usd_note"] = ""
                 rec["usd_only"] = False
+                delta_track_record(chat_id, rec)
         if remove_ids:
             store["records"] = [r for r in (store.get("records", []) or []) if int(r.get("id", -1)) not in remove_ids]
         for dk, arr in list((store.get("daily_records", {}) or {}).items()):
@@ -455,6 +457,7 @@ def update_record_in_chat(chat_id: int, rid: int, amount: float, note: str, sour
         target["note"] = note
         if source_finance_text is not None:
             target["source_finance_text"] = str(source_finance_text or "").strip()
+        delta_track_record(chat_id, target, ledger=_key)
 
     # Update the matching day mirrors.  For a message-qualified edit update all persistent
     # ledgers containing that exact message; otherwise update only the active day list.
@@ -470,13 +473,13 @@ def update_record_in_chat(chat_id: int, rid: int, amount: float, note: str, sour
                     rec["source_finance_text"] = str(source_finance_text or "").strip()
 
     # Recalculate every touched persistent ledger, then snapshot the active working ledger.
-    store["balance"] = sum(float(r.get("amount", 0) or 0) for r in store.get("records", []) or [])
+    recalc_balance(chat_id, incremental=True)
     for ledger in touched_ledgers:
         if ledger == active:
             continue
         store[f"{ledger}_balance"] = sum(float(r.get("amount", 0) or 0) for r in store.get(f"{ledger}_records", []) or [])
     _snapshot_active_currency_ledger(store, active)
-    rebuild_month_short_ids(chat_id)
+    rebuild_month_short_ids(chat_id, incremental=True)
     rebuild_global_records()
     try:
         for _key, _target in targets:
@@ -514,6 +517,8 @@ def delete_selected_records(chat_id: int, day_key: str) -> int:
         deleted_snapshot = [copy.deepcopy(r) for r in (store.get("records", []) or []) if int(r.get("id", -1)) in selected]
         before = len(store.get("records", []) or [])
         store["records"] = [r for r in (store.get("records", []) or []) if int(r.get("id", -1)) not in selected]
+        for r in deleted_snapshot:
+            delta_track_record(chat_id, None, deleted=True, key=_delta_record_key(r))
 
         daily = store.get("daily_records", {}) or {}
         for dk in list(daily.keys()):
@@ -98,7 +98,7 @@ def _v177_legacy_0206_google_access_token() -> str:
         signature = _google_sign_rs256(signing_input, info["private_key"])
         assertion = signing_input.decode("ascii") + "." + _b64url(signature)
         response = _google_request_guarded(
-            "oauth", requests.post,
+            "oauth", google_http_session().post,
             info.get("token_uri") or "https://oauth2.googleapis.com/token",
             data={"grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer", "assertion": assertion},
             timeout=30, attempts=2,
@@ -156,46 +156,289 @@ except Exception: pass
 _google_spreadsheet_id = _v177_legacy_0207_google_spreadsheet_id
 
 
-def _google_sheet_tab_title(title: str) -> str:
-    """Creates a short unique Google Sheets tab title safe for repeated exports."""
+def _google_sheet_tab_title(title: str, stable_suffix: str | None = None) -> str:
+    """Creates a short unique Google Sheets tab title safe for repeated exports.
+
+    v199: ``stable_suffix`` (период) вместо времени — у пары (чат, период) одна вкладка.
+    """
     base = re.sub(r"[\\/\?\*\[\]:]", " ", str(title or "Статьи"))
     base = re.sub(r"\s+", " ", base).strip(" ' ") or "Статьи"
-    stamp = datetime.now().strftime("%d.%m %H-%M-%S")
+    if stable_suffix:
+        stamp = re.sub(r"\s+", " ", re.sub(r"[\\/\?\*\[\]:]", " ", str(stable_suffix))).strip()
+    else:
+        stamp = datetime.now().strftime("%d.%m %H-%M-%S")
     suffix = f" · {stamp}"
     limit = max(1, 100 - len(suffix))
     return base[:limit].rstrip() + suffix
 
 
-def _v177_legacy_0208_google_sheets_create_category_report(title: str, rows: list[list], layout: str = "category", annotations_override: dict | None = None, include_annotations: bool = True) -> str:
+# ─────────────────────────────────────────────────────────────
+# v199: пул HTTP-сессий Google и инкрементальная синхронизация вкладок
+# ─────────────────────────────────────────────────────────────
+# Раньше каждая выгрузка: новые TLS-соединения (голые requests.get/post), повторный
+# metadata-запрос, новая вкладка и перезапись всех строк.  Теперь у пространства одна
+# requests.Session с пулом соединений, вкладка пары (чат, период) запоминается в
+# tenant_google_config()["sheet_tabs"] вместе с дайджестами строк, и в Google уходит
+# один batchUpdate только с изменившимися диапазонами строк.
+GOOGLE_SHEETS_API_BASE = (os.getenv("GOOGLE_SHEETS_API_BASE", "https://sheets.googleapis.com") or "https://sheets.googleapis.com").rstrip("/")
+GOOGLE_SHEETS_INCREMENTAL = _env_bool("GOOGLE_SHEETS_INCREMENTAL", "1")
+GOOGLE_HTTP_POOL_SIZE = _env_int("GOOGLE_HTTP_POOL_SIZE", 4, 1, 32)
+GOOGLE_SHEETS_TAB_MAP_LIMIT = _env_int("GOOGLE_SHEETS_TAB_MAP_LIMIT", 60, 5, 1000)
+_GOOGLE_HTTP_SESSIONS = {}
+_GOOGLE_HTTP_LOCK = threading.RLock()
+_GOOGLE_SYNC_LOCKS = {}
+_GOOGLE_SYNC_STATS = defaultdict(int)
+
+
+def _google_tenant_key(tenant_id: str | None = None) -> str:
+    if tenant_id:
+        return str(tenant_id)
+    resolver = globals().get("_v149_tenant_id")
+    if callable(resolver):
+        try:
+            return str(resolver() or "platform")
+        except Exception:
+            pass
+    return "platform"
+
+
+def google_http_session(tenant_id: str | None = None):
+    """Одна keep-alive сессия на пространство: TLS-рукопожатие один раз, а не на каждый вызов."""
+    key = _google_tenant_key(tenant_id)
+    with _GOOGLE_HTTP_LOCK:
+        session = _GOOGLE_HTTP_SESSIONS.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=GOOGLE_HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _GOOGLE_HTTP_SESSIONS[key] = session
+            _GOOGLE_SYNC_STATS["sessions_opened"] += 1
+        return session
+
+
+def google_http_session_drop(tenant_id: str | None = None) -> None:
+    """Закрывает сессию пространства (смена Google-аккаунта или отключение)."""
+    with _GOOGLE_HTTP_LOCK:
+        session = _GOOGLE_HTTP_SESSIONS.pop(_google_tenant_key(tenant_id), None)
+    if session is not None:
+        try:
+            session.close()
+        except Exception:
+            pass
+
+
+def _google_sheets_url(spreadsheet_id: str, suffix: str = "") -> str:
+    return f"{GOOGLE_SHEETS_API_BASE}/v4/spreadsheets/{spreadsheet_id}{suffix}"
+
+
+def _google_sheets_access_error(status: int, detail: str, service_email: str, spreadsheet_id: str, what: str = "target") -> RuntimeError:
+    if status in (401, 403):
+        return RuntimeError(
+            "Google Sheets target access 403: сервисный аккаунт не имеет доступа к таблице. "
+            f"Откройте таблицу → Поделиться → добавьте {service_email} как Редактор. "
+            f"spreadsheet_id={spreadsheet_id}; Google: {detail}"
+        )
+    return RuntimeError(f"Google Sheets {what} {status}: {detail}")
+
+
+def _google_row_digest(row: dict) -> str:
+    payload = json.dumps(row, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=6).hexdigest()
+
+
+def _google_changed_ranges(old: list, new: list) -> list[tuple[int, int]]:
+    """Полуоткрытые диапазоны [start, end) строк ``new``, чьи дайджесты отличаются от ``old``."""
+    ranges = []
+    start = None
+    for idx, digest in enumerate(new):
+        changed = idx >= len(old) or old[idx] != digest
+        if changed and start is None:
+            start = idx
+        elif not changed and start is not None:
+            ranges.append((start, idx))
+            start = None
+    if start is not None:
+        ranges.append((start, len(new)))
+    return ranges
+
+
+def _google_sheet_tabs(tenant_id: str) -> dict:
+    cfg_fn = globals().get("tenant_google_config")
+    if callable(cfg_fn):
+        try:
+            cfg = cfg_fn(tenant_id)
+            tabs = cfg.get("sheet_tabs")
+            if not isinstance(tabs, dict):
+                tabs = cfg["sheet_tabs"] = {}
+            return tabs
+        except Exception:
+            pass
+    return data.setdefault("_global_settings", {}).setdefault("google_sheet_tabs_v199", {}).setdefault(str(tenant_id), {})
+
+
+def _google_sheet_find_tab(session, spreadsheet_id: str, headers: dict, title: str) -> dict | None:
+    meta = _google_request_guarded(
+        "sync_metadata", session.get, _google_sheets_url(spreadsheet_id), headers=headers,
+        params={"fields": "sheets.properties(sheetId,title,gridProperties)"}, timeout=45, attempts=2,
+    )
+    _GOOGLE_SYNC_STATS["http_requests"] += 1
+    if meta.status_code >= 300:
+        return None
+    for sheet in meta.json().get("sheets") or []:
+        props = sheet.get("properties") or {}
+        if str(props.get("title") or "") == title:
+            return props
+    return None
+
+
+def google_sheets_sync_tab(sync_key: tuple, spreadsheet_id: str, headers: dict, tab_title: str, cell_rows: list[dict],
+                           max_cols: int, frozen_rows: int = 0, on_create=None, service_email: str = "") -> tuple[int, dict]:
+    """Записывает ``cell_rows`` во вкладку пары (чат, период) и возвращает (sheetId, итог).
+
+    ``sync_key`` = (tenant_id, chat_id, period_key).  Первая запись создаёт вкладку
+    (или находит одноимённую) и пишет всё; дальше один batchUpdate с изменившимися
+    диапазонами строк, очисткой хвоста и расширением сетки.  Без изменений — ни одного
+    HTTP-запроса.  ``on_create(sheet_id)`` добавляет разовые запросы (ширины колонок).
+    Итог: mode full/delta/noop, rows, ranges [(start, end)] (0-based, для проверки notes).
+    """
+    tenant_id, chat_id, period_key = str(sync_key[0]), int(sync_key[1]), str(sync_key[2])
+    map_key = f"{chat_id}:{period_key}"
+    session = google_http_session(tenant_id)
+    url = _google_sheets_url(spreadsheet_id, ":batchUpdate")
+    with _GOOGLE_HTTP_LOCK:
+        lock = _GOOGLE_SYNC_LOCKS.setdefault((tenant_id, map_key), threading.RLock())
+    with lock:
+        tabs = _google_sheet_tabs(tenant_id)
+        digests = [_google_row_digest(row) for row in cell_rows]
+        row_need = max(100, len(cell_rows) + 20)
+        col_need = max(26, max_cols + 3)
+        for attempt in (0, 1):
+            entry = tabs.get(map_key)
+            if not isinstance(entry, dict) or entry.get("spreadsheet_id") != spreadsheet_id:
+                entry = None
+            reqs = []
+            if entry is None:
+                props = None
+                add = _google_request_guarded(
+                    "sync_add_sheet", session.post, url, headers=headers,
+                    json={"requests": [{"addSheet": {"properties": {"title": tab_title, "gridProperties": {
+                        "rowCount": row_need, "columnCount": col_need, "frozenRowCount": frozen_rows}}}}]},
+                    timeout=60, attempts=1,
+                )
+                _GOOGLE_SYNC_STATS["http_requests"] += 1
+                if add.status_code < 300:
+                    try:
+                        props = add.json()["replies"][0]["addSheet"]["properties"]
+                    except Exception as exc:
+                        raise RuntimeError(f"Google Sheets API не вернул sheetId новой вкладки: {exc}")
+                elif add.status_code == 400 and "already exists" in add.text:
+                    # Вкладка с этим названием уже есть (карта потеряна при restore): берём её.
+                    props = _google_sheet_find_tab(session, spreadsheet_id, headers, tab_title)
+                if not props:
+                    raise _google_sheets_access_error(add.status_code, add.text[:700], service_email, spreadsheet_id, "add tab")
+                grid = props.get("gridProperties") or {}
+                entry = {"spreadsheet_id": spreadsheet_id, "sheet_id": int(props["sheetId"]), "title": tab_title,
+                         "grid_rows": int(grid.get("rowCount") or row_need), "grid_cols": int(grid.get("columnCount") or col_need),
+                         "frozen": int(grid.get("frozenRowCount") or 0), "digests": []}
+                ranges = [(0, len(cell_rows))] if cell_rows else []
+                if add.status_code >= 300:
+                    reqs.append({"updateCells": {"range": {"sheetId": entry["sheet_id"]}, "fields": "userEnteredValue,note,userEnteredFormat"}})
+                if callable(on_create):
+                    reqs_after = list(on_create(entry["sheet_id"]) or [])
+                else:
+                    reqs_after = []
+                mode = "full"
+            else:
+                ranges = _google_changed_ranges(list(entry.get("digests") or []), digests)
+                reqs_after = []
+                mode = "delta"
+            sheet_id = int(entry["sheet_id"])
+            grid_props, grid_fields = {}, []
+            if len(cell_rows) > int(entry.get("grid_rows") or 0):
+                grid_props["rowCount"] = row_need; grid_fields.append("gridProperties.rowCount")
+            if max_cols > int(entry.get("grid_cols") or 0):
+                grid_props["columnCount"] = col_need; grid_fields.append("gridProperties.columnCount")
+            if int(entry.get("frozen") or 0) != int(frozen_rows):
+                grid_props["frozenRowCount"] = int(frozen_rows); grid_fields.append("gridProperties.frozenRowCount")
+            if grid_fields:
+                reqs.insert(0, {"updateSheetProperties": {"properties": {"sheetId": sheet_id, "gridProperties": grid_props},
+                                                          "fields": ",".join(grid_fields)}})
+            for start, end in ranges:
+                reqs.append({"updateCells": {"range": {"sheetId": sheet_id, "startRowIndex": start, "startColumnIndex": 0},
+                                             "rows": cell_rows[start:end], "fields": "userEnteredValue,note,userEnteredFormat"}})
+            old_len = len(entry.get("digests") or [])
+            if mode == "delta" and old_len > len(cell_rows):
+                reqs.append({"updateCells": {"range": {"sheetId": sheet_id, "startRowIndex": len(cell_rows), "endRowIndex": old_len},
+                                             "fields": "userEnteredValue,note,userEnteredFormat"}})
+            reqs.extend(reqs_after)
+            if not reqs:
+                _GOOGLE_SYNC_STATS["noop"] += 1
+                entry["at"] = time.time()
+                return sheet_id, {"mode": "noop", "rows": 0, "ranges": []}
+            update = _google_request_guarded("sync_update", session.post, url, headers=headers, json={"requests": reqs},
+                                             timeout=90, attempts=1)
+            _GOOGLE_SYNC_STATS["http_requests"] += 1
+            if update.status_code >= 300:
+                # Вкладку удалили руками: забываем её и один раз пишем заново.
+                if mode == "delta" and attempt == 0 and update.status_code == 400 and str(sheet_id) in update.text:
+                    tabs.pop(map_key, None)
+                    _GOOGLE_SYNC_STATS["tab_lost"] += 1
+                    continue
+                raise _google_sheets_access_error(update.status_code, update.text[:700], service_email, spreadsheet_id, "update")
+            entry.update(digests=digests, frozen=int(frozen_rows), at=time.time(),
+                         grid_rows=max(int(entry.get("grid_rows") or 0), row_need if "gridProperties.rowCount" in grid_fields else 0),
+                         grid_cols=max(int(entry.get("grid_cols") or 0), col_need if "gridProperties.columnCount" in grid_fields else 0))
+            tabs[map_key] = entry
+            if len(tabs) > GOOGLE_SHEETS_TAB_MAP_LIMIT:
+                for old_key, _row in sorted(tabs.items(), key=lambda kv: float((kv[1] or {}).get("at") or 0))[:len(tabs) - GOOGLE_SHEETS_TAB_MAP_LIMIT]:
+                    tabs.pop(old_key, None)
+            changed = sum(end - start for start, end in ranges)
+            _GOOGLE_SYNC_STATS[mode] += 1
+            _GOOGLE_SYNC_STATS["rows_written"] += changed
+            _GOOGLE_SYNC_STATS["rows_skipped"] += max(0, len(cell_rows) - changed)
+            return sheet_id, {"mode": mode, "rows": changed, "ranges": ranges}
+    raise RuntimeError("Google Sheets sync: вкладка потеряна повторно")
+
+
+def google_sheets_sync_stats() -> dict:
+    with _GOOGLE_HTTP_LOCK:
+        row = dict(_GOOGLE_SYNC_STATS)
+        row["sessions"] = len(_GOOGLE_HTTP_SESSIONS)
+    row["enabled"] = bool(GOOGLE_SHEETS_INCREMENTAL)
+    return row
+
+
+def _v177_legacy_0208_google_sheets_create_category_report(title: str, rows: list[list], layout: str = "category", annotations_override: dict | None = None, include_annotations: bool = True, sync_key: tuple | None = None) -> str:
     """v129: writes a category report to a NEW TAB in an existing owner-shared spreadsheet.
 
     The service account does not create/own a Drive file. The owner creates one spreadsheet once
     and shares it to the service-account client_email as Editor. Each export adds a new sheet tab
     and writes descriptions into native Google Sheets CellData.note.
+
+    v199: с ``sync_key`` = (tenant, chat, период) вкладка пары переиспользуется, и пишутся
+    только изменившиеся строки (google_sheets_sync_tab).
     """
     token = _google_access_token()
     info = _google_service_account_info()
     service_email = str(info.get("client_email") or "").strip()
     spreadsheet_id = _google_spreadsheet_id()
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    session = google_http_session()
+    incremental = bool(sync_key and GOOGLE_SHEETS_INCREMENTAL)
 
     # First verify that this service account can actually open the shared spreadsheet.
-    meta = _google_request_guarded(
-        "metadata", requests.get,
-        f"https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}",
-        headers=headers,
-        params={"fields": "spreadsheetId,properties.title,sheets.properties(sheetId,title)"},
-        timeout=45, attempts=2,
-    )
-    if meta.status_code >= 300:
-        detail = meta.text[:700]
-        if meta.status_code in (401, 403):
-            raise RuntimeError(
-                "Google Sheets target access 403: сервисный аккаунт не имеет доступа к таблице. "
-                f"Откройте таблицу → Поделиться → добавьте {service_email} как Редактор. "
-                f"spreadsheet_id={spreadsheet_id}; Google: {detail}"
-            )
-        raise RuntimeError(f"Google Sheets target {meta.status_code}: {detail}")
+    # v199: в инкрементальном режиме доступ проверяет сам batchUpdate (тот же текст ошибки).
+    if not incremental:
+        meta = _google_request_guarded(
+            "metadata", session.get,
+            _google_sheets_url(spreadsheet_id),
+            headers=headers,
+            params={"fields": "spreadsheetId,properties.title,sheets.properties(sheetId,title)"},
+            timeout=45, attempts=2,
+        )
+        if meta.status_code >= 300:
+            raise _google_sheets_access_error(meta.status_code, meta.text[:700], service_email, spreadsheet_id)
 
     layout = str(layout or "category").strip().lower()
     if layout == "compact":
@@ -211,30 +454,33 @@ def _v177_legacy_0208_google_sheets_create_category_report(title: str, rows: lis
     max_cols = max((len(row) for row in rows), default=1)
     row_count = max(100, len(rows) + 20)
     col_count = max(26, max_cols + 3)
-    tab_title = _google_sheet_tab_title(title)
-
-    # Add a fresh tab to the existing spreadsheet. The returned sheetId is then used for updates.
-    add_sheet = _google_request_guarded(
-        "add_sheet", requests.post,
-        f"https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}:batchUpdate",
-        headers=headers,
-        json={"requests": [{"addSheet": {"properties": {
-            "title": tab_title,
-            "gridProperties": {
-                "rowCount": row_count,
-                "columnCount": col_count,
-                "frozenRowCount": 1 if layout in {"compact", "category_compact"} else 2,
-            },
-        }}}]},
-        timeout=60, attempts=1,
-    )
-    if add_sheet.status_code >= 300:
-        raise RuntimeError(f"Google Sheets add tab {add_sheet.status_code}: {add_sheet.text[:700]}")
-    add_payload = add_sheet.json()
-    try:
-        sheet_id = int(add_payload["replies"][0]["addSheet"]["properties"]["sheetId"])
-    except Exception as exc:
-        raise RuntimeError(f"Google Sheets API не вернул sheetId новой вкладки: {exc}")
+    frozen_rows = 1 if layout in {"compact", "category_compact"} else 2
+    tab_title = _google_sheet_tab_title(title, stable_suffix=(str(sync_key[2]) if incremental else None))
+
+    sheet_id = None
+    if not incremental:
+        # Add a fresh tab to the existing spreadsheet. The returned sheetId is then used for updates.
+        add_sheet = _google_request_guarded(
+            "add_sheet", session.post,
+            _google_sheets_url(spreadsheet_id, ":batchUpdate"),
+            headers=headers,
+            json={"requests": [{"addSheet": {"properties": {
+                "title": tab_title,
+                "gridProperties": {
+                    "rowCount": row_count,
+                    "columnCount": col_count,
+                    "frozenRowCount": frozen_rows,
+                },
+            }}}]},
+            timeout=60, attempts=1,
+        )
+        if add_sheet.status_code >= 300:
+            raise RuntimeError(f"Google Sheets add tab {add_sheet.status_code}: {add_sheet.text[:700]}")
+        add_payload = add_sheet.json()
+        try:
+            sheet_id = int(add_payload["replies"][0]["addSheet"]["properties"]["sheetId"])
+        except Exception as exc:
+            raise RuntimeError(f"Google Sheets API не вернул sheetId новой вкладки: {exc}")
 
     cell_rows = []
     for r_idx, row in enumerate(rows, start=1):
@@ -272,31 +518,38 @@ def _v177_legacy_0208_google_sheets_create_category_report(title: str, rows: lis
             values.append(cell)
         cell_rows.append({"values": values})
 
-    requests_payload = [{
-        "updateCells": {
-            "range": {"sheetId": sheet_id, "startRowIndex": 0, "startColumnIndex": 0},
-            "rows": cell_rows,
-            "fields": "userEnteredValue,note,userEnteredFormat",
-        }
-    }, {
-        "autoResizeDimensions": {
-            "dimensions": {
-                "sheetId": sheet_id,
-                "dimension": "COLUMNS",
-                "startIndex": 0,
-                "endIndex": max_cols,
+    def _autoresize(sid):
+        return [{"autoResizeDimensions": {"dimensions": {"sheetId": sid, "dimension": "COLUMNS", "startIndex": 0, "endIndex": max_cols}}}]
+
+    verify_rows = (1, max(1, len(rows)))
+    if incremental:
+        sheet_id, sync = google_sheets_sync_tab(
+            sync_key, spreadsheet_id, headers, tab_title, cell_rows, max_cols,
+            frozen_rows=frozen_rows, on_create=_autoresize, service_email=service_email,
+        )
+        if not sync["ranges"]:
+            annotations = {}
+        else:
+            # Проверяем примечания только в переписанных строках.
+            verify_rows = (sync["ranges"][0][0] + 1, sync["ranges"][-1][1])
+            annotations = {(r, c): note for (r, c), note in annotations.items() if verify_rows[0] <= r <= verify_rows[1]}
+    else:
+        requests_payload = [{
+            "updateCells": {
+                "range": {"sheetId": sheet_id, "startRowIndex": 0, "startColumnIndex": 0},
+                "rows": cell_rows,
+                "fields": "userEnteredValue,note,userEnteredFormat",
             }
-        }
-    }]
-    update = _google_request_guarded(
-        "update_sheet", requests.post,
-        f"https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}:batchUpdate",
-        headers=headers,
-        json={"requests": requests_payload},
-        timeout=90, attempts=1,
-    )
-    if update.status_code >= 300:
-        raise RuntimeError(f"Google Sheets update {update.status_code}: {update.text[:700]}")
+        }] + _autoresize(sheet_id)
+        update = _google_request_guarded(
+            "update_sheet", session.post,
+            _google_sheets_url(spreadsheet_id, ":batchUpdate"),
+            headers=headers,
+            json={"requests": requests_payload},
+            timeout=90, attempts=1,
+        )
+        if update.status_code >= 300:
+            raise RuntimeError(f"Google Sheets update {update.status_code}: {update.text[:700]}")
 
     # Read back notes only: success means the real Google Sheet contains native notes,
     # not merely that our request returned HTTP 200.
@@ -307,12 +560,12 @@ def _v177_legacy_0208_google_sheets_create_category_report(title: str, rows: lis
     }
     if expected_notes:
         verify = _google_request_guarded(
-            "verify_notes", requests.get,
-            f"https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}",
+            "verify_notes", session.get,
+            _google_sheets_url(spreadsheet_id),
             headers=headers,
             params={
                 "includeGridData": "true",
-                "ranges": f"'{tab_title.replace(chr(39), chr(39)*2)}'!A1:{_xlsx_col_name(max_cols)}{max(1, len(rows))}",
+                "ranges": f"'{tab_title.replace(chr(39), chr(39)*2)}'!A{verify_rows[0]}:{_xlsx_col_name(max_cols)}{verify_rows[1]}",
                 "fields": "sheets(data(rowData(values(note))))",
             },
             timeout=60, attempts=2,
@@ -322,7 +575,7 @@ def _v177_legacy_0208_google_sheets_create_category_report(title: str, rows: lis
         actual_notes = {}
         try:
             row_data = (((verify.json().get("sheets") or [{}])[0].get("data") or [{}])[0].get("rowData") or [])
-            for r0, row_obj in enumerate(row_data, start=1):
+            for r0, row_obj in enumerate(row_data, start=verify_rows[0]):
                 for c0, cell in enumerate(row_obj.get("values") or [], start=1):
                     note = str(cell.get("note") or "").strip()
                     if note:
@@ -369,7 +622,8 @@ def _v177_legacy_0209_send_export_for_chat_to(recipient_chat_id: int, target_cha
 
         # v194: never use the stale prebuilt raw CSV shortcut.  All visible
         # financial tables must pass through the canonical ARS/USD projection.
-        if delivery == "chat" and mode == "all" and file_type == "xlsx" and not financial_view_is_usd(get_chat_store(target_chat_id)) and (excel_style_override == "old" and not custom_options and not force_google):
+        # v199: with streaming export on, a fresh one-pass workbook is cheaper than save_chat_json.
+        if delivery == "chat" and mode == "all" and file_type == "xlsx" and not globals().get("EXPORT_STREAMING") and not financial_view_is_usd(get_chat_store(target_chat_id)) and (excel_style_override == "old" and not custom_options and not force_google):
             save_chat_json(target_chat_id)
             path = chat_xlsx_file(target_chat_id) if file_type == "xlsx" else chat_csv_file(target_chat_id)
             label = "за всё время"
@@ -387,21 +641,35 @@ def _v177_legacy_0209_send_export_for_chat_to(recipient_chat_id: int, target_cha
                 )
                 return True
 
-        rows, label = _period_export_rows(target_chat_id, mode, day_key)
         ext = "xlsx" if file_type in {"xlsx", "xlsxstat"} else "csv"
-        if not rows and ext != "xlsx":
-            send_info(recipient_chat_id, f"Нет данных {label}.")
-            try: file_job_mark_external_delivery("info", "no_data")
-            except Exception: pass
-            return True
         tmp_name = os.path.join(MEGA_LOCAL_TMP_DIR, f"export_{target_chat_id}_{mode}_{int(time.time() * 1000)}.{ext}")
+        # v199: CSV and OLD-style Excel are written in one streaming pass over the ledger
+        # (export_stream_*); the styled/category layouts keep the list builders below.
+        stream_export = globals().get("export_stream_period_file") if globals().get("EXPORT_STREAMING") else None
+        streamed = callable(stream_export) and (ext == "csv" or (file_type == "xlsx" and excel_style_override == "old" and not force_google))
+        if streamed:
+            info, label = stream_export(tmp_name, target_chat_id, mode, day_key, ext)
+            if not info["records"] and ext != "xlsx":
+                send_info(recipient_chat_id, f"Нет данных {label}.")
+                try: file_job_mark_external_delivery("info", "no_data")
+                except Exception: pass
+                return True
+        else:
+            rows, label = _period_export_rows(target_chat_id, mode, day_key)
+            if not rows and ext != "xlsx":
+                send_info(recipient_chat_id, f"Нет данных {label}.")
+                try: file_job_mark_external_delivery("info", "no_data")
+                except Exception: pass
+                return True
         if file_type == "xlsxstat":
             safe_chat = mega_safe_name(get_chat_display_name(target_chat_id), "chat")
             display_name = f"{safe_chat}_{mode}_{day_key}_excel_статьи.xlsx"
         else:
             display_name = export_display_filename(target_chat_id, mode, day_key, ext)
 
-        if file_type == "xlsxstat":
+        if streamed:
+            pass
+        elif file_type == "xlsxstat":
             store = get_chat_store(target_chat_id)
             start_key, end_key = _period_export_bounds(store, mode, day_key)
             xlsx_rows = build_exact_category_stats_xlsx_rows(target_chat_id, start_key, 0, end_key, 0)
@@ -418,6 +686,7 @@ def _v177_legacy_0209_send_export_for_chat_to(recipient_chat_id: int, target_cha
                     annotations_override=(annotations_override if annotations_enabled else {}),
                     include_annotations=annotations_enabled,
                     target_chat_id=target_chat_id,
+                    period_key=f"{start_key}–{end_key}",
                 )
                 bot.send_message(
                     recipient_chat_id,
@@ -451,6 +720,7 @@ def _v177_legacy_0209_send_export_for_chat_to(recipient_chat_id: int, target_cha
                     annotations_override=(annotations_override if annotations_enabled else {}),
                     include_annotations=annotations_enabled,
                     target_chat_id=target_chat_id,
+                    period_key=f"{start_key}–{end_key}",
                 )
                 bot.send_message(
                     recipient_chat_id,
@@ -828,7 +828,7 @@ def all_task_pool_stats() -> list[dict]:
         WEBHOOK_TASK_POOL.stats(), UI_TASK_POOL.stats(), CALLBACK_ACK_TASK_POOL.stats(),
         RECOVERY_TASK_POOL.stats(), REMINDER_TASK_POOL.stats(),
         FINANCE_TASK_POOL.stats(), FIN_FORWARD_TASK_POOL.stats(), FORWARD_TASK_POOL.stats(),
-        DELTA_TASK_POOL.stats(), BACKUP_TASK_POOL.stats(), EXPORT_TASK_POOL.stats(), GENERAL_TASK_POOL.stats(),
+        DELTA_TASK_POOL.stats(), BACKUP_TASK_POOL.stats(), EXPORT_TASK_POOL.stats(), TRANSCODE_TASK_POOL.stats(), GENERAL_TASK_POOL.stats(),
         MAINTENANCE_TASK_POOL.stats(), JOURNAL_TASK_POOL.stats(), DELAYED_TASK_POOL.stats(), DOZVON_TASK_POOL.stats(),
     ]
 
@@ -839,7 +839,9 @@ def build_queue_status_text() -> str:
         lines.append(
             f"{st['name']}: {st['active']}/{st['workers']} работают, "
             f"ожидают {st['pending']}, ключей {st['keys']}, "
-            f"отказов {st['rejected']}, ошибок {st['failed']}, max ожидание {st['max_wait']}с"
+            f"отказов {st['rejected']}, ошибок {st['failed']}, max ожидание {st['max_wait']}с; "
+            f"ожидание p50/p95/p99 {st.get('wait_p50_ms', 0):.0f}/{st.get('wait_p95_ms', 0):.0f}/{st.get('wait_p99_ms', 0):.0f} мс, "
+            f"выполнение p95 {st.get('run_p95_ms', 0):.0f} мс"
         )
     with timer_lock:
         lines.append("")
@@ -869,8 +871,27 @@ def build_queue_status_text() -> str:
     )
     if mts.get('last_error'):
         lines.append(f"Последняя ошибка MEGA task: {str(mts.get('last_error'))[:180]}")
+    try:
+        gst = mega_task_group_stats()
+        if gst.get("enabled"):
+            pend, tomb = gst.get("pending") or {}, gst.get("tombstones") or {}
+            lines.append(
+                f"MEGA group commit: сегментов {gst.get('segments', 0)}, пакетов {pend.get('batches', 0)} "
+                f"(задач {pend.get('items', 0)}, макс {pend.get('max_batch', 0)}), tombstone-пакетов {tomb.get('batches', 0)}, "
+                f"ошибок {pend.get('errors', 0) + tomb.get('errors', 0)}"
+            )
+    except Exception:
+        pass
+    try:
+        lines.extend(MEGA_SESSION.status_lines())
+    except Exception:
+        pass
     lines.append(f"Excel-бэкап всех чатов: {backup_excel_all_label()}")
     lines.append(f"Telegram общий интервал: {TELEGRAM_GLOBAL_MIN_GAP:.3f}с")
+    try:
+        lines.extend(TELEGRAM_RATE_SCHEDULER.status_lines())
+    except Exception:
+        pass
     return "\n".join(lines)
 
 
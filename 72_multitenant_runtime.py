@@ -386,11 +386,14 @@ def _finance_changed_now(chat_id: int, day_key: str | None = None, reason: str =
         store = get_chat_store(chat_id)
         # v189: business finalization must NEVER move the user's selected/main window day.
         # day_key is the mutation day only; canonical UI day is owned by the last main window.
-        _safe_stabilize("normalize_chat_records", lambda: normalize_chat_records(chat_id))
-        _safe_stabilize("recalc_balance", lambda: recalc_balance(chat_id))
-        _safe_stabilize("rebuild_month_short_ids", lambda: rebuild_month_short_ids(chat_id))
+        # v199: incremental — ставятся только записи, изменённые с прошлого normalize; полный проход в фоне.
+        _safe_stabilize("normalize_chat_records", lambda: normalize_chat_records(chat_id, incremental=True))
+        _safe_stabilize("recalc_balance", lambda: recalc_balance(chat_id, incremental=True))
+        _safe_stabilize("rebuild_month_short_ids", lambda: rebuild_month_short_ids(chat_id, incremental=True))
         _safe_stabilize("rebuild_global_records", rebuild_global_records)
         _safe_stabilize("currency_ledger_snapshot", lambda: _snapshot_active_currency_ledger(store, _ensure_currency_ledgers(store)))
+        # v199: flush финализации сверяет отпечатки строк finance_records с RAM (правки мимо delta_track_record).
+        _safe_stabilize("finance_rows_check", lambda: finance_rows_check(chat_id))
         _safe_stabilize("save_data", lambda: save_data(data, chat_ids=[chat_id]))
     # Critical protection first; UI is explicitly detached and cannot delay durable completion.
     _safe_stabilize("delta_queue_early", lambda: schedule_quick_backup(chat_id, MEGA_DELTA_PRIORITY_DELAY_SECONDS if mega_backup_priority_enabled() else MEGA_DELTA_DELAY_SECONDS))
@@ -488,7 +491,6 @@ def _persist_forward_finance_delivery_now(src_chat_id: int, src_msg_id: int, dst
                 for rr in arr or []:
                     if isinstance(rr, dict) and rr.get("id") == rid:
                         rr.update(tags)
-        _persist_forward_index_in_data(data)
         save_data(data, chat_ids=[int(dst_chat_id)])
         schedule_quick_backup(int(dst_chat_id), 0.5)
         with _FIN_FORWARD_BATCH_LOCK:
@@ -617,11 +619,17 @@ def _v146_load_failed_task_detail(key: str, row: dict) -> dict:
     local = None
     try:
         remote = str((row or {}).get("path") or mega_task_remote_path(key, "failed"))
-        local = _mega_download_remote_path(remote)
-        if not local:
-            raise RuntimeError("failed task file download returned empty")
-        with open(local, "r", encoding="utf-8") as fh:
-            task = json.load(fh)
+        if "_mega_task_is_segment_path" in globals() and _mega_task_is_segment_path(remote):
+            # v199: group-commit task lives inside a segment file.
+            task = mega_task_load_remote(key, remote)
+            if not task:
+                raise RuntimeError("failed task not found in segment")
+        else:
+            local = _mega_download_remote_path(remote)
+            if not local:
+                raise RuntimeError("failed task file download returned empty")
+            with open(local, "r", encoding="utf-8") as fh:
+                task = json.load(fh)
         payload = task.get("payload") or {}
         expected = _durable_expected_from_task_or_payload(task, payload)
         report = _durable_effect_report(payload, expected)
@@ -1020,7 +1028,10 @@ def tenant_current_id(chat_id: int | None = None) -> str:
 
 def tenant_create(name: str, owner_user_id: int, root_chat_id: int, created_by: int = 0, deterministic_chat_id: int | None = None) -> str:
     root = _tenants_root()
-    with _TENANT_LOCK:
+    # v199: data_lock берётся раньше _TENANT_LOCK — тот же порядок, что у get_chat_store →
+    # is_owner_chat → _tenants_root.  Иначе tenant_bind_chat под _TENANT_LOCK ждёт data_lock,
+    # а get_chat_store другого потока ждёт _TENANT_LOCK (deadlock на первом update нового чата).
+    with data_lock, _TENANT_LOCK:
         if deterministic_chat_id is not None:
             seed = hashlib.sha256(f"chat:{int(deterministic_chat_id)}".encode("utf-8")).hexdigest()[:12]
             tid = f"chat_{seed}"
@@ -2370,7 +2381,7 @@ def tenant_v148_enforce_forward_isolation() -> int:
 def tenant_v148_bootstrap() -> dict:
     root = _tenants_root()
     report = {"created": 0, "bound": 0, "legacy_owners": 0, "reminders_tagged": 0, "cross_links_removed": 0}
-    with _TENANT_LOCK:
+    with data_lock, _TENANT_LOCK:
         if TENANT_PLATFORM_ID not in root["tenants"]:
             root["tenants"][TENANT_PLATFORM_ID] = _tenant_normalize(TENANT_PLATFORM_ID, {
                 "name": "Основное пространство владельца",
@@ -2681,6 +2692,8 @@ def tenant_google_set_credentials(tenant_id: str, raw: str, actor_user_id: int)
         for key in list(_V149_GOOGLE_TOKEN_CACHE):
             if str(key).startswith(str(tenant_id) + ":"):
                 _V149_GOOGLE_TOKEN_CACHE.pop(key, None)
+    try: google_http_session_drop(tid)
+    except Exception: pass
     tenant_google_history(tenant_id, "account_connected", "Google service account подключён", ok=True)
     tenant_google_persist(tid, "tenant_google_update")
     return info
@@ -2812,7 +2825,7 @@ def _google_access_token(tenant_id: str | None = None) -> str:
         signature = _google_sign_rs256(signing_input, info["private_key"])
         assertion = signing_input.decode("ascii") + "." + _b64url(signature)
         response = _google_request_guarded(
-            "oauth", requests.post,
+            "oauth", google_http_session(tid).post,
             info.get("token_uri") or "https://oauth2.googleapis.com/token",
             data={"grant_type": "urn:ietf:params:oauth:grant-type:jwt-bearer", "assertion": assertion},
             timeout=30, attempts=2,
@@ -2827,7 +2840,8 @@ def _google_access_token(tenant_id: str | None = None) -> str:
         return token
 
 
-def _google_sheets_create_category_report(title: str, rows: list[list], layout: str = "category", annotations_override: dict | None = None, include_annotations: bool = True, tenant_id: str | None = None, target_chat_id: int | None = None) -> str:
+def _google_sheets_create_category_report(title: str, rows: list[list], layout: str = "category", annotations_override: dict | None = None, include_annotations: bool = True, tenant_id: str | None = None, target_chat_id: int | None = None, period_key: str | None = None) -> str:
+    """v199: ``period_key`` + ``target_chat_id`` → одна вкладка на (чат, период), запись только изменений."""
     if not callable(_V149_BASE_GOOGLE_SHEETS_CREATE):
         raise RuntimeError("Модуль Google Sheets не загружен")
     tid = _v149_tenant_id(tenant_id, target_chat_id)
@@ -2842,6 +2856,7 @@ def _google_sheets_create_category_report(title: str, rows: list[list], layout:
                 title, rows, layout=layout,
                 annotations_override=annotations_override,
                 include_annotations=include_annotations,
+                sync_key=((tid, int(target_chat_id), str(period_key)) if period_key and target_chat_id is not None else None),
             )
         tenant_google_history(tid, "sheets_export", title, ok=True, chat_id=target_chat_id or 0, url=url)
         tenant_google_persist(tid, "tenant_google_update")
@@ -2870,7 +2885,7 @@ def tenant_google_upload_export(local_path: str, display_name: str, target_chat_
     try:
         with open(local_path, "rb") as fh:
             response = _google_request_guarded(
-                "drive_upload", requests.post,
+                "drive_upload", google_http_session(tid).post,
                 "https://www.googleapis.com/upload/drive/v3/files",
                 headers=headers,
                 params={"uploadType": "multipart", "fields": "id,name,webViewLink,parents"},
@@ -2905,7 +2920,7 @@ def tenant_google_create_spreadsheet(tenant_id: str, title: str = "Финанс
         "appProperties": {"tenant_id": tid},
     }
     response = _google_request_guarded(
-        "drive_create_sheet", requests.post,
+        "drive_create_sheet", google_http_session(tid).post,
         "https://www.googleapis.com/drive/v3/files",
         headers=headers,
         params={"fields": "id,name,webViewLink,parents"},
@@ -2936,7 +2951,7 @@ def tenant_google_test(tenant_id: str) -> tuple[bool, str]:
         folder_id = str(tenant_google_config(tid).get("drive_folder_id") or "")
         if folder_id:
             response = _google_request_guarded(
-                "drive_folder_test", requests.get,
+                "drive_folder_test", google_http_session(tid).get,
                 f"https://www.googleapis.com/drive/v3/files/{_v149_google_id(folder_id, 'folder')}",
                 headers=headers,
                 params={"fields": "id,name,mimeType,trashed"},
@@ -2953,8 +2968,8 @@ def tenant_google_test(tenant_id: str) -> tuple[bool, str]:
         if sheet_raw:
             sid = _v149_google_id(sheet_raw, "sheet")
             response = _google_request_guarded(
-                "sheet_test", requests.get,
-                f"https://sheets.googleapis.com/v4/spreadsheets/{sid}",
+                "sheet_test", google_http_session(tid).get,
+                _google_sheets_url(sid),
                 headers=headers,
                 params={"fields": "spreadsheetId,properties.title"},
                 timeout=30, attempts=2,
@@ -3457,7 +3472,12 @@ def _v149_reminder_batch_job(force_chat_id: int | None = None) -> None:
     """
     if not _V149_REMINDER_BATCH_LOCK.acquire(blocking=False):
         return
+    # v199: индекс сроков отдаёт сработавшие напоминалки и всех участников их чатов;
+    # None — индекс не собран/устарел, тогда прежний полный обход и пересборка в конце.
+    plan = None
     try:
+        plan = reminder_deadline_begin(force_chat_id)
+        scope = None if plan is None else plan[1]
         legacy_migrated = _v149_cleanup_legacy_group_state_once()
         now_dt = now_local()
         due_ids = set()
@@ -3465,7 +3485,15 @@ def _v149_reminder_batch_job(force_chat_id: int | None = None) -> None:
         active_by_chat = _v149_defaultdict(list)
         ended_changed = False
         with _REMINDER_CONFIG_LOCK:
-            for rid, cfg in _v149_reminder_all_rows(include_completed=False):
+            if plan is None:
+                rows = _v149_reminder_all_rows(include_completed=False)
+            else:
+                rows = []
+                for rid in sorted(plan[0]):
+                    cfg = _reminder_cfg(rid)
+                    if cfg and not _reminder_is_completed(cfg):
+                        rows.append((rid, cfg))
+            for rid, cfg in rows:
                 rid = int(rid)
                 if _reminder_end_has_passed(cfg, now_dt):
                     _reminder_mark_completed(rid, cfg, "end_date_finished", delete_messages=True)
@@ -3489,6 +3517,9 @@ def _v149_reminder_batch_job(force_chat_id: int | None = None) -> None:
                     for cid in _v149_reminder_chat_ids(snap):
                         if force_chat_id is not None and int(cid) != int(force_chat_id):
                             continue
+                        if scope is not None and int(cid) not in scope:
+                            # Состав этого чата известен не полностью — его сверит свой срок.
+                            continue
                         if _v149_reminder_chat_allowed(snap, cid):
                             active_by_chat[int(cid)].append((rid, snap))
                         else:
@@ -3503,7 +3534,10 @@ def _v149_reminder_batch_job(force_chat_id: int | None = None) -> None:
         sent_for_rid = _v149_defaultdict(bool)
         chats_to_consider = set(active_by_chat)
         if force_chat_id is None:
-            chats_to_consider.update(int(k) for k in state_snapshot.keys() if str(k).lstrip("-").isdigit())
+            chats_to_consider.update(
+                int(k) for k in state_snapshot.keys()
+                if str(k).lstrip("-").isdigit() and (scope is None or int(k) in scope)
+            )
         else:
             chats_to_consider.add(int(force_chat_id))
 
@@ -3597,14 +3631,19 @@ def _v149_reminder_batch_job(force_chat_id: int | None = None) -> None:
                 changed = True
 
             # Diagnostics: next group refresh is the earliest remaining member schedule.
+            diag_rows = _v149_reminder_all_rows(include_completed=False) if scope is None else rows
             for cid, row in list(state_root.items()):
                 try:
                     chat_id = int(cid)
                 except Exception:
                     continue
+                if scope is not None and chat_id not in scope:
+                    continue
                 next_rows = []
                 member_ids = []
-                for rid, cfg in _v149_reminder_all_rows(include_completed=False):
+                for rid, cfg in diag_rows:
+                    if _reminder_is_completed(cfg):
+                        continue
                     if not _v149_reminder_active_now(cfg, now_local()) or chat_id not in _v149_reminder_chat_ids(cfg):
                         continue
                     if not _v149_reminder_chat_allowed(cfg, chat_id):
@@ -3624,6 +3663,10 @@ def _v149_reminder_batch_job(force_chat_id: int | None = None) -> None:
             except Exception:
                 pass
     finally:
+        try:
+            reminder_deadline_end(full=plan is None)
+        except Exception as exc:
+            log_error(f"reminder deadline end: {exc}")
         _V149_REMINDER_BATCH_LOCK.release()
 
 
@@ -1356,29 +1356,34 @@ def _v151_usd_rate() -> float:
         return 0.0
 
 
+def _v151_product_amount(store: dict, rec: dict, amount: float, note: str) -> float:
+    """|amount| if the record is a Products expense, else 0 (one record of _v151_product_total)."""
+    if amount >= 0:
+        return 0.0
+    try:
+        category = resolve_expense_category(note, store)
+        override_slug = str((rec or {}).get("category_override_slug") or "").strip()
+        if override_slug:
+            category = get_category_by_slug(override_slug, store) or category
+        category = str(category or "").strip().casefold()
+    except Exception:
+        category = ""
+    return abs(amount) if category in {"продукты", "продукт", "еда", "food", "products"} else 0.0
+
+
 def _v151_product_total(chat_id: int, records: list[dict]) -> float:
     store = get_chat_store(int(chat_id))
     total = 0.0
     for rec in records or []:
-        amount = _v151_float(rec.get("_v151_amount"))
-        if amount >= 0:
-            continue
-        note = str(rec.get("_v151_note") or "")
-        try:
-            category = resolve_expense_category(note, store)
-            override_slug = str((rec or {}).get("category_override_slug") or "").strip()
-            if override_slug:
-                category = get_category_by_slug(override_slug, store) or category
-            category = str(category or "").strip().casefold()
-        except Exception:
-            category = ""
-        if category in {"продукты", "продукт", "еда", "food", "products"}:
-            total += abs(amount)
+        total += _v151_product_amount(store, rec, _v151_float(rec.get("_v151_amount")), str(rec.get("_v151_note") or ""))
     return total
 
 
 def _v151_food_metric(chat_id: int, records: list[dict], start_key: str, end_key: str) -> tuple[float, float, int, float]:
-    products = _v151_product_total(chat_id, records)
+    return _v151_food_metric_for(_v151_product_total(chat_id, records), start_key, end_key)
+
+
+def _v151_food_metric_for(products: float, start_key: str, end_key: str) -> tuple[float, float, int, float]:
     days = _v151_period_days(start_key, end_key)
     rate = _v151_usd_rate()
     metric = products / 5.0 / rate / days if rate > 0 and days > 0 else 0.0
@@ -3785,11 +3790,11 @@ def _v153_db_logical_checksum(path: str) -> str:
     conn = _v153_sqlite3.connect(path)
     try:
         h = _v153_hashlib.sha256()
-        for table in ("kv", "chats", "meta", "cold_fields"):
+        for table in ("kv", "chats", "meta", "cold_fields", "finance_records", "root_sections"):
             cols = [x[1] for x in conn.execute(f"PRAGMA table_info({table})").fetchall()]
             if not cols:
                 continue
-            order = ",".join(cols[:2])
+            order = ",".join(cols[:3] if table == "finance_records" else cols[:2])
             for row in conn.execute(f"SELECT * FROM {table} ORDER BY {order}").fetchall():
                 if table == "meta" and len(row) >= 2 and str(row[0]) == "v153_export" and str(row[1]) == "manifest":
                     continue
@@ -3931,6 +3936,9 @@ def _v153_build_export(scope: str, tenant_id: str | None = None) -> str:
     SQLITE.backup_to(raw)
     conn = _v153_sqlite3.connect(raw)
     try:
+        # v199: callback-токены — эфемерный UI-кэш рабочей базы, в экспорт не попадают.
+        try: conn.execute("DELETE FROM callback_tokens")
+        except Exception: pass
         chat_ids = set()
         if scope == "tenant":
             chat_ids = set(int(x) for x in tenant_chat_ids(str(tenant_id)))
@@ -3938,15 +3946,19 @@ def _v153_build_export(scope: str, tenant_id: str | None = None) -> str:
             if chat_ids:
                 conn.execute(f"DELETE FROM chats WHERE CAST(chat_id AS INTEGER) NOT IN ({marks})", tuple(chat_ids))
                 conn.execute(f"DELETE FROM cold_fields WHERE CAST(chat_id AS INTEGER) NOT IN ({marks})", tuple(chat_ids))
+                conn.execute(f"DELETE FROM finance_records WHERE CAST(chat_id AS INTEGER) NOT IN ({marks})", tuple(chat_ids))
+                try: conn.execute(f"DELETE FROM finance_msg_index WHERE CAST(chat_id AS INTEGER) NOT IN ({marks})", tuple(chat_ids))
+                except Exception: pass
             else:
-                conn.execute("DELETE FROM chats"); conn.execute("DELETE FROM cold_fields")
-            row = conn.execute("SELECT v FROM kv WHERE k='root'").fetchone()
-            root = _v153_json.loads(row[0]) if row else {}
+                conn.execute("DELETE FROM chats"); conn.execute("DELETE FROM cold_fields"); conn.execute("DELETE FROM finance_records")
+                try: conn.execute("DELETE FROM finance_msg_index")
+                except Exception: pass
+            root = _sqlite_root_from_conn(conn) or {}
             filtered = _v153_filter_root_for_tenant(root, str(tenant_id), chat_ids)
-            conn.execute("INSERT INTO kv(k,v) VALUES('root',?) ON CONFLICT(k) DO UPDATE SET v=excluded.v", (_v153_json.dumps(filtered, ensure_ascii=False, separators=(",", ":")),))
+            _sqlite_root_to_conn(conn, filtered)
         else:
             # Sanitize every JSON-bearing state table without changing the live DB.
-            for table, key_cols, json_col in (("kv", ("k",), "v"), ("chats", ("chat_id",), "v"), ("meta", ("kind", "k"), "v"), ("cold_fields", ("chat_id", "k"), "v")):
+            for table, key_cols, json_col in (("kv", ("k",), "v"), ("chats", ("chat_id",), "v"), ("meta", ("kind", "k"), "v"), ("cold_fields", ("chat_id", "k"), "v"), ("finance_records", ("chat_id", "currency", "record_uid"), "v")):
                 cols = ",".join(key_cols + (json_col,))
                 for row in conn.execute(f"SELECT {cols} FROM {table}").fetchall():
                     keys, raw_json = row[:-1], row[-1]
@@ -3956,6 +3968,10 @@ def _v153_build_export(scope: str, tenant_id: str | None = None) -> str:
                         payload = v153_redact_text(raw_json)
                     where = " AND ".join(f"{c}=?" for c in key_cols)
                     conn.execute(f"UPDATE {table} SET {json_col}=? WHERE {where}", (_v153_json.dumps(payload, ensure_ascii=False, separators=(",", ":")), *keys))
+            # v199: секции root санитизируются целиком, чтобы redaction видел имена ключей настроек.
+            root = _sqlite_root_from_conn(conn)
+            if isinstance(root, dict):
+                _sqlite_root_to_conn(conn, v153_sanitize(root))
             chat_ids = {int(x[0]) for x in conn.execute("SELECT chat_id FROM chats").fetchall() if str(x[0]).lstrip("-").isdigit()}
         failed = _v153_collect_failed_tasks(tenant_id if scope == "tenant" else None, chat_ids)
         conn.execute("INSERT INTO meta(kind,k,v) VALUES('v153_export','failed_tasks',?) ON CONFLICT(kind,k) DO UPDATE SET v=excluded.v", (_v153_json.dumps(failed, ensure_ascii=False, separators=(",", ":")),))
@@ -4206,6 +4222,8 @@ def _v153_restore_tenant_root(source_root: dict, manifest: dict, target_tenant:
         live_items[str(new_id)] = row
         remap[old_id] = new_id
     live_rem["next_id"] = max([int(x) for x in live_items if str(x).isdigit()] + [1]) + 1
+    try: reminder_deadline_invalidate()
+    except Exception: pass
     live_rem["migrated_v134"] = True
 
     # Restore tenant-scoped operation/integrity history without touching other contours.
@@ -4271,8 +4289,7 @@ def _v153_apply_tenant_restore(raw: str, target_tenant: str, mode: str = "replac
     try:
         manifest = _v153_json.loads(src.execute("SELECT v FROM meta WHERE kind='v153_export' AND k='manifest'").fetchone()[0])
         source_chat_ids = {int(x) for x in (manifest.get("chat_ids") or [])}
-        root_row = src.execute("SELECT v FROM kv WHERE k='root'").fetchone()
-        source_root = _v153_json.loads(root_row[0]) if root_row else {}
+        source_root = _sqlite_root_from_conn(src) or {}
         target_row = tenant_get(target_tenant) or {}
         target_chat_ids = set(int(x) for x in (target_row.get("chat_ids") or []))
         for cid in source_chat_ids:
@@ -4301,7 +4318,10 @@ def _v153_apply_tenant_restore(raw: str, target_tenant: str, mode: str = "replac
             SQLITE.save_chat(cid, _lowram_store_meta_payload(payload))
         for row in src.execute("SELECT chat_id,k,v FROM cold_fields").fetchall():
             cid = int(row[0]); key = str(row[1]); value = _v153_json.loads(row[2])
-            SQLITE.set_cold(cid, key, value)
+            if key not in FINANCE_ROW_LEDGERS:
+                SQLITE.set_cold(cid, key, value)
+        for cid, key, rows in _sqlite_finance_cold_items(src):
+            SQLITE.set_cold(int(cid), key, rows)
         _v153_restore_tenant_root(source_root, manifest, target_tenant, target_chat_ids, mode)
         # Rebind imported chats only to the chosen target tenant.
         for cid in source_chat_ids:
@@ -4896,7 +4916,7 @@ _export_end_calendar_keyboard = _v177_legacy_0171_export_end_calendar_keyboard
 # before the export boundary. ARS uses the authoritative stored accounting ledger
 # (the same amounts as the main window/store balance); USD uses its separate ledger.
 # Historical source text is never re-parsed while calculating an opening balance.
-def _excel_canonical_opening_balance(chat_id: int, currency: str, start_day: str, start_rid: int | None = 0, exact: bool = False) -> float:
+def _excel_canonical_opening_balance_scan(chat_id: int, currency: str, start_day: str, start_rid: int | None = 0, exact: bool = False) -> float:
     cid = int(chat_id)
     cur = "usd" if str(currency or "ars").strip().lower() == "usd" else "ars"
     start = str(start_day or "")[:10]
@@ -4953,6 +4973,175 @@ def _excel_canonical_opening_balance(chat_id: int, currency: str, start_day: str
     return float(total)
 
 
+def _excel_canonical_opening_balance(chat_id: int, currency: str, start_day: str, start_rid: int | None = 0, exact: bool = False) -> float:
+    # v199: the day boundary is a prefix-sum lookup in FINANCE_BALANCE_INDEX. An exact
+    # record boundary inside the start day (ARS exports) still walks the ledger.
+    cur = "usd" if str(currency or "ars").strip().lower() == "usd" else "ars"
+    try:
+        rid = int(start_rid or 0)
+    except Exception:
+        rid = 0
+    index = globals().get("FINANCE_BALANCE_INDEX")
+    if index is not None and not (bool(exact) and rid and cur == "ars"):
+        try:
+            return float(index.opening(int(chat_id), cur, str(start_day or "")[:10]))
+        except Exception as exc:
+            try: log_error(f"finance balance index opening {chat_id}/{cur}: {exc}")
+            except Exception: pass
+    return _excel_canonical_opening_balance_scan(chat_id, currency, start_day, start_rid, exact)
+
+
+# v199: FINANCE_BALANCE_INDEX is fed from the same canonical ledgers as the scan above.
+def _balance_index_row(rec: dict) -> tuple:
+    """(key, day, amount) exactly as the canonical ledgers count one record."""
+    amount = rec.get("_v151_amount") if "_v151_amount" in rec else _v151_float(rec.get("amount"))
+    return _delta_record_key(rec), _v151_day_key(dict(rec)), _v151_float(amount)
+
+
+def _balance_index_rows(chat_id: int, currency: str):
+    for rec in _v151_all_records(int(chat_id), currency) or []:
+        yield _balance_index_row(rec)
+
+
+def _balance_index_active(chat_id: int) -> str:
+    store = (data.get("chats", {}) or {}).get(str(int(chat_id))) if isinstance(data, dict) else None
+    settings = (store or {}).get("settings") or {}
+    return "usd" if str(settings.get("_active_currency_ledger") or "ars").lower() == "usd" else "ars"
+
+
+def _balance_index_ledger_currency(chat_id: int, ledger: str):
+    """Which canonical ledger a stored list feeds; the snapshot copy of the active one feeds none."""
+    active = _balance_index_active(chat_id)
+    ledger = str(ledger or "records")
+    if ledger == "records":
+        return active
+    if ledger in ("ars_records", "usd_records"):
+        cur = ledger[:3]
+        return None if cur == active else cur
+    return None
+
+
+def _balance_index_size(chat_id: int, currency: str):
+    """Cheap shape of the source lists when they are already in RAM (never loads a cold field):
+    ARS — row count of its ledger (plus its exact total units while the records order tracker
+    describes exactly that list), USD — lengths of both lists it is derived from."""
+    store = (data.get("chats", {}) or {}).get(str(int(chat_id))) if isinstance(data, dict) else None
+    if not isinstance(store, dict):
+        return None
+    active = _balance_index_active(chat_id)
+    keys = ("records" if active == "ars" else "ars_records",)
+    if str(currency) == "usd":
+        keys += ("records" if active == "usd" else "usd_records",)
+    sizes = []
+    for key in keys:
+        if not dict.__contains__(store, key):
+            return None
+        rows = dict.__getitem__(store, key)
+        sizes.append(len(rows) if isinstance(rows, list) else 0)
+    if len(sizes) == 1:
+        units_fn = globals().get("finance_records_order_units") if active == "ars" else None
+        units = units_fn(chat_id, dict.__getitem__(store, "records")) if units_fn is not None else None
+        return sizes[0] if units is None else (sizes[0], units)
+    return tuple(sizes)
+
+
+FINANCE_BALANCE_INDEX = FinanceBalanceIndex(
+    SQLITE, _balance_index_rows, _balance_index_row, _balance_index_ledger_currency, size_fn=_balance_index_size,
+    verify_every=FINANCE_BALANCE_VERIFY_EVERY, persist=LOWRAM_ENABLED, log_fn=log_error,
+) if FINANCE_BALANCE_INDEX_ENABLED else None
+
+
+def finance_balance_opening(chat_id: int, currency: str, day_key: str) -> float:
+    """Остаток валюты на начало дня (все записи раньше day_key)."""
+    return float(_excel_canonical_opening_balance(int(chat_id), currency, str(day_key or "")[:10], 0, False))
+
+
+def finance_balance_through(chat_id: int, currency: str, day_key: str) -> float:
+    """Остаток валюты на конец дня (включительно) по каноническому ledger."""
+    cur = "usd" if str(currency or "ars").strip().lower() == "usd" else "ars"
+    if FINANCE_BALANCE_INDEX is not None:
+        try:
+            return float(FINANCE_BALANCE_INDEX.through(int(chat_id), cur, str(day_key or "")[:10]))
+        except Exception as exc:
+            try: log_error(f"finance balance index through {chat_id}/{cur}: {exc}")
+            except Exception: pass
+    day = str(day_key or "")[:10]
+    return float(sum(_v151_float(r.get("_v151_amount")) for r in _v151_all_records(int(chat_id), cur) if _v151_day_key(r) and _v151_day_key(r) <= day))
+
+
+def finance_balance_month(chat_id: int, currency: str, month_key: str) -> dict:
+    """Остаток на начало месяца, оборот за месяц и остаток на конец (YYYY-MM)."""
+    cur = "usd" if str(currency or "ars").strip().lower() == "usd" else "ars"
+    month_key = str(month_key or "")[:7]
+    if FINANCE_BALANCE_INDEX is not None:
+        try:
+            return FINANCE_BALANCE_INDEX.month(int(chat_id), cur, month_key)
+        except Exception as exc:
+            try: log_error(f"finance balance index month {chat_id}/{cur}: {exc}")
+            except Exception: pass
+    opening = total = 0.0; days = set()
+    for rec in _v151_all_records(int(chat_id), cur):
+        day = _v151_day_key(rec)
+        if not day or day[:7] > month_key:
+            continue
+        amount = _v151_float(rec.get("_v151_amount"))
+        if day[:7] < month_key:
+            opening += amount
+        else:
+            total += amount; days.add(day)
+    return {"opening": opening, "total": total, "closing": opening + total, "days": len(days)}
+
+
+def finance_balance_total(chat_id: int, currency: str) -> float:
+    cur = "usd" if str(currency or "ars").strip().lower() == "usd" else "ars"
+    if FINANCE_BALANCE_INDEX is not None:
+        try:
+            return float(FINANCE_BALANCE_INDEX.total(int(chat_id), cur))
+        except Exception as exc:
+            try: log_error(f"finance balance index total {chat_id}/{cur}: {exc}")
+            except Exception: pass
+    return float(sum(_v151_float(r.get("_v151_amount")) for r in _v151_all_records(int(chat_id), cur)))
+
+
+def finance_balance_index_verify(chat_ids=None, currencies=("ars", "usd")) -> dict:
+    """Доказательство против полного прохода: для каждого дня каждого ledger остаток на начало
+    и на конец дня из индекса должен совпасть бит-в-бит с точной (Fraction) суммой канонических
+    строк; calc_day_balance — с прежним обходом daily_records. legacy_max_drift — насколько
+    прежнее последовательное сложение float отличалось от точной суммы."""
+    from fractions import Fraction
+    ids = [int(x) for x in (chat_ids if chat_ids is not None else list((data.get("chats", {}) or {}).keys()))]
+    report = {"chats": 0, "checks": 0, "mismatches": [], "legacy_max_drift": 0.0}
+    for cid in ids:
+        report["chats"] += 1
+        for cur in currencies:
+            rows = [(d, _v151_float(r.get("_v151_amount"))) for r in _v151_all_records(cid, cur) for d in (_v151_day_key(r),) if d]
+            by_day = {}
+            for day, amount in rows:
+                by_day.setdefault(day, []).append(amount)
+            exact = Fraction(0); legacy = 0.0
+            for day in sorted(by_day):
+                checks = [("opening", day, finance_balance_opening(cid, cur, day), float(exact))]
+                for amount in by_day[day]:
+                    exact += Fraction(amount); legacy += amount
+                checks.append(("through", day, finance_balance_through(cid, cur, day), float(exact)))
+                for kind, dk, got, want in checks:
+                    report["checks"] += 1
+                    if got != want:
+                        report["mismatches"].append({"chat_id": cid, "currency": cur, "kind": kind, "day": dk, "index": got, "scan": want})
+                report["legacy_max_drift"] = max(report["legacy_max_drift"], abs(legacy - float(exact)))
+            if cur == "ars" and _balance_index_active(cid) == "ars":
+                store = get_chat_store(cid)
+                for day in sorted(by_day):
+                    got = calc_day_balance(store, day); want = _calc_day_balance_scan(store, day)
+                    report["checks"] += 1
+                    if abs(got - want) > 1e-6 * max(1.0, abs(want)):
+                        report["mismatches"].append({"chat_id": cid, "currency": cur, "kind": "calc_day_balance", "day": day, "index": got, "scan": want})
+    if report["mismatches"]:
+        try: log_error(f"finance balance index verify: {len(report['mismatches'])} mismatch(es), first={report['mismatches'][0]}")
+        except Exception: pass
+    return report
+
+
 def _excel_canonical_records_for_range(chat_id: int, currency: str, start_day: str, end_day: str) -> list[dict]:
     cid = int(chat_id)
     cur = "usd" if str(currency or "ars").strip().lower() == "usd" else "ars"
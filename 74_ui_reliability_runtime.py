@@ -3740,6 +3740,9 @@ def _v160_annotation_roots():
 
 def _v160_persist_annotations(chat_id: int) -> None:
     try:
+        # v199: каталоги окон растут месяцами — save_root пишет их только по пометке.
+        SQLITE.root_touch("_global_settings", _V160_MARKER_ROOT_KEY)
+        SQLITE.root_touch("_global_settings", _V160_TZ_ROOT_KEY)
         save_data(data, root_only=True)
     except Exception:
         pass
@@ -3165,7 +3165,12 @@ def _v151_category_table(chat_id: int, currency: str):
 # 4) XLSX package formatting shared by ALL local Excel writers:
 # thousands separator, wrap/contain text, thin borders, wider Description.
 # ---------------------------------------------------------------------------
-def _v167_patch_xlsx_package(path: str) -> None:
+def _v167_patch_xlsx_package(path: str, sheet_widths: bool = True) -> None:
+    """Patch styles.xml (and column B width unless ``sheet_widths`` is off).
+
+    v199: other package parts are copied as streams, so a long sheet1.xml is
+    never held in RAM when only styles.xml changes.
+    """
     if not path or not _v167_os.path.exists(path):
         return
     tmp = path + ".v167.tmp"
@@ -3173,6 +3178,10 @@ def _v167_patch_xlsx_package(path: str) -> None:
     _v167_ET.register_namespace("", ns)
     with _v167_zipfile.ZipFile(path, "r") as zin, _v167_zipfile.ZipFile(tmp, "w", _v167_zipfile.ZIP_DEFLATED) as zout:
         for item in zin.infolist():
+            if item.filename != "xl/styles.xml" and not (sheet_widths and item.filename == "xl/worksheets/sheet1.xml"):
+                with zin.open(item) as src, zout.open(item, "w") as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                continue
             raw = zin.read(item.filename)
             if item.filename == "xl/styles.xml":
                 try:
@@ -3301,7 +3310,8 @@ def _write_simple_xlsx(path: str, rows: list[list], sheet_name: str = "Данн
     if not callable(_V167_BASE_WRITE_SIMPLE):
         raise RuntimeError("XLSX writer is unavailable")
     _V167_BASE_WRITE_SIMPLE(path, rows, sheet_name=sheet_name)
-    _v167_patch_xlsx_package(path)
+    # The base writer already emits column B at width 42; only styles.xml needs the patch.
+    _v167_patch_xlsx_package(path, sheet_widths=False)
 
 
 def _write_tabl_lsx_xlsx(path: str, rows: list[list], styles: list[list], sheet_name: str = "4 недели", comments: dict | None = None, freeze_rows: int = 3, widths: list[float] | None = None, annotation_mode: str | None = "notes") -> None:
@@ -3316,6 +3326,362 @@ def _write_tabl_lsx_xlsx(path: str, rows: list[list], styles: list[list], sheet_
     _v167_patch_xlsx_package(path)
 
 
+# ---------------------------------------------------------------------------
+# v199: single-pass streaming export.  One row producer walks a ledger in day
+# order straight from storage (the hot in-memory list, or finance_records pages
+# when the chat is cold) and feeds writers that already take any iterable:
+# write_csv_rows_with_day_gaps for CSV and the sheet-XML stream behind
+# _write_simple_xlsx for the OLD-style Excel.  Totals and formulas are folded in
+# while rows pass by, so peak memory is one SQLite page plus one day's records
+# instead of several copies of the whole period.
+# ---------------------------------------------------------------------------
+EXPORT_STREAMING = _env_bool("EXPORT_STREAMING", "1")
+EXPORT_STREAM_PAGE_ROWS = _env_int("EXPORT_STREAM_PAGE_ROWS", 2000, 100, 50000)
+_EXPORT_STREAM_STATS = defaultdict(int)
+_EXPORT_STREAM_LABELS = {"day": "за день", "week": "за неделю", "month": "за месяц", "wedthu": "Чт–Ср", "all": "за всё время"}
+
+
+def _export_stream_ledger_keys(store: dict) -> tuple[str, str]:
+    """(ARS, independent USD) ledger keys, read from settings without snapshotting cold lists."""
+    settings = store.get("settings") or {}
+    if str(settings.get("_active_currency_ledger") or "ars").lower() == "usd":
+        return "ars_records", "records"
+    return "records", "usd_records"
+
+
+def _export_stream_is_hot(store: dict, key: str) -> bool:
+    return not (LOWRAM_ENABLED and isinstance(store, ColdChatStore)) or dict.__contains__(store, key)
+
+
+def _export_stream_hot_records(records: list):
+    """The hot list itself when it is already in day order (normal after normalize)."""
+    prev = ""
+    for rec in records:
+        if not isinstance(rec, dict):
+            continue
+        day = _v151_day_key(rec)
+        if day < prev:
+            _EXPORT_STREAM_STATS["hot_resorts"] += 1
+            return sorted((r for r in records if isinstance(r, dict)), key=record_sort_key)
+        prev = day
+    return records
+
+
+def _export_stream_sqlite_records(chat_id: int, key: str, start_key: str, end_key: str, page_rows: int):
+    after = None
+    while True:
+        page = SQLITE.get_finance_rows_page(int(chat_id), key, start_key, end_key, after=after, limit=page_rows)
+        _EXPORT_STREAM_STATS["sqlite_pages"] += 1
+        for _day, _pos, rec in page:
+            if rec is not None:
+                yield rec
+        if len(page) < page_rows:
+            return
+        after = page[-1][:2]
+
+
+def _export_stream_ledger(chat_id: int, key: str, start_key: str = "", end_key: str = "", page_rows: int | None = None, store: dict | None = None):
+    """Records of one ledger within [start_key, end_key] in record_sort_key order.
+
+    Each day is sorted on its own, which equals one global sort because
+    record_sort_key starts with the day.
+    """
+    store = store if isinstance(store, dict) else get_chat_store(int(chat_id))
+    end_key = str(end_key or "9999-99-99")[:10]
+    start_key = str(start_key or "")[:10]
+    if _export_stream_is_hot(store, key):
+        _EXPORT_STREAM_STATS["hot_sources"] += 1
+        source = _export_stream_hot_records(store.get(key) or [])
+    else:
+        _EXPORT_STREAM_STATS["sqlite_sources"] += 1
+        source = _export_stream_sqlite_records(int(chat_id), key, start_key, end_key, int(page_rows or EXPORT_STREAM_PAGE_ROWS))
+    day_recs, current = [], None
+    for rec in source:
+        if not isinstance(rec, dict):
+            continue
+        day = _v151_day_key(rec)
+        if day != current:
+            if day_recs:
+                yield from sorted(day_recs, key=record_sort_key)
+            day_recs, current = [], day
+        if day > end_key:
+            break
+        if day >= start_key:
+            day_recs.append(rec)
+    if day_recs:
+        yield from sorted(day_recs, key=record_sort_key)
+
+
+def _export_stream_day_range(chat_id: int, store: dict, key: str) -> tuple[str, str]:
+    if not _export_stream_is_hot(store, key):
+        return SQLITE.finance_day_range(int(chat_id), key)
+    days = [day for day in (_v151_day_key(r) for r in (store.get(key) or []) if isinstance(r, dict)) if day]
+    return (min(days), max(days)) if days else ("", "")
+
+
+def export_stream_bounds(chat_id: int, ctx: dict | None = None) -> tuple[str, str]:
+    """_v151_context_bounds, but «всё время» takes the ledgers' first/last day without loading them."""
+    ctx = dict(ctx or _v151_context())
+    mode = str(ctx.get("mode") or "all").replace("csv_", "").replace("xlsx_", "")
+    if str(ctx.get("kind") or "period") == "exact" or mode in {"day", "week", "month", "wedthu"}:
+        return _v151_context_bounds(int(chat_id), ctx)
+    store = get_chat_store(int(chat_id))
+    days = sorted(day for key in _export_stream_ledger_keys(store) for day in _export_stream_day_range(int(chat_id), store, key)
+                  if _v151_parse_day(day))
+    day_key = str(ctx.get("day_key") or today_key())[:10]
+    return (days[0], days[-1]) if days else (day_key, day_key)
+
+
+def _export_stream_usd(chat_id: int, store: dict, start_key: str, end_key: str):
+    """v156 _v151_usd_records as a merge of the independent USD ledger and usd_amount carried by ARS rows."""
+    ars_key, usd_key = _export_stream_ledger_keys(store)
+    # The USD ledger is small: its untagged rows are matched against one pass over the ARS ledger
+    # instead of keeping every ARS identity/fingerprint in memory.
+    untagged = {}
+    for rec in _export_stream_ledger(chat_id, usd_key, store=store):
+        if _v156_explicit_currency(rec) == "":
+            untagged[_v156_record_identity(rec)] = True
+            untagged[_v156_record_fingerprint(rec)] = True
+    copies = set()
+    if untagged:
+        for rec in _export_stream_ledger(chat_id, ars_key, store=store):
+            for key in (_v156_record_identity(rec), _v156_record_fingerprint(rec)):
+                if key in untagged:
+                    copies.add(key)
+    seen = set()
+    for rec in _export_stream_ledger(chat_id, usd_key, store=store):
+        currency = _v156_explicit_currency(rec)
+        if currency == "ars" or (currency != "usd" and (_v156_record_identity(rec) in copies or _v156_record_fingerprint(rec) in copies)):
+            continue
+        seen.add(_v156_record_identity(rec))
+
+    def _independent():
+        emitted = set()
+        for rec in _export_stream_ledger(chat_id, usd_key, start_key, end_key, store=store):
+            currency = _v156_explicit_currency(rec)
+            ident = _v156_record_identity(rec)
+            if currency == "ars" or (currency != "usd" and (ident in copies or _v156_record_fingerprint(rec) in copies)):
+                continue
+            if ident in emitted:
+                continue
+            emitted.add(ident)
+            yield rec, _v151_float(rec.get("amount")), str(rec.get("note") or rec.get("usd_note") or "USD операция").strip()
+
+    def _embedded():
+        for rec in _export_stream_ledger(chat_id, ars_key, start_key, end_key, store=store):
+            if rec.get("usd_amount") is None or abs(_v151_float(rec.get("usd_amount"))) <= 1e-12:
+                continue
+            ident = _v156_record_identity(rec)
+            if ident in seen:
+                continue
+            seen.add(ident)
+            yield rec, _v151_float(rec.get("usd_amount")), _v156_clean_embedded_usd_description(rec)
+
+    yield from heapq.merge(_independent(), _embedded(), key=lambda item: record_sort_key(item[0]))
+
+
+def export_stream_records(chat_id: int, currency: str, ctx: dict | None = None):
+    """Streaming _v151_records_in_context: (day, amount, note, record) in day order."""
+    ctx = dict(ctx or _v151_context())
+    cid = int(chat_id)
+    currency = "usd" if str(currency).lower() == "usd" else "ars"
+    start_key, end_key = export_stream_bounds(cid, ctx)
+    store = get_chat_store(cid)
+    exact = str(ctx.get("kind") or "") == "exact" and currency == "ars"
+    start_rid = int(ctx.get("start_rid") or 0) if exact else 0
+    end_rid = int(ctx.get("end_rid") or 0) if exact else 0
+    if currency == "usd":
+        items = _export_stream_usd(cid, store, start_key, end_key)
+    else:
+        items = ((rec, _v151_float(rec.get("amount")), str(rec.get("note") or ""))
+                 for rec in _export_stream_ledger(cid, _export_stream_ledger_keys(store)[0], start_key, end_key, store=store))
+    for rec, amount, note in items:
+        day = _v151_day_key(rec)
+        if start_rid or end_rid:
+            rid = int(rec.get("id") or 0)
+            if (day == start_key and start_rid and rid < start_rid) or (day == end_key and end_rid and rid > end_rid):
+                continue
+        _EXPORT_STREAM_STATS["records"] += 1
+        yield day, amount, note, rec
+
+
+def _export_stream_simple_table(chat_id: int, currency: str, ctx: dict, base: int = 0, counts: dict | None = None):
+    """One _v151_simple_table (compact=False) with the _v167_formulaize_simple formulas.
+
+    ``base`` is the number of sheet rows above the table (ARS before USD), so
+    formulas come out already shifted as _v154_join_ars_usd would shift them.
+    """
+    cid = int(chat_id)
+    start_key, end_key = export_stream_bounds(cid, ctx)
+    canonical = globals().get("_excel_canonical_opening_balance")
+    if callable(canonical):
+        opening = float(canonical(cid, currency, start_key, int(ctx.get("start_rid") or 0), str(ctx.get("kind") or "") == "exact"))
+    else:
+        opening = _v151_opening_balance(cid, currency, ctx)
+    store = get_chat_store(cid)
+    yield [currency.upper(), "", "", ""]
+    yield ["Дата", "Описание", "Приход", "Расход"]
+    yield ["", "Остаток с прошлого раза", _v151_num(opening), ""]
+    yield []
+    n = 4
+    income = expense = products = 0.0
+    prev_day = None
+    for day, amount, note, rec in export_stream_records(cid, currency, ctx):
+        if prev_day is not None and day != prev_day:
+            yield []
+            n += 1
+        prev_day = day
+        income_cell, expense_cell = _xlsx_income_expense_values(amount)
+        yield [fmt_date_table(day), note, income_cell, expense_cell]
+        n += 1
+        income += max(0.0, amount)
+        expense += max(0.0, -amount)
+        if currency == "ars":
+            products += _v151_product_amount(store, rec, amount, note)
+        if counts is not None:
+            counts[currency] += 1
+    yield []
+    n += 1
+    closing = opening + income - expense
+    reserve = _v151_reserve(cid, currency)
+    opening_row, income_row = base + 3, base + n + 1
+    expense_row, closing_row, reserve_row, turnover_row = income_row + 1, income_row + 2, income_row + 3, income_row + 4
+    data_start = opening_row + 2
+    data_end = max(data_start, income_row - 2)
+    yield ["", "Приход за период", _v167_formula(f"SUM(C{data_start}:C{data_end})", _v151_num(income)), ""]
+    yield ["", "Расход за период", "", _v167_formula(f"SUM(D{data_start}:D{data_end})", _v151_num(expense))]
+    yield ["", "Остаток на руках", _v167_formula(f"C{opening_row}+C{income_row}-D{expense_row}", _v151_num(closing)), ""]
+    yield ["", "Гомонковые", _v151_num(reserve), ""]
+    yield ["", "Остаток в обороте", _v167_formula(f"C{closing_row}-C{reserve_row}", _v151_num(closing - reserve)), ""]
+    if currency != "ars":
+        return
+    products, metric, days, rate = _v151_food_metric_for(products, start_key, end_key)
+    products_row = turnover_row + 2
+    metric_cell = _v167_formula(f"C{products_row}/({max(1, int(days))}*5*{float(rate):g})", metric) if float(rate or 0) > 0 else metric
+    yield []
+    yield ["", "Продукты", _v151_num(products), ""]
+    yield []
+    yield ["", "Расход еды на человека в сутки", metric_cell, ""]
+    yield ["", "Расчёт", f"{days} дн. · 5 чел. · курс {rate:g}" if rate > 0 else f"{days} дн. · 5 чел. · курс не найден", ""]
+
+
+def export_stream_simple_rows(chat_id: int, ctx: dict | None = None, counts: dict | None = None):
+    """ARS + USD simple tables as one row stream (_xlsx_simple_rows_with_balances → _v154_join_ars_usd)."""
+    ctx = dict(ctx or _v151_context())
+    written = 0
+    for row in _export_stream_simple_table(int(chat_id), "ars", ctx, 0, counts):
+        written += 1
+        yield row
+    if not excel_usd_table_enabled(int(chat_id)):
+        return
+    yield []
+    yield []
+    yield from _export_stream_simple_table(int(chat_id), "usd", ctx, written + 2, counts)
+
+
+def _export_stream_write(path: str, chat_id: int, ext: str, ctx: dict, sheet_name: str) -> dict:
+    """CSV or OLD-style XLSX in one pass; returns record counts for the no-data checks."""
+    cid = int(chat_id)
+    counts = defaultdict(int)
+    started = time.monotonic()
+    if ext == "xlsx":
+        _write_simple_xlsx(path, export_stream_simple_rows(cid, ctx, counts), sheet_name=sheet_name)
+        currency = "ars"
+    else:
+        currency = "usd" if financial_view_is_usd(get_chat_store(cid)) else "ars"
+
+        def _rows():
+            for day, amount, note, _rec in export_stream_records(cid, currency, ctx):
+                counts[currency] += 1
+                yield fmt_date_table(day), fmt_csv_amount(amount), note
+
+        with open(path, "w", newline="", encoding="utf-8") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(["date", "amount", "note"])
+            write_csv_rows_with_day_gaps(writer, _rows(), 3)
+    _EXPORT_STREAM_STATS[ext] += 1
+    _EXPORT_STREAM_STATS["last_ms"] = int((time.monotonic() - started) * 1000)
+    return {"currency": currency, "ars": counts["ars"], "usd": counts["usd"],
+            "records": counts["ars"] + counts["usd"] if ext == "xlsx" else counts[currency]}
+
+
+def export_stream_period_file(path: str, target_chat_id: int, mode: str, day_key: str, ext: str) -> tuple[dict, str]:
+    """Period export file (send_export_for_chat_to) → (counts, caption label)."""
+    normalized = str(mode or "all").replace("csv_", "").replace("xlsx_", "")
+    ctx = _v151_context() or {"kind": "period", "target_chat_id": int(target_chat_id), "mode": normalized,
+                              "day_key": str(day_key or today_key())[:10], "file_type": ext}
+    info = _export_stream_write(path, int(target_chat_id), ext, ctx, "Экспорт")
+    label = _EXPORT_STREAM_LABELS.get(normalized, "за всё время")
+    if info["currency"] == "usd":
+        label = "USD " + label
+    return info, label
+
+
+def export_stream_exact_file(path: str, target_chat_id: int, start_key: str, start_rid: int, end_key: str, end_rid: int, ext: str) -> dict:
+    ctx = _v151_context() or {"kind": "exact", "target_chat_id": int(target_chat_id), "start_key": str(start_key)[:10],
+                              "start_rid": int(start_rid or 0), "end_key": str(end_key)[:10], "end_rid": int(end_rid or 0),
+                              "file_type": ext}
+    return _export_stream_write(path, int(target_chat_id), ext, ctx, "Точный период")
+
+
+def export_stream_global_rows(d: dict):
+    """Global CSV rows of every chat: k-way merge of per-chat day streams of the active ledger."""
+    page_rows = max(100, EXPORT_STREAM_PAGE_ROWS // 8)
+
+    def _chat(cid: int, store: dict):
+        day, label = None, ""
+        for rec in _export_stream_ledger(cid, "records", page_rows=page_rows, store=store):
+            if _v151_day_key(rec) != day:
+                day = _v151_day_key(rec)
+                label = fmt_date_table(day)  # rows arrive grouped by day: one strptime per day
+            yield day, (label, fmt_csv_amount(rec.get("amount")), rec.get("note", ""))
+
+    streams = []
+    for cid, store in list((d.get("chats") or {}).items()):
+        try:
+            streams.append(_chat(int(cid), store))
+        except Exception:
+            continue
+    _EXPORT_STREAM_STATS["global_csv"] += 1
+    for _day, row in heapq.merge(*streams, key=lambda item: item[0]):
+        yield row
+
+
+_EXPORT_STREAM_BASE_BALANCE_ROWS = _balance_index_rows
+
+
+def _export_stream_balance_rows(chat_id: int, currency: str):
+    """FINANCE_BALANCE_INDEX rows_fn: the same (key, day, amount) rows, read page by page for cold ledgers.
+
+    The USD side otherwise copies the whole ARS ledger to find usd_amount, which
+    made the first opening-balance lookup of a streamed export load it into RAM.
+    """
+    cid = int(chat_id)
+    store = get_chat_store(cid)
+    settings = store.get("settings") or {}
+    if not EXPORT_STREAMING or str(settings.get("_active_currency_ledger") or "") not in {"ars", "usd"}:
+        # Ledger split not settled yet: _v151_all_records snapshots it first.
+        yield from _EXPORT_STREAM_BASE_BALANCE_ROWS(cid, currency)
+        return
+    if str(currency).lower() == "usd":
+        for rec, amount, _note in _export_stream_usd(cid, store, "", ""):
+            yield _delta_record_key(rec), _v151_day_key(rec), amount
+        return
+    for rec in _export_stream_ledger(cid, _export_stream_ledger_keys(store)[0], store=store):
+        yield _balance_index_row(rec)
+
+
+if FINANCE_BALANCE_INDEX is not None:
+    FINANCE_BALANCE_INDEX.rows_fn = _export_stream_balance_rows
+
+
+def export_stream_stats() -> dict:
+    row = dict(_EXPORT_STREAM_STATS)
+    row["enabled"] = bool(EXPORT_STREAMING)
+    row["page_rows"] = EXPORT_STREAM_PAGE_ROWS
+    return row
+
+
 # ---------------------------------------------------------------------------
 # 5) F47: visible Thu-Wed label + Google rolling tab controls.
 # ---------------------------------------------------------------------------
@@ -3453,22 +3819,8 @@ def _v167_google_upsert_named_tab(tab_title: str, rows: list[list], target_chat_
         token = _google_access_token(); info = _google_service_account_info(); spreadsheet_id = _google_spreadsheet_id()
         service_email = str(info.get("client_email") or "")
         headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-        meta = _google_request_guarded("v167_metadata", requests.get, f"https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}", headers=headers, params={"fields": "spreadsheetId,properties.title,sheets.properties(sheetId,title,gridProperties)"}, timeout=45, attempts=2)
-        if meta.status_code >= 300:
-            if meta.status_code in (401,403):
-                raise RuntimeError(f"Google Sheets access denied. Добавьте {service_email} как Редактор.")
-            raise RuntimeError(f"Google Sheets metadata {meta.status_code}: {meta.text[:500]}")
-        payload = meta.json(); sheet_id = None
-        for sh in payload.get("sheets") or []:
-            props = sh.get("properties") or {}
-            if str(props.get("title") or "") == tab_title:
-                sheet_id = int(props.get("sheetId")); break
+        session = google_http_session(tid)
         max_cols = max((len(r or []) for r in rows), default=1); row_count = max(100, len(rows)+20); col_count=max(26,max_cols+3)
-        if sheet_id is None:
-            add = _google_request_guarded("v167_add_sheet", requests.post, f"https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}:batchUpdate", headers=headers, json={"requests":[{"addSheet":{"properties":{"title":tab_title,"gridProperties":{"rowCount":row_count,"columnCount":col_count,"frozenRowCount":2}}}}]}, timeout=60, attempts=1)
-            if add.status_code >= 300:
-                raise RuntimeError(f"Google Sheets add tab {add.status_code}: {add.text[:500]}")
-            sheet_id = int(add.json()["replies"][0]["addSheet"]["properties"]["sheetId"])
         annotations = dict(annotations_override or {})
         if not annotations and layout == "category":
             try:
@@ -3485,18 +3837,44 @@ def _v167_google_upsert_named_tab(tab_title: str, rows: list[list], target_chat_
                 if note: cell["note"]=note
                 vals.append(cell)
             cell_rows.append({"values":vals})
-        req=[
-            {"updateCells":{"range":{"sheetId":sheet_id},"fields":"userEnteredValue,note,userEnteredFormat"}},
-            {"updateCells":{"range":{"sheetId":sheet_id,"startRowIndex":0,"startColumnIndex":0},"rows":cell_rows,"fields":"userEnteredValue,note,userEnteredFormat"}},
-            {"updateDimensionProperties":{"range":{"sheetId":sheet_id,"dimension":"COLUMNS","startIndex":0,"endIndex":1},"properties":{"pixelSize":95},"fields":"pixelSize"}},
-        ]
-        if max_cols >= 2:
-            req.append({"updateDimensionProperties":{"range":{"sheetId":sheet_id,"dimension":"COLUMNS","startIndex":1,"endIndex":2},"properties":{"pixelSize":320},"fields":"pixelSize"}})
-        if max_cols >= 3:
-            req.append({"updateDimensionProperties":{"range":{"sheetId":sheet_id,"dimension":"COLUMNS","startIndex":2,"endIndex":max_cols},"properties":{"pixelSize":115},"fields":"pixelSize"}})
-        upd=_google_request_guarded("v167_update_named", requests.post, f"https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}:batchUpdate", headers=headers, json={"requests":req}, timeout=90, attempts=1)
-        if upd.status_code >= 300:
-            raise RuntimeError(f"Google Sheets update {upd.status_code}: {upd.text[:500]}")
+
+        def _widths(sid):
+            req=[{"updateDimensionProperties":{"range":{"sheetId":sid,"dimension":"COLUMNS","startIndex":0,"endIndex":1},"properties":{"pixelSize":95},"fields":"pixelSize"}}]
+            if max_cols >= 2:
+                req.append({"updateDimensionProperties":{"range":{"sheetId":sid,"dimension":"COLUMNS","startIndex":1,"endIndex":2},"properties":{"pixelSize":320},"fields":"pixelSize"}})
+            if max_cols >= 3:
+                req.append({"updateDimensionProperties":{"range":{"sheetId":sid,"dimension":"COLUMNS","startIndex":2,"endIndex":max_cols},"properties":{"pixelSize":115},"fields":"pixelSize"}})
+            return req
+
+        if GOOGLE_SHEETS_INCREMENTAL:
+            # v199: вкладка периода запоминается; в Google уходят только изменившиеся строки.
+            sheet_id, _sync = google_sheets_sync_tab(
+                (tid, target_chat_id, f"thuwed:{tab_title}"), spreadsheet_id, headers, tab_title, cell_rows, max_cols,
+                frozen_rows=2, on_create=_widths, service_email=service_email,
+            )
+        else:
+            meta = _google_request_guarded("v167_metadata", session.get, _google_sheets_url(spreadsheet_id), headers=headers, params={"fields": "spreadsheetId,properties.title,sheets.properties(sheetId,title,gridProperties)"}, timeout=45, attempts=2)
+            if meta.status_code >= 300:
+                if meta.status_code in (401,403):
+                    raise RuntimeError(f"Google Sheets access denied. Добавьте {service_email} как Редактор.")
+                raise RuntimeError(f"Google Sheets metadata {meta.status_code}: {meta.text[:500]}")
+            payload = meta.json(); sheet_id = None
+            for sh in payload.get("sheets") or []:
+                props = sh.get("properties") or {}
+                if str(props.get("title") or "") == tab_title:
+                    sheet_id = int(props.get("sheetId")); break
+            if sheet_id is None:
+                add = _google_request_guarded("v167_add_sheet", session.post, _google_sheets_url(spreadsheet_id, ":batchUpdate"), headers=headers, json={"requests":[{"addSheet":{"properties":{"title":tab_title,"gridProperties":{"rowCount":row_count,"columnCount":col_count,"frozenRowCount":2}}}}]}, timeout=60, attempts=1)
+                if add.status_code >= 300:
+                    raise RuntimeError(f"Google Sheets add tab {add.status_code}: {add.text[:500]}")
+                sheet_id = int(add.json()["replies"][0]["addSheet"]["properties"]["sheetId"])
+            req=[
+                {"updateCells":{"range":{"sheetId":sheet_id},"fields":"userEnteredValue,note,userEnteredFormat"}},
+                {"updateCells":{"range":{"sheetId":sheet_id,"startRowIndex":0,"startColumnIndex":0},"rows":cell_rows,"fields":"userEnteredValue,note,userEnteredFormat"}},
+            ] + _widths(sheet_id)
+            upd=_google_request_guarded("v167_update_named", session.post, _google_sheets_url(spreadsheet_id, ":batchUpdate"), headers=headers, json={"requests":req}, timeout=90, attempts=1)
+            if upd.status_code >= 300:
+                raise RuntimeError(f"Google Sheets update {upd.status_code}: {upd.text[:500]}")
         url=f"https://docs.google.com/spreadsheets/d/{spreadsheet_id}/edit#gid={sheet_id}"
     try:
         tenant_google_history(tid,"thuwed_auto_update",tab_title,ok=True,chat_id=target_chat_id,url=url)
@@ -160,6 +160,8 @@ def _v172_persist(chat_id: int, reason: str = "task_change") -> None:
     """Persist root state locally immediately and schedule compact MEGA delta."""
     try:
         with data_lock:
+            for key in (V172_TASKS_KEY, V172_TASK_SETTINGS_KEY, V172_TASK_SOURCE_INDEX_KEY):
+                SQLITE.root_touch(key)
             SQLITE.save_root(_sqlite_pack_root(data))
     except Exception as exc:
         try: log_error(f"v172 task SQLite root save: {exc}")
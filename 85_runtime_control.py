@@ -612,6 +612,7 @@ def _v176_speed_text() -> str:
     pools = [x for x in (_v176_pool_line(n) for n in (
         "UI_TASK_POOL", "V166_WINDOW_UI_TASK_POOL", "FINANCE_TASK_POOL", "FORWARD_TASK_POOL",
         "GENERAL_TASK_POOL", "DELTA_TASK_POOL", "BACKUP_TASK_POOL", "JOURNAL_TASK_POOL",
+        "WEB_TASK_POOL", "WEB_PROBE_TASK_POOL",
     )) if x]
     if pools:
         lines += ["", "Очереди active/pending:", " · ".join(pools)]
@@ -716,19 +717,26 @@ V196_BRANCH_CATALOG = {
         "tests": ["pure USD", "mixed ARS+USD", "polluted legacy USD filter"],
     },
     "finance.balance": {
-        "group": "💰 Финансы", "title": "Остаток / с ост", "rev": 2,
+        "group": "💰 Финансы", "title": "Остаток / с ост", "rev": 5,
         "purpose": "Показывать остаток начала дня и остаток после каждой операции.",
         "entry": ["кнопка «с ост»", "remaining_open:*", "переход день ←/→"],
-        "flow": ["выбранный день", "opening = закрытие предыдущего дня", "операции дня по порядку", "текущий остаток"],
-        "storage": ["record.amount", "gomonk settings"],
-        "depends": ["finance.ars", "finance.gomonk", "ui.main"],
+        "flow": ["выбранный день", "opening = закрытие предыдущего дня", "операции дня по порядку", "текущий остаток",
+                 "opening/day/month = bisect по FINANCE_BALANCE_INDEX (поденные итоги + префиксные суммы)",
+                 "add/edit/delete → delta_track_* → итог одного дня; USD пересобирается при первом обращении",
+                 "сборка индекса для холодного чата читает finance_records страницами (_export_stream_balance_rows), без копии ledger"],
+        "storage": ["record.amount", "gomonk settings", "SQLite balance_days/balance_index (штамп finance_generations)"],
+        "depends": ["finance.ars", "finance.gomonk", "ui.main", "storage.sqlite"],
         "invariants": [
             "остаток с прошлого раза = фактический остаток на конец предыдущего дня",
             "финансовый текст не переразбирается для восстановления суммы",
             "переключение гомонковых не меняет ledger",
             "день окна не меняется фоновым finalize",
+            "итог индекса = точная сумма канонических строк (целые единицы 2**-1074), бит-в-бит с Fraction полного прохода",
+            "поденные итоги с чужим поколением finance_records не читаются; каждые FINANCE_BALANCE_VERIFY_EVERY изменений — сверка с полным проходом",
+            "guard ARS: число строк и точная сумма ledger (finance_records_order_units) — правка суммы мимо delta_track_record → пересборка; finance_records_audit сверяет индекс с полным проходом",
         ],
-        "tests": ["previous-day carry", "11.08→12.08 carry", "remaining rows", "gomonk ON/OFF idempotent"],
+        "tests": ["previous-day carry", "11.08→12.08 carry", "remaining rows", "gomonk ON/OFF idempotent",
+                  "finance_balance_index_verify()", "BENCH_v199.py balance_index", "BENCH_v199.py finance_edits"],
     },
     "finance.gomonk": {
         "group": "💰 Финансы", "title": "Гомонковые ARS/USD", "rev": 2,
@@ -741,21 +749,31 @@ V196_BRANCH_CATALOG = {
         "tests": ["SET ON twice", "SET OFF twice", "ARS/USD independence"],
     },
     "finance.records": {
-        "group": "💰 Финансы", "title": "Записи · редактирование/удаление", "rev": 1,
+        "group": "💰 Финансы", "title": "Записи · редактирование/удаление", "rev": 5,
         "purpose": "Безопасно изменять существующие финансовые записи.",
         "entry": ["редактор записей", "edited Telegram message", "delete/bulk delete"],
-        "flow": ["выбор записи", "изменение", "integrity ledger", "rebuild derived state"],
-        "storage": ["records", "finance integrity ledger"],
+        "flow": ["выбор записи", "изменение", "integrity ledger", "rebuild derived state",
+                 "add/edit/finalize → normalize(incremental=True): bisect-вставка, short_id одного месяца, баланс на дельту",
+                 "через FINANCE_RECORDS_AUDIT_DELAY_SECONDS — фоновый полный normalize чата и сверка (finance_records_audit)",
+                 "поиск по message-id/record_uid → индекс чата (finance_msg_index_*), в LOW-RAM ledger грузится только при попадании в SQLite finance_msg_index"],
+        "storage": ["records", "finance integrity ledger", "мета чата _v199_records_order (штамп поколения finance_records)", "SQLite finance_msg_index"],
         "depends": ["finance.ars", "storage.constitution"],
-        "invariants": ["каждое изменение имеет witness", "удаление не затрагивает чужие записи", "derived indexes перестраиваются"],
-        "tests": ["edit", "delete", "bulk delete", "integrity event"],
+        "invariants": ["каждое изменение имеет witness", "удаление не затрагивает чужие записи", "derived indexes перестраиваются",
+                       "инкрементальный итог = полный проход: порядок records/daily, short_id, баланс; любое сомнение → полный проход",
+                       "вызов без incremental=True всегда полный (мутации мимо delta_track_record)",
+                       "правка записи на месте (edited message, finwin, пересылка, rebind, миграция USD) сразу зовёт delta_track_record",
+                       "баланс без отмеченных правок сверяется с records (fsum; ledger > FINANCE_RECORDS_UNITS_CHECK_MAX_ROWS — раз в FINANCE_RECORDS_UNITS_CHECK_SECONDS), расхождение → точный пересчёт + delta_track_chat_full; noop-settle ставит аудит",
+                       "индекс message-id отвечает тем же, что полный скан (ledger active → ars → usd, порядок списка); форма ledgers разошлась → пересборка"],
+        "tests": ["edit", "delete", "bulk delete", "integrity event", "finance_records_audit() drift=0", "BENCH_v199.py records_incremental",
+                  "finance_msg_index_verify() drift=0", "BENCH_v199.py msg_index", "BENCH_v199.py finance_edits"],
     },
     "export.excel": {
-        "group": "📊 Таблицы", "title": "Excel · единый ARS/USD", "rev": 4,
+        "group": "📊 Таблицы", "title": "Excel · единый ARS/USD", "rev": 5,
         "purpose": "Строить все XLSX из одного канонического набора финансовых данных.",
         "entry": ["Excel", "Excel статьи", "/tabl_lsx", "monthly XLSX", "Telegram download"],
-        "flow": ["period bounds", "canonical ARS/USD", "opening balance", "formulas", "OOXML validation", "delivery"],
-        "storage": ["finance ledgers", "category overrides"],
+        "flow": ["period bounds", "canonical ARS/USD", "opening balance", "formulas", "OOXML validation", "delivery",
+                 "OLD-стиль: export_stream_records (горячий список или страницы finance_records по дням) → итоги/формулы на лету → sheet XML потоком (EXPORT_STREAMING=0 — прежняя сборка списков)"],
+        "storage": ["finance ledgers", "category overrides", "SQLite finance_records (idx_finance_records_day)"],
         "depends": ["finance.ars", "finance.usd", "finance.balance"],
         "invariants": [
             "исправление Excel применяется ко всем Excel-путям и всем контурам",
@@ -763,38 +781,44 @@ V196_BRANCH_CATALOG = {
             "остаток начала периода един для Excel/CSV/Google/UI",
             "USD формулы не ссылаются на ARS-блок",
             "операция с описанием «приход/расход» не является служебной итоговой строкой",
+            "потоковый OLD-XLSX совпадает по ячейкам и формулам со списочной сборкой; пик памяти не растёт с длиной периода",
         ],
-        "tests": ["all periods", "formula refs", "opening carry", "category override", "Telegram workbook"],
+        "tests": ["all periods", "formula refs", "opening carry", "category override", "Telegram workbook",
+                  "BENCH_v199.py export (100k записей: время, пик RSS, совпадение ячеек)"],
     },
     "export.csv": {
-        "group": "📊 Таблицы", "title": "CSV · единый расчёт", "rev": 2,
+        "group": "📊 Таблицы", "title": "CSV · единый расчёт", "rev": 3,
         "purpose": "Выгружать CSV с тем же каноническим расчётом, что Excel.",
-        "entry": ["CSV день/неделя/месяц/Чт–Ср/всё"],
-        "flow": ["period → canonical records → opening/totals → file"],
-        "storage": ["finance ledgers"],
+        "entry": ["CSV день/неделя/месяц/Чт–Ср/всё", "точный период", "глобальный CSV (export_global_csv)"],
+        "flow": ["period → canonical records → opening/totals → file",
+                 "export_stream_records → write_csv_rows_with_day_gaps одним проходом; глобальный CSV — heapq.merge потоков чатов по дате"],
+        "storage": ["finance ledgers", "SQLite finance_records (idx_finance_records_day)"],
         "depends": ["export.excel"],
-        "invariants": ["CSV не имеет отдельной бухгалтерской логики", "ARS/USD не смешиваются", "opening совпадает с Excel"],
-        "tests": ["period parity with Excel", "delivery"],
+        "invariants": ["CSV не имеет отдельной бухгалтерской логики", "ARS/USD не смешиваются", "opening совпадает с Excel",
+                       "холодный чат не поднимается в RAM ради выгрузки"],
+        "tests": ["period parity with Excel", "delivery", "BENCH_v199.py export (байтовое совпадение CSV)"],
     },
     "export.google": {
-        "group": "📊 Таблицы", "title": "Google Sheets / Drive", "rev": 3,
+        "group": "📊 Таблицы", "title": "Google Sheets / Drive", "rev": 4,
         "purpose": "Заливать тот же отчёт, который скачивается в Telegram.",
         "entry": ["Залить в Google Sheets", "Google Drive", "авто Чт–Ср"],
-        "flow": ["canonical workbook/data → Google upload → delivery proof"],
-        "storage": ["Google config", "same export dataset"],
+        "flow": ["canonical workbook/data → Google upload → delivery proof",
+                 "google_http_session(tenant) → вкладка (чат, период) из sheet_tabs → дайджесты строк → один batchUpdate изменившихся диапазонов (GOOGLE_SHEETS_INCREMENTAL=0 — прежняя полная запись)"],
+        "storage": ["Google config", "same export dataset", "google_v149.sheet_tabs (sheetId, дайджесты строк)"],
         "depends": ["export.excel", "export.csv"],
-        "invariants": ["Google и Telegram одного периода получают один источник данных", "Google не пересчитывает ошибочные межблочные ссылки", "успех подтверждается отдельно от Telegram send_document"],
-        "tests": ["Telegram/Google parity", "external delivery proof", "Thu-Wed 7 days"],
+        "invariants": ["Google и Telegram одного периода получают один источник данных", "Google не пересчитывает ошибочные межблочные ссылки", "успех подтверждается отдельно от Telegram send_document",
+                       "неизменённые строки не отправляются; удалённая вручную вкладка пересоздаётся полной записью"],
+        "tests": ["Telegram/Google parity", "external delivery proof", "Thu-Wed 7 days", "BENCH_v199.py sheets (fake Sheets API: запросы, соединения, байты на выгрузку)"],
     },
     "ui.main": {
-        "group": "🪟 Интерфейс", "title": "Основное окно · единственный источник UI-даты", "rev": 2,
+        "group": "🪟 Интерфейс", "title": "Основное окно · единственный источник UI-даты", "rev": 3,
         "purpose": "Держать одно последнее основное финансовое окно на чат.",
         "entry": ["/start", "день ←/→", "календарь", "возврат в осн. окно"],
-        "flow": ["open day → primary main window", "new main retires old", "stale callback redirects"],
-        "storage": ["primary main window id/day", "window registry"],
+        "flow": ["open day → primary main window", "new main retires old", "stale callback redirects", "длинный callback → catx:/fvcatx:/cbx: токен (хэш содержимого) → LRU → SQLite callback_tokens"],
+        "storage": ["primary main window id/day", "window registry", "SQLite callback_tokens"],
         "depends": ["finance.ars"],
-        "invariants": ["одно каноническое основное окно", "старое окно не выполняет бизнес-действие", "finance finalize не меняет UI-день"],
-        "tests": ["stale main redirect", "day navigation", "background refresh does not resurrect old window"],
+        "invariants": ["одно каноническое основное окно", "старое окно не выполняет бизнес-действие", "finance finalize не меняет UI-день", "короткие callback-токены переживают рестарт до TTL; одна команда — один токен"],
+        "tests": ["stale main redirect", "day navigation", "background refresh does not resurrect old window", "BENCH_v199.py callback_tokens (100k live, restart)"],
     },
     "ui.info": {
         "group": "🪟 Интерфейс", "title": "Инфо / служебные меню", "rev": 2,
@@ -837,54 +861,56 @@ V196_BRANCH_CATALOG = {
         "tests": ["target day", "timeout", "normal input outside mode"],
     },
     "storage.sqlite": {
-        "group": "💾 Хранилище", "title": "SQLite · рабочее состояние", "rev": 1,
+        "group": "💾 Хранилище", "title": "SQLite · рабочее состояние", "rev": 9,
         "purpose": "Хранить материализованное рабочее состояние на текущем экземпляре Render.",
         "entry": ["load/save state", "snapshot"],
-        "flow": ["RAM ↔ SQLite", "snapshot → MEGA"],
-        "storage": ["SQLite tables kv/chats/meta/cold_fields"],
+        "flow": ["RAM ↔ SQLite", "snapshot → MEGA", "save_root → root_sections: пишутся только секции с новым digest/pos; большие секции без root_touch и с тем же объектом не сериализуются, сверка по digest — при full и раз в ROOT_SECTIONS_FULL_EVERY",
+                 "flush ledger: помеченные delta_track_record и новые записи сериализуются до SQLITE.lock; полная сверка по digest — при выгрузке чата и раз в FINANCE_ROW_SYNC_FULL_EVERY",
+                 "flush финализации чата (finance_rows_check): отпечатки строк сверяются с RAM без сериализации, разошедшиеся строки пишутся; ledger больше FINANCE_ROW_CHECK_MAX_ROWS — не чаще раза в FINANCE_ROW_CHECK_SECONDS"],
+        "storage": ["SQLite tables kv/chats/meta/cold_fields/finance_records/finance_msg_index/forward_links/forward_outcomes/balance_days/root_sections/callback_tokens"],
         "depends": [],
-        "invariants": ["локальный Render disk не считается долговечным", "SQLite integrity проверяется", "low-RAM cold fields сохраняются"],
-        "tests": ["quick_check", "save/load", "cold field roundtrip"],
+        "invariants": ["локальный Render disk не считается долговечным", "SQLite integrity проверяется", "low-RAM cold fields сохраняются", "finance ledger хранится строками; flush пишет только изменённые строки", "правка на месте мимо delta_track_record доходит до SQLite на ближайшей финализации чата", "pos разреженный: вставка задним числом не сдвигает следующие строки", "раскладка ledger в памяти сверяется с поколением finance_records", "finance_msg_index пишется в одной транзакции со строками finance_records", "root не содержит forward_index", "root_touch ставится после изменения секции, под её lock", "load_root собирает из секций тот же dict (ключи и порядок), kv['root'] — только legacy fallback"],
+        "tests": ["quick_check", "save/load", "cold field roundtrip", "legacy cold_fields → finance_records migration", "BENCH_v199.py finance_rows (no-op/правка/вставка/удаление, правка без пометки + финализация, диск == RAM)", "BENCH_v199.py finance_edits (заметка без пометки → SQLite == RAM)", "forward_links roundtrip", "BENCH_v199.py root_sections (roundtrip + bytes/ms per save, правка без пометки ловится полной сверкой)"],
     },
     "storage.mega": {
-        "group": "💾 Хранилище", "title": "MEGA · durable storage", "rev": 3,
+        "group": "💾 Хранилище", "title": "MEGA · durable storage", "rev": 7,
         "purpose": "Переживать deploy/restart и хранить долговечные snapshots/tasks/deltas.",
         "entry": ["durable witness", "delta", "generation", "runtime backup"],
-        "flow": ["small witness → background ledger/delta → verified full snapshot"],
-        "storage": ["/TelegramBotBackups"],
+        "flow": ["small witness → background ledger/delta → verified full snapshot", "все mega-* → MEGA_SESSION (v178 классы, N в полёте)", "witness burst → один tasks/segments/seg_*.json; done/failed → tasks/tombstones/tomb_*.json", "DURABLE_WAL_ENABLED=1: witness → локальный WAL (fsync) → shipper → seg_*/tomb_*", "universal global backup пишется потоком по одному чату (*.gz → gzip); delta baseline берёт подписи из writer"],
+        "storage": ["/TelegramBotBackups", "MEGA_BACKEND=local → MEGA_LOCAL_BACKEND_DIR", "DURABLE_WAL_DIR (только постоянный диск)"],
         "depends": ["storage.sqlite"],
-        "invariants": ["единственный canonical root /TelegramBotBackups", "пропавший root/path пересоздаётся", "пользователь не ждёт тяжёлый full snapshot"],
-        "tests": ["root self-heal", "one-put hot path", "restart recovery"],
+        "invariants": ["единственный canonical root /TelegramBotBackups", "пропавший root/path пересоздаётся", "пользователь не ждёт тяжёлый full snapshot", "более важный класс v178 не ждёт менее важный; один remote path — одна команда", "webhook отвечает только после put сегмента со своей задачей", "registry/recovery читают segments+tombstones", "WAL-запись CRC-проверена; рваный хвост обрезается при BOOT", "неотправленные WAL-сегменты отправляются до recovery и при shutdown", "global backup никогда не собирается целиком в RAM; поток байт-в-байт равен прежнему json.dump"],
+        "tests": ["root self-heal", "one-put hot path", "restart recovery", "BENCH_v199.py mega_session", "BENCH_v199.py mega_tasks (reload → все done)", "BENCH_v199.py wal (torn tail replay)", "BENCH_v199.py global_backup (peak RSS)"],
     },
     "storage.delta": {
-        "group": "💾 Хранилище", "title": "MEGA delta · compact WAL", "rev": 2,
+        "group": "💾 Хранилище", "title": "MEGA delta · compact WAL", "rev": 3,
         "purpose": "Закрывать промежуток между полными SQLite generations маленькими изменениями.",
         "entry": ["state change", "scheduled delta"],
-        "flow": ["coalesce → compact payload → MEGA → prune after verified snapshot"],
+        "flow": ["record tracking → coalesce → compact payload → MEGA → prune after verified snapshot"],
         "storage": ["/TelegramBotBackups/deltas"],
         "depends": ["storage.mega", "storage.constitution"],
-        "invariants": ["не копировать растущие operation ledger histories", "delta остаётся компактной", "не удалять recovery bridge до проверенного snapshot"],
-        "tests": ["real delta size", "coalescing", "retention"],
+        "invariants": ["не копировать растущие operation ledger histories", "delta остаётся компактной", "не удалять recovery bridge до проверенного snapshot", "incremental delta совпадает с full-scan (periodic verify)"],
+        "tests": ["real delta size", "coalescing", "retention", "incremental vs full-scan verify"],
     },
     "storage.constitution": {
-        "group": "💾 Хранилище", "title": "DATA CONSTITUTION", "rev": 3,
+        "group": "💾 Хранилище", "title": "DATA CONSTITUTION", "rev": 5,
         "purpose": "Защищать финансовую историю от тихой семантической потери.",
-        "entry": ["finance mutation", "snapshot publish", "boot restore", "manual restore"],
-        "flow": ["immutable witness", "semantic manifest", "generation", "quarantine on unexplained loss"],
-        "storage": ["ledger", "database/generations", "manifests/current_manifest"],
+        "entry": ["finance mutation", "snapshot publish", "boot restore", "manual restore", "/data_constitution verify"],
+        "flow": ["immutable witness", "semantic manifest", "generation", "quarantine on unexplained loss", "сводки чатов по поколению finance_records → Merkle-корень → semantic_hash", "событие леджера → локальный сегмент (fsync) → закрытие по размеру/возрасту → один put сегмента + segments_index.json"],
+        "storage": ["ledger/finance/segments/ledger_seg_<first>_<last>_<hash>.json", "ledger/finance/segments_index.json", "CONSTITUTION_LEDGER_DIR (локальные сегменты)", "database/generations", "manifests/current_manifest", "SQLite constitution_chat_semantics (штамп finance_generations)"],
         "depends": ["storage.sqlite", "storage.mega"],
-        "invariants": ["SQLite integrity недостаточно — нужна semantic completeness", "unexplained history loss → quarantine", "restore creates checkpoint/reanchor"],
-        "tests": ["semantic loss rejection", "generation fallback", "restore reanchor", "protected symbols"],
+        "invariants": ["SQLite integrity недостаточно — нужна semantic completeness", "unexplained history loss → quarantine", "restore creates checkpoint/reanchor", "live-манифест пересчитывает только чаты со сменившимся поколением; загруженные в память леджеры считаются по памяти", "semantic_hash не зависит от created_at: полный проход и инкрементальный путь дают один hash", "durable-задача не завершается, пока сегмент с её токеном не в MEGA", "без durable-задачи событие отправляется сразу (сегмент закрывается принудительно)", "BOOT: неотправленные сегменты → MEGA, отставший highwater догоняется по индексу без листинга"],
+        "tests": ["semantic loss rejection", "generation fallback", "restore reanchor", "protected symbols", "/data_constitution verify (full scan ≡ incremental)", "BENCH_v199.py constitution", "BENCH_v199.py ledger (500 событий → 1 сегмент)"],
     },
     "forward.core": {
-        "group": "🔁 Пересылка", "title": "Пересылка · правила/доставка", "rev": 1,
+        "group": "🔁 Пересылка", "title": "Пересылка · правила/доставка", "rev": 3,
         "purpose": "Пересылать разрешённый контент между настроенными чатами без дублей.",
         "entry": ["forward rules", "message router"],
-        "flow": ["source message → rule → durable task → destination"],
-        "storage": ["forward_rules/edges", "durable tasks"],
-        "depends": ["storage.mega"],
-        "invariants": ["нет дублей", "правила других чатов не повреждаются", "restore edges exact"],
-        "tests": ["single forward", "duplicate guard", "restore edges"],
+        "flow": ["source message → rule → durable task → token-bucket slot → destination", "delivered → SQLite forward_links (src↔dst) → delta только по изменённым источникам"],
+        "storage": ["forward_rules/edges", "durable tasks", "SQLite forward_links / forward_outcomes"],
+        "depends": ["storage.mega", "storage.sqlite"],
+        "invariants": ["нет дублей", "правила других чатов не повреждаются", "restore edges exact", "пауза/429 одного чата не задерживает другие чаты", "карта копий не пишется в root; поиск копии и origin по индексу", "forward_index в backup собирается из forward_links; TTL FORWARD_MAP_TTL_DAYS", "исходы прошлых процессов не считаются живым доказательством"],
+        "tests": ["single forward", "duplicate guard", "restore edges", "burst в один чат + одиночная отправка в другой", "legacy root forward_index → forward_links", "BENCH_v199.py forward_map"],
     },
     "forward.media": {
         "group": "🔁 Пересылка", "title": "Пересылка · media groups", "rev": 1,
@@ -907,24 +933,25 @@ V196_BRANCH_CATALOG = {
         "tests": ["create", "selected chats", "close", "restart"],
     },
     "reminders.core": {
-        "group": "⏰ Напоминания", "title": "Напоминания", "rev": 1,
+        "group": "⏰ Напоминания", "title": "Напоминания", "rev": 2,
         "purpose": "Надёжно планировать и доставлять напоминания.",
         "entry": ["reminder commands/UI", "scheduler"],
-        "flow": ["create → scheduler → delivery → next/complete"],
+        "flow": ["create → scheduler → delivery → next/complete", "touch → deadline index → reminder-due timer → batch(due + chat members)"],
         "storage": ["reminders state"],
         "depends": ["storage.sqlite", "storage.mega"],
-        "invariants": ["не теряются после restart", "не дублируются при replay", "очередь имеет завершение"],
-        "tests": ["one-shot", "recurring", "restart", "dedupe"],
+        "invariants": ["не теряются после restart", "не дублируются при replay", "очередь имеет завершение", "правка пересчитывает срок только своей напоминалки; полный обход только при сборке индекса"],
+        "tests": ["one-shot", "recurring", "restart", "dedupe", "deadline jitter", "10k reminders"],
     },
     "multitenant.core": {
-        "group": "🏢 Доступ", "title": "Пространства / круги / роли", "rev": 1,
+        "group": "🏢 Доступ", "title": "Пространства / круги / роли", "rev": 2,
         "purpose": "Изолировать владельца, пространства и доступные пользователям функции.",
         "entry": ["space menu", "permissions", "circle views"],
         "flow": ["actor → tenant/role → permission → operation"],
         "storage": ["tenant/owner scope", "permissions"],
         "depends": [],
-        "invariants": ["данные пространств не смешиваются", "глобальные исправления функций действуют во всех контурах где функция доступна", "owner-only операции закрыты"],
-        "tests": ["owner", "circle1", "circle2", "permission deny"],
+        "invariants": ["данные пространств не смешиваются", "глобальные исправления функций действуют во всех контурах где функция доступна", "owner-only операции закрыты",
+                       "порядок блокировок: data_lock → _TENANT_LOCK (tenant_create/bootstrap берут оба)"],
+        "tests": ["owner", "circle1", "circle2", "permission deny", "REPLAY_v199.py: 40 соединений, первые update новых чатов без deadlock"],
     },
     "diagnostics.journal": {
         "group": "🩺 Диагностика", "title": "Журналы / диагностика", "rev": 3,
@@ -942,24 +969,35 @@ V196_BRANCH_CATALOG = {
         "tests": ["current/full journal", "custom filename", "warm tail", "owner-only technical alerts", "non-owner contour has no W/Ф/🚨 diagnostic helper"],
     },
     "runtime.performance": {
-        "group": "🩺 Диагностика", "title": "Процессы / скорость", "rev": 1,
+        "group": "🩺 Диагностика", "title": "Процессы / скорость", "rev": 8,
         "purpose": "Измерять UI latency и управлять необязательными тяжёлыми процессами.",
-        "entry": ["Инфо → Процессы / скорость"],
-        "flow": ["toggle optional process → repeat transitions → P50/P90"],
+        "entry": ["Инфо → Процессы / скорость", "Render Watcher → очереди"],
+        "flow": ["toggle optional process → repeat transitions → P50/P90", "KeyedTaskPool: приоритет 0..3 → старение → donor lane (lend_to) → wait/run P50/P95/P99", "DELAYED_SCHEDULER: timing wheel 256×64×64×64 тиков (DELAYED_SCHEDULER_BACKEND=heap — прежний heap)", "finance_cache_get: LRU по (вид, чат, поколение ledger) → замороженное значение без копии; delta_track_* → finance_ledger_bump",
+                 "приём update: webhook или TELEGRAM_INGEST_MODE=polling (getUpdates-пачки) → общий telegram_update_admit → lane → telegram_update_reply",
+                 "HTTP: WEB_SERVER_MODE=bounded → WEB_TASK_POOL / WEB_PROBE_TASK_POOL (GET/HEAD /healthz /readyz /keepalive /), латентность по маршрутам"],
         "storage": ["process_control_v176"],
         "depends": ["diagnostics.journal"],
-        "invariants": ["ядро бота нельзя выключить диагностикой", "финансы/пересылка/SQLite остаются core", "diagnostics remain available in test profiles"],
-        "tests": ["profile fast", "profile minimal", "locked core"],
+        "invariants": ["ядро бота нельзя выключить диагностикой", "финансы/пересылка/SQLite остаются core", "diagnostics remain available in test profiles", "один ключ — один воркер и строгий порядок, даже у одолженного воркера", "донор одалживает не больше lend max воркеров", "перепланирование таймера не оставляет устаревших записей", "кэш финансовых окон не копирует ledger для ключа и не отдаёт изменяемые значения",
+                       "getUpdates offset подтверждается только до первого update с 5xx-исходом общего пути (BOOT/durable/BUSY/PENDING)",
+                       "update, проваливший (RETRY/ERROR) POLLING_MAX_ATTEMPTS попыток подряд, подтверждается и уходит в журнал проблем (operation_fail tg:<update_id>)",
+                       "health/readiness-пробы не стоят в очереди за webhook; переполненная линия сразу отвечает 503"],
+        "tests": ["profile fast", "profile minimal", "locked core", "BENCH_v199.py pool (per-key order kept)", "BENCH_v199.py timers", "BENCH_v199.py view_cache",
+                  "BENCH_v199.py ingest", "BENCH_v199.py web",
+                  "REPLAY_v199.py --compare <отчёт прошлого релиза> (wait по линиям, e2e P95/P99, вызовы Bot API на update, peak RSS)"],
     },
     "secret.core": {
-        "group": "🔐 Прочее", "title": "SECRET / скрытые функции", "rev": 1,
+        "group": "🔐 Прочее", "title": "SECRET / скрытые функции", "rev": 2,
         "purpose": "Сохранять штатную SECRET-функциональность и её доступы.",
         "entry": ["SECRET controls/messages"],
-        "flow": ["permission → action → persist"],
-        "storage": ["secret settings/notes"],
-        "depends": ["multitenant.core"],
-        "invariants": ["не отключается меню диагностики", "доступы соблюдаются"],
-        "tests": ["permission", "persistence"],
+        "flow": ["permission → action → persist",
+                 "медиа: file_unique_id → известный blob | скачать → sha256 → известный blob | загрузить / TRANSCODE_TASK_POOL (ffmpeg с лимитами) → blob → ссылки записей"],
+        "storage": ["secret settings/notes", "MEGA secrets/blobs/<sha[:2]>/<sha256>", "SQLite secret_blobs/secret_blob_aliases"],
+        "depends": ["multitenant.core", "storage.mega"],
+        "invariants": ["не отключается меню диагностики", "доступы соблюдаются",
+                       "одинаковый файл не скачивается, не сжимается и не загружается повторно",
+                       "проход загрузки трогает только записи без сохранённого медиа",
+                       "общий blob удаляется только вместе с последней ссылающейся записью"],
+        "tests": ["permission", "persistence", "дубликат по file_unique_id / по sha256", "переполнение очереди сжатия → повтор"],
     },
     "system.branch_registry": {
         "group": "🛡 Защита", "title": "Ветки функций / контракты", "rev": 1,
@@ -1785,7 +1823,13 @@ def _v153_validate_restore_gz(gz_path: str):
             except Exception:
                 chat_ids = []
             record_count = 0
-            if "cold_fields" in tables:
+            if "finance_records" in tables:
+                try:
+                    row = conn.execute("SELECT COUNT(*) FROM finance_records WHERE currency='active'").fetchone()
+                    record_count = int(row[0] or 0) if row else 0
+                except Exception:
+                    pass
+            if not record_count and "cold_fields" in tables:
                 try:
                     for (value,) in conn.execute("SELECT v FROM cold_fields WHERE k='records'").fetchall():
                         try:
@@ -80,6 +80,7 @@ def _finance_add_record_base(
                 if (operation_key and str(existing.get("operation_key") or "") == operation_key) or int(existing.get("source_msg_id") or 0) == int(source_msg_id):
                     if operation_key and not existing.get("operation_key"):
                         existing["operation_key"] = operation_key
+                        delta_track_record(chat_id, existing)
                     bot_journal("finance_duplicate_blocked", chat_id, f"source_msg_id={source_msg_id} operation_key={operation_key}")
                     if op_id and "operation_complete" in globals(): operation_complete(op_id, "duplicate blocked; existing record reused")
                     return existing
@@ -106,15 +107,17 @@ def _finance_add_record_base(
             rec["source_finance_text"] = str(source_finance_text)
 
         store.setdefault("records", []).append(rec)
-        normalize_chat_records(chat_id)
-        store["next_id"] = max([int(r.get("id", 0) or 0) for r in store.get("records", [])] + [0]) + 1
-        store["balance"] = sum(float(r.get("amount", 0) or 0) for r in store.get("records", []))
+        # v199: новая запись встаёт бинарным поиском, short_id — только её месяц, баланс — на дельту.
+        normalize_chat_records(chat_id, incremental=True)
+        store["next_id"] = finance_records_max_id(chat_id) + 1
+        recalc_balance(chat_id, incremental=True)
 
-        rebuild_month_short_ids(chat_id)
+        rebuild_month_short_ids(chat_id, incremental=True)
         rebuild_global_records()
         # v168: commit the concrete row locally and repaint visible Ф91 before slower reserve/root/MEGA work.
         try:
             if "ensure_finance_record_uid" in globals(): ensure_finance_record_uid(int(chat_id), rec)
+            delta_track_record(chat_id, rec)
             if "persist_finance_chat_local_fast" in globals(): persist_finance_chat_local_fast(int(chat_id))
         except Exception as _v168_local_exc:
             try: log_error(f"v168 record local commit {chat_id}: {_v168_local_exc}")
@@ -138,6 +141,8 @@ def delete_record_in_chat(chat_id: int, rid: int):
         deleted_record = next((copy.deepcopy(x) for x in store.get("records", []) if int(x.get("id", -1)) == int(rid)), None)
 
         store["records"] = [x for x in store["records"] if x["id"] != rid]
+        if deleted_record:
+            delta_track_record(chat_id, None, deleted=True, key=_delta_record_key(deleted_record))
 
         for day, arr in list(store.get("daily_records", {}).items()):
             arr2 = [x for x in arr if x["id"] != rid]
@@ -164,7 +169,10 @@ def renumber_chat_records(chat_id: int):
     all_recs.sort(key=record_sort_key)
 
     for new_id, r in enumerate(all_recs, 1):
-        r["id"] = new_id
+        if r.get("id") != new_id:
+            old_key = _delta_record_key(r)
+            r["id"] = new_id
+            delta_track_record_rekey(chat_id, old_key, r)
 
     store["records"] = all_recs
     rebuilt_daily = {}
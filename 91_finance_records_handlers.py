@@ -15,11 +15,331 @@ def _record_day_key(rec: dict) -> str:
     return rec["day_key"]
 
 
-def normalize_chat_records(chat_id: int) -> None:
-    """
-    v33: records — основной источник, daily_records строится из него.
-    Сортировка стабильная: Telegram date + исходный message_id, чтобы 1 2 3 4 не превращалось в 1 2 4 3.
-    """
+# v199: инкрементальный режим normalize/recalc/short_id.  Полный проход остаётся
+# эталоном (и для любых вызовов без incremental=True), а горячие пути — добавление,
+# правка и финализация — ставят только изменённые записи бинарным поиском,
+# перенумеровывают затронутые месяцы и двигают баланс на дельту.  Дрейф от мутаций
+# мимо delta_track_record ловит отложенный фоновый полный аудит чата, а баланс, для
+# которого с прошлого пересчёта ничего не отмечено, сверяется с records (fsum) сразу.
+FINANCE_RECORDS_INCREMENTAL = _env_bool("FINANCE_RECORDS_INCREMENTAL", "1")
+try:
+    FINANCE_RECORDS_PENDING_LIMIT = max(1, int(os.getenv("FINANCE_RECORDS_PENDING_LIMIT", "64") or "64"))
+except Exception:
+    FINANCE_RECORDS_PENDING_LIMIT = 64
+try:
+    FINANCE_RECORDS_AUDIT_DELAY_SECONDS = max(0, int(os.getenv("FINANCE_RECORDS_AUDIT_DELAY_SECONDS", "120") or "120"))
+except Exception:
+    FINANCE_RECORDS_AUDIT_DELAY_SECONDS = 120
+# Сверка units с records — проход по всем суммам (~20 мс на 100k строк): небольшие ledger сверяются
+# на каждом балансе без отмеченных правок, большие — не чаще раза в FINANCE_RECORDS_UNITS_CHECK_SECONDS.
+FINANCE_RECORDS_UNITS_CHECK_MAX_ROWS = _env_int("FINANCE_RECORDS_UNITS_CHECK_MAX_ROWS", 20000, 0, 100000000)
+FINANCE_RECORDS_UNITS_CHECK_SECONDS = _env_int("FINANCE_RECORDS_UNITS_CHECK_SECONDS", 30, 0, 86400)
+_FINANCE_ORDER_STAMP_KEY = "_v199_records_order"
+_FINANCE_ORDER_LOCK = threading.RLock()
+_FINANCE_ORDER_LOCAL = threading.local()
+_FINANCE_ORDER_STATE = {}
+_FINANCE_ORDER_AUDIT_QUEUED = set()
+_FINANCE_ORDER_STATS = defaultdict(int)
+
+
+def _normalize_record_fields(chat_id: int, rec: dict) -> None:
+    """Поля по умолчанию, day_key и record_uid одной записи (общая часть полного и инкрементального режимов)."""
+    before_len = len(rec); before_uid = rec.get("record_uid")
+    rec.setdefault("timestamp", now_local().isoformat(timespec="seconds"))
+    rec.setdefault("amount", 0)
+    rec.setdefault("note", "")
+    rec.setdefault("owner", "")
+    rec.setdefault("source_order_msg_id", rec.get("source_msg_id") or rec.get("origin_msg_id") or rec.get("msg_id") or rec.get("id") or 0)
+    _record_day_key(rec)
+    try:
+        if "ensure_finance_record_uid" in globals(): ensure_finance_record_uid(int(chat_id), rec)
+    except Exception: pass
+    if rec.get("record_uid") != before_uid:
+        delta_track_record_rekey(chat_id, _delta_record_key(dict(rec, record_uid=before_uid)), rec)
+    elif len(rec) != before_len:
+        delta_track_record(chat_id, rec)
+
+
+def _record_id_int(rec: dict) -> int:
+    try:
+        return int(rec.get("id", 0) or 0)
+    except Exception:
+        return 0
+
+
+def _finance_order_bind(chat_id: int, records: list, daily: dict, units: int, max_id: int, ids_ok: bool = False, n: int | None = None) -> dict:
+    n = len(records) if n is None else int(n)
+    state = {
+        "records": records, "daily": daily, "n": n, "tail": records[n - 1] if n else None,
+        "units": int(units), "max_id": int(max_id), "amounts": None, "pending": {}, "ids_ok": bool(ids_ok),
+        # fresh: units только что посчитаны/сдвинуты по отмеченным правкам — recalc_balance может им верить.
+        "fresh": True, "checked_at": 0.0,
+    }
+    with _FINANCE_ORDER_LOCK:
+        _FINANCE_ORDER_STATE[int(chat_id)] = state
+    return state
+
+
+def _finance_order_seed(chat_id: int, records: list, daily: dict) -> dict:
+    """Состояние после полного прохода: записи отсортированы, daily собран из них же."""
+    units = 0; max_id = 0
+    for rec in records:
+        units += balance_units(rec.get("amount"))
+        rid = _record_id_int(rec)
+        if rid > max_id:
+            max_id = rid
+    with _FINANCE_ORDER_LOCK:
+        _FINANCE_ORDER_STATS["full"] += 1
+    return _finance_order_bind(chat_id, records, daily, units, max_id)
+
+
+def _finance_order_adopt(chat_id: int, store: dict, records: list, daily: dict):
+    """LOW-RAM: список только что поднят из SQLite в порядке pos; штамп последнего flush
+    говорит, что именно этот набор строк был нормализован."""
+    if not LOWRAM_ENABLED:
+        return None
+    stamp = dict.get(store, _FINANCE_ORDER_STAMP_KEY)
+    if not isinstance(stamp, dict):
+        return None
+    try:
+        n = int(stamp.get("n", -1))
+        # Хвост сверх n — записи, добавленные уже после загрузки (их поставит settle).
+        if not 0 < n <= len(records) or int(stamp.get("gen", -1)) != SQLITE.finance_generation(int(chat_id)):
+            return None
+        if list(stamp.get("edges") or []) != [_delta_record_key(records[0]), _delta_record_key(records[n - 1])]:
+            return None
+        state = _finance_order_bind(chat_id, records, daily, int(stamp.get("units") or 0), int(stamp.get("max_id") or 0), bool(stamp.get("ids")), n=n)
+    except Exception:
+        return None
+    with _FINANCE_ORDER_LOCK:
+        _FINANCE_ORDER_STATS["adopted"] += 1
+    return state
+
+
+def _finance_order_current(chat_id: int, store: dict):
+    """Состояние, которое всё ещё описывает текущие объекты records/daily_records, либо None."""
+    with _FINANCE_ORDER_LOCK:
+        state = _FINANCE_ORDER_STATE.get(int(chat_id))
+    if state is None:
+        return None
+    if dict.get(store, "records") is not state["records"] or dict.get(store, "daily_records") is not state["daily"]:
+        return None
+    return state
+
+
+def finance_records_order_note(chat_id: int, rec: dict | None = None, deleted: bool = False) -> None:
+    """Хук delta_track_record* для активного ledger: запись изменена на месте (или удалена)."""
+    try:
+        cid = int(chat_id)
+    except Exception:
+        return
+    if getattr(_FINANCE_ORDER_LOCAL, "busy", None) == cid:
+        return
+    with _FINANCE_ORDER_LOCK:
+        state = _FINANCE_ORDER_STATE.get(cid)
+        if state is None:
+            return
+        if deleted or rec is None:
+            # Удаление всегда пересобирает список; позицию по ключу без записи не найти.
+            _FINANCE_ORDER_STATE.pop(cid, None)
+            return
+        if len(state["pending"]) >= FINANCE_RECORDS_PENDING_LIMIT:
+            # Массовая правка (перенумерация, миграция) — дешевле один полный проход.
+            _FINANCE_ORDER_STATE.pop(cid, None)
+            return
+        state["pending"][id(rec)] = rec
+
+
+def finance_records_order_release(chat_id: int | None = None) -> None:
+    """Списки выгружены из RAM (LOW-RAM evict) или заменены целиком."""
+    with _FINANCE_ORDER_LOCK:
+        if chat_id is None:
+            _FINANCE_ORDER_STATE.clear()
+        else:
+            _FINANCE_ORDER_STATE.pop(int(chat_id), None)
+
+
+def finance_records_order_clean(chat_id: int, records, daily) -> bool:
+    """True, если records/daily — ровно нормализованное состояние без незакрытых правок."""
+    with _FINANCE_ORDER_LOCK:
+        state = _FINANCE_ORDER_STATE.get(int(chat_id))
+        if state is None or state["records"] is not records or state["daily"] is not daily or state["pending"]:
+            return False
+    return state["n"] == len(records) and (not records or records[-1] is state["tail"])
+
+
+def finance_records_order_stamp(chat_id: int, records) -> dict | None:
+    """Штамп для меты чата при LOW-RAM flush (поколение finance_rows добавляет вызывающий)."""
+    with _FINANCE_ORDER_LOCK:
+        state = _FINANCE_ORDER_STATE.get(int(chat_id))
+        if state is None or state["records"] is not records or state["pending"]:
+            return None
+        if state["n"] != len(records) or (records and records[-1] is not state["tail"]):
+            return None
+        edges = [_delta_record_key(records[0]), _delta_record_key(records[-1])] if records else []
+        return {"n": state["n"], "units": str(state["units"]), "max_id": state["max_id"], "ids": bool(state["ids_ok"]), "edges": edges}
+
+
+def finance_records_order_units(chat_id: int, records) -> int | None:
+    """Точная сумма units ровно этого списка без незакрытых правок (сверка FINANCE_BALANCE_INDEX), иначе None."""
+    with _FINANCE_ORDER_LOCK:
+        state = _FINANCE_ORDER_STATE.get(int(chat_id))
+        if state is None or state["records"] is not records or state["pending"]:
+            return None
+        if state["n"] != len(records) or (records and records[-1] is not state["tail"]):
+            return None
+        return int(state["units"])
+
+
+def finance_records_max_id(chat_id: int) -> int:
+    store = get_chat_store(chat_id)
+    state = _finance_order_current(chat_id, store)
+    if state is not None and state["n"] == len(store.get("records") or []):
+        return int(state["max_id"])
+    return max([_record_id_int(r) for r in store.get("records", []) or [] if isinstance(r, dict)] + [0])
+
+
+def _finance_order_locate(records: list, rec: dict) -> int:
+    key = record_sort_key(rec)
+    i = bisect.bisect_left(records, key, key=record_sort_key)
+    while i < len(records) and record_sort_key(records[i]) == key:
+        if records[i] is rec:
+            return i
+        i += 1
+    return -1
+
+
+def _renumber_short_ids_days(chat_id: int, daily: dict, day_keys) -> None:
+    """R/U нумерация по дням в порядке day_keys; счётчики живут в пределах месяца."""
+    month_counters = {}
+    usd_month_counters = {}
+    for dk in day_keys:
+        month_key = dk[:7]
+        month_counters.setdefault(month_key, 1)
+        usd_month_counters.setdefault(month_key, 1)
+        recs = sorted(daily.get(dk, []) or [], key=record_sort_key)
+        daily[dk] = recs
+        for r in recs:
+            try:
+                if "ensure_finance_record_uid" in globals(): ensure_finance_record_uid(int(chat_id), r)
+            except Exception: pass
+            has_usd = bool(float(r.get("usd_amount", 0) or 0))
+            usd_only = bool(r.get("usd_only", False))
+            before_ids = (r.get("short_id"), r.get("usd_short_id"))
+            if not usd_only:
+                r["short_id"] = f"R{month_counters[month_key]}"
+                month_counters[month_key] += 1
+            elif has_usd:
+                r["short_id"] = f"U{usd_month_counters[month_key]}"
+            if has_usd:
+                r["usd_short_id"] = f"U{usd_month_counters[month_key]}"
+                usd_month_counters[month_key] += 1
+            if (r.get("short_id"), r.get("usd_short_id")) != before_ids:
+                delta_track_record(chat_id, r)
+
+
+def _finance_order_month_days(records: list, month_key: str) -> list:
+    """Дни месяца из отсортированного records: два бинарных поиска + проход по одному месяцу."""
+    day_of = lambda r: str(r.get("day_key", ""))[:7]
+    lo = bisect.bisect_left(records, month_key, key=day_of)
+    hi = bisect.bisect_right(records, month_key, lo=lo, key=day_of)
+    days = []
+    for rec in records[lo:hi]:
+        dk = _record_day_key(rec)
+        if not days or days[-1] != dk:
+            days.append(dk)
+    return sorted(set(days))
+
+
+def _finance_order_settle(chat_id: int, store: dict) -> bool:
+    """Инкрементальный normalize + short_id + баланс.  False — нужен полный проход."""
+    cid = int(chat_id)
+    records = store.get("records")
+    daily = store.get("daily_records")
+    if not isinstance(records, list) or not records or not isinstance(daily, dict):
+        return False
+    with _FINANCE_ORDER_LOCK:
+        state = _FINANCE_ORDER_STATE.get(cid)
+    if state is None or state["records"] is not records:
+        state = _finance_order_adopt(cid, store, records, daily)
+        if state is None:
+            return False
+    if state["daily"] is not daily:
+        return False
+    n = state["n"]
+    if len(records) < n or (n and records[n - 1] is not state["tail"]):
+        return False
+    with _FINANCE_ORDER_LOCK:
+        pending = state["pending"]
+        state["pending"] = {}
+    appended = records[n:]
+    if not appended and not pending:
+        with _FINANCE_ORDER_LOCK:
+            _FINANCE_ORDER_STATS["noop"] += 1
+        # Финализация без отмеченных правок — возможно, правка прошла мимо delta_track_record.
+        _finance_order_schedule_audit(cid)
+        return True
+    if len(appended) + len(pending) > FINANCE_RECORDS_PENDING_LIMIT or not all(isinstance(r, dict) for r in appended):
+        return False
+    months = set()
+    _FINANCE_ORDER_LOCAL.busy = cid
+    try:
+        if appended:
+            del records[n:]
+            for rec in appended:
+                _normalize_record_fields(cid, rec)
+                bisect.insort_right(records, rec, key=record_sort_key)
+                dk = _record_day_key(rec)
+                day = daily.setdefault(dk, [])
+                if any(x is rec for x in day):
+                    # daily уже собран из records вместе с хвостом (ленивая загрузка) — переставить.
+                    day[:] = [x for x in day if x is not rec]
+                bisect.insort_right(day, rec, key=record_sort_key)
+                state["units"] += balance_units(rec.get("amount"))
+                if state["amounts"] is not None:
+                    state["amounts"][id(rec)] = rec.get("amount")
+                state["max_id"] = max(state["max_id"], _record_id_int(rec))
+                months.add(dk[:7])
+        added = {id(r) for r in appended}
+        edited = [r for k, r in pending.items() if k not in added and isinstance(r, dict)]
+        for rec in edited:
+            _normalize_record_fields(cid, rec)
+            # Ключ сортировки сменился (перенос дня/времени) — позицию не найти, честный полный проход.
+            if _finance_order_locate(records, rec) < 0:
+                return False
+            dk = _record_day_key(rec)
+            if not any(x is rec for x in daily.get(dk) or []):
+                return False
+            months.add(dk[:7])
+        if edited:
+            amounts = state["amounts"]
+            if amounts is None:
+                # Первая правка после загрузки: старых сумм нет, один дешёвый проход по amount.
+                state["amounts"] = {id(r): r.get("amount") for r in records}
+                state["units"] = sum(balance_units(a) for a in state["amounts"].values())
+            else:
+                for rec in edited:
+                    new = rec.get("amount")
+                    state["units"] += balance_units(new) - balance_units(amounts.get(id(rec)))
+                    amounts[id(rec)] = new
+            state["max_id"] = max([state["max_id"]] + [_record_id_int(r) for r in edited])
+        for month_key in sorted(months):
+            _renumber_short_ids_days(cid, daily, _finance_order_month_days(records, month_key))
+    finally:
+        _FINANCE_ORDER_LOCAL.busy = None
+    state["n"] = len(records)
+    state["tail"] = records[-1] if records else None
+    state["fresh"] = True
+    with _FINANCE_ORDER_LOCK:
+        _FINANCE_ORDER_STATS["incremental"] += 1
+        _FINANCE_ORDER_STATS["placed"] += len(appended)
+        _FINANCE_ORDER_STATS["edited"] += len(edited)
+        _FINANCE_ORDER_STATS["months"] += len(months)
+    _finance_order_schedule_audit(cid)
+    return True
+
+
+def _normalize_chat_records_full(chat_id: int) -> None:
     store = get_chat_store(chat_id)
     records = store.get("records")
     daily = store.get("daily_records") or {}
@@ -37,15 +357,7 @@ def normalize_chat_records(chat_id: int) -> None:
     for rec in records or []:
         if not isinstance(rec, dict):
             continue
-        rec.setdefault("timestamp", now_local().isoformat(timespec="seconds"))
-        rec.setdefault("amount", 0)
-        rec.setdefault("note", "")
-        rec.setdefault("owner", "")
-        rec.setdefault("source_order_msg_id", rec.get("source_msg_id") or rec.get("origin_msg_id") or rec.get("msg_id") or rec.get("id") or 0)
-        _record_day_key(rec)
-        try:
-            if "ensure_finance_record_uid" in globals(): ensure_finance_record_uid(int(chat_id), rec)
-        except Exception: pass
+        _normalize_record_fields(chat_id, rec)
         clean.append(rec)
 
     clean.sort(key=record_sort_key)
@@ -55,47 +367,219 @@ def normalize_chat_records(chat_id: int) -> None:
     for rec in clean:
         rebuilt_daily.setdefault(_record_day_key(rec), []).append(rec)
     store["daily_records"] = rebuilt_daily
+    _finance_order_seed(chat_id, clean, rebuilt_daily)
 
 
-def recalc_balance(chat_id: int):
-    normalize_chat_records(chat_id)
+def _finance_order_try_settle(chat_id: int) -> bool:
+    if not FINANCE_RECORDS_INCREMENTAL:
+        return False
+    try:
+        if _finance_order_settle(int(chat_id), get_chat_store(chat_id)):
+            return True
+    except Exception as exc:
+        log_error(f"finance records incremental normalize {chat_id}: {exc}")
+    with _FINANCE_ORDER_LOCK:
+        _FINANCE_ORDER_STATS["fallbacks"] += 1
+    return False
+
+
+def normalize_chat_records(chat_id: int, incremental: bool = False) -> None:
+    """
+    v33: records — основной источник, daily_records строится из него.
+    Сортировка стабильная: Telegram date + исходный message_id, чтобы 1 2 3 4 не превращалось в 1 2 4 3.
+    v199: incremental=True ставит только добавленные/изменённые записи; при любом сомнении — полный проход.
+    """
+    if incremental and _finance_order_try_settle(chat_id):
+        return
+    _FINANCE_ORDER_LOCAL.busy = int(chat_id)
+    try:
+        _normalize_chat_records_full(chat_id)
+    finally:
+        _FINANCE_ORDER_LOCAL.busy = None
+
+
+def _finance_order_verify_units(chat_id: int, store: dict, state: dict) -> int:
+    """С прошлого баланса ничего не отмечено: сверить units с records, при расхождении — точный пересчёт."""
+    records = store.get("records") or []
+    now = time.monotonic()
+    if len(records) > FINANCE_RECORDS_UNITS_CHECK_MAX_ROWS and now - state["checked_at"] < FINANCE_RECORDS_UNITS_CHECK_SECONDS:
+        # Большой ledger недавно сверен; до следующей сверки расхождение ловит аудит, поставленный noop-settle.
+        return state["units"]
+    state["checked_at"] = now
+    try:
+        ok = math.fsum(float(r.get("amount", 0) or 0) for r in records) == balance_from_units(state["units"])
+    except Exception:
+        ok = False
+    with _FINANCE_ORDER_LOCK:
+        _FINANCE_ORDER_STATS["units_checks"] += 1
+    if ok:
+        return state["units"]
+    units = sum(balance_units(r.get("amount")) for r in records if isinstance(r, dict))
+    if units == state["units"]:
+        return units
+    with _FINANCE_ORDER_LOCK:
+        _FINANCE_ORDER_STATS["units_drift"] += 1
+    log_error(f"finance records {chat_id}: balance drift {balance_from_units(state['units'])} → {balance_from_units(units)} "
+              f"(правка мимо delta_track_record); индексы чата пересобираются")
+    # Какая запись изменилась — неизвестно: delta/индекс баланса/finance_rows этого чата — полным проходом,
+    # а штамп LOW-RAM с теми же устаревшими units не должен снова приняться в _finance_order_adopt.
+    dict.pop(store, _FINANCE_ORDER_STAMP_KEY, None)
+    delta_track_chat_full(chat_id, "records_units_drift")
+    _finance_order_schedule_audit(chat_id)
+    return units
+
+
+def recalc_balance(chat_id: int, incremental: bool = False):
+    normalize_chat_records(chat_id, incremental=incremental)
     store = get_chat_store(chat_id)
-    store["balance"] = sum(float(r.get("amount", 0) or 0) for r in store.get("records", []))
+    state = _finance_order_current(chat_id, store)
+    if state is not None:
+        units = state["units"] if state["fresh"] else _finance_order_verify_units(chat_id, store, state)
+        state["fresh"] = False
+        store["balance"] = balance_from_units(units)
+    else:
+        store["balance"] = math.fsum(float(r.get("amount", 0) or 0) for r in store.get("records", []))
 
 
-def rebuild_month_short_ids(chat_id: int):
+def rebuild_month_short_ids(chat_id: int, incremental: bool = False):
     """Пересчитывает short_id как месячную нумерацию по стабильной хронологии."""
-    normalize_chat_records(chat_id)
+    if incremental and _finance_order_try_settle(chat_id):
+        # settle уже перенумеровал месяцы, которых коснулись изменения.
+        state = _finance_order_current(chat_id, get_chat_store(chat_id))
+        if state is not None and state["ids_ok"]:
+            return
+    else:
+        normalize_chat_records(chat_id)
     store = get_chat_store(chat_id)
     daily = store.get("daily_records", {}) or {}
-    month_counters = {}
-    usd_month_counters = {}
-
-    for dk in sorted(daily.keys()):
-        month_key = dk[:7]
-        month_counters.setdefault(month_key, 1)
-        usd_month_counters.setdefault(month_key, 1)
-        recs = sorted(daily.get(dk, []) or [], key=record_sort_key)
-        daily[dk] = recs
-        for r in recs:
-            try:
-                if "ensure_finance_record_uid" in globals(): ensure_finance_record_uid(int(chat_id), r)
-            except Exception: pass
-            has_usd = bool(float(r.get("usd_amount", 0) or 0))
-            usd_only = bool(r.get("usd_only", False))
-            if not usd_only:
-                r["short_id"] = f"R{month_counters[month_key]}"
-                month_counters[month_key] += 1
-            elif has_usd:
-                r["short_id"] = f"U{usd_month_counters[month_key]}"
-            if has_usd:
-                r["usd_short_id"] = f"U{usd_month_counters[month_key]}"
-                usd_month_counters[month_key] += 1
+    _FINANCE_ORDER_LOCAL.busy = int(chat_id)
+    try:
+        _renumber_short_ids_days(chat_id, daily, sorted(daily.keys()))
+    finally:
+        _FINANCE_ORDER_LOCAL.busy = None
 
     store["records"] = [r for dk in sorted(daily.keys()) for r in daily.get(dk, [])]
+    with _FINANCE_ORDER_LOCK:
+        state = _FINANCE_ORDER_STATE.get(int(chat_id))
+        if state is not None and state["daily"] is dict.get(store, "daily_records"):
+            state["records"] = store["records"]
+            state["n"] = len(store["records"])
+            state["tail"] = store["records"][-1] if store["records"] else None
+            state["ids_ok"] = True
+
+
+def _finance_order_schedule_audit(chat_id: int) -> None:
+    if FINANCE_RECORDS_AUDIT_DELAY_SECONDS <= 0:
+        return
+    cid = int(chat_id)
+    with _FINANCE_ORDER_LOCK:
+        if cid in _FINANCE_ORDER_AUDIT_QUEUED:
+            return
+        _FINANCE_ORDER_AUDIT_QUEUED.add(cid)
+    try:
+        DELAYED_SCHEDULER.schedule(
+            f"finance-records-audit:{cid}", FINANCE_RECORDS_AUDIT_DELAY_SECONDS,
+            lambda: GENERAL_TASK_POOL.submit_unique(f"finance-records-audit:{cid}", finance_records_audit, cid),
+        )
+    except Exception as exc:
+        with _FINANCE_ORDER_LOCK:
+            _FINANCE_ORDER_AUDIT_QUEUED.discard(cid)
+        log_error(f"finance records audit schedule {cid}: {exc}")
+
+
+def finance_records_audit(chat_id: int) -> dict:
+    """Фоновый полный normalize/short_id/баланс одного чата и сравнение с инкрементальным итогом."""
+    cid = int(chat_id)
+    with _FINANCE_ORDER_LOCK:
+        _FINANCE_ORDER_AUDIT_QUEUED.discard(cid)
+    drift = {"order": 0, "daily": 0, "short_ids": 0, "balance": 0}
+    with locked_chat(cid):
+        store = get_chat_store(cid)
+        was_loaded = dict.__contains__(store, "records")
+        records = list(store.get("records", []) or [])
+        daily = store.get("daily_records", {}) or {}
+        before_order = [id(r) for r in records]
+        before_daily = {dk: [id(r) for r in arr or []] for dk, arr in daily.items()}
+        before_ids = {id(r): (r.get("short_id"), r.get("usd_short_id")) for r in records if isinstance(r, dict)}
+        try:
+            before_balance = float(store.get("balance", 0) or 0)
+        except Exception:
+            before_balance = 0.0
+        rebuild_month_short_ids(cid)
+        recalc_balance(cid, incremental=True)
+        after = store.get("records", []) or []
+        drift["order"] = int([id(r) for r in after] != before_order)
+        drift["daily"] = int({dk: [id(r) for r in arr] for dk, arr in (store.get("daily_records", {}) or {}).items()} != before_daily)
+        drift["short_ids"] = sum(1 for r in after if before_ids.get(id(r)) != (r.get("short_id"), r.get("usd_short_id")))
+        drift["balance"] = int(abs(float(store.get("balance", 0) or 0) - before_balance) > 1e-6)
+        if any(drift.values()):
+            if drift["balance"]:
+                # Суммы менялись мимо delta_track_record: индекс баланса, delta и finance_rows чата — полным проходом.
+                delta_track_chat_full(cid, "finance_records_audit")
+            try: rebuild_global_records()
+            except Exception: pass
+            try: finance_cache_invalidate(cid, "finance_records_audit")
+            except Exception: pass
+            save_data(data, chat_ids=[cid])
+    with _FINANCE_ORDER_LOCK:
+        _FINANCE_ORDER_STATS["audits"] += 1
+        if any(drift.values()):
+            _FINANCE_ORDER_STATS["audit_drift"] += 1
+            for kind, count in drift.items():
+                _FINANCE_ORDER_STATS[f"drift_{kind}"] += int(count)
+    if any(drift.values()):
+        log_error(f"finance records audit {cid}: drift {drift} (исправлено полным проходом)")
+    verify = globals().get("finance_msg_index_verify")
+    if verify is not None:
+        verify(cid)
+    index = globals().get("FINANCE_BALANCE_INDEX")
+    if index is not None:
+        # Префиксные суммы ARS против полного прохода (только если индекс чата уже собран).
+        try: index.verify(cid, "ars")
+        except Exception as exc: log_error(f"finance balance index verify {cid}: {exc}")
+    if LOWRAM_ENABLED and not was_loaded:
+        _lowram_release_chat(cid)
+    return drift
+
+
+def finance_records_order_stats() -> dict:
+    with _FINANCE_ORDER_LOCK:
+        stats = dict(_FINANCE_ORDER_STATS)
+        stats["chats"] = len(_FINANCE_ORDER_STATE)
+        stats["audits_queued"] = len(_FINANCE_ORDER_AUDIT_QUEUED)
+    stats["enabled"] = bool(FINANCE_RECORDS_INCREMENTAL)
+    return stats
+
+
+def _balance_store_chat_id(store) -> int | None:
+    cid = getattr(store, "_chat_id", None)
+    if cid is not None:
+        return int(cid)
+    for raw_cid, row in (data.get("chats", {}) or {}).items():
+        if row is store:
+            try:
+                return int(raw_cid)
+            except Exception:
+                return None
+    return None
 
 
 def calc_day_balance(store: dict, day_key: str) -> float:
+    """Остаток активного ledger на конец дня; для ARS — lookup в FINANCE_BALANCE_INDEX."""
+    index = globals().get("FINANCE_BALANCE_INDEX")
+    if index is not None and isinstance(store, dict):
+        settings = store.get("settings") or {}
+        if str(settings.get("_active_currency_ledger") or "ars").lower() != "usd":
+            cid = _balance_store_chat_id(store)
+            if cid is not None:
+                try:
+                    return float(index.through(cid, "ars", str(day_key)[:10]))
+                except Exception as exc:
+                    log_error(f"finance balance index day {cid}: {exc}")
+    return _calc_day_balance_scan(store, day_key)
+
+
+def _calc_day_balance_scan(store: dict, day_key: str) -> float:
     total = 0.0
     daily = store.get("daily_records", {}) or {}
     for dk in sorted(daily.keys()):
@@ -673,6 +1157,7 @@ def reset_chat_data(chat_id: int):
             store["records"] = []
             store["daily_records"] = {}
             store["next_id"] = 1
+            delta_track_chat_full(chat_id, "reset")
             store["active_windows"] = {}
             clear_edit_wait_state(chat_id, delete_prompt=True)
             store["edit_target"] = None
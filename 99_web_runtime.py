@@ -236,28 +236,40 @@ def telegram_webhook():
     except Exception as e:
         log_error(f"WEBHOOK: get_json failed: {e}")
         return "BAD REQUEST", 400
+    ticket, reply = telegram_update_admit(payload, "webhook")
+    if reply is not None:
+        return reply
+    return telegram_update_reply(ticket, WEBHOOK_ACK_WAIT_SECONDS)
 
+
+def telegram_update_admit(payload, source: str = "webhook"):
+    """Общий приём update для webhook и getUpdates: BOOT-gate, durable-карточка, claim, lane.
+
+    Возвращает (ticket, None), если исход нужно дождаться (telegram_update_reply), или
+    (None, (text, status)), если ответ известен сразу.  Status < 500 — update можно
+    подтверждать Telegram; 5xx — Telegram должен отдать его снова.
+    """
     # v108 BOOT/SHUTDOWN gate: do not execute a new Telegram update against partially restored
     # state or while the old Render instance is draining.  503 keeps the update retryable.
     if runtime_is_shutting_down():
         runtime_mark_webhook(payload if isinstance(payload, dict) else None, blocked="shutdown")
-        return "SHUTTING DOWN", 503
+        return None, ("SHUTTING DOWN", 503)
     if not runtime_is_ready():
         runtime_mark_webhook(payload if isinstance(payload, dict) else None, blocked="boot")
-        return "BOOTING", 503
+        return None, ("BOOTING", 503)
     runtime_mark_webhook(payload if isinstance(payload, dict) else None)
 
     try:
         if isinstance(payload, dict):
             if "edited_message" in payload:
-                log_info("WEBHOOK: получен update с edited_message ✅")
+                log_info(f"{source.upper()}: получен update с edited_message ✅")
             elif "message" in payload:
-                log_info("WEBHOOK: получен update с message")
+                log_info(f"{source.upper()}: получен update с message")
             elif "callback_query" in payload:
-                log_info("WEBHOOK: получен update с callback_query")
+                log_info(f"{source.upper()}: получен update с callback_query")
             try:
                 upd_type = "edited_message" if "edited_message" in payload else "message" if "message" in payload else "callback_query" if "callback_query" in payload else "other"
-                bot_journal("webhook_update", _extract_update_chat_id(payload), upd_type)
+                bot_journal(f"{source}_update", _extract_update_chat_id(payload), upd_type)
             except Exception:
                 pass
 
@@ -283,7 +295,7 @@ def telegram_webhook():
         if durable_update_processed(update_id):
             with _MEGA_TASK_LOCK:
                 _mega_task_counters["skipped_done"] += 1
-            return "OK", 200
+            return None, ("OK", 200)
 
         # v105/v108: critical content and rare state-mutating F39 callbacks first get a durable card.
         # Only after confirmed pending persistence may the update enter a RAM worker.
@@ -294,26 +306,26 @@ def telegram_webhook():
             if cloud_state == "done":
                 with _MEGA_TASK_LOCK:
                     _mega_task_counters["skipped_done"] += 1
-                return "OK", 200
+                return None, ("OK", 200)
             if cloud_state == "running":
                 # После deploy это означает: выполнение уже начиналось. Не запускаем второй worker
                 # через webhook; recovery-контур сам сверит/доделает такую задачу.
                 schedule_mega_task_recovery(0.2)
-                return "TASK RUNNING", 503
+                return None, ("TASK RUNNING", 503)
             if cloud_state == "failed":
                 # v109: failed means manual review. Automatic Telegram retry must not replay
                 # a potentially-applied finance operation or toggle.
-                return "TASK NEEDS REVIEW", 200
+                return None, ("TASK NEEDS REVIEW", 200)
             if cloud_state != "pending":
                 task_payload = _build_mega_task_payload(update_id, payload, update_chat_id, update_type, durable_reason)
                 durable_expected = _durable_expected_from_task_or_payload(task_payload, payload)
                 if not _mega_task_upload_new_pending(update_id, task_payload):
                     # Не исполняем критическую команду без внешнего свидетеля. Telegram повторит update.
-                    return "TASK BACKUP UNAVAILABLE", 503
+                    return None, ("TASK BACKUP UNAVAILABLE", 503)
 
         claim_state, ticket = UPDATE_DISPATCHER.claim(update_id, update_chat_id, update_type)
         if claim_state == "done":
-            return "OK", 200
+            return None, ("OK", 200)
 
         update_enqueued_at = time.time()
 
@@ -378,25 +390,219 @@ def telegram_webhook():
                 log_error(f"{selected_pool.name.upper()} QUEUE FULL: chat={update_chat_id}")
                 UPDATE_DISPATCHER.release_failed_enqueue(update_id, f"{selected_pool.name}_queue_full")
                 # Telegram повторит update позже; pending-файл уже сохранён в MEGA.
-                return "BUSY", 503
-
-        # v138 safety invariant: callback spinner is cleared by the dedicated ACK lane, but the
-        # HTTP webhook receipt is still held until the queued action finishes (or times out).
-        # Therefore a Render crash cannot silently lose even a non-cloud UI action: Telegram keeps
-        # the update as the external emergency queue and retries after our 503. Critical finance/
-        # forwarding/secret content additionally keeps the existing write-before-execute MEGA card.
-        state, dispatch_error = UPDATE_DISPATCHER.wait_result(ticket, WEBHOOK_ACK_WAIT_SECONDS)
-        if state == "done":
-            return "OK", 200
-        if state == "failed":
-            return "RETRY", 503
-        return "PENDING", 503
+                return None, ("BUSY", 503)
+
+        return ticket, None
     except Exception as e:
-        log_error(f"WEBHOOK: enqueue/update dispatcher error: {e}")
-        return "ERROR", 500
-        
+        log_error(f"{source.upper()}: enqueue/update dispatcher error: {e}")
+        return None, ("ERROR", 500)
+
+
+def telegram_update_reply(ticket, timeout: float):
+    # v138 safety invariant: callback spinner is cleared by the dedicated ACK lane, but the
+    # receipt (HTTP 200 / getUpdates offset) is still held until the queued action finishes
+    # (or times out).  Therefore a Render crash cannot silently lose even a non-cloud UI action:
+    # Telegram keeps the update as the external emergency queue and retries after our 503.
+    # Critical finance/forwarding/secret content additionally keeps the write-before-execute MEGA card.
+    state, dispatch_error = UPDATE_DISPATCHER.wait_result(ticket, timeout)
+    if state == "done":
+        return "OK", 200
+    if state == "failed":
+        return "RETRY", 503
+    return "PENDING", 503
+
+# ─────────────────────────────────────────────────────────────
+# v199: приём update через getUpdates (TELEGRAM_INGEST_MODE=polling).
+# Один поток забирает пачку до POLLING_LIMIT update, пропускает каждый через тот же
+# telegram_update_admit, что и webhook (BOOT-gate, durable-карточка, claim, lane), и
+# ждёт исход всей пачки одним общим сроком WEBHOOK_ACK_WAIT_SECONDS.  Offset
+# подтверждается только до первого update с 5xx-исходом: остальное Telegram отдаст
+# снова, а UPDATE_DISPATCHER/durable-маркеры отсекут уже выполненное.  Вместо 40
+# HTTP-потоков, висящих в wait_result, — один поток на всю пачку.
+# ─────────────────────────────────────────────────────────────
+TELEGRAM_INGEST_MODE = (os.getenv("TELEGRAM_INGEST_MODE", "webhook") or "webhook").strip().lower()
+TELEGRAM_API_BASE = (os.getenv("TELEGRAM_API_BASE", "https://api.telegram.org") or "https://api.telegram.org").strip().rstrip("/")
+try:
+    POLLING_LIMIT = max(1, min(100, int(os.getenv("POLLING_LIMIT", "100") or "100")))
+except Exception:
+    POLLING_LIMIT = 100
+try:
+    POLLING_TIMEOUT_SECONDS = max(0, min(50, int(os.getenv("POLLING_TIMEOUT_SECONDS", "25") or "25")))
+except Exception:
+    POLLING_TIMEOUT_SECONDS = 25
+try:
+    POLLING_RETRY_SECONDS = max(0.2, min(60.0, float(os.getenv("POLLING_RETRY_SECONDS", "1.5") or "1.5")))
+except Exception:
+    POLLING_RETRY_SECONDS = 1.5
+# Update, который раз за разом падает (RETRY/ERROR), иначе держал бы offset вечно: после
+# POLLING_MAX_ATTEMPTS проваленных попыток offset сдвигается за него, а сам он уходит
+# в журнал проблем (operation_fail + bot_journal).  0 — без предела.
+try:
+    POLLING_MAX_ATTEMPTS = max(0, min(1000, int(os.getenv("POLLING_MAX_ATTEMPTS", "5") or "5")))
+except Exception:
+    POLLING_MAX_ATTEMPTS = 5
+_POLLING_FAILED_REPLIES = {"RETRY", "ERROR"}
+TELEGRAM_ALLOWED_UPDATES = [
+    "message",
+    "edited_message",
+    "callback_query",
+    "channel_post",
+    "edited_channel_post",
+    "deleted_business_messages",
+]
+_POLLING_LOCK = threading.RLock()
+_POLLING_THREAD = None
+_POLLING_STATS = defaultdict(int)
+_POLLING_STATE = {"offset": None, "last_error": "", "last_batch_at": ""}
+_POLLING_FAILURES = {}   # update_id -> проваленных попыток подряд
+_POLLING_BATCH_MS = LatencyHistogram()
+
+
+def telegram_polling_enabled() -> bool:
+    return TELEGRAM_INGEST_MODE == "polling"
+
+
+def _telegram_api_call(session, method: str, params: dict, timeout: float):
+    """Прямой вызов Bot API: getUpdates нужен сырой JSON update (durable-карточки хранят payload)."""
+    resp = session.post(f"{TELEGRAM_API_BASE}/bot{BOT_TOKEN}/{method}", json=params, timeout=timeout)
+    try:
+        body = resp.json()
+    except Exception:
+        raise RuntimeError(f"{method}: HTTP {resp.status_code} без JSON")
+    if not body.get("ok"):
+        retry_after = (body.get("parameters") or {}).get("retry_after")
+        err = RuntimeError(f"{method}: {body.get('error_code') or resp.status_code} {body.get('description') or ''}".strip())
+        err.retry_after = float(retry_after or 0)
+        raise err
+    return body.get("result")
+
+
+def _telegram_poll_give_up(update_id: int, payload: dict, ticket, reply) -> bool:
+    """Ещё одна проваленная попытка update; True — предел исчерпан, offset можно сдвигать за него."""
+    if POLLING_MAX_ATTEMPTS <= 0 or str(reply[0]) not in _POLLING_FAILED_REPLIES:
+        return False
+    with _POLLING_LOCK:
+        failures = _POLLING_FAILURES.get(update_id, 0) + 1
+        if failures < POLLING_MAX_ATTEMPTS:
+            _POLLING_FAILURES[update_id] = failures
+            return False
+        _POLLING_FAILURES.pop(update_id, None)
+        _POLLING_STATS["given_up"] += 1
+    error = str((ticket.get("error") if isinstance(ticket, dict) else "") or reply[0])[:300]
+    chat_id = _extract_update_chat_id(payload)
+    log_error(f"POLLING update {update_id}: {failures} попыток провалились ({error}) — offset сдвинут, update в журнале проблем")
+    try:
+        op_id = operation_begin("telegram_update", chat_id, target="polling_given_up", payload={"update_id": update_id},
+                                operation_id=operation_for_update(update_id))
+        operation_fail(op_id, f"getUpdates: {failures} failed attempts, offset confirmed past the update: {error}")
+    except Exception as exc:
+        log_error(f"POLLING given-up journal {update_id}: {exc}")
+    try:
+        bot_journal("polling_update_given_up", chat_id, f"update_id={update_id} attempts={failures} error={error}")
+    except Exception:
+        pass
+    return True
+
+
+def telegram_poll_batch(updates: list):
+    """Пропустить пачку getUpdates через общий путь.  Возвращает offset для подтверждения или None."""
+    started = time.perf_counter()
+    admitted = []
+    for upd in updates:
+        if not isinstance(upd, dict) or upd.get("update_id") is None:
+            continue
+        ticket, reply = telegram_update_admit(upd, "polling")
+        admitted.append((int(upd["update_id"]), upd, ticket, reply))
+    deadline = time.monotonic() + WEBHOOK_ACK_WAIT_SECONDS
+    offset = None
+    confirmed = 0
+    for update_id, upd, ticket, reply in admitted:
+        if ticket is not None:
+            reply = telegram_update_reply(ticket, max(0.1, deadline - time.monotonic()))
+        if int(reply[1]) >= 500:
+            if not _telegram_poll_give_up(update_id, upd, ticket, reply):
+                break
+        elif _POLLING_FAILURES:
+            with _POLLING_LOCK:
+                _POLLING_FAILURES.pop(update_id, None)
+        offset = update_id + 1
+        confirmed += 1
+    with _POLLING_LOCK:
+        _POLLING_STATS["batches"] += 1
+        _POLLING_STATS["updates"] += len(admitted)
+        _POLLING_STATS["confirmed"] += confirmed
+        _POLLING_STATS["held"] += len(admitted) - confirmed
+        _POLLING_STATE["last_batch_at"] = now_local().isoformat(timespec="seconds")
+    _POLLING_BATCH_MS.observe(time.perf_counter() - started)
+    return offset
+
+
+def _telegram_poll_loop():
+    session = requests.Session()
+    offset = None
+    while not runtime_is_shutting_down():
+        if not runtime_is_ready():
+            # BOOT-gate: не забираем update, пока durable recovery не закончен.
+            time.sleep(0.5)
+            continue
+        params = {"timeout": POLLING_TIMEOUT_SECONDS, "limit": POLLING_LIMIT, "allowed_updates": TELEGRAM_ALLOWED_UPDATES}
+        if offset is not None:
+            params["offset"] = offset
+        try:
+            updates = _telegram_api_call(session, "getUpdates", params, POLLING_TIMEOUT_SECONDS + 15) or []
+        except Exception as exc:
+            with _POLLING_LOCK:
+                _POLLING_STATS["errors"] += 1
+                _POLLING_STATE["last_error"] = str(exc)[:300]
+            log_error(f"POLLING getUpdates: {exc}")
+            time.sleep(max(POLLING_RETRY_SECONDS, float(getattr(exc, "retry_after", 0) or 0)))
+            continue
+        if not updates:
+            continue
+        committed = telegram_poll_batch(updates)
+        if committed is not None:
+            offset = committed
+            with _POLLING_LOCK:
+                _POLLING_STATE["offset"] = offset
+        if committed is None or committed <= int(updates[-1].get("update_id") or 0):
+            # Хвост пачки не принят (BOOT/BUSY/PENDING) — Telegram отдаст его снова.
+            time.sleep(POLLING_RETRY_SECONDS)
+    if offset is not None:
+        # Подтвердить последнюю принятую пачку до выхода: следующий процесс не получит её повторно.
+        try:
+            _telegram_api_call(session, "getUpdates", {"offset": offset, "limit": 1, "timeout": 0}, 10)
+        except Exception as exc:
+            log_error(f"POLLING final offset commit: {exc}")
+
+
+def start_telegram_polling():
+    global _POLLING_THREAD
+    with _POLLING_LOCK:
+        if _POLLING_THREAD is not None and _POLLING_THREAD.is_alive():
+            return _POLLING_THREAD
+        _POLLING_THREAD = threading.Thread(target=_telegram_poll_loop, name="telegram-poller", daemon=True)
+        _POLLING_THREAD.start()
+        return _POLLING_THREAD
+
+
+def telegram_polling_stats() -> dict:
+    with _POLLING_LOCK:
+        out = {k: int(v) for k, v in _POLLING_STATS.items()}
+        out.update(_POLLING_STATE)
+        out["running"] = bool(_POLLING_THREAD is not None and _POLLING_THREAD.is_alive())
+    out["mode"] = TELEGRAM_INGEST_MODE
+    out["batch_ms"] = _POLLING_BATCH_MS.snapshot()
+    return out
+
+
 def _v177_legacy_0269_set_webhook():
     global WEBHOOK_HEADER_SECRET_ENABLED
+    if telegram_polling_enabled():
+        # getUpdates и webhook взаимоисключающие: снимаем webhook и запускаем poller.
+        bot.remove_webhook()
+        start_telegram_polling()
+        log_info(f"Приём update: getUpdates (limit={POLLING_LIMIT}, timeout={POLLING_TIMEOUT_SECONDS}s); webhook снят")
+        return
     if not WEBHOOK_URL:
         log_info("WEBHOOK_URL / APP_URL / RENDER_EXTERNAL_URL не указаны — webhook не установлен.")
         return
@@ -416,14 +622,7 @@ def _v177_legacy_0269_set_webhook():
     kwargs = dict(
         url=wh_url,
         max_connections=webhook_connections,
-        allowed_updates=[
-            "message",
-            "edited_message",
-            "callback_query",
-            "channel_post",
-            "edited_channel_post",
-            "deleted_business_messages",
-        ],
+        allowed_updates=TELEGRAM_ALLOWED_UPDATES,
     )
     try:
         bot.set_webhook(secret_token=WEBHOOK_HEADER_SECRET, **kwargs)
@@ -440,9 +639,155 @@ try: _v177_legacy_0269_set_webhook.__name__ = 'set_webhook'
 except Exception: pass
 set_webhook = _v177_legacy_0269_set_webhook
 
+# ─────────────────────────────────────────────────────────────
+# v199: HTTP-сервер.  WEB_SERVER_MODE=flask — прежний app.run(threaded=True): поток на
+# соединение без предела.  WEB_SERVER_MODE=bounded — werkzeug BaseWSGIServer, соединения
+# раздаются в две ограниченные линии: WEB_TASK_POOL (webhook, expense-ping, прочее) и
+# WEB_PROBE_TASK_POOL для GET/HEAD /healthz, /readyz, /keepalive, / — пробы никогда не
+# стоят в очереди за webhook, которые держат ответ до исхода update.  Переполненная
+# линия сразу отвечает 503 (Telegram повторит).  Латентность по маршрутам пишется в
+# обоих режимах.
+# ─────────────────────────────────────────────────────────────
+import select
+
+WEB_SERVER_MODE = (os.getenv("WEB_SERVER_MODE", "flask") or "flask").strip().lower()
+WEB_WORKERS = _env_int("WEB_WORKERS", 16, 2, 128)
+WEB_MAX_PENDING = _env_int("WEB_MAX_PENDING", 64, 10, 4096)
+WEB_PROBE_WORKERS = _env_int("WEB_PROBE_WORKERS", 2, 1, 8)
+WEB_PROBE_PATHS = frozenset({b"/", b"/healthz", b"/readyz", b"/keepalive"})
+WEB_TASK_POOL = None
+WEB_PROBE_TASK_POOL = None
+_WEB_LOCK = threading.RLock()
+_WEB_ROUTE_LATENCY = {}
+_WEB_ROUTE_STATUS = defaultdict(int)
+_WEB_STATS = defaultdict(int)
+
+
+def _web_route_label(path: str) -> str:
+    """Имя маршрута для метрик; секрет webhook и токен expense-ping в метки не попадают."""
+    path = str(path or "/")
+    if path == WEBHOOK_ROUTE_PATH:
+        return "/tg/<secret>"
+    if path.startswith("/expense-ping/"):
+        return "/expense-ping/<token>"
+    if path in ("/", "/healthz", "/readyz", "/keepalive"):
+        return path
+    return "other"
+
+
+class _WebRouteMetrics:
+    """WSGI-обёртка app.wsgi_app: время ответа и статусы по маршрутам."""
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        label = _web_route_label(environ.get("PATH_INFO"))
+        status = ["000"]
+
+        def _start(st, headers, exc_info=None):
+            status[0] = str(st)[:3]
+            return start_response(st, headers, exc_info)
+
+        started = time.perf_counter()
+        try:
+            return self.wsgi_app(environ, _start)
+        finally:
+            with _WEB_LOCK:
+                hist = _WEB_ROUTE_LATENCY.get(label)
+                if hist is None:
+                    hist = _WEB_ROUTE_LATENCY[label] = LatencyHistogram()
+                _WEB_ROUTE_STATUS[(label, status[0])] += 1
+            hist.observe(time.perf_counter() - started)
+
+
+if not isinstance(app.wsgi_app, _WebRouteMetrics):
+    app.wsgi_app = _WebRouteMetrics(app.wsgi_app)
+
+
+def _web_is_probe(sock) -> bool:
+    """Подсмотреть строку запроса (MSG_PEEK, ≤20 мс) и узнать health/readiness-пробу."""
+    try:
+        ready, _w, _x = select.select([sock], [], [], 0.02)
+        if not ready:
+            return False
+        head = sock.recv(256, socket.MSG_PEEK)
+    except Exception:
+        return False
+    parts = head.split(b" ", 2)
+    if len(parts) < 3 or parts[0] not in (b"GET", b"HEAD"):
+        return False
+    return parts[1].split(b"?", 1)[0] in WEB_PROBE_PATHS
+
+
+def _web_make_bounded_server(host: str, port: int):
+    global WEB_TASK_POOL, WEB_PROBE_TASK_POOL
+    from werkzeug.serving import BaseWSGIServer
+
+    if WEB_TASK_POOL is None:
+        WEB_TASK_POOL = KeyedTaskPool("web", WEB_WORKERS, WEB_MAX_PENDING)
+    if WEB_PROBE_TASK_POOL is None:
+        WEB_PROBE_TASK_POOL = KeyedTaskPool("web-probe", WEB_PROBE_WORKERS, 32)
+
+    class BoundedWSGIServer(BaseWSGIServer):
+        request_queue_size = 128
+
+        def process_request(self, request, client_address):
+            probe = _web_is_probe(request)
+            pool = WEB_PROBE_TASK_POOL if probe else WEB_TASK_POOL
+            with _WEB_LOCK:
+                _WEB_STATS["connections"] += 1
+                _WEB_STATS["probe_connections" if probe else "app_connections"] += 1
+                seq = _WEB_STATS["connections"]
+            if pool.submit(f"conn:{seq}", self._serve_connection, request, client_address):
+                return
+            with _WEB_LOCK:
+                _WEB_STATS["rejected"] += 1
+            try:
+                request.sendall(b"HTTP/1.0 503 Service Unavailable\r\nRetry-After: 1\r\nContent-Length: 4\r\n"
+                                b"Connection: close\r\n\r\nBUSY")
+            except Exception:
+                pass
+            self.shutdown_request(request)
+
+        def _serve_connection(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    return BoundedWSGIServer(host, int(port), app)
+
+
+def web_server_stats() -> dict:
+    with _WEB_LOCK:
+        out = {k: int(v) for k, v in _WEB_STATS.items()}
+        routes = {label: hist.snapshot() for label, hist in _WEB_ROUTE_LATENCY.items()}
+        statuses = dict(_WEB_ROUTE_STATUS)
+    for label, snap in routes.items():
+        snap.pop("buckets", None)
+        snap["status"] = {code: n for (lbl, code), n in statuses.items() if lbl == label}
+    out["routes"] = routes
+    out["mode"] = WEB_SERVER_MODE
+    if WEB_TASK_POOL is not None:
+        out["workers"] = WEB_WORKERS
+        out["pending"] = int(WEB_TASK_POOL.stats().get("pending", 0))
+    return out
+
+
 def _v177_start_web_server_early():
     """Bind Render's HTTP port immediately; webhook stays BOOT-gated until runtime_ready."""
     def _serve():
+        if WEB_SERVER_MODE == "bounded":
+            try:
+                server = _web_make_bounded_server("0.0.0.0", PORT)
+            except Exception as exc:
+                log_error(f"WEB bounded server unavailable, fallback to Flask threaded: {exc}")
+            else:
+                log_info(f"WEB: bounded server, workers {WEB_WORKERS} (+{WEB_PROBE_WORKERS} probe), queue {WEB_MAX_PENDING}")
+                server.serve_forever()
+                return
         app.run(host="0.0.0.0", port=PORT, threaded=True, use_reloader=False)
     thread = threading.Thread(target=_serve, name="v177-web-early", daemon=True)
     thread.start()
@@ -636,6 +981,14 @@ def main():
     boot_recovery_remaining = 0
     if mega_tasks_active():
         try:
+            if DURABLE_WAL.enabled:
+                # v199: локальный WAL отправляется в MEGA до чтения реестра и recovery.
+                runtime_set_phase("boot_wal_replay", "проверяю локальный WAL durable-задач")
+                wal_stats = durable_wal_replay_blocking()
+                log_info(
+                    f"[DURABLE WAL STARTUP] replayed={wal_stats.get('replayed_records', 0)} "
+                    f"torn={wal_stats.get('torn_tails', 0)} left_segments={wal_stats.get('segments', 0)}"
+                )
             task_stats = mega_task_refresh_registry()
             log_info(
                 f"[MEGA TASKS STARTUP] pending={task_stats.get('pending', 0)} "
@@ -734,7 +1087,7 @@ def main():
                     f"Восстановление: {'OK — SQLite snapshot из MEGA' if db_restored else ('OK — legacy global → SQLite' if restored else ('ОШИБКА — защитный режим' if RESTORE_GUARD_ACTIVE else 'локальная база сохранена'))}\n"
                     f"LOW-RAM: {'ВКЛ — RAM только активное; SQLite рабочее; MEGA постоянное' if LOWRAM_ENABLED else 'ВЫКЛ'}\n"
                     f"Защита бэкапа: {'ВКЛ — ' + RESTORE_GUARD_REASON if RESTORE_GUARD_ACTIVE else 'норма'}\n"
-                    f"Индекс старых сообщений: {len(data.get('forward_index', {}) or {})}\n"
+                    f"Индекс старых сообщений: {SQLITE.forward_links_count()}\n"
                     f"Приоритет: ФИНАНСЫ → ПЕРЕСЫЛКА; forward yield максимум {FORWARD_FINANCE_PRIORITY_MAX_WAIT_SECONDS:g}с\n"
                     f"Журнал: {'ВКЛ' if is_journal_registration_enabled() else 'ВЫКЛ'}; durable MEGA: {'ВКЛ' if BOT_JOURNAL_DURABLE_ENABLED else 'ВЫКЛ'}; keep-alive: {'ВКЛ' if KEEP_ALIVE_ENABLED else 'ВЫКЛ'}\n"
                     f"MEGA-задачи: pending {mega_task_registry_stats().get('pending', 0)}, running {mega_task_registry_stats().get('running', 0)}, failed {mega_task_registry_stats().get('failed', 0)}\n"
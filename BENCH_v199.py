@@ -0,0 +1,2125 @@
+# v199 offline benchmarks
+"""Offline benchmarks for v199 runtime components.
+
+The runtime parts are exec'd into one namespace by bot.py and import telebot /
+flask at the top, so every benchmark loads only the top-level definitions it
+needs (by name, via ast) into a small namespace.  Nothing talks to Telegram,
+MEGA or Google.
+
+    python BENCH_v199.py                 # all benchmarks
+    python BENCH_v199.py mega_session    # one benchmark (see BENCHES)
+"""
+from pathlib import Path
+import ast, os, sys, time, threading, shutil, subprocess, tempfile
+from collections import defaultdict
+
+R = Path(__file__).resolve().parent
+
+
+def load(part: str, names, ns=None) -> dict:
+    """Exec the named top-level defs/assignments of a runtime part into ``ns``."""
+    ns = {} if ns is None else ns
+    ns.setdefault("__name__", "bench_v199")
+    src = (R / part).read_text(encoding="utf-8")
+    tree = ast.parse(src)
+    wanted = set(names)
+    found = set()
+    for node in tree.body:
+        name = getattr(node, "name", None)
+        if name is None and isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+        if name in wanted:
+            exec(compile(ast.Module([node], []), f"{part}:{name}", "exec"), ns)
+            found.add(name)
+    missing = wanted - found
+    if missing:
+        raise SystemExit(f"{part}: missing {sorted(missing)}")
+    return ns
+
+
+def base_ns() -> dict:
+    ns = {"os": os, "time": time, "threading": threading, "shutil": shutil,
+          "subprocess": subprocess, "defaultdict": defaultdict}
+    load("00_core.py", ["LatencyHistogram"], ns)
+    return ns
+
+
+def bench_mega_session():
+    """Durable-path mix on the local-directory MEGA: old one-at-a-time lock vs storage session."""
+    ns = base_ns()
+    ns["MEGA_TIMEOUT"] = 120
+    load("10_mega_runtime.py", ["_MEGA_SESSION_EXCLUSIVE", "_v178_mega_priority", "_mega_norm_remote",
+                                "_mega_split_flags", "_mega_session_paths", "LocalDirMegaBackend",
+                                "MegaStorageSession"], ns)
+    latency_ms = int(os.getenv("BENCH_MEGA_LATENCY_MS", "40"))
+    per_lane = int(os.getenv("BENCH_MEGA_OPS", "40"))
+    lanes = {
+        "tasks": "/TelegramBotBackups/tasks/pending",
+        "deltas": "/TelegramBotBackups/deltas/2026-10",
+        "snapshot": "/TelegramBotBackups/database",
+        "journal": "/TelegramBotBackups/runtime/journal",
+    }
+    print(f"mega_session: local backend, {latency_ms} ms/command, {per_lane} puts x {len(lanes)} lanes")
+    for label, inflight in (("serial (old lock)", 1), ("session", 3)):
+        root = tempfile.mkdtemp(prefix="bench_mega_")
+        src_dir = tempfile.mkdtemp(prefix="bench_src_")
+        try:
+            backend = ns["LocalDirMegaBackend"](root, latency_ms=latency_ms)
+            for remote in lanes.values():
+                backend.run("mega-mkdir", ["-p", remote], 30)
+            session = ns["MegaStorageSession"](backend, inflight=inflight)
+
+            def lane(name, remote):
+                for i in range(per_lane):
+                    local = os.path.join(src_dir, f"{name}_{i}.json")
+                    with open(local, "w") as fh:
+                        fh.write('{"n": %d}' % i)
+                    res = session.run("mega-put", [local, remote], timeout=30)
+                    assert res.returncode == 0, res.stderr
+
+            started = time.perf_counter()
+            threads = [threading.Thread(target=lane, args=(n, r)) for n, r in lanes.items()]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - started
+            st = session.stats()
+            total = st["commands"]
+            print(f"  {label:<18} {elapsed:6.2f}s  {total / elapsed:6.1f} cmd/s  peak_inflight={st['peak_inflight']}")
+            for prio in range(4):  # v178 classes from the remote path
+                w = st["wait"][prio]
+                if not w["count"]:
+                    continue
+                print(f"    class {prio}: n={w['count']} wait p50<={w['p50_ms']:.0f}ms p95<={w['p95_ms']:.0f}ms max={w['max_ms']:.0f}ms")
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+            shutil.rmtree(src_dir, ignore_errors=True)
+
+
+def mega_task_ns(root: str, latency_ms: int, group_commit: bool, wal: bool = False) -> dict:
+    """Durable-task witness code from 10_mega_runtime on a local-directory MEGA."""
+    import json, hashlib, re
+    from datetime import datetime
+    import struct, zlib
+    ns = base_ns()
+    ns.update(json=json, hashlib=hashlib, re=re, struct=struct, zlib=zlib, tempfile=tempfile, MEGA_TIMEOUT=60, VERSION="bench",
+              MEGA_LOCAL_TMP_DIR=tempfile.mkdtemp(prefix="bench_tmp_"), MEGA_BACKUP_DIR="/TelegramBotBackups",
+              MEGA_TASK_BACKUP_DIR="tasks", MEGA_TASKS_ENABLED=True, RESTORE_GUARD_ACTIVE=False,
+              MEGA_TASK_GROUP_COMMIT=group_commit, MEGA_TASK_GROUP_WINDOW_MS=30, MEGA_TASK_GROUP_MAX=64,
+              MEGA_TASK_TOMBSTONE_WINDOW_MS=250, MEGA_TASK_TOMBSTONE_COMPACT_AT=24,
+              now_local=datetime.now, log_error=lambda msg: print("  error:", msg), log_info=lambda msg: None,
+              bot_journal=lambda *a, **k: None, mega_is_configured=lambda: True, _mega_task_processing=set(),
+              _load_json=lambda path, default: json.load(open(path, encoding="utf-8")),
+              mega_task_registry_stats=lambda: {})
+    load("10_mega_runtime.py", [
+        "_MEGA_SESSION_EXCLUSIVE", "_v178_mega_priority", "_mega_norm_remote", "_mega_split_flags",
+        "_mega_session_paths", "LocalDirMegaBackend", "MegaStorageSession", "mega_command_available",
+        "mega_tasks_active", "mega_task_remote_root", "ensure_mega_task_dirs", "mega_task_remote_dir",
+        "mega_task_segment_dir", "mega_task_tombstone_dir", "_mega_task_is_segment_path", "_mega_task_id",
+        "mega_task_filename", "mega_task_remote_path", "_mega_task_update_registry", "mega_task_known_state",
+        "_MEGA_TASK_LOCK", "_mega_task_registry", "_mega_task_counters", "_mega_task_last_error",
+        "_mega_task_dirs_ready", "_MEGA_TASK_SEGMENT_LOCK", "_mega_task_segment_index",
+        "_mega_task_segment_cache", "_mega_task_tombstone_cache", "_MEGA_TASK_SEGMENT_CACHE_MAX",
+        "_mega_task_group_seq", "MegaTaskGroupCommitter", "_mega_task_group_name", "_mega_task_put_group_file",
+        "_mega_task_segment_digest", "_mega_task_cache_segment", "_mega_task_flush_segment",
+        "_mega_task_flush_tombstones", "_MEGA_TASK_PENDING_COMMITTER", "_MEGA_TASK_TOMBSTONE_COMMITTER",
+        "_mega_task_download_json", "_mega_task_segment_tasks", "mega_task_load_remote",
+        "_mega_task_segment_registry", "_mega_task_upload_new_pending", "_mega_task_move",
+        "_mega_find_remote_files", "_mega_remote_missing_error", "_mega_download_remote_path",
+        "mega_task_refresh_registry", "_DURABLE_WAL_SHIP_LOCK",
+        "_durable_wal_shipper_started", "durable_wal_active", "_durable_wal_path", "_durable_wal_is_path",
+        "_durable_wal_overlay_registry", "_durable_wal_ship_segment", "durable_wal_ship_once",
+    ], ns)
+    load("00_core.py", ["DurableUpdateWAL"], ns)
+    session = ns["MegaStorageSession"](ns["LocalDirMegaBackend"](root, latency_ms=latency_ms), inflight=3)
+    ns["MEGA_SESSION"] = session
+    ns["DURABLE_WAL"] = ns["DurableUpdateWAL"](os.path.join(root, "_local_wal"), 1024 * 1024, 2.0, enabled=wal)
+
+    def _mega_run(cmd, args=None, timeout=None, check=True):
+        res = session.run(cmd, args, timeout)
+        if check and res.returncode != 0:
+            raise RuntimeError(f"{cmd} failed: {res.stderr}")
+        return res
+
+    ns["_mega_run"] = _mega_run
+    ns["mega_ensure_remote_path"] = lambda path, force=False: _mega_run("mega-mkdir", ["-p", path], check=False) is not None
+    return ns
+
+
+def bench_mega_tasks():
+    """Burst of concurrent finance witnesses: per-file put+mv vs group-commit segment+tombstones."""
+    latency_ms = int(os.getenv("BENCH_MEGA_LATENCY_MS", "40"))
+    burst = int(os.getenv("BENCH_MEGA_TASK_BURST", "30"))
+    print(f"mega_tasks: burst of {burst} witnesses, local backend {latency_ms} ms/command")
+    for label, group in (("per-file", False), ("group commit", True)):
+        root = tempfile.mkdtemp(prefix="bench_mega_tasks_")
+        try:
+            ns = mega_task_ns(root, latency_ms, group)
+            ns["ensure_mega_task_dirs"]()
+            session = ns["MEGA_SESSION"]
+            before = session.stats()["commands"]
+
+            def one(i, phase):
+                key = 5000 + i
+                if phase == "persist":
+                    assert ns["_mega_task_upload_new_pending"](key, {"task_id": str(key), "payload": {"n": i}})
+                else:
+                    assert ns["_mega_task_move"](key, "pending", "done")
+
+            timings = {}
+            for phase in ("persist", "finish"):
+                started = time.perf_counter()
+                threads = [threading.Thread(target=one, args=(i, phase)) for i in range(burst)]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+                timings[phase] = time.perf_counter() - started
+            commands = session.stats()["commands"] - before
+            for key in ("_mega_task_segment_index", "_mega_task_segment_cache", "_mega_task_tombstone_cache", "_mega_task_registry"):
+                ns[key].clear()
+            ns["mega_task_refresh_registry"]()
+            done = sum(1 for row in ns["_mega_task_registry"].values() if row.get("state") == "done")
+            print(f"  {label:<13} persist {timings['persist']:5.2f}s  finish {timings['finish']:5.2f}s  "
+                  f"MEGA commands {commands:3d}  done after reload {done}/{burst}")
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_wal():
+    """Webhook witness latency: MEGA group commit vs local fsync'd WAL, then ship + torn-tail replay."""
+    latency_ms = int(os.getenv("BENCH_MEGA_LATENCY_MS", "40"))
+    burst = int(os.getenv("BENCH_MEGA_TASK_BURST", "30"))
+    print(f"wal: burst of {burst} witnesses, local backend {latency_ms} ms/command")
+    for label, wal in (("group commit", False), ("local WAL", True)):
+        root = tempfile.mkdtemp(prefix="bench_wal_")
+        try:
+            ns = mega_task_ns(root, latency_ms, True, wal=wal)
+            ns["ensure_mega_task_dirs"]()
+            hist = ns["LatencyHistogram"]()
+
+            def one(i):
+                started = time.perf_counter()
+                assert ns["_mega_task_upload_new_pending"](7000 + i, {"task_id": str(7000 + i), "payload": {"n": i}})
+                hist.observe(time.perf_counter() - started)
+                if i % 2 == 0:
+                    assert ns["_mega_task_move"](7000 + i, "pending", "done")
+
+            threads = [threading.Thread(target=one, args=(i,)) for i in range(burst)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            snap = hist.snapshot()
+            line = f"  {label:<13} persist p50<={snap['p50_ms']:.0f}ms p99<={snap['p99_ms']:.0f}ms max={snap['max_ms']:.1f}ms"
+            if wal:
+                before = ns["DURABLE_WAL"].stats()
+                started = time.perf_counter()
+                after = ns["durable_wal_ship_once"](force_seal=True)
+                line += (f"  lag {before['lag_bytes']}B -> {after['lag_bytes']}B, shipped in "
+                         f"{time.perf_counter() - started:.2f}s (skipped done {after.get('skipped_done', 0)})")
+            print(line)
+            if wal:
+                # Crash after a torn append: replay truncates the tail and keeps the whole records.
+                wal_dir = os.path.join(root, "_crash_wal")
+                w = ns["DurableUpdateWAL"](wal_dir, 1024 * 1024, 2.0)
+                for i in range(5):
+                    w.append("task", i, {"n": i})
+                with open(os.path.join(wal_dir, "wal_000000000001.open"), "ab") as fh:
+                    fh.write(ns["DurableUpdateWAL"].encode({"type": "task", "key": "torn"})[:-3])
+                again = ns["DurableUpdateWAL"](wal_dir, 1024 * 1024, 2.0)
+                st = again.open()
+                print(f"  torn tail replay: records {st['replayed_records']}/5, torn {st['torn_tails']}, "
+                      f"task 4 = {again.task(4)}")
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_pool():
+    """KeyedTaskPool: saturated ui lane with/without a donor lane; priorities inside one lane."""
+    import logging
+    from collections import deque
+    ns = base_ns()
+    ns.update(deque=deque, logging=logging, log_error=lambda msg: print("  error:", msg), POOL_PRIORITY_AGING_SECONDS=3.0)
+    load("00_core.py", ["POOL_PRIORITY_LEVELS", "POOL_DEFAULT_PRIORITY", "POOL_WORK_STEALING", "KeyedTaskPool"], ns)
+    Pool = ns["KeyedTaskPool"]
+    jobs = int(os.getenv("BENCH_POOL_JOBS", "120"))
+    run_ms = int(os.getenv("BENCH_POOL_RUN_MS", "20"))
+    print(f"pool: {jobs} ui jobs x {run_ms} ms over 30 chats, 2 ui workers, background donor with 2 workers")
+    for label, lend in (("no stealing", False), ("work stealing", True)):
+        ui = Pool(f"ui-{label}", 2, 5000)
+        background = Pool(f"bg-{label}", 2, 5000)
+        if lend:
+            background.lend_to(ui, 1)
+        order = defaultdict(list)
+        done = threading.Semaphore(0)
+
+        def job(chat, n):
+            time.sleep(run_ms / 1000.0)
+            order[chat].append(n)
+            done.release()
+
+        started = time.perf_counter()
+        for n in range(jobs):
+            ui.submit(n % 30, job, n % 30, n)
+        for _ in range(jobs):
+            done.acquire()
+        elapsed = time.perf_counter() - started
+        st = ui.stats()
+        in_order = all(seq == sorted(seq) for seq in order.values())
+        print(f"  {label:<14} {elapsed:5.2f}s  wait p50<={st['wait_p50_ms']:.0f} p95<={st['wait_p95_ms']:.0f} "
+              f"p99<={st['wait_p99_ms']:.0f}ms  borrowed={st['borrowed']}  per-key order kept={in_order}")
+    lane = Pool("background-prio", 1, 5000, priority_rules={"back-": 0, "runtime-": 2})
+    gate = threading.Event()
+    lane.submit("block", gate.wait)
+    finished = []
+    for n in range(20):
+        lane.submit(f"runtime-{n}", finished.append, f"runtime-{n}")
+    lane.submit("back-send:1", finished.append, "back-send:1")
+    gate.set()
+    while len(finished) < 21:
+        time.sleep(0.01)
+    print(f"  priority: user job ran at position {finished.index('back-send:1') + 1}/21 behind 20 queued housekeeping jobs")
+
+
+def pool_ns() -> dict:
+    import logging, heapq
+    from collections import deque
+    ns = base_ns()
+    ns.update(deque=deque, heapq=heapq, logging=logging, log_error=lambda msg: print("  error:", msg),
+              POOL_PRIORITY_AGING_SECONDS=3.0)
+    load("00_core.py", ["POOL_PRIORITY_LEVELS", "POOL_DEFAULT_PRIORITY", "POOL_WORK_STEALING", "KeyedTaskPool",
+                        "DelayedTaskScheduler", "TimingWheelScheduler"], ns)
+    return ns
+
+
+def bench_timers():
+    """Window-timer churn (auto-close/balance panel/countdown reschedules): heap vs timing wheel."""
+    import random
+    import tracemalloc
+    ns = pool_ns()
+    keys = int(os.getenv("BENCH_TIMER_KEYS", "5000"))
+    ops = int(os.getenv("BENCH_TIMER_OPS", "200000"))
+    print(f"timers: {ops} reschedule/cancel ops over {keys} window keys, delays 1..600s; then 2000 short timers")
+    for label, cls in (("heap", "DelayedTaskScheduler"), ("wheel", "TimingWheelScheduler")):
+        pool = ns["KeyedTaskPool"](f"bench-{label}", 2, 100000)
+        sched = ns[cls](pool)
+        rnd = random.Random(7)
+        noop = lambda: None
+        plan = [(f"win:{rnd.randrange(keys)}", rnd.uniform(1.0, 600.0)) for _ in range(ops)]
+        worst = 0.0
+        started = time.perf_counter()
+        for i, (key, delay) in enumerate(plan):
+            op_started = time.perf_counter()
+            if i % 10 == 9:
+                sched.cancel(key)
+            else:
+                sched.schedule(key, delay, noop)
+            worst = max(worst, time.perf_counter() - op_started)
+        elapsed = time.perf_counter() - started
+        tracemalloc.start()
+        for key, delay in plan[: ops // 4]:
+            sched.schedule(key, delay, noop)
+        _cur, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        st = sched.stats()
+        late = []
+        done = threading.Semaphore(0)
+
+        def fire(expected):
+            late.append(time.time() - expected)
+            done.release()
+
+        for i in range(2000):
+            delay = rnd.uniform(0.0, 1.0)
+            sched.schedule(f"short:{i}", delay, fire, time.time() + delay)
+        for _ in range(2000):
+            done.acquire()
+        late.sort()
+        print(f"  {label:<6} {ops / elapsed:8.0f} ops/s  worst op {worst * 1000:5.2f}ms  "
+              f"entries kept {st.get('heap', st['scheduled']):5d} for {st['scheduled']} live  "
+              f"alloc for {ops // 4} more ops {peak / 1024 / 1024:4.1f} MB  "
+              f"short timers late p50 {late[1000] * 1000:.1f}ms p99 {late[1980] * 1000:.1f}ms")
+        for key in list(range(keys)):
+            sched.cancel(f"win:{key}")
+
+
+def bench_forward_map():
+    """Copied-message map: dict in root JSON with linear origin scan vs SQLite forward_links."""
+    import json, sqlite3
+    ns = base_ns()
+    ns.update(json=json, sqlite3=sqlite3)
+    load("00_core.py", ["FINANCE_ROW_LEDGERS", "FINANCE_ROW_DAILY", "FINANCE_MSG_FIELDS", "_finance_msg_fields", "_finance_row_digest",
+                        "_finance_row_key", "FINANCE_ROW_POS_GAP", "_finance_row_prepare", "_finance_row_spread", "_finance_row_positions",
+                        "_finance_rows_plan", "SQLiteState"], ns)
+    sources = int(os.getenv("BENCH_FORWARD_SOURCES", "100000"))
+    lookups = 2000
+    print(f"forward_map: {sources} sources x 2 copies; {lookups} reply-origin lookups; root save size")
+    fmap = {(i % 40, i): [(1000 + i % 9, i * 2), (2000 + i % 5, i * 2 + 1)] for i in range(sources)}
+    probe = [(1000 + i % 9, i * 2) for i in range(0, sources, max(1, sources // lookups))]
+    started = time.perf_counter()
+    for dst in probe:
+        next((src for src, pairs in fmap.items() if dst in pairs), None)
+    scan = (time.perf_counter() - started) / len(probe)
+    idx = {f"{s}:{m}": [{"dst_chat_id": c, "dst_msg_id": d, "status": "delivered"} for c, d in pairs]
+           for (s, m), pairs in fmap.items()}
+    root_old = len(json.dumps({"forward_index": idx}, separators=(",", ":")))
+    started = time.perf_counter()
+    json.dumps({"forward_index": idx}, separators=(",", ":"))
+    dump_old = time.perf_counter() - started
+    print(f"  dict   origin lookup {scan * 1000:8.3f}ms  root JSON +{root_old / 1024 / 1024:5.1f} MB "
+          f"({dump_old * 1000:.0f}ms to serialize on every save_data)")
+    tmp = tempfile.mkdtemp(prefix="bench_fwd_")
+    try:
+        store = ns["SQLiteState"](os.path.join(tmp, "bot.sqlite3"))
+        started = time.perf_counter()
+        store.forward_links_import(idx, replace=True)
+        imported = time.perf_counter() - started
+        started = time.perf_counter()
+        for dst in probe:
+            store.forward_origin_for_copy(*dst)
+        origin = (time.perf_counter() - started) / len(probe)
+        started = time.perf_counter()
+        for src in list(fmap)[:lookups]:
+            store.forward_links_for_source(*src)
+        by_src = (time.perf_counter() - started) / lookups
+        started = time.perf_counter()
+        for i in range(lookups):
+            store.forward_link_add(7, sources + i, 8, i)
+        add = (time.perf_counter() - started) / lookups
+        print(f"  sqlite origin lookup {origin * 1000:8.3f}ms  by source {by_src * 1000:.3f}ms  "
+              f"add+commit {add * 1000:.3f}ms  root JSON +0.0 MB  (one-off import {imported:.1f}s)")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def global_backup_ns(db_path: str) -> dict:
+    """Low-RAM state: chat metadata in ``data``, finance ledgers in SQLite finance_records."""
+    import json, hashlib, sqlite3
+    from datetime import datetime, timezone
+    ns = base_ns()
+    ns.update(json=json, hashlib=hashlib, sqlite3=sqlite3, re=__import__("re"), io=__import__("io"), gzip=__import__("gzip"),
+              datetime=datetime, timezone=timezone, LOWRAM_ENABLED=True, VERSION="bench",
+              data_lock=threading.RLock(), log_error=lambda msg: print("  error:", msg),
+              now_local=datetime.now, today_key=lambda: "2026-10-18")
+    load("00_core.py", ["FINANCE_ROW_LEDGERS", "FINANCE_ROW_DAILY", "FINANCE_MSG_FIELDS", "_finance_msg_fields", "_finance_row_digest",
+                        "_finance_row_key", "FINANCE_ROW_POS_GAP", "_finance_row_prepare", "_finance_row_spread", "_finance_row_positions",
+                        "_finance_rows_plan", "SQLiteState", "LOWRAM_COLD_KEYS", "LOWRAM_LIST_KEYS", "_lowram_default_for_key",
+                        "_lowram_store_meta_payload", "_lowram_rebuild_daily", "_lowram_materialize_chat_snapshot",
+                        "fmt_date_backup", "backup_record_copy", "backup_records_list",
+                        "UNIVERSAL_BACKUP_KIND", "UNIVERSAL_BACKUP_SCHEMA_VERSION"], ns)
+    load("10_mega_runtime.py", ["_delta_json_clone", "_delta_hash", "_delta_record_key", "_DELTA_VOLATILE_CHAT_KEYS",
+                                "_DELTA_DERIVED_CHAT_KEYS", "_DELTA_GLOBAL_SETTINGS_EXCLUDE", "_DELTA_CHAT_SETTINGS_EXCLUDE",
+                                "_DELTA_VOLATILE_ROOT_KEYS", "_DELTA_ROOT_MAP_KEYS", "_delta_chat_meta", "_delta_root_patch",
+                                "_delta_root_signature_state", "_snapshot_runtime_state_for_backup",
+                                "_GLOBAL_BACKUP_STREAM_LAST", "_global_backup_json_chunk", "_global_backup_stream_map",
+                                "_global_backup_chat_snapshot", "write_global_backup_stream"], ns)
+    ns["ColdChatStore"] = type("ColdChatStore", (dict,), {})
+    ns["SQLITE"] = ns["SQLiteState"](db_path)
+    chat_ids = [str(r[0]) for r in ns["SQLITE"].conn.execute("SELECT DISTINCT chat_id FROM finance_records").fetchall()]
+    ns["data"] = {"chats": {cid: {"settings": {"title": f"chat {cid}"}} for cid in chat_ids},
+                  "forward_rules": {}, "forward_finance": {}, "finance_active_chats": {cid: True for cid in chat_ids},
+                  "_global_settings": {}, "backup_flags": {"drive": True, "channel": True}}
+    return ns
+
+
+def _global_backup_child(mode: str, db_path: str, out_path: str):
+    """Runs in its own process so ru_maxrss is the peak of exactly one writer."""
+    import json, resource
+    ns = global_backup_ns(db_path)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if mode == "old":
+        # The pre-v199 path: whole payload (every chat materialized) in RAM, then json.dump.
+        chats = ns["data"]["chats"]
+        payload = {k: v for k, v in ns["data"].items() if k != "chats"}
+        payload["chats"] = {cid: ns["_lowram_materialize_chat_snapshot"](int(cid), store) for cid, store in chats.items()}
+        payload = json.loads(json.dumps(payload, ensure_ascii=False, default=str))
+        for store in payload["chats"].values():
+            store["records"] = ns["backup_records_list"](store.get("records", []))
+            store["daily_records_by_date"] = {ns["fmt_date_backup"](k): ns["backup_records_list"](v)
+                                              for k, v in (store.get("daily_records", {}) or {}).items()}
+        with open(out_path, "w", encoding="utf-8") as fh:
+            json.dump(payload, fh, ensure_ascii=False, indent=2)
+    else:
+        ns["write_global_backup_stream"](out_path)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"before_mb": before / 1024, "peak_mb": peak / 1024, "seconds": elapsed,
+                      "bytes": os.path.getsize(out_path)}))
+
+
+def bench_global_backup():
+    """Universal global backup: whole-payload json.dump vs streaming chat-by-chat writer (peak RSS)."""
+    import json, random
+    chats = int(os.getenv("BENCH_BACKUP_CHATS", "30"))
+    per_chat = int(os.getenv("BENCH_BACKUP_RECORDS", "3000"))
+    tmp = tempfile.mkdtemp(prefix="bench_backup_")
+    try:
+        db_path = os.path.join(tmp, "bot.sqlite3")
+        ns = global_backup_ns(db_path)
+        rnd = random.Random(5)
+        for c in range(chats):
+            recs = [{"id": i, "amount": rnd.randint(-90000, 90000), "note": f"оплата поставщику №{i} " + "x" * rnd.randint(5, 60),
+                     "day_key": f"2026-{1 + i % 9:02d}-{1 + i % 27:02d}", "record_uid": f"{c:04d}{i:08d}",
+                     "source_msg_id": 1000 + i, "timestamp": "2026-10-18T10:00:00"} for i in range(per_chat)]
+            ns["SQLITE"].set_cold(-1000 - c, "records", recs)
+        ns["SQLITE"].conn.close()
+        print(f"global_backup: {chats} chats x {per_chat} records in SQLite (low-RAM); peak RSS per writer process")
+        for label, mode, name in (("old dict+json.dump", "old", "global.json"), ("stream .json", "stream", "global.json"),
+                                  ("stream .json.gz", "stream", "global.json.gz")):
+            out = os.path.join(tmp, name)
+            res = subprocess.run([sys.executable, str(R / "BENCH_v199.py"), "_global_backup_child", mode, db_path, out],
+                                 capture_output=True, text=True, check=True)
+            row = json.loads(res.stdout.strip().splitlines()[-1])
+            print(f"  {label:<20} peak RSS {row['peak_mb']:7.1f} MB (+{row['peak_mb'] - row['before_mb']:6.1f} over loaded state)  "
+                  f"{row['seconds']:5.1f}s  {row['bytes'] / 1024 / 1024:6.1f} MB on disk")
+            os.remove(out)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def balance_index_ns(db_path: str) -> dict:
+    """Canonical ARS/USD ledgers (73_state_export_runtime) + FINANCE_BALANCE_INDEX on a temp SQLite."""
+    import json, hashlib, re, sqlite3, math, bisect
+    from datetime import datetime, timezone
+    ns = base_ns()
+    ns.update(json=json, hashlib=hashlib, re=re, sqlite3=sqlite3, math=math, bisect=bisect, _v151_math=math,
+              datetime=datetime, timezone=timezone, data={"chats": {}}, LOWRAM_ENABLED=True,
+              FINANCE_BALANCE_INDEX_ENABLED=True, FINANCE_BALANCE_VERIFY_EVERY=200,
+              today_key=lambda: "2026-10-18", log_error=lambda msg: print("  error:", msg))
+    ns["get_chat_store"] = lambda cid: ns["data"]["chats"].setdefault(str(int(cid)), {"settings": {}, "records": []})
+    ns["_ensure_currency_ledgers"] = lambda store: str(store.setdefault("settings", {}).get("_active_currency_ledger") or "ars")
+    ns["_snapshot_active_currency_ledger"] = lambda store, active: None
+    load("00_core.py", ["FINANCE_ROW_LEDGERS", "FINANCE_ROW_DAILY", "FINANCE_MSG_FIELDS", "_finance_msg_fields", "_finance_row_digest",
+                        "_finance_row_key", "FINANCE_ROW_POS_GAP", "_finance_row_prepare", "_finance_row_spread", "_finance_row_positions",
+                        "_finance_rows_plan", "SQLiteState", "record_sort_key", "FINANCE_BALANCE_UNITS_SHIFT", "balance_units", "balance_from_units",
+                        "_BalanceLedger", "FinanceBalanceIndex"], ns)
+    ns["_lowram_rebuild_daily"] = lambda records: {}
+    ns["SQLITE"] = ns["SQLiteState"](db_path)
+    load("91_finance_records_handlers.py", ["_record_day_key", "_balance_store_chat_id", "calc_day_balance", "_calc_day_balance_scan"], ns)
+    load("10_mega_runtime.py", ["_delta_hash", "_delta_record_key"], ns)
+    load("73_state_export_runtime.py", [
+        "_v151_float", "_v151_day_key", "_v151_sync_currency_snapshots", "_v151_ars_records",
+        "_v177_legacy_0271_v151_usd_records", "_v177_legacy_0272_v151_usd_records", "_v151_usd_records", "_v151_all_records",
+        "_excel_canonical_opening_balance_scan", "_excel_canonical_opening_balance", "_balance_index_row", "_balance_index_rows",
+        "_balance_index_active", "_balance_index_ledger_currency", "_balance_index_size", "FINANCE_BALANCE_INDEX",
+        "finance_balance_opening", "finance_balance_through", "finance_balance_month", "finance_balance_total",
+        "finance_balance_index_verify"], ns)
+    return ns
+
+
+def bench_balance_index():
+    """Opening/day balance: full re-sort per call vs per-day prefix-sum index (+ incremental add, verify)."""
+    import random
+    n = int(os.getenv("BENCH_BALANCE_RECORDS", "20000"))
+    tmp = tempfile.mkdtemp(prefix="bench_balance_")
+    try:
+        ns = balance_index_ns(os.path.join(tmp, "bot.sqlite3"))
+        rnd = random.Random(11)
+        cid = -1001
+        store = ns["get_chat_store"](cid)
+        recs = []
+        for i in range(n):
+            day = f"{2024 + i * 3 // n}-{1 + rnd.randrange(12):02d}-{1 + rnd.randrange(28):02d}"
+            rec = {"id": i + 1, "record_uid": "%012X" % (i + 1), "amount": rnd.choice([rnd.randint(-90000, 90000), round(rnd.uniform(-999, 999), 2)]),
+                   "note": "x", "day_key": day, "timestamp": day + "T12:00:00", "source_msg_id": 10 + i}
+            if i % 7 == 0:
+                rec["usd_amount"] = round(rnd.uniform(-50, 50), 2)
+            recs.append(rec)
+        store["records"] = recs
+        store["daily_records"] = {}
+        for rec in recs:
+            store["daily_records"].setdefault(rec["day_key"], []).append(rec)
+        days = sorted(store["daily_records"])
+        probes = [rnd.choice(days) for _ in range(30)]
+        print(f"balance_index: one chat, {n} records over {len(days)} days; 30 lookups per row")
+
+        def timed(fn):
+            started = time.perf_counter()
+            for d in probes:
+                fn(d)
+            return (time.perf_counter() - started) / len(probes) * 1000
+
+        old_open = timed(lambda d: ns["_excel_canonical_opening_balance_scan"](cid, "ars", d, 0, False))
+        old_day = timed(lambda d: ns["_calc_day_balance_scan"](store, d))
+        started = time.perf_counter()
+        ns["finance_balance_opening"](cid, "ars", probes[0])
+        first = (time.perf_counter() - started) * 1000
+        new_open = timed(lambda d: ns["finance_balance_opening"](cid, "ars", d))
+        new_day = timed(lambda d: ns["calc_day_balance"](store, d))
+        print(f"  opening  scan {old_open:8.2f} ms/call   index {new_open:7.4f} ms/call   (first build {first:.0f} ms)")
+        print(f"  day bal  scan {old_day:8.2f} ms/call   index {new_day:7.4f} ms/call")
+        print(f"  month report (31 days): scan {old_day * 31:7.1f} ms   index {new_day * 31:6.2f} ms")
+        idx = ns["FINANCE_BALANCE_INDEX"]
+        started = time.perf_counter()
+        for i in range(500):
+            rec = {"id": n + i + 1, "record_uid": "%012X" % (n + i + 1), "amount": 100 + i, "note": "y",
+                   "day_key": rnd.choice(days), "timestamp": "", "source_msg_id": n + i + 10}
+            recs.append(rec)
+            idx.note_record(cid, rec)
+            ns["finance_balance_opening"](cid, "ars", rnd.choice(days))
+        per = (time.perf_counter() - started) / 500 * 1000
+        print(f"  add record + opening lookup: {per:.3f} ms (incremental; includes the full-scan verify every {idx.verify_every} updates)")
+        store["daily_records"] = {}
+        for rec in recs:
+            store["daily_records"].setdefault(rec["day_key"], []).append(rec)
+        started = time.perf_counter()
+        rep = ns["finance_balance_index_verify"]([cid])
+        print(f"  verify vs full scan: {rep['checks']} checks, {len(rep['mismatches'])} mismatches, "
+              f"legacy float drift {rep['legacy_max_drift']:.2e}  ({time.perf_counter() - started:.1f}s)")
+        print(f"  stats {({k: v for k, v in idx.snapshot_stats().items() if k in ('builds', 'incremental', 'verify_runs', 'verify_mismatches')})}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def records_ns() -> dict:
+    """normalize/recalc/short_id pipeline of 91_finance_records_handlers on an in-memory store."""
+    import re, math, bisect, hashlib, json
+    from datetime import datetime
+    from contextlib import nullcontext
+    ns = base_ns()
+    ns.update(re=re, math=math, bisect=bisect, hashlib=hashlib, json=json, data={"chats": {}}, LOWRAM_ENABLED=False,
+              FINANCE_RECORDS_PENDING_LIMIT=64, FINANCE_RECORDS_AUDIT_DELAY_SECONDS=0,
+              today_key=lambda: "2026-10-18", now_local=datetime.now, log_error=lambda msg: print("  error:", msg),
+              locked_chat=lambda cid: nullcontext(), save_data=lambda *a, **k: None,
+              rebuild_global_records=lambda: None, finance_cache_invalidate=lambda *a, **k: None)
+    ns["get_chat_store"] = lambda cid: ns["data"]["chats"].setdefault(str(int(cid)), {"settings": {}, "records": []})
+    ns["ensure_finance_record_uid"] = lambda cid, rec: rec.setdefault("record_uid", "%012X" % int(rec.get("id") or 0))
+
+    def delta_track_record(chat_id, rec, ledger="records", deleted=False, key=None):
+        if str(ledger) == "records" and (rec is not None or key):
+            ns["finance_records_order_note"](chat_id, rec, deleted)
+
+    ns["delta_track_record"] = delta_track_record
+    ns["delta_track_chat_full"] = lambda chat_id, reason="": ns["finance_records_order_release"](chat_id)
+    ns["delta_track_record_rekey"] = lambda chat_id, old_key, rec: delta_track_record(chat_id, rec)
+    load("00_core.py", ["_env_bool", "_env_int", "record_sort_key", "FINANCE_BALANCE_UNITS_SHIFT", "balance_units", "balance_from_units"], ns)
+    load("10_mega_runtime.py", ["_delta_hash", "_delta_record_key"], ns)
+    load("91_finance_records_handlers.py", [
+        "_record_day_key", "FINANCE_RECORDS_INCREMENTAL", "FINANCE_RECORDS_UNITS_CHECK_MAX_ROWS",
+        "FINANCE_RECORDS_UNITS_CHECK_SECONDS", "_FINANCE_ORDER_STAMP_KEY", "_FINANCE_ORDER_LOCK",
+        "_FINANCE_ORDER_LOCAL", "_FINANCE_ORDER_STATE", "_FINANCE_ORDER_AUDIT_QUEUED", "_FINANCE_ORDER_STATS",
+        "_normalize_record_fields", "_record_id_int", "_finance_order_bind", "_finance_order_seed", "_finance_order_adopt",
+        "_finance_order_current", "finance_records_order_note", "finance_records_order_release", "finance_records_order_clean",
+        "finance_records_order_stamp", "finance_records_max_id", "_finance_order_locate", "_renumber_short_ids_days",
+        "_finance_order_month_days", "_finance_order_settle", "_normalize_chat_records_full", "_finance_order_try_settle",
+        "normalize_chat_records", "_finance_order_verify_units", "recalc_balance", "rebuild_month_short_ids", "_finance_order_schedule_audit",
+        "finance_records_audit", "finance_records_order_stats"], ns)
+    return ns
+
+
+def bench_records_incremental():
+    """One added expense through add + finalize: full normalize pipeline vs incremental, by history size."""
+    import random
+    ns = records_ns()
+    rnd = random.Random(12)
+    import gc
+    sizes = [int(x) for x in os.getenv("BENCH_RECORDS_SIZES", "1000,10000,100000").split(",")]
+    adds = {False: int(os.getenv("BENCH_RECORDS_FULL_ADDS", "5")), True: int(os.getenv("BENCH_RECORDS_ADDS", "200"))}
+    print(f"records_incremental: add record + finalize; {adds[False]} full / {adds[True]} incremental adds per history size")
+
+    def add(cid, rid, incremental):
+        store = ns["get_chat_store"](cid)
+        day = f"2026-{1 + rnd.randrange(10):02d}-{1 + rnd.randrange(28):02d}"
+        rec = {"id": rid, "short_id": "", "timestamp": day + "T23:00:00", "amount": rnd.randint(-9000, 9000),
+               "note": "z", "source_msg_id": 10 ** 6 + rid, "day_key": day}
+        if rid % 5 == 0:
+            rec.update(usd_amount=round(rnd.uniform(-40, 40), 2), usd_note="u", usd_only=not rid % 10)
+        store["records"].append(rec)
+        # 90_commands_exports._finance_add_record_base, then the 72 finalizer.
+        ns["normalize_chat_records"](cid, incremental=incremental)
+        store["next_id"] = ns["finance_records_max_id"](cid) + 1
+        ns["recalc_balance"](cid, incremental=incremental)
+        ns["rebuild_month_short_ids"](cid, incremental=incremental)
+        ns["normalize_chat_records"](cid, incremental=incremental)
+        ns["recalc_balance"](cid, incremental=incremental)
+        ns["rebuild_month_short_ids"](cid, incremental=incremental)
+
+    for n in sizes:
+        row = []
+        for incremental in (False, True):
+            cid = n * 10 + int(incremental)
+            store = ns["get_chat_store"](cid)
+            store["records"] = [{"id": i + 1, "amount": rnd.randint(-90000, 90000), "note": "x", "timestamp": "",
+                                 "day_key": f"{2016 + i * 10 // n}-{1 + rnd.randrange(12):02d}-{1 + rnd.randrange(28):02d}",
+                                 "source_msg_id": 10 + i} for i in range(n)]
+            ns["recalc_balance"](cid)
+            ns["rebuild_month_short_ids"](cid)
+            # The synthetic histories stay alive across rows; keep the cyclic GC out of the timings.
+            gc.collect(); gc.freeze()
+            started = time.perf_counter()
+            for i in range(adds[incremental]):
+                add(cid, n + i + 1, incremental)
+            row.append((time.perf_counter() - started) / adds[incremental] * 1000)
+            gc.unfreeze()
+        print(f"  {n:>7} records   full {row[0]:9.2f} ms/add   incremental {row[1]:7.3f} ms/add")
+    for cid in sorted(int(k) for k in ns["data"]["chats"]):
+        if cid % 10:
+            drift = ns["finance_records_audit"](cid)
+            assert not any(drift.values()), (cid, drift)
+    stats = ns["finance_records_order_stats"]()
+    print(f"  background audit: {stats.get('audits', 0)} chats, drift {stats.get('audit_drift', 0)};"
+          f" incremental {stats.get('incremental', 0)}, fallbacks {stats.get('fallbacks', 0)};"
+          f" units checks {stats.get('units_checks', 0)}, drift {stats.get('units_drift', 0)}")
+    assert not stats.get("units_drift")
+
+
+def bench_callback_tokens():
+    """Short callback tokens: 100k live tokens in SQLite behind an LRU; resolve latency, dedup, restart, sweep."""
+    import json, sqlite3, hashlib, re, random
+    from collections import OrderedDict
+    from datetime import datetime, timezone
+    n = int(os.getenv("BENCH_CALLBACK_TOKENS", "100000"))
+    probes = 20000
+    tmp = tempfile.mkdtemp(prefix="bench_cbx_")
+    try:
+        ns = base_ns()
+        ns.update(json=json, sqlite3=sqlite3, hashlib=hashlib, re=re, datetime=datetime, timezone=timezone,
+                  OrderedDict=OrderedDict, log_error=lambda msg: print("  error:", msg),
+                  SHORT_CALLBACK_TTL_SECONDS=7 * 24 * 3600, SHORT_CALLBACK_LRU_SIZE=4096,
+                  SHORT_CALLBACK_SWEEP_INTERVAL_SECONDS=600, SHORT_CALLBACK_PERSIST=True)
+        load("00_core.py", ["FINANCE_ROW_LEDGERS", "FINANCE_ROW_DAILY", "FINANCE_MSG_FIELDS", "_finance_msg_fields", "_finance_row_digest",
+                            "_finance_row_key", "FINANCE_ROW_POS_GAP", "_finance_row_prepare", "_finance_row_spread", "_finance_row_positions",
+                            "_finance_rows_plan", "SQLiteState"], ns)
+        load("20_callback_tokens.py", [
+            "_short_callback_lock", "_short_callback_store", "SHORT_CALLBACK_TOKEN_LEN", "_SHORT_CALLBACK_PREFIXES",
+            "_short_callback_last_sweep", "_SHORT_CALLBACK_STATS", "base36", "_short_callback_token",
+            "_short_callback_remember", "_short_callback_lookup", "_short_callback_maybe_sweep",
+            "make_short_callback", "resolve_short_callback", "short_callback_stats"], ns)
+        path = os.path.join(tmp, "bot.sqlite3")
+        ns["SQLITE"] = ns["SQLiteState"](path)
+        ns["_short_callback_last_sweep"] = time.time()
+        long_cb = [f"cat_show_records:2026-{1 + i % 12:02d}-01:{i}:2026-{1 + i % 12:02d}-28:{i + 7}:slug_{i:07d}" for i in range(n)]
+        started = time.perf_counter()
+        tokens = [ns["make_short_callback"](cb, "catx") for cb in long_cb]
+        make_us = (time.perf_counter() - started) / n * 1e6
+        print(f"callback_tokens: {n} live tokens, LRU {ns['SHORT_CALLBACK_LRU_SIZE']}; make {make_us:.1f} us/token (write-through)")
+        rnd = random.Random(3)
+
+        def timed(picks):
+            lat = []
+            for i in picks:
+                started = time.perf_counter()
+                got = ns["resolve_short_callback"](tokens[i])
+                lat.append(time.perf_counter() - started)
+                assert got == long_cb[i]
+            lat.sort()
+            return lat[len(lat) // 2] * 1e6, lat[int(len(lat) * 0.99)] * 1e6
+
+        cold = timed([rnd.randrange(n) for _ in range(probes)])
+        hot_set = [rnd.randrange(n) for _ in range(500)]
+        timed(hot_set)
+        hot = timed([rnd.choice(hot_set) for _ in range(probes)])
+        print(f"  resolve uniform over 100%  p50 {cold[0]:6.1f} us  p99 {cold[1]:6.1f} us (mostly SQLite)")
+        print(f"  resolve hot 500 tokens     p50 {hot[0]:6.1f} us  p99 {hot[1]:6.1f} us (LRU)")
+        writes = ns["_SHORT_CALLBACK_STATS"]["writes"]
+        again = [ns["make_short_callback"](long_cb[i], "catx") for i in range(0, n, 97)]
+        dedup = all(t == tokens[i] for t, i in zip(again, range(0, n, 97))) and ns["_SHORT_CALLBACK_STATS"]["writes"] == writes
+        ns["SQLITE"].conn.close()
+        ns["_short_callback_store"].clear()
+        ns["SQLITE"] = ns["SQLiteState"](path)
+        restart = all(ns["resolve_short_callback"](tokens[i]) == long_cb[i] for i in range(0, n, 997))
+        with ns["SQLITE"].lock:
+            ns["SQLITE"].conn.execute("UPDATE callback_tokens SET expires_at=? WHERE token IN (SELECT token FROM callback_tokens LIMIT ?)", (time.time() - 1, n // 10))
+            ns["SQLITE"].conn.commit()
+        started = time.perf_counter()
+        swept = ns["_short_callback_maybe_sweep"](force=True)
+        sweep_ms = (time.perf_counter() - started) * 1000
+        st = ns["short_callback_stats"]()
+        print(f"  dedup same token, no write: {dedup}; resolve after restart: {restart}; "
+              f"sweep {swept} expired in {sweep_ms:.1f} ms; stored {st['stored']}")
+        ns["SQLITE"].conn.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_view_cache():
+    """Month view hits: list(records) key + deepcopy per hit/store vs generation-keyed LRU of frozen values."""
+    import copy, random
+    from collections import OrderedDict
+    n = int(os.getenv("BENCH_VIEW_RECORDS", "100000"))
+    hits = 200
+    ns = base_ns()
+    ns.update(copy=copy, OrderedDict=OrderedDict, FINANCE_VIEW_CACHE_MAX=400, data={"chats": {}},
+              bot_journal=lambda *a, **k: None)
+    load("15_operation_safety.py", [
+        "_FINANCE_CACHE_LOCK", "_FINANCE_VIEW_CACHE", "_FINANCE_VIEW_CACHE_BY_CHAT", "_FINANCE_LEDGER_GEN",
+        "_FINANCE_STORE_CHAT", "_FINANCE_CACHE_STATS", "_FrozenView", "_finance_cache_freeze", "finance_ledger_generation",
+        "_finance_cache_drop_locked", "finance_ledger_bump", "finance_cache_invalidate", "_finance_store_chat_id",
+        "finance_view_key", "finance_cache_get", "finance_cache_stats"], ns)
+    rnd = random.Random(5)
+    store = {"next_id": n + 1, "records": [
+        {"id": i + 1, "amount": rnd.randint(-9000, 9000), "note": "x" * 12, "day_key": f"2026-{1 + i * 12 // n:02d}-{1 + i % 28:02d}"}
+        for i in range(n)]}
+    ns["data"]["chats"]["-1001"] = store
+
+    def month(m):
+        return [r for r in store["records"] if r["day_key"].startswith(m)]
+
+    old_cache = {}
+
+    def old_get(m):
+        records = list(store.get("records", []) or [])
+        key = ("month_records", id(store), m, len(records), int(store.get("next_id", 0) or 0), str(records[-1].get("day_key")))
+        row = old_cache.get(key)
+        if row:
+            return copy.deepcopy(row)
+        value = month(m)
+        old_cache[key] = copy.deepcopy(value)
+        return value
+
+    def new_get(m):
+        cid = ns["_finance_store_chat_id"](store)
+        return ns["finance_cache_get"](ns["finance_view_key"]("month_records", cid, store, m), lambda: month(m), ttl=30.0)
+
+    print(f"view_cache: one chat, {n} records; {hits} hits on a ~{n // 12}-record month view")
+    for label, fn in (("deepcopy", old_get), ("frozen LRU", new_get)):
+        started = time.perf_counter(); fn("2026-05"); miss = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        for _ in range(hits):
+            fn("2026-05")
+        hit = (time.perf_counter() - started) / hits * 1000
+        print(f"  {label:10s}  miss {miss:8.2f} ms   hit {hit:8.3f} ms")
+    view = new_get("2026-05")
+    try:
+        view[0]["amount"] = 0
+        frozen = False
+    except TypeError:
+        frozen = True
+    store["records"][len(store["records"]) // 2 + 100]["note"] = "edited"
+    ns["finance_ledger_bump"](-1001)
+    fresh = new_get("2026-05") is not view
+    for i in range(600):
+        ns["finance_cache_get"](("probe", -2000 - i % 50, i), lambda: i, ttl=30.0)
+    st = ns["finance_cache_stats"]()
+    print(f"  frozen={frozen} rebuilt after bump={fresh}; entries {st['entries']}/{st['max_entries']} "
+          f"hits {st['hits']} misses {st['misses']} evictions {st['evictions']} invalidated {st['invalidated']}")
+
+
+def bench_root_sections():
+    """save_root: one kv['root'] JSON per save vs root_sections written only when their digest changed."""
+    import json, sqlite3, hashlib, re, random
+    from datetime import datetime, timezone
+    ns = base_ns()
+    ns.update(json=json, sqlite3=sqlite3, hashlib=hashlib, re=re, datetime=datetime, timezone=timezone)
+    load("00_core.py", ["FINANCE_ROW_LEDGERS", "FINANCE_ROW_DAILY", "FINANCE_MSG_FIELDS", "_finance_msg_fields", "_finance_row_digest",
+                        "_finance_row_key", "FINANCE_ROW_POS_GAP", "_finance_row_prepare", "_finance_row_spread", "_finance_row_positions", "_finance_rows_plan",
+                        "ROOT_SPLIT_KEYS", "_root_sections_split", "_root_sections_join", "_sqlite_root_from_conn", "SQLiteState"], ns)
+    ns.update(ROOT_SECTION_TRACK_BYTES=32768, ROOT_SECTIONS_FULL_EVERY=int(os.getenv("BENCH_ROOT_FULL_EVERY", "20")))
+    rnd = random.Random(13)
+    items = int(os.getenv("BENCH_ROOT_ITEMS", "20000"))
+    gs = {f"setting_{i}": {"enabled": bool(i % 2), "value": i} for i in range(40)}
+    gs["finance_integrity_v141"] = {"event_seq": items, "events": [{"seq": i, "kind": "edit", "hash": "%016x" % rnd.getrandbits(64)} for i in range(items)]}
+    gs["operation_ledger"] = {"items": {f"op{i}": {"status": "done", "chat_id": -100 - i % 50} for i in range(items // 2)}}
+    gs["runtime_counters"] = {"ticks": 0}
+    root = {"_global_settings": gs, "tenants": {"tenants": {str(i): {"chat_ids": [i]} for i in range(200)}},
+            "known_chats": {str(-100 - i): {"title": f"chat {i}"} for i in range(500)}, "empty": {}, "version": 199}
+    saves = 50
+    tmp = tempfile.mkdtemp(prefix="bench_root_")
+    try:
+        store = ns["SQLiteState"](os.path.join(tmp, "bot.sqlite3"))
+        # legacy DB: only kv['root']; the first save migrates it.
+        store.set_kv("root", root)
+        assert json.dumps(store.load_root()) == json.dumps(root), "legacy fallback"
+        store.save_root(root)
+        assert store.get_kv("root") is None, "kv['root'] left behind"
+        full = len(json.dumps(root, ensure_ascii=False, separators=(",", ":")).encode())
+        print(f"root_sections: root {full / 1024:.0f} KB, {saves} saves, one small setting changed per save")
+        started = time.perf_counter()
+        for i in range(saves):
+            gs["runtime_counters"]["ticks"] = i
+            store.set_kv("bench_root_old", root)
+        old = (time.perf_counter() - started) / saves * 1000
+        store.conn.execute("DELETE FROM kv WHERE k='bench_root_old'"); store.conn.commit()
+        before = store.root_section_stats()
+        started = time.perf_counter()
+        for i in range(saves):
+            gs["runtime_counters"]["ticks"] = i + 1
+            if i % 10 == 9:
+                gs["finance_integrity_v141"]["events"].append({"seq": gs["finance_integrity_v141"]["event_seq"] + 1, "kind": "add", "hash": "0"})
+                gs["finance_integrity_v141"]["event_seq"] += 1
+                store.root_touch("_global_settings", "finance_integrity_v141")  # as finance_integrity_append
+            store.save_root(root)
+        new = (time.perf_counter() - started) / saves * 1000
+        after = store.root_section_stats()
+        written = (after["bytes_written"] - before["bytes_written"]) / saves
+        print(f"  kv root        {old:7.2f} ms/save  {full / 1024:9.1f} KB written/save")
+        print(f"  root_sections  {new:7.2f} ms/save  {written / 1024:9.1f} KB written/save "
+              f"({after['written'] - before['written']} section writes, {after['skipped'] - before['skipped']} skipped, "
+              f"{after['unserialized'] - before['unserialized']} not serialized, {after['full_checks'] - before['full_checks']} full checks)")
+        # An in-place edit of a large section without root_touch is caught by the digest backstop.
+        gs["operation_ledger"]["items"]["op0"]["status"] = "untracked"
+        store.save_root(root, full=True)
+        store.conn.close()
+        reopened = ns["SQLiteState"](os.path.join(tmp, "bot.sqlite3"))
+        same = json.dumps(reopened.load_root(), ensure_ascii=False) == json.dumps(root, ensure_ascii=False)
+        print(f"  reload identical (values + key order): {same}")
+        reopened.conn.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_reminders():
+    """Reminder engine with 10k configs: 15-second full scan vs deadline index (cost + fire jitter)."""
+    import random
+    from datetime import datetime, timedelta, timezone
+    ns = pool_ns()
+    tz = timezone(timedelta(hours=3))
+    n = int(os.getenv("BENCH_REMINDERS", "10000"))
+    hot = int(os.getenv("BENCH_REMINDERS_HOT", "400"))
+    ns.update(datetime=datetime, timedelta=timedelta, now_local=lambda: datetime.now(tz),
+              today_key=lambda: datetime.now(tz).strftime("%Y-%m-%d"),
+              _env_bool=lambda name, default="0": True, REMINDER_RECONCILE_SECONDS=600.0,
+              runtime_is_ready=lambda: True)
+    load("35_reminders.py", [
+        "_REMINDER_CONFIG_LOCK", "_REMINDER_CHECK_SECONDS", "_REMINDER_CFG_KEYS", "_REMINDER_ROOT_NORMALIZED",
+        "_normalize_reminder_cfg", "_reminders_root", "_reminder_is_completed", "_reminder_touch",
+        "_reminder_parse_date", "_reminder_parse_dt", "_reminder_normalize_hours", "_reminder_date_allowed",
+        "_reminder_time_allowed", "_reminder_next_valid_start", "_reminder_due_now",
+        "REMINDER_DEADLINE_INDEX", "_REMINDER_DEADLINE_LOCK", "_REMINDER_DEADLINES", "_REMINDER_DEADLINE_CHATS",
+        "_REMINDER_CHAT_MEMBERS", "_REMINDER_CFG_RID", "_REMINDER_DEADLINE_DUE", "_REMINDER_DIRTY_CHATS",
+        "_REMINDER_DEADLINE_READY", "_REMINDER_DEADLINE_ITEMS_ID", "_REMINDER_RECONCILED_AT",
+        "_REMINDER_DEADLINE_LOCAL", "_REMINDER_JITTER", "_REMINDER_DEADLINE_STATS", "_reminder_items_dict",
+        "_reminder_chat_set", "_reminder_deadline_at", "_reminder_deadline_put_locked", "_reminder_deadline_fresh",
+        "_reminder_deadline_rebuild", "_reminder_deadline_rid", "_reminder_deadline_note",
+        "_reminder_deadline_fire", "_reminder_deadline_kick", "_reminder_deadline_dispatch",
+        "reminder_deadline_begin", "reminder_deadline_end", "reminder_deadline_stats",
+    ], ns)
+    pool = ns["KeyedTaskPool"]("bench-reminder", 2, 100000)
+    ns["DELAYED_SCHEDULER"] = ns["TimingWheelScheduler"](pool)
+    rnd = random.Random(16)
+    now = datetime.now(tz)
+    items = {}
+    for rid in range(1, n + 1):
+        items[str(rid)] = {
+            "enabled": True, "text": f"напоминалка {rid}", "chat_ids": [-100 - rid % 300],
+            "interval_minutes": rnd.choice([30, 60, 120, 240]), "start_hour": 0, "end_hour": 23,
+            "start_date": now.strftime("%Y-%m-%d"), "end_date": "",
+            "next_run_at": (now + timedelta(minutes=rnd.uniform(5, 600))).isoformat(timespec="seconds"),
+            "last_sent_at": "", "last_message_ids": {}, "created_at": "", "updated_at": "",
+            "completed_at": "", "completion_reason": "",
+        }
+    ns["data"] = {"_global_settings": {"reminders_v2": {"next_id": n + 1, "items": items, "migrated_v134": True}}}
+    fired = []
+
+    def batch():
+        plan = ns["reminder_deadline_begin"]()
+        t = datetime.now(tz)
+        with ns["_REMINDER_CONFIG_LOCK"]:
+            for rid in sorted(plan[0] if plan else (int(k) for k in items)):
+                cfg = items.get(str(rid))
+                if cfg and ns["_reminder_due_now"](cfg, t):
+                    fired.append(rid)
+                    cfg["next_run_at"] = (t + timedelta(minutes=int(cfg["interval_minutes"]))).isoformat(timespec="seconds")
+                    ns["_reminder_touch"](cfg)
+        ns["reminder_deadline_end"](full=plan is None)
+
+    ns["_reminder_tick"] = lambda: pool.submit_unique("reminder-v149-batch", batch)
+
+    def full_scan():
+        t = datetime.now(tz)
+        with ns["_REMINDER_CONFIG_LOCK"]:
+            root = ns["_reminders_root"]()
+            return [rid for rid, cfg in root["items"].items() if ns["_reminder_due_now"](ns["_normalize_reminder_cfg"](cfg), t)]
+
+    print(f"reminders: {n} configs in 300 chats, next_run_at 5..600 min ahead")
+    started = time.perf_counter()
+    for _ in range(20):
+        full_scan()
+    scan_ms = (time.perf_counter() - started) / 20 * 1000
+    print(f"  old full scan        {scan_ms:8.2f} ms per 15 s tick  = {scan_ms * 5760 / 1000:6.1f} s CPU/day, due lateness 0..15 s")
+    started = time.perf_counter()
+    ns["_reminder_deadline_rebuild"]()
+    build_ms = (time.perf_counter() - started) * 1000
+    print(f"  index build          {build_ms:8.2f} ms (boot; reconcile every 600 s = {build_ms * 144 / 1000:6.1f} s CPU/day)")
+    sample = rnd.sample(range(1, n + 1), 2000)
+    started = time.perf_counter()
+    for rid in sample:
+        cfg = items[str(rid)]
+        cfg["interval_minutes"] = rnd.choice([30, 60, 120])
+        ns["_reminder_touch"](cfg)
+    edit_us = (time.perf_counter() - started) / len(sample) * 1e6
+    with ns["_REMINDER_DEADLINE_LOCK"]:
+        ns["_REMINDER_DEADLINE_DUE"].clear()
+    print(f"  edit -> recompute    {edit_us:8.1f} us per reminder (touch hook, one timer moved)")
+    time.sleep(0.5)
+    fired.clear()
+    base = time.time()
+    targets = {}
+    for rid in rnd.sample(range(1, n + 1), hot):
+        at = datetime.fromtimestamp(base + rnd.uniform(0.5, 3.0), tz)
+        items[str(rid)]["next_run_at"] = at.isoformat(timespec="microseconds")
+        targets[rid] = at
+        ns["_reminder_touch"](items[str(rid)])
+    deadline = time.time() + 10
+    while len(set(fired) & set(targets)) < hot and time.time() < deadline:
+        time.sleep(0.05)
+    st = ns["reminder_deadline_stats"]()
+    jit = st["jitter"]
+    print(f"  index fire jitter    p50 {jit['p50_ms']:.1f} ms  p95 {jit['p95_ms']:.1f} ms  p99 {jit['p99_ms']:.1f} ms  max {jit['max_ms']:.1f} ms "
+          f"({len(set(fired) & set(targets))}/{hot} due reminders sent)")
+    print(f"  batches {st['batches']} (full {st['full_batches']}), candidates/batch "
+          f"{st['candidates'] / max(1, st['batches']):.0f} of {n}, armed timers {st['armed']}")
+
+
+def bench_msg_index():
+    """Forwarded-copy lookups by message id on a 100k-record chat: full scan vs per-chat index (+ SQLite side)."""
+    import json, sqlite3, hashlib, re, random
+    from contextlib import contextmanager
+    from datetime import datetime, timezone
+    n = int(os.getenv("BENCH_MSG_INDEX_RECORDS", "100000"))
+    probes = int(os.getenv("BENCH_MSG_INDEX_PROBES", "2000"))
+    ns = base_ns()
+    data = {"chats": {}}
+
+    @contextmanager
+    def locked_chat(_cid):
+        yield
+
+    ns.update(json=json, sqlite3=sqlite3, hashlib=hashlib, re=re, datetime=datetime, timezone=timezone, data=data,
+              locked_chat=locked_chat, log_error=lambda msg: print("  error:", msg), LOWRAM_ENABLED=False,
+              FINANCE_MSG_INDEX=True, FINANCE_MSG_INDEX_VERIFY_EVERY=0,
+              get_chat_store=lambda cid: data["chats"].setdefault(str(cid), {"records": []}))
+    load("00_core.py", ["FINANCE_ROW_LEDGERS", "FINANCE_ROW_DAILY", "FINANCE_MSG_FIELDS", "_finance_msg_fields",
+                        "_finance_row_digest", "_finance_row_key", "FINANCE_ROW_POS_GAP", "_finance_row_prepare", "_finance_row_spread", "_finance_row_positions",
+                        "_finance_rows_plan", "SQLiteState"], ns)
+    load("50_forwarding.py", [
+        "_finance_record_lists", "_record_has_message_id", "_FINANCE_MSG_LEDGERS", "_FINANCE_MSG_UID_RE", "_FINANCE_MSG_LOCK", "_FINANCE_MSG_STATE",
+        "_FINANCE_MSG_STATS", "_finance_msg_ledger", "_finance_msg_shape", "_finance_msg_put_locked", "_finance_msg_drop_locked",
+        "_finance_msg_build", "_finance_msg_state", "_finance_msg_cold_load", "_finance_msg_ordered", "finance_msg_index_note",
+        "finance_msg_index_touch", "finance_msg_index_release", "finance_msg_index_verify", "finance_msg_index_stats",
+        "find_record_by_message_id"], ns)
+    rnd = random.Random(17)
+    cid = -100123
+    store = ns["get_chat_store"](cid)
+    store["records"] = [{"id": i + 1, "record_uid": f"{i + 1:012X}", "amount": 1, "day_key": "2026-10-01",
+                         "source_msg_id": 10 + i, "forward_dst_msg_id": (10 ** 7 + i) if i % 3 == 0 else None}
+                        for i in range(n)]
+    store["ars_records"] = [{"id": i + 1, "record_uid": f"A{i + 1:011X}", "amount": 1, "msg_id": 5 * 10 ** 6 + i}
+                            for i in range(n // 10)]
+    store["usd_records"] = []
+    targets = [rnd.choice(store["records"])["source_msg_id"] for _ in range(probes // 2)]
+    targets += [rnd.choice(store["ars_records"])["msg_id"] for _ in range(probes // 4)]
+    targets += [9 * 10 ** 8 + i for i in range(probes - len(targets))]  # промахи: чужие сообщения
+    print(f"msg_index: {n} active + {n // 10} ars records, {len(targets)} lookups (1/4 misses)")
+
+    def scan(mid):
+        for _key, r in ns["_finance_record_lists"](store):
+            if ns["_record_has_message_id"](r, mid):
+                return r
+        return None
+
+    started = time.perf_counter()
+    want = [scan(mid) for mid in targets[:200]]
+    scan_ms = (time.perf_counter() - started) / 200 * 1000
+    started = time.perf_counter()
+    ns["find_record_by_message_id"](cid, targets[0])
+    build_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    got = [ns["find_record_by_message_id"](cid, mid) for mid in targets]
+    index_us = (time.perf_counter() - started) / len(targets) * 1e6
+    assert all(a is b for a, b in zip(want, got[:200]))
+    print(f"  full scan {scan_ms:8.2f} ms/lookup   index {index_us:6.1f} us/lookup   (one-time build {build_ms:.0f} ms)")
+
+    spent = 0.0
+    edits = 0
+    for i in range(1000):
+        rec = {"id": n + i + 1, "record_uid": f"{n + i + 1:012X}", "amount": 1, "source_msg_id": 10 ** 8 + i}
+        store["records"].append(rec)
+        started = time.perf_counter()
+        ns["finance_msg_index_note"](cid, rec)
+        spent += time.perf_counter() - started
+        victim = store["records"][rnd.randrange(len(store["records"]) - 1)]
+        store["records"] = [r for r in store["records"] if r is not victim]  # как delete_record_in_chat
+        moved = rnd.choice(store["records"])
+        moved["source_msg_id"] = 2 * 10 ** 8 + i
+        started = time.perf_counter()
+        ns["finance_msg_index_note"](cid, None, "records", True, f"uid:{victim['record_uid']}")
+        ns["finance_msg_index_touch"](cid, moved)
+        spent += time.perf_counter() - started
+        assert ns["find_record_by_message_id"](cid, 2 * 10 ** 8 + i) is moved
+        assert ns["find_record_by_message_id"](cid, victim["source_msg_id"]) is not victim
+        edits += 3
+    maint_us = spent / edits * 1e6
+    report = ns["finance_msg_index_verify"](cid)
+    st = ns["finance_msg_index_stats"]()
+    print(f"  add/delete/rebind {edits} mutations: index upkeep {maint_us:.1f} us each; builds {st['builds']}, "
+          f"verify drift {report['drift']}")
+    assert report["drift"] == 0
+
+    tmp = tempfile.mkdtemp(prefix="bench_msgidx_")
+    try:
+        sq = ns["SQLiteState"](os.path.join(tmp, "bot.sqlite3"))
+        started = time.perf_counter()
+        sq.sync_finance_rows(cid, "records", store["records"])
+        sq.sync_finance_rows(cid, "ars_records", store["ars_records"])
+        sync_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        for mid in targets:
+            sq.finance_msg_lookup(cid, mid)
+        disk_us = (time.perf_counter() - started) / len(targets) * 1e6
+        for rec in store["records"][:500]:
+            rec["source_msg_id"] = int(rec["source_msg_id"]) + 3 * 10 ** 8
+        started = time.perf_counter()
+        sq.sync_finance_rows(cid, "records", store["records"])
+        resync_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        sq.sync_finance_rows(cid, "records", store["records"])
+        noop_ms = (time.perf_counter() - started) * 1000
+        check = sq.finance_msg_index_check(cid)
+        print(f"  SQLite finance_msg_index: first sync {sync_ms:.0f} ms, 500-row resync {resync_ms:.0f} ms (no-op {noop_ms:.0f} ms), "
+              f"lookup {disk_us:.1f} us; check rows {check['rows']} missing {check['missing']} extra {check['extra']}")
+        assert not check["missing"] and not check["extra"]
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def bench_ingest():
+    """Webhook (Telegram pushes, 40 connections) vs getUpdates batches against a local fake Bot API."""
+    import json, random, requests
+    from types import SimpleNamespace
+    from datetime import datetime
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+    class Server(ThreadingHTTPServer):
+        request_queue_size = 128  # 40 одновременных соединений Telegram
+        daemon_threads = True
+
+    n = int(os.getenv("BENCH_INGEST_UPDATES", "2000"))
+    rtt = int(os.getenv("BENCH_INGEST_RTT_MS", "30")) / 1000.0
+    work = int(os.getenv("BENCH_INGEST_WORK_MS", "10")) / 1000.0
+    connections = 40
+    chats = 200
+    ns = pool_ns()
+    stop = threading.Event()
+    executed = set()
+    exec_lock = threading.Lock()
+
+    def execute(payload, update_id, chat_id, update_type):
+        time.sleep(work)  # обработчик: 1–2 вызова Bot API
+        with exec_lock:
+            executed.add(int(update_id))
+        return {}
+
+    ns.update(json=json, requests=requests, WEBHOOK_ACK_WAIT_SECONDS=8.0, WEBHOOK_STUCK_WARN_SECONDS=20.0,
+              WEBHOOK_DONE_TTL_SECONDS=600.0, BOT_TOKEN="123:bench", POLLING_LIMIT=100, POLLING_TIMEOUT_SECONDS=1,
+              POLLING_RETRY_SECONDS=0.2, POLLING_MAX_ATTEMPTS=5, TELEGRAM_INGEST_MODE="polling",
+              runtime_is_shutting_down=stop.is_set, runtime_is_ready=lambda: True,
+              runtime_mark_webhook=lambda *a, **k: None, log_info=lambda msg: None, bot_journal=lambda *a, **k: None,
+              telebot=SimpleNamespace(types=SimpleNamespace(Update=SimpleNamespace(
+                  de_json=lambda p: SimpleNamespace(update_id=p.get("update_id"))))),
+              _protect_pending_ui_timers_on_receipt=lambda p: None, schedule_callback_receipt_ack=lambda *a, **k: None,
+              durable_update_processed=lambda uid: False, durable_task_required=lambda p: (False, ""),
+              _durable_expected_effects=lambda p: {}, _execute_telegram_payload=execute,
+              _lowram_release_chat=lambda cid: None, _MEGA_TASK_LOCK=threading.RLock(),
+              now_local=datetime.now)
+    load("00_core.py", ["DurableUpdateDispatcher", "_extract_update_chat_id"], ns)
+    load("99_web_runtime.py", ["TELEGRAM_ALLOWED_UPDATES", "_POLLING_FAILED_REPLIES", "_POLLING_LOCK",
+                               "_POLLING_STATS", "_POLLING_STATE", "_POLLING_FAILURES", "_POLLING_BATCH_MS", "_telegram_api_call",
+                               "telegram_update_admit", "telegram_update_reply", "_telegram_poll_give_up",
+                               "telegram_poll_batch", "_telegram_poll_loop", "telegram_polling_stats"], ns)
+    ns["_POLLING_THREAD"] = None
+    ns["UPDATE_DISPATCHER"] = ns["DurableUpdateDispatcher"]()
+
+    def updates(base):
+        return [{"update_id": base + i, "message": {"message_id": i, "text": "100 кофе",
+                 "chat": {"id": -1000 - i % chats}}} for i in range(n)]
+
+    def fresh_pools():
+        ns["WEBHOOK_TASK_POOL"] = ns["KeyedTaskPool"]("content", 8, 2000)
+        ns["UI_TASK_POOL"] = ns["KeyedTaskPool"]("ui", 2, 400)
+
+    def wait_done(ids, deadline):
+        while time.time() < deadline:
+            with exec_lock:
+                if ids <= executed:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    print(f"ingest: {n} updates over {chats} chats, {int(work * 1000)} ms handler, "
+          f"{int(rtt * 1000)} ms Telegram RTT, 8 content workers")
+    results = {}
+
+    # --- webhook: Telegram держит до 40 соединений, каждое ждёт HTTP-ответ на свой update.
+    fresh_pools()
+    blocked = {"now": 0, "peak": 0}
+    blocked_lock = threading.Lock()
+
+    class Hook(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        def log_message(self, *a):
+            pass
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+            with blocked_lock:
+                blocked["now"] += 1; blocked["peak"] = max(blocked["peak"], blocked["now"])
+            try:
+                ticket, reply = ns["telegram_update_admit"](payload, "webhook")
+                if reply is None:
+                    reply = ns["telegram_update_reply"](ticket, ns["WEBHOOK_ACK_WAIT_SECONDS"])
+            finally:
+                with blocked_lock:
+                    blocked["now"] -= 1
+            body = reply[0].encode()
+            self.send_response(reply[1]); self.send_header("Content-Length", str(len(body))); self.end_headers()
+            self.wfile.write(body)
+
+    server = Server(("127.0.0.1", 0), Hook)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/tg/bench"
+    queue = list(reversed(updates(1)))
+    q_lock = threading.Lock()
+    retries = [0]
+
+    def connection():
+        session = requests.Session()
+        while True:
+            with q_lock:
+                if not queue:
+                    return
+                upd = queue.pop()
+            time.sleep(rtt)
+            try:
+                status = session.post(url, json=upd, timeout=30).status_code
+            except requests.RequestException:
+                status = 599
+            if status >= 500:
+                with q_lock:
+                    queue.insert(0, upd); retries[0] += 1
+
+    started = time.time()
+    conns = [threading.Thread(target=connection) for _ in range(connections)]
+    for t in conns:
+        t.start()
+    for t in conns:
+        t.join()
+    assert wait_done({u["update_id"] for u in updates(1)}, time.time() + 60)
+    results["webhook"] = (time.time() - started, blocked["peak"], retries[0])
+    server.shutdown()
+
+    # --- getUpdates: один поток забирает пачки; offset подтверждает принятое.
+    fresh_pools()
+    pending = updates(10 ** 6)
+    ids = {u["update_id"] for u in pending}
+    api = {"calls": 0, "lock": threading.Lock()}
+
+    class FakeBotApi(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        def log_message(self, *a):
+            pass
+        def do_POST(self):
+            params = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            time.sleep(rtt)
+            with api["lock"]:
+                api["calls"] += 1
+                offset = int(params.get("offset") or 0)
+                while pending and pending[0]["update_id"] < offset:
+                    pending.pop(0)
+                batch = pending[: int(params.get("limit") or 100)]
+            body = json.dumps({"ok": True, "result": batch}).encode()
+            self.send_response(200); self.send_header("Content-Length", str(len(body))); self.end_headers()
+            self.wfile.write(body)
+
+    api_server = Server(("127.0.0.1", 0), FakeBotApi)
+    threading.Thread(target=api_server.serve_forever, daemon=True).start()
+    ns["TELEGRAM_API_BASE"] = f"http://127.0.0.1:{api_server.server_address[1]}"
+    started = time.time()
+    poller = threading.Thread(target=ns["_telegram_poll_loop"], daemon=True)
+    poller.start()
+    ok = wait_done(ids, started + 300)
+    while pending and time.time() < started + 300:
+        time.sleep(0.01)  # offset подтверждён для всей очереди
+    results["polling"] = (time.time() - started, 1, 0)
+    stop.set()
+    poller.join(timeout=10)
+    api_server.shutdown()
+    assert ok and not pending, (len(ids - executed), len(pending))
+    st = ns["telegram_polling_stats"]()
+    for label, (secs, peak, retry) in results.items():
+        print(f"  {label:8} {n / secs:7.0f} updates/s  ({secs:5.2f} s)  threads parked on results: peak {peak:3}  5xx retries {retry}")
+    print(f"  polling: getUpdates calls {api['calls']}, batches {st.get('batches', 0)}, "
+          f"held for redelivery {st.get('held', 0)}, batch p95 {st['batch_ms']['p95_ms']:.0f} ms")
+
+    # --- poison update: its handler always fails; after POLLING_MAX_ATTEMPTS the offset moves past it.
+    fresh_pools()
+    stop.clear()
+    poison = 2 * 10 ** 6
+    problems, errors = [], []
+
+    def execute_poison(payload, update_id, chat_id, update_type):
+        if int(update_id) == poison:
+            raise RuntimeError("poison update")
+        return execute(payload, update_id, chat_id, update_type)
+
+    ns.update(_execute_telegram_payload=execute_poison, log_error=errors.append,
+              operation_for_update=lambda uid: f"tg:{uid}",
+              operation_begin=lambda kind, chat_id=None, target="", payload=None, operation_id=None, critical=True: operation_id,
+              operation_fail=lambda op_id, error="": problems.append((op_id, error)) or True)
+    pending.extend(updates(poison)[:2])
+    api["calls"] = 0
+    api_server = Server(("127.0.0.1", 0), FakeBotApi)
+    threading.Thread(target=api_server.serve_forever, daemon=True).start()
+    ns["TELEGRAM_API_BASE"] = f"http://127.0.0.1:{api_server.server_address[1]}"
+    started = time.time()
+    poller = threading.Thread(target=ns["_telegram_poll_loop"], daemon=True)
+    poller.start()
+    ok = wait_done({poison + 1}, started + 60)
+    while pending and time.time() < started + 60:
+        time.sleep(0.01)
+    stop.set()
+    poller.join(timeout=10)
+    api_server.shutdown()
+    st = ns["telegram_polling_stats"]()
+    print(f"  poison update: given up after {ns['POLLING_MAX_ATTEMPTS']} failed attempts in {time.time() - started:.1f} s "
+          f"(getUpdates calls {api['calls']}), next update executed {ok}, problem journal {problems}")
+    assert ok and not pending and st.get("given_up") == 1 and problems and problems[0][0] == f"tg:{poison}"
+    assert ns["UPDATE_DISPATCHER"].stats()["retries"] == ns["POLLING_MAX_ATTEMPTS"] - 1
+
+
+def bench_web():
+    """Health probes under a webhook burst: Flask threaded dev server vs bounded server with probe lane."""
+    import requests, logging
+    from flask import Flask
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    hold = float(os.getenv("BENCH_WEB_HOLD_SECONDS", "1.5"))
+    burst = int(os.getenv("BENCH_WEB_WEBHOOKS", "120"))
+    ns = pool_ns()
+    app = Flask("bench_web")
+    ns.update(app=app, WEBHOOK_ROUTE_PATH="/tg/bench", _env_int=lambda name, default, lo, hi: default,
+              log_error=lambda msg: print("  error:", msg), log_info=lambda msg: None)
+    load("99_web_runtime.py", ["WEB_SERVER_MODE", "WEB_WORKERS", "WEB_MAX_PENDING", "WEB_PROBE_WORKERS",
+                               "WEB_PROBE_PATHS", "WEB_TASK_POOL", "WEB_PROBE_TASK_POOL", "_WEB_LOCK",
+                               "_WEB_ROUTE_LATENCY", "_WEB_ROUTE_STATUS", "_WEB_STATS", "_web_route_label",
+                               "_WebRouteMetrics", "_web_is_probe", "_web_make_bounded_server", "web_server_stats"], ns)
+    import select, socket
+    ns.update(select=select, socket=socket)
+
+    @app.route("/healthz")
+    def healthz():
+        return {"ok": True}, 200
+
+    @app.route("/tg/bench", methods=["POST"])
+    def hook():
+        time.sleep(hold)  # update ждёт исход в UPDATE_DISPATCHER.wait_result
+        return "OK", 200
+
+    app.wsgi_app = ns["_WebRouteMetrics"](app.wsgi_app)
+    print(f"web: {burst} webhook requests held {hold:g} s each, health probe every 50 ms")
+    def server_threads():
+        return sum(1 for t in threading.enumerate() if not t.name.startswith("bench-"))
+
+    for mode in ("flask", "bounded"):
+        threads_before = server_threads()
+        if mode == "flask":
+            server = make_server("127.0.0.1", 0, app, threaded=True)
+            server.request_queue_size = 256
+        else:
+            server = ns["_web_make_bounded_server"]("127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        codes = defaultdict(int)
+        peak = [0]
+        done = threading.Event()
+
+        def hook_client():
+            try:
+                codes[requests.post(base + "/tg/bench", json={}, timeout=30).status_code] += 1
+            except requests.RequestException:
+                codes["error"] += 1
+
+        def watch():
+            while not done.is_set():
+                peak[0] = max(peak[0], server_threads() - threads_before)
+                time.sleep(0.01)
+
+        threading.Thread(target=watch, name="bench-watch", daemon=True).start()
+        clients = [threading.Thread(target=hook_client, name=f"bench-client-{i}") for i in range(burst)]
+        for t in clients:
+            t.start()
+        lat = []
+        started = time.time()
+        while time.time() - started < hold * 2:
+            t0 = time.perf_counter()
+            assert requests.get(base + "/healthz", timeout=30).status_code == 200
+            lat.append((time.perf_counter() - t0) * 1000)
+            time.sleep(0.05)
+        for t in clients:
+            t.join()
+        done.set()
+        server.shutdown()
+        lat.sort()
+        print(f"  {mode:8} healthz p50 {lat[len(lat) // 2]:6.1f} ms  p99 {lat[int(len(lat) * 0.99)]:7.1f} ms  "
+              f"server threads +{peak[0]:3}  webhook {dict(codes)}")
+    routes = ns["web_server_stats"]()["routes"]
+    print("  per-route: " + "; ".join(f"{k} n={v['count']} p95 {v['p95_ms']:g} ms {v['status']}" for k, v in sorted(routes.items())))
+
+
+class FakeSheetsApi:
+    """In-process subset of Sheets API v4 (metadata, batchUpdate, notes read-back).
+
+    Counts HTTP requests, new TCP connections and request bytes; every new connection
+    pays ``handshake`` (TLS to Google), every request ``rtt``.
+    """
+
+    def __init__(self, rtt: float, handshake: float):
+        import json, re
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+        from urllib.parse import urlsplit, parse_qs
+        self.tabs = {}  # sheetId -> {"title", "grid": {row: cells}, "props": {}}
+        self.counters = defaultdict(int)
+        self.lock = threading.Lock()
+        api = self
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 64
+            daemon_threads = True
+
+            def finish_request(self, request, client_address):
+                with api.lock:
+                    api.counters["connections"] += 1
+                time.sleep(handshake)
+                super().finish_request(request, client_address)
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *a):
+                pass
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                time.sleep(rtt)
+                with api.lock:
+                    api.counters["requests"] += 1
+                    parts = urlsplit(self.path)
+                    query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+                    if query.get("includeGridData") == "true":
+                        m = re.match(r"'(.*)'!A(\d+):[A-Z]+(\d+)$", query.get("ranges", ""))
+                        tab = next((t for t in api.tabs.values() if m and t["title"] == m.group(1).replace("''", "'")), None)
+                        if not tab:
+                            return self._send(400, {"error": {"message": "Unable to parse range"}})
+                        rows = [{"values": [{"note": c["note"]} if c.get("note") else {} for c in tab["grid"].get(r, [])]}
+                                for r in range(int(m.group(2)) - 1, int(m.group(3)))]
+                        return self._send(200, {"sheets": [{"data": [{"rowData": rows}]}]})
+                    sheets = [{"properties": dict(t["props"], sheetId=sid, title=t["title"])} for sid, t in api.tabs.items()]
+                    return self._send(200, {"spreadsheetId": "bench", "sheets": sheets})
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                time.sleep(rtt)
+                with api.lock:
+                    api.counters["requests"] += 1
+                    api.counters["bytes"] += len(raw)
+                    replies = []
+                    for req in json.loads(raw).get("requests") or []:
+                        (kind, body), = req.items()
+                        if kind == "addSheet":
+                            props = body["properties"]
+                            if any(t["title"] == props["title"] for t in api.tabs.values()):
+                                return self._send(400, {"error": {"message": f"A sheet with the name \"{props['title']}\" already exists."}})
+                            sid = 1000 + len(api.tabs)
+                            api.tabs[sid] = {"title": props["title"], "grid": {}, "props": {"gridProperties": dict(props.get("gridProperties") or {})}}
+                            replies.append({"addSheet": {"properties": {"sheetId": sid, "title": props["title"],
+                                                                         "gridProperties": dict(props.get("gridProperties") or {})}}})
+                            continue
+                        rng = body.get("range") or body.get("properties") or {}
+                        tab = api.tabs.get(rng.get("sheetId"))
+                        if tab is None and kind in ("updateCells", "updateSheetProperties"):
+                            return self._send(400, {"error": {"message": f"No grid with id: {rng.get('sheetId')}"}})
+                        if kind == "updateCells":
+                            start = int(rng.get("startRowIndex") or 0)
+                            if "rows" in body:
+                                for i, row in enumerate(body["rows"]):
+                                    tab["grid"][start + i] = row.get("values") or []
+                            else:
+                                end = rng.get("endRowIndex")
+                                for r in [r for r in tab["grid"] if r >= start and (end is None or r < end)]:
+                                    tab["grid"].pop(r)
+                        elif kind == "updateSheetProperties":
+                            tab["props"]["gridProperties"].update(body["properties"].get("gridProperties") or {})
+                        replies.append({})
+                    return self._send(200, {"spreadsheetId": "bench", "replies": replies})
+
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, name="bench-fake-sheets", daemon=True).start()
+
+    def take(self) -> dict:
+        with self.lock:
+            out = dict(self.counters)
+            self.counters.clear()
+        return out
+
+
+def bench_sheets():
+    """Repeated exports of one (chat, period): bare requests + new tab + full rewrite vs pooled session + row delta."""
+    import json, re, hashlib, requests
+    from datetime import datetime, timedelta
+    rtt = int(os.getenv("BENCH_SHEETS_RTT_MS", "40")) / 1000.0
+    handshake = int(os.getenv("BENCH_SHEETS_TLS_MS", "60")) / 1000.0
+    n_rows = int(os.getenv("BENCH_SHEETS_ROWS", "400"))
+    exports = int(os.getenv("BENCH_SHEETS_EXPORTS", "20"))
+    fake = FakeSheetsApi(rtt, handshake)
+    os.environ["GOOGLE_SHEETS_API_BASE"] = fake.base
+    ns = base_ns()
+    ns.update(json=json, re=re, hashlib=hashlib, requests=requests, data={},
+              log_error=lambda msg: print("  error:", msg),
+              _google_access_token=lambda: "bench-token",
+              _google_service_account_info=lambda: {"client_email": "bench@example.iam.gserviceaccount.com"},
+              _google_spreadsheet_id=lambda: "bench_spreadsheet_0123456789",
+              _modern_category_excel_styles_comments=lambda rows: ({}, {(r, 2): f"заметка {r}" for r in range(3, len(rows) + 1, 25)}, 2, {}))
+    load("00_core.py", ["_env_bool", "_env_int"], ns)
+    load("10_mega_runtime.py", ["_xlsx_col_name", "_excel_nonempty"], ns)
+    load("63_google_sheets.py", [
+        "_google_request_guarded", "_google_cell_value", "_google_category_fill", "_google_sheet_tab_title",
+        "GOOGLE_SHEETS_API_BASE", "GOOGLE_SHEETS_INCREMENTAL", "GOOGLE_HTTP_POOL_SIZE", "GOOGLE_SHEETS_TAB_MAP_LIMIT",
+        "_GOOGLE_HTTP_SESSIONS", "_GOOGLE_HTTP_LOCK", "_GOOGLE_SYNC_LOCKS", "_GOOGLE_SYNC_STATS", "_google_tenant_key",
+        "google_http_session", "_google_sheets_url", "_google_sheets_access_error", "_google_row_digest",
+        "_google_changed_ranges", "_google_sheet_tabs", "_google_sheet_find_tab", "google_sheets_sync_tab",
+        "google_sheets_sync_stats", "_v177_legacy_0208_google_sheets_create_category_report"], ns)
+    create = ns["_v177_legacy_0208_google_sheets_create_category_report"]
+    pooled_session = ns["google_http_session"]
+    tick = [0]
+
+    class _Clock:  # прежние вкладки называются по секундам: в бенчмарке каждая выгрузка — своя секунда
+        @staticmethod
+        def now():
+            tick[0] += 1
+            return datetime(2026, 10, 18, 12, 0, 0) + timedelta(seconds=tick[0])
+    ns["datetime"] = _Clock
+
+    def report(step):
+        head = ["Дата", "Описание", "Приход", "Еда", "Транспорт", "Связь", "Дом", "Прочее"]
+        rows = [head, ["", "Остаток с прошлого раза", 50000, "", "", "", "", ""]]
+        for i in range(n_rows + 2 * step):
+            rows.append([f"{1 + i // 20:02d}.10", f"запись {i}", "", 100 + i % 7, "", 30 + i % 3, "", i % 11])
+        rows.append(["", "Сумма по статьям", "", 1000 + step, 200, 300 + step, 0, 55])
+        return rows
+
+    def grid(tab):
+        return [[c.get("userEnteredValue") for c in tab["grid"][r]] for r in sorted(tab["grid"])]
+
+    print(f"sheets: {exports} exports of one (chat, period), {n_rows}+ rows; "
+          f"{int(rtt * 1000)} ms RTT, {int(handshake * 1000)} ms TLS handshake per new connection")
+    final = {}
+    for mode in ("legacy", "incremental"):
+        ns["GOOGLE_SHEETS_INCREMENTAL"] = mode == "incremental"
+        if mode == "legacy":
+            ns["google_http_session"] = lambda tenant_id=None: requests  # прежние голые requests.get/post
+        else:
+            ns["google_http_session"] = pooled_session
+        fake.take()
+        spent = 0.0
+        for step in range(exports):
+            t0 = time.perf_counter()
+            create("Чат — статьи — неделя", report(step), layout="category",
+                   sync_key=("platform", -100123, "2026-10-12–2026-10-18") if mode == "incremental" else None)
+            spent += time.perf_counter() - t0
+        c = fake.take()
+        final[mode] = grid(list(fake.tabs.values())[-1])
+        print(f"  {mode:12} {spent / exports * 1000:7.1f} ms/export  {c.get('requests', 0) / exports:4.1f} requests  "
+              f"{c.get('connections', 0) / exports:4.2f} new conns  {c.get('bytes', 0) / exports / 1024:7.1f} KiB sent/export  "
+              f"tabs now {len(fake.tabs)}")
+    st = ns["google_sheets_sync_stats"]()
+    print(f"  incremental: full {st.get('full', 0)}, delta {st.get('delta', 0)}, rows written {st.get('rows_written', 0)}, "
+          f"skipped {st.get('rows_skipped', 0)}; final tab identical to full rewrite: {final['legacy'] == final['incremental']}")
+
+
+def _export_child(mode: str, kind: str, n: str, out_path: str):
+    """Loads the whole runtime (REPLAY_v199) with EXPORT_STREAMING per ``mode``; one export per process."""
+    import json, random, logging
+    work = tempfile.mkdtemp(prefix="bench_export_")
+    os.makedirs(os.path.join(work, "mega_tmp"), exist_ok=True)
+    os.chdir(work)
+    os.environ["EXPORT_STREAMING"] = "1" if mode == "stream" else "0"
+    sys.path.insert(0, str(R))
+    import REPLAY_v199
+    ns = REPLAY_v199.load_runtime(REPLAY_v199.FakeBotApi(0, 0, 0.0, 1, 1), work)
+    logging.getLogger().setLevel(logging.CRITICAL)
+    g = ns["send_export_for_chat_to"].__globals__  # run_path returns a copy; patch the live namespace
+    cid = -1002000
+    store = g["get_chat_store"](cid)
+    g["set_excel_table_style"](cid, "old")
+    store.setdefault("settings", {})["_active_currency_ledger"] = "ars"  # as after the first finance operation
+    rnd = random.Random(7)
+    notes = ["продукты", "такси", "аренда", "зарплата", "кофе", "оплата поставщику"]
+    total = int(n)
+    recs = []
+    for i in range(total):
+        day = f"2025-{1 + i * 12 // total:02d}-{1 + i % 28:02d}"
+        rec = {"id": i + 1, "amount": rnd.choice([1, -1, -1]) * rnd.randint(100, 90000), "note": f"{rnd.choice(notes)} {i}",
+               "day_key": day, "timestamp": f"{day}T10:{i % 60:02d}:00", "record_uid": f"{i:012X}", "source_msg_id": 10000 + i}
+        if i % 50 == 0:
+            rec["usd_amount"] = rnd.randint(1, 90) * rnd.choice([1, -1])
+        recs.append(rec)
+    recs.sort(key=g["record_sort_key"])
+    g["SQLITE"].set_cold(cid, "records", recs)
+    del recs
+    dict.pop(store, "records", None)
+    dict.pop(store, "daily_records", None)
+    getattr(store, "_cold_loaded", set()).clear()
+    sent = g["file_bytesio_named"]
+
+    def _capture(path, name):
+        shutil.copyfile(path, out_path)
+        return sent(path, name)
+    g["file_bytesio_named"] = _capture
+    g["log_error"] = lambda msg, *a, **k: print("  error:", str(msg)[:300], file=sys.stderr)
+    before, peak_of = _export_rss_reset()
+    started = time.perf_counter()
+    if kind == "global":
+        g["export_global_csv"](g["data"])
+        shutil.copyfile(g["CSV_FILE"], out_path)
+    else:
+        g["send_export_for_chat_to"](111, cid, "all", "2025-12-31", kind)
+    elapsed = time.perf_counter() - started
+    print(json.dumps({"before_mb": before / 1024, "peak_mb": peak_of() / 1024, "seconds": elapsed,
+                      "bytes": os.path.getsize(out_path) if os.path.exists(out_path) else 0}))
+    sys.stdout.flush()
+    shutil.rmtree(work, ignore_errors=True)
+    os._exit(0)  # the runtime leaves background threads behind
+
+
+def _export_rss_reset():
+    """(current RSS KiB, peak-since-now callable). Seeding the ledger happens in the same process, so
+    the peak is reset through /proc/self/clear_refs (VmHWM) after the freed seed memory is trimmed."""
+    import gc, ctypes, resource
+
+    def _status(field: str) -> int:
+        with open("/proc/self/status", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+        raise OSError(field)
+
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+        return _status("VmRSS"), lambda: _status("VmHWM")
+    except OSError:
+        return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                lambda: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def _xlsx_cells(path: str) -> list:
+    import re, zipfile
+    with zipfile.ZipFile(path) as zf:
+        sheet = zf.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    return re.findall(r"<c [^>]*?(?:/>|>.*?</c>)", sheet)
+
+
+def bench_export():
+    """All-time export of a 100k-record cold chat: list-building path vs single-pass stream (time, peak RSS, identical output)."""
+    import json
+    n = int(os.getenv("BENCH_EXPORT_RECORDS", "100000"))
+    tmp = tempfile.mkdtemp(prefix="bench_export_out_")
+    print(f"export: {n} records of one chat in SQLite (cold); one export per process, full runtime")
+    try:
+        for kind in ("csv", "xlsx", "global"):
+            outs = {}
+            for mode in ("legacy", "stream"):
+                out = os.path.join(tmp, f"{mode}.{kind}")
+                res = subprocess.run([sys.executable, str(R / "BENCH_v199.py"), "_export_child", mode, kind, str(n), out],
+                                     capture_output=True, text=True, check=True)
+                row = json.loads(res.stdout.strip().splitlines()[-1])
+                outs[mode] = out
+                print(f"  {kind:<6} {mode:<7} {row['seconds']:6.2f}s  peak RSS {row['peak_mb']:7.1f} MB "
+                      f"(+{row['peak_mb'] - row['before_mb']:6.1f} during export)  {row['bytes'] / 1024:8.0f} KiB")
+            if kind == "xlsx":
+                same = _xlsx_cells(outs["legacy"]) == _xlsx_cells(outs["stream"])
+                print(f"  {kind:<6} cells identical: {same}")
+            elif kind == "csv":
+                print(f"  {kind:<6} bytes identical: {Path(outs['legacy']).read_bytes() == Path(outs['stream']).read_bytes()}")
+            else:
+                # The old global CSV sorted by the DD.MM.YY string; the merge orders by real date.
+                lines = [sorted(Path(outs[m]).read_text(encoding="utf-8").splitlines()) for m in ("legacy", "stream")]
+                print(f"  {kind:<6} same rows (order is now chronological): {lines[0] == lines[1]}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _secret_media_child(mode: str, n: str, passes: str):
+    """One process per mode: SECRET_MEDIA_BLOBS=0 (download + ffmpeg + upload per record) vs the blob store."""
+    import json, random, types, logging
+    work = tempfile.mkdtemp(prefix="bench_secret_")
+    os.makedirs(os.path.join(work, "mega_tmp"), exist_ok=True)
+    os.chdir(work)
+    os.environ["SECRET_MEDIA_BLOBS"] = "1" if mode == "blobs" else "0"
+    sys.path.insert(0, str(R))
+    import REPLAY_v199
+    ns = REPLAY_v199.load_runtime(REPLAY_v199.FakeBotApi(0, 0, 0.0, 1, 1), work)
+    logging.getLogger().setLevel(logging.CRITICAL)
+    g = ns["upload_chat_secrets_to_mega"].__globals__
+    g["log_error"] = lambda msg, *a, **k: None
+    dl_ms = int(os.getenv("BENCH_SECRET_DOWNLOAD_MS", "30")) / 1000.0
+    ff_ms = int(os.getenv("BENCH_SECRET_FFMPEG_MS", "300")) / 1000.0
+    counts = defaultdict(int)
+    g["bot"].get_file = lambda fid: types.SimpleNamespace(file_path=f"media/{fid}.bin")
+
+    def _download(telegram_path, local_path, max_bytes=None):
+        time.sleep(dl_ms)
+        fid = os.path.basename(telegram_path).split(".")[0]
+        with open(local_path, "wb") as fh:
+            fh.write(fid.split("_")[0].encode() * 20000)  # "<content>_<copy>": copies share bytes
+        counts["downloads"] += 1
+        return os.path.getsize(local_path)
+
+    def _ffmpeg(src, dst):
+        time.sleep(ff_ms)
+        counts["ffmpeg"] += 1
+        if "bad" in os.path.basename(src):
+            return False  # files ffmpeg cannot encode: the old path retried them on every pass
+        with open(dst, "wb") as fh:
+            fh.write(b"x" * 4000)
+        return True
+    g["telegram_download_to_file"] = _download
+    g["_compress_secret_video_low"] = _ffmpeg
+    put = g["mega_put_replace"]
+
+    def _put(local_path, *a, **k):
+        counts["uploads"] += 1
+        counts["upload_bytes"] += os.path.getsize(local_path)
+        return put(local_path, *a, **k)
+    g["mega_put_replace"] = _put
+    rnd = random.Random(11)
+    cid = -1004000
+    records = g["get_chat_store"](cid).setdefault("secret_messages", [])
+    total = int(n)
+    for i in range(total):
+        video = i % 5 == 0
+        content = f"{'bad' if video and i % 25 == 0 else ('v' if video else 'p')}{rnd.randint(0, total // 3)}"
+        fid = f"{content}_{i}"
+        records.append({"id": i + 1, "day_key": "2026-10-18", "content_type": "video" if video else "photo",
+                        "file_id": fid, "file_unique_id": content, "content": {}, "source_msg_id": 1000 + i})
+    started = time.perf_counter()
+    for _ in range(int(passes)):
+        g["upload_chat_secrets_to_mega"](cid)
+        pool = g["TRANSCODE_TASK_POOL"]
+        while pool.stats().get("pending") or pool.stats().get("active"):
+            time.sleep(0.02)
+    elapsed = time.perf_counter() - started
+    stored = sum(1 for r in records if r.get("mega_media_path"))
+    counts["rejected"] = g["secret_media_store_stats"]().get("transcode_rejected", 0)
+    counts["distinct"] = len({r["file_unique_id"] for r in records})
+    print(json.dumps({"seconds": elapsed, "stored": stored, "records": total, **counts}))
+    sys.stdout.flush()
+    shutil.rmtree(work, ignore_errors=True)
+    os._exit(0)
+
+
+def bench_secret_media():
+    """Secret media with forwarded duplicates over repeated upload passes: per-record path vs content-addressed blobs."""
+    import json
+    n = int(os.getenv("BENCH_SECRET_RECORDS", "150"))
+    passes = int(os.getenv("BENCH_SECRET_PASSES", "3"))
+    print(f"secret_media: {n} media records (1/5 video, ~1/3 distinct contents), {passes} upload passes "
+          f"(a pass runs after every secret save)")
+    for mode in ("direct", "blobs"):
+        res = subprocess.run([sys.executable, str(R / "BENCH_v199.py"), "_secret_media_child", mode, str(n), str(passes)],
+                             capture_output=True, text=True, check=True)
+        row = json.loads(res.stdout.strip().splitlines()[-1])
+        print(f"  {mode:<7} {row['seconds']:6.2f}s  downloads {row.get('downloads', 0):4}  ffmpeg {row.get('ffmpeg', 0):3}  "
+              f"uploads {row.get('uploads', 0):4} ({row.get('upload_bytes', 0) / 1024:7.0f} KiB)  stored {row['stored']}/{row['records']}  "
+              f"(distinct files {row.get('distinct', 0)}, transcode queue full {row.get('rejected', 0)}x)")
+
+
+def _constitution_child(mode: str, chats: str, per_chat: str, publishes: str):
+    """One process per mode: DATA_CONSTITUTION_INCREMENTAL=0 (full scan per manifest) vs per-chat summaries."""
+    import json, random, logging
+    work = tempfile.mkdtemp(prefix="bench_constitution_")
+    os.makedirs(os.path.join(work, "mega_tmp"), exist_ok=True)
+    os.chdir(work)
+    os.environ["DATA_CONSTITUTION_INCREMENTAL"] = "1" if mode == "incremental" else "0"
+    sys.path.insert(0, str(R))
+    import REPLAY_v199
+    ns = REPLAY_v199.load_runtime(REPLAY_v199.FakeBotApi(0, 0, 0.0, 1, 1), work)
+    logging.getLogger().setLevel(logging.CRITICAL)
+    g = ns["constitution_semantic_manifest_from_live"].__globals__
+    g["log_error"] = lambda msg, *a, **k: print("  error:", str(msg)[:300], file=sys.stderr)
+    rnd = random.Random(11)
+    ids = [-1003000 - i for i in range(int(chats))]
+    for n_chat, cid in enumerate(ids):
+        store = g["get_chat_store"](cid)
+        store["finance_mode"] = True
+        recs = []
+        for i in range(int(per_chat)):
+            day = f"2025-{1 + i * 12 // int(per_chat):02d}-{1 + i % 28:02d}"
+            rec = {"id": i + 1, "amount": rnd.randint(-90000, 90000), "note": f"запись {i}", "day_key": day,
+                   "timestamp": f"{day}T10:00:00", "record_uid": f"{n_chat:04X}{i:08X}", "source_msg_id": 10000 + i}
+            if i % 40 == 0:
+                rec["usd_amount"] = rnd.randint(-90, 90)
+            recs.append(rec)
+        g["SQLITE"].set_cold(cid, "records", recs)
+        for key in ("records", "daily_records"):
+            dict.pop(store, key, None)
+        getattr(store, "_cold_loaded", set()).clear()
+    before, peak_of = _export_rss_reset()
+    build = g["constitution_semantic_manifest_from_live"]
+    started = time.perf_counter()
+    first = build()
+    first_s = time.perf_counter() - started
+    times = []
+    for k in range(int(publishes)):
+        # One finance mutation between publishes: append to one chat, then the usual release (flush + evict).
+        cid = ids[k % len(ids)]
+        store = g["get_chat_store"](cid)
+        store["records"].append({"id": 10 ** 6 + k, "amount": 100 + k, "note": "новая", "day_key": "2025-12-30",
+                                 "timestamp": "2025-12-30T12:00:00", "record_uid": f"NEW{k:08X}", "source_msg_id": 900000 + k})
+        g["_lowram_release_chat"](cid)
+        started = time.perf_counter()
+        last = build()
+        times.append(time.perf_counter() - started)
+    peak = peak_of()
+    verify = g["constitution_verify_incremental_manifest"](repair=False) if mode == "incremental" else {}
+    print(json.dumps({"first_s": first_s, "publish_ms": 1000 * sum(times) / max(1, len(times)),
+                      "before_mb": before / 1024, "peak_mb": peak / 1024,
+                      "records": last.get("total_records"), "first_records": first.get("total_records"),
+                      "hash": last.get("semantic_hash"), "verify_ok": verify.get("ok"),
+                      "stats": g["constitution_semantic_stats"]()}))
+    sys.stdout.flush()
+    shutil.rmtree(work, ignore_errors=True)
+    os._exit(0)
+
+
+def bench_constitution():
+    """Live semantic manifest per snapshot publish: full scan of every chat vs SQLite per-chat summaries + Merkle root."""
+    import json
+    chats = int(os.getenv("BENCH_CONSTITUTION_CHATS", "200"))
+    per_chat = int(os.getenv("BENCH_CONSTITUTION_RECORDS", "500"))
+    publishes = int(os.getenv("BENCH_CONSTITUTION_PUBLISHES", "20"))
+    print(f"constitution: {chats} finance chats x {per_chat} records in SQLite (cold); {publishes} publishes, one changed chat before each")
+    hashes = {}
+    for mode in ("full", "incremental"):
+        res = subprocess.run([sys.executable, str(R / "BENCH_v199.py"), "_constitution_child", mode, str(chats), str(per_chat), str(publishes)],
+                             capture_output=True, text=True, check=True)
+        row = json.loads(res.stdout.strip().splitlines()[-1])
+        hashes[mode] = row["hash"]
+        st = row.get("stats") or {}
+        print(f"  {mode:<11} first {row['first_s']:6.2f}s  per publish {row['publish_ms']:8.1f} ms  peak RSS {row['peak_mb']:6.1f} MB "
+              f"(+{row['peak_mb'] - row['before_mb']:6.1f})  records {row['records']}  recomputed {st.get('chats_recomputed', 0)} "
+              f"cached {st.get('chats_cached', 0)}" + (f"  verify ok={row['verify_ok']}" if mode == "incremental" else ""))
+    print(f"  same semantic_hash: {hashes['full'] == hashes['incremental']}")
+
+
+def _ledger_child(mode: str, events: str, put_ms: str):
+    """One process per mode: one MEGA put per ledger event vs local segments shipped as one object."""
+    import json, logging
+    work = tempfile.mkdtemp(prefix="bench_ledger_")
+    os.makedirs(os.path.join(work, "mega_tmp"), exist_ok=True)
+    os.chdir(work)
+    os.environ["CONSTITUTION_LEDGER_SEGMENTS"] = "1" if mode == "segments" else "0"
+    sys.path.insert(0, str(R))
+    import REPLAY_v199
+    ns = REPLAY_v199.load_runtime(REPLAY_v199.FakeBotApi(0, 0, 0.0, 1, 1), work)
+    logging.getLogger().setLevel(logging.CRITICAL)
+    g = ns["constitution_ledger_append"].__globals__
+    g["log_error"] = lambda msg, *a, **k: print("  error:", str(msg)[:300], file=sys.stderr)
+    ops = {"put": 0, "other": 0}
+    real_run = g["_mega_run"]
+
+    def _run(cmd, args, *a, **k):
+        # Every remote command pays a MEGA-like round trip; puts are what the ledger path multiplies.
+        ops["put" if cmd == "mega-put" else "other"] += 1
+        time.sleep(float(put_ms) / 1000.0)
+        return real_run(cmd, args, *a, **k)
+    g["_mega_run"] = _run
+    # A bulk import inside one durable Telegram update: the finalizer waits for every token.
+    g["_current_telegram_update_context"] = lambda: {"update_id": 424242}
+    g["mega_task_known_state"] = lambda key: "running"
+    g["_TELEGRAM_UPDATE_CONTEXT"].value = {}
+    ops["put"] = ops["other"] = 0
+    started = time.perf_counter()
+    for i in range(int(events)):
+        g["constitution_ledger_append"](-100500, "add", {"id": i, "amount": 100 + i}, {}, f"h{i}", 1000 + i)
+    appended = time.perf_counter() - started
+    tokens = list(g["_TELEGRAM_UPDATE_CONTEXT"].value.get("constitution_ledger_tokens") or [])
+    ready, detail = False, ""
+    while time.perf_counter() - started < 600:
+        ready, detail = g["constitution_ledger_tokens_ready"](tokens)
+        if ready or detail.startswith("failed"):
+            break
+        time.sleep(0.02)
+    done = time.perf_counter() - started
+    high = g["_constitution_ledger_highwater"]()
+    objects = sum(len([n for n in files if n.startswith("ledger_")]) for _d, _s, files in os.walk(os.path.join(work, "mega")))
+    print(json.dumps({"append_s": appended, "ready_s": done, "ready": ready, "tokens": len(tokens), "puts": ops["put"],
+                      "other": ops["other"], "objects": objects, "highwater": int(high.get("seq") or 0)}))
+    sys.stdout.flush()
+    shutil.rmtree(work, ignore_errors=True)
+    os._exit(0)
+
+
+def bench_ledger():
+    """Bulk finance import under one durable update: per-event ledger puts vs sealed segments + seq-range index."""
+    import json
+    events = int(os.getenv("BENCH_LEDGER_EVENTS", "500"))
+    put_ms = int(os.getenv("BENCH_LEDGER_MEGA_MS", "40"))
+    print(f"ledger: {events} finance mutations in one durable update; every MEGA command costs {put_ms} ms")
+    for mode in ("per_event", "segments"):
+        res = subprocess.run([sys.executable, str(R / "BENCH_v199.py"), "_ledger_child", mode, str(events), str(put_ms)],
+                             capture_output=True, text=True, check=True)
+        row = json.loads(res.stdout.strip().splitlines()[-1])
+        print(f"  {mode:<9} append {row['append_s']:6.2f}s  all tokens in MEGA {row['ready_s']:6.2f}s (ready={row['ready']})  "
+              f"mega-put {row['puts']:4}  other cmds {row['other']:4}  ledger objects {row['objects']:4}  highwater {row['highwater']}")
+
+
+def bench_finance_rows():
+    """LOW-RAM flush of one big ledger: full digest reconcile on every flush vs dirty-driven flush."""
+    import json, sqlite3, hashlib, re, random
+    from datetime import datetime, timezone
+    n = int(os.getenv("BENCH_FINANCE_ROWS", "100000"))
+    reps = int(os.getenv("BENCH_FINANCE_ROWS_REPS", "5"))
+    ns = base_ns()
+    ns.update(json=json, sqlite3=sqlite3, hashlib=hashlib, re=re, datetime=datetime, timezone=timezone)
+    load("00_core.py", ["_env_bool", "_env_int", "FINANCE_ROW_LEDGERS", "FINANCE_ROW_DAILY", "FINANCE_MSG_FIELDS",
+                        "_finance_msg_fields", "_finance_row_digest", "_finance_row_key", "FINANCE_ROW_POS_GAP",
+                        "_finance_row_prepare", "_finance_row_spread", "_finance_row_positions", "_finance_rows_plan",
+                        "SQLiteState", "_LOWRAM_LOCK", "_LOWRAM_STATS", "FINANCE_ROW_SYNC_INCREMENTAL", "FINANCE_ROW_SYNC_FULL_EVERY",
+                        "FINANCE_ROW_CHECK_MAX_ROWS", "FINANCE_ROW_CHECK_SECONDS", "_FINANCE_ROW_LOCK", "_FINANCE_ROW_STATE",
+                        "_FINANCE_ROW_LOCAL", "_finance_row_fp", "_finance_rows_seed", "_finance_rows_advance", "finance_rows_note",
+                        "finance_rows_check", "finance_rows_release", "_finance_rows_full", "_finance_rows_flush"], ns)
+    ns["FINANCE_ROW_SYNC_FULL_EVERY"] = 0
+
+    class TimedLock:
+        """SQLITE.lock с учётом времени удержания."""
+        def __init__(self):
+            self.lock = threading.RLock(); self.held = 0.0; self.depth = 0; self.since = 0.0
+        def __enter__(self):
+            self.lock.acquire(); self.depth += 1
+            if self.depth == 1:
+                self.since = time.perf_counter()
+            return self
+        def __exit__(self, *exc):
+            self.depth -= 1
+            if self.depth == 0:
+                self.held += time.perf_counter() - self.since
+            self.lock.release()
+
+    rnd = random.Random(29)
+    cid = -100777
+    days = [f"2026-{m:02d}-{d:02d}" for m in range(1, 13) for d in range(1, 29)]
+    records = [{"id": i + 1, "record_uid": f"{i + 1:012X}", "amount": rnd.randint(-5000, 5000), "note": f"row {i}",
+                "day_key": days[i * len(days) // n], "timestamp": f"{days[i * len(days) // n]}T12:00:00",
+                "source_msg_id": 10 + i, "owner": "bench"} for i in range(n)]
+    tmp = tempfile.mkdtemp(prefix="bench_rows_")
+    try:
+        sq = ns["SQLITE"] = ns["SQLiteState"](os.path.join(tmp, "bot.sqlite3"))
+        sq.lock = TimedLock()
+        sq.sync_finance_rows(cid, "records", records)
+        placed = []
+        records = sq.get_finance_rows(cid, "records", placed=placed)  # как ColdChatStore._ensure_cold
+        ns["_finance_rows_seed"](cid, "records", records, placed, sq.finance_generation(cid))
+        print(f"finance_rows: one ledger of {n} records in SQLite (low-RAM flush); {reps} flushes per case")
+        uid = [n]
+
+        def mutate(kind):
+            if kind == "edit":
+                rec = records[rnd.randrange(n)]
+                rec["note"] = f"edited {rnd.random()}"
+                ns["finance_rows_note"](cid, rec)
+            elif kind == "insert":
+                uid[0] += 1
+                at = len(records) // 2
+                day = records[at]["day_key"]
+                records.insert(at, {"id": uid[0], "record_uid": f"{uid[0]:012X}", "amount": 1, "note": "back-dated",
+                                    "day_key": day, "timestamp": f"{day}T12:00:00", "source_msg_id": 10 ** 7 + uid[0]})
+                return len(records) - at - 1
+            elif kind == "delete":
+                rec = records.pop(rnd.randrange(len(records)))
+                ns["finance_rows_note"](cid, None, "records", True, f"uid:{rec['record_uid']}")
+            return 0
+
+        for kind in ("no-op", "edit", "insert", "delete"):
+            line = []
+            for label, full in (("full", True), ("dirty", False)):
+                spent = 0.0; held = 0.0; moved = 0; written = 0; dense = 0
+                for _ in range(reps):
+                    dense += mutate(kind)
+                    sq.lock.held = 0.0
+                    started = time.perf_counter()
+                    res = ns["_finance_rows_flush"](cid, "records", records, full=full)
+                    spent += time.perf_counter() - started; held += sq.lock.held
+                    moved += res["moves"]; written += res["upserts"]
+                line.append(f"{label} {spent / reps * 1000:7.1f} ms (lock {held / reps * 1000:5.1f} ms, "
+                            f"rows {written / reps:.0f} written {moved / reps:.0f} moved)")
+            extra = f"   dense pos would move {dense // reps} rows per insert" if kind == "insert" else ""
+            print(f"  {kind:7} " + "   ".join(line) + extra)
+        # Правка мимо delta_track_record: flush финализации (finance_rows_check) находит её по отпечатку строки.
+        records[rnd.randrange(len(records))]["note"] = "untracked edit"
+        ns["finance_rows_check"](cid)
+        started = time.perf_counter()
+        res = ns["_finance_rows_flush"](cid, "records", records)
+        print(f"  untracked edit, finalize flush with fingerprint check: {(time.perf_counter() - started) * 1000:.1f} ms, "
+              f"rows {res['upserts']} written")
+        assert res["upserts"] == 1
+        stored = sq.get_finance_rows(cid, "records")
+        same = [json.dumps(r, sort_keys=True) for r in stored] == [json.dumps(r, sort_keys=True) for r in records]
+        check = sq.sync_finance_rows(cid, "records", records)
+        print(f"  on disk == in RAM (order and content): {same}; full reconcile afterwards: "
+              f"{check['upserts']} written {check['moves']} moved {check['deletes']} deleted; stats "
+              f"{ {k: v for k, v in ns['_LOWRAM_STATS'].items() if k.startswith(('row_sync', 'row_check'))} }")
+        assert same and not (check["upserts"] or check["moves"] or check["deletes"])
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _finance_edits_child():
+    """Full runtime, LOW-RAM + incremental deltas: an in-place amount edit via handle_finance_edit."""
+    import json, logging, types
+    work = tempfile.mkdtemp(prefix="bench_finance_edits_")
+    os.makedirs(os.path.join(work, "mega_tmp"), exist_ok=True)
+    os.chdir(work)
+    sys.path.insert(0, str(R))
+    import REPLAY_v199
+    ns = REPLAY_v199.load_runtime(REPLAY_v199.FakeBotApi(0, 0, 0.0, 1, 1), work)
+    logging.getLogger().setLevel(logging.CRITICAL)
+    g = ns["handle_finance_edit"].__globals__
+    cid = -1001000000077
+    REPLAY_v199.prepare(ns, [cid], [])
+    g["MEGA_DELTA_VERIFY_EVERY"] = 0
+    day = g["finance_today_key"]()
+    now = int(time.time())
+    for i in range(5):
+        with g["locked_chat"](cid):
+            g["add_record_to_chat"](cid, 1000 * (i + 1), f"r{i}", REPLAY_v199.OWNER_ID,
+                                    source_msg=types.SimpleNamespace(message_id=500 + i, date=now + i), day_key=day)
+    g["_finance_changed_now"](cid, day)
+    store = g["get_chat_store"](cid)
+    index_vs_scan = lambda: [g["calc_day_balance"](store, day), g["_calc_day_balance_scan"](store, day)]
+    day_balances = [index_vs_scan()]   # also builds the balance index before the edits
+    _payload, baseline = g["_build_delta_payload"]([cid], {})
+    g["_commit_delta_baseline"](baseline)
+    inc_before = g["_DELTA_TRACK_STATS"]["incremental_chats"]
+    msg = types.SimpleNamespace(chat=types.SimpleNamespace(id=cid), message_id=502, text="2500 обед", caption=None,
+                                from_user=types.SimpleNamespace(id=REPLAY_v199.OWNER_ID))
+    edited = bool(g["handle_finance_edit"](msg))
+    g["_finance_changed_now"](cid, day)
+    balances = [[store["balance"], sum(r["amount"] for r in store["records"])]]
+    day_balances.append(index_vs_scan())
+    payload, baseline = g["_build_delta_payload"]([cid], {})
+    g["_commit_delta_baseline"](baseline)
+    ups = ((payload or {}).get("chat_changes") or {}).get(str(cid), {}).get("upserts") or []
+    # A mutation site that still bypasses delta_track_record: the next finalize must not trust the tracked units.
+    store["records"][0]["amount"] = 100000.0
+    g["_finance_changed_now"](cid, day)
+    balances.append([store["balance"], sum(r["amount"] for r in store["records"])])
+    day_balances.append(index_vs_scan())
+    # A ledger above FINANCE_RECORDS_UNITS_CHECK_MAX_ROWS / FINANCE_ROW_CHECK_MAX_ROWS that was checked recently:
+    # the finalizer skips the units and row checks; the index guard still compares its total with the ledger
+    # total, the audit verifies the rest.
+    row_check_max = g["FINANCE_ROW_CHECK_MAX_ROWS"]
+    g["FINANCE_RECORDS_UNITS_CHECK_MAX_ROWS"] = g["FINANCE_ROW_CHECK_MAX_ROWS"] = 0
+    g["_FINANCE_ORDER_STATE"][cid]["checked_at"] = time.monotonic()
+    for row_state in g["_FINANCE_ROW_STATE"].values():
+        row_state["checked_at"] = time.monotonic()
+    store["records"][1]["amount"] = 77777.0
+    g["_finance_changed_now"](cid, day)
+    day_balances.append(index_vs_scan())
+    audit = g["finance_records_audit"](cid)
+    day_balances.append(index_vs_scan())
+    # A non-amount field edited in place without delta_track_record: the finalize flush still writes the row.
+    g["FINANCE_ROW_CHECK_MAX_ROWS"] = row_check_max
+    store["records"][2]["note"] = "untracked note"
+    g["_finance_changed_now"](cid, day)
+    dump = lambda rows: [json.dumps(r, sort_keys=True, ensure_ascii=False) for r in rows]
+    rows_same = dump(g["SQLITE"].get_finance_rows(cid, "records")) == dump(store["records"])
+    order = g["finance_records_order_stats"]()
+    print(json.dumps({
+        "edited": edited,
+        "incremental": g["_DELTA_TRACK_STATS"]["incremental_chats"] - inc_before,
+        "upserts": [[u["key"], u["record"].get("amount"), u["record"].get("note")] for u in ups],
+        "balances": balances,
+        "units_checks": order.get("units_checks", 0), "units_drift": order.get("units_drift", 0),
+        "audits_queued": order.get("audits_queued", 0),
+        "day_balances": day_balances, "audit": audit, "rows_same": rows_same,
+        "rows": {k: v for k, v in g["_LOWRAM_STATS"].items() if k.startswith(("row_sync", "row_check"))},
+        "index": {k: v for k, v in g["FINANCE_BALANCE_INDEX"].stats.items()
+                  if k in ("incremental", "invalidations", "guard_rebuilds", "verify_runs", "verify_mismatches")},
+    }))
+    sys.stdout.flush()
+    shutil.rmtree(work, ignore_errors=True)
+    os._exit(0)
+
+
+def bench_finance_edits():
+    """In-place finance edits must reach every incremental tracker (delta, order, balance index, rows)."""
+    import json
+    res = subprocess.run([sys.executable, str(R / "BENCH_v199.py"), "_finance_edits_child"],
+                         capture_output=True, text=True, check=True)
+    row = json.loads(res.stdout.strip().splitlines()[-1])
+    print("finance_edits: 5 records, amount of one edited in place via handle_finance_edit")
+    print(f"  edited {row['edited']}  incremental delta builds {row['incremental']}  upserts {row['upserts']}")
+    assert row["edited"] and row["incremental"] == 1
+    assert [[amount, note] for _key, amount, note in row["upserts"]] == [[-2500.0, "обед"]]
+    print(f"  balance vs sum of records: after edit {row['balances'][0]}, after untracked edit {row['balances'][1]}  "
+          f"units checks {row['units_checks']} drift {row['units_drift']}  audits queued {row['audits_queued']}")
+    assert all(balance == total for balance, total in row["balances"])
+    assert row["units_drift"] == 1 and row["audits_queued"] == 1
+    print(f"  day balance index vs scan: built {row['day_balances'][0]}, after edit {row['day_balances'][1]}, after untracked "
+          f"edit {row['day_balances'][2]}, big-ledger untracked edit {row['day_balances'][3]}, after audit {row['day_balances'][4]}")
+    print(f"  audit drift {row['audit']}  index {row['index']}")
+    assert all(index == scan for index, scan in row["day_balances"])
+    assert row["index"]["guard_rebuilds"] >= 1 and row["index"]["verify_runs"] >= 1 and not row["index"]["verify_mismatches"]
+    print(f"  untracked note edit + finalize: SQLite rows == RAM {row['rows_same']}  row flush {row['rows']}")
+    assert row["rows_same"] and row["rows"]["row_check_drift"] >= 1
+
+
+BENCHES = {
+    "mega_session": bench_mega_session,
+    "mega_tasks": bench_mega_tasks,
+    "wal": bench_wal,
+    "pool": bench_pool,
+    "timers": bench_timers,
+    "forward_map": bench_forward_map,
+    "global_backup": bench_global_backup,
+    "balance_index": bench_balance_index,
+    "records_incremental": bench_records_incremental,
+    "root_sections": bench_root_sections,
+    "view_cache": bench_view_cache,
+    "callback_tokens": bench_callback_tokens,
+    "reminders": bench_reminders,
+    "msg_index": bench_msg_index,
+    "finance_rows": bench_finance_rows,
+    "ingest": bench_ingest,
+    "web": bench_web,
+    "sheets": bench_sheets,
+    "export": bench_export,
+    "secret_media": bench_secret_media,
+    "constitution": bench_constitution,
+    "ledger": bench_ledger,
+    "finance_edits": bench_finance_edits,
+}
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["_global_backup_child"]:
+        _global_backup_child(*sys.argv[2:5])
+        raise SystemExit(0)
+    if sys.argv[1:2] == ["_export_child"]:
+        _export_child(*sys.argv[2:6])
+    if sys.argv[1:2] == ["_secret_media_child"]:
+        _secret_media_child(*sys.argv[2:5])
+    if sys.argv[1:2] == ["_constitution_child"]:
+        _constitution_child(*sys.argv[2:6])
+    if sys.argv[1:2] == ["_ledger_child"]:
+        _ledger_child(*sys.argv[2:5])
+    if sys.argv[1:2] == ["_finance_edits_child"]:
+        _finance_edits_child()
+    selected = sys.argv[1:] or list(BENCHES)
+    for key in selected:
+        if key not in BENCHES:
+            raise SystemExit(f"unknown benchmark {key!r}; known: {', '.join(BENCHES)}")
+        BENCHES[key]()
@@ -0,0 +1,519 @@
+# v199 offline replay
+"""Offline replay / load test of the whole bot runtime.
+
+Replays recorded or synthetic Telegram updates into ``telegram_webhook`` (via the
+Flask test client, so the real admit → durable card → lane path runs).  The Bot API
+is a local fake that records every call and injects latency and 429s; MEGA is a
+local directory (MEGA_BACKEND=local).  Nothing leaves the machine, all state lives
+in a temporary working directory.
+
+    python REPLAY_v199.py                               # synthetic mix, 500 updates
+    python REPLAY_v199.py --updates dump.jsonl          # recorded updates, one JSON per line
+    python REPLAY_v199.py --json v199.json              # save the report
+    python REPLAY_v199.py --compare v198.json           # exit 1 on regression vs a saved report
+
+Reports per-lane queue wait, end-to-end latency percentiles, Telegram calls per
+update and peak RSS.  Needs the runtime requirements (telebot, flask, requests).
+"""
+from pathlib import Path
+import argparse, json, logging, os, random, re, resource, runpy, sys, tempfile, threading, time
+from collections import defaultdict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlsplit
+
+R = Path(__file__).resolve().parent
+OWNER_ID = 111
+BOT_ID = 5550001
+
+
+# ─── fake Bot API ─────────────────────────────────────────────────────────────
+
+class FakeBotApi:
+    """Local Bot API: plausible results, per-method call log, latency and 429 injection."""
+
+    def __init__(self, latency_ms: float, jitter_ms: float, rate_429: float, retry_after: int, seed: int):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = defaultdict(int)
+        self.throttled = defaultdict(int)
+        self.next_mid = 700000
+        api = self
+
+        class Server(ThreadingHTTPServer):
+            request_queue_size = 256
+            daemon_threads = True
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *a):
+                pass
+
+            def _reply(self, status: int, body: bytes, ctype: str = "application/json"):
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith("/file/"):
+                    api.count("<download>")
+                    return self._reply(200, b"\xff\xd8replay" * 64, "application/octet-stream")
+                self.do_POST()
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                parts = urlsplit(self.path)
+                method = parts.path.rstrip("/").rsplit("/", 1)[-1]
+                params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+                params.update(api.parse_body(self.headers.get("Content-Type") or "", raw))
+                status, payload = api.handle(method, params)
+                self._reply(status, json.dumps(payload).encode("utf-8"))
+
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.port = self.server.server_address[1]
+        self.base = f"http://127.0.0.1:{self.port}"
+        threading.Thread(target=self.server.serve_forever, name="replay-fake-api", daemon=True).start()
+
+    @staticmethod
+    def parse_body(ctype: str, raw: bytes) -> dict:
+        if not raw:
+            return {}
+        if "json" in ctype:
+            try:
+                body = json.loads(raw)
+                return body if isinstance(body, dict) else {}
+            except ValueError:
+                return {}
+        if "urlencoded" in ctype:
+            return {k: v[-1] for k, v in parse_qs(raw.decode("utf-8", "replace")).items()}
+        if "multipart" in ctype:
+            out = {}
+            for name, value in re.findall(rb'name="([^"]+)"\r\n\r\n([^\r]{0,256})\r\n', raw):
+                out[name.decode()] = value.decode("utf-8", "replace")
+            return out
+        return {}
+
+    def count(self, method: str):
+        with self.lock:
+            self.calls[method] += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"calls": dict(self.calls), "throttled": dict(self.throttled)}
+
+    def _mid(self) -> int:
+        with self.lock:
+            self.next_mid += 1
+            return self.next_mid
+
+    def _message(self, params: dict, **extra) -> dict:
+        try:
+            chat_id = int(params.get("chat_id") or OWNER_ID)
+        except (TypeError, ValueError):
+            chat_id = OWNER_ID
+        msg = {"message_id": int(params.get("message_id") or 0) or self._mid(), "date": int(time.time()),
+               "chat": _chat(chat_id), "from": {"id": BOT_ID, "is_bot": True, "first_name": "ReplayBot"}}
+        if params.get("text") is not None:
+            msg["text"] = str(params.get("text"))
+        if params.get("caption") is not None:
+            msg["caption"] = str(params.get("caption"))
+        msg.update(extra)
+        return msg
+
+    def handle(self, method: str, params: dict):
+        self.count(method)
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.rnd.uniform(0, self.jitter))
+        if method not in ("getMe", "getUpdates", "getWebhookInfo") and self.rnd.random() < self.rate_429:
+            with self.lock:
+                self.throttled[method] += 1
+            return 429, {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after "
+                         f"{self.retry_after}", "parameters": {"retry_after": self.retry_after}}
+        low = method.lower()
+        if low == "getme":
+            result = {"id": BOT_ID, "is_bot": True, "first_name": "ReplayBot", "username": "replay_bot"}
+        elif low in ("getupdates", "getchatadministrators"):
+            result = []
+        elif low == "getwebhookinfo":
+            result = {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        elif low == "getchat":
+            result = _chat(int(params.get("chat_id") or OWNER_ID))
+        elif low == "getchatmember":
+            result = {"status": "administrator", "can_delete_messages": True,
+                      "user": {"id": int(params.get("user_id") or OWNER_ID), "is_bot": False, "first_name": "Owner"}}
+        elif low == "getfile":
+            fid = str(params.get("file_id") or "f")
+            result = {"file_id": fid, "file_unique_id": fid[-16:], "file_size": 1024, "file_path": f"photos/{fid[-16:]}.jpg"}
+        elif low == "copymessage":
+            result = {"message_id": self._mid()}
+        elif low in ("copymessages", "forwardmessages"):
+            ids = params.get("message_ids") or "[]"
+            result = [{"message_id": self._mid()} for _ in (json.loads(ids) if isinstance(ids, str) else ids)]
+        elif low == "sendmediagroup":
+            media = params.get("media") or "[]"
+            result = [self._message(params) for _ in (json.loads(media) if isinstance(media, str) else media)]
+        elif low.startswith("send") or low == "forwardmessage":
+            result = self._message(params)
+        elif low.startswith("edit"):
+            result = True if params.get("inline_message_id") else self._message(params, edit_date=int(time.time()))
+        else:
+            result = True
+        return 200, {"ok": True, "result": result}
+
+
+def _chat(chat_id: int) -> dict:
+    if chat_id > 0:
+        return {"id": chat_id, "type": "private", "first_name": "Owner"}
+    return {"id": chat_id, "type": "supergroup", "title": f"replay {chat_id}"}
+
+
+# ─── synthetic updates ────────────────────────────────────────────────────────
+
+FINANCE_WORDS = ["кофе", "такси", "обед", "аренда", "связь", "продукты", "бензин", "зарплата"]
+CALLBACKS = ["none", "info_queues"]
+
+
+def synthetic_updates(count: int, chats: int, seed: int):
+    """Смесь по умолчанию: finance-текст 45%, альбомы-пересылки 20%, callback 20%, правки 15%."""
+    rnd = random.Random(seed)
+    owner = {"id": OWNER_ID, "is_bot": False, "first_name": "Owner"}
+    finance = [-1001000000000 - i for i in range(chats)]
+    sources = [-1002000000000 - i for i in range(max(1, chats // 4))]
+    sent = []
+    mids = defaultdict(lambda: 1000)
+    out = []
+    now = int(time.time())
+
+    def mid(cid):
+        mids[cid] += 1
+        return mids[cid]
+
+    while len(out) < count:
+        roll = rnd.random()
+        if roll < 0.45 or (roll >= 0.80 and not sent):
+            cid = rnd.choice(finance)
+            amount = rnd.choice([1, 1, 1, -1]) * rnd.randint(50, 20000)
+            msg = {"message_id": mid(cid), "date": now, "chat": _chat(cid), "from": owner,
+                   "text": f"{amount} {rnd.choice(FINANCE_WORDS)}"}
+            sent.append(msg)
+            out.append({"message": msg})
+        elif roll < 0.65:
+            cid = rnd.choice(sources)
+            group = f"replay{len(out)}"
+            for i in range(rnd.randint(2, 4)):
+                uid = f"AQAD{len(out):08d}{i}"
+                out.append({"message": {
+                    "message_id": mid(cid), "date": now, "chat": _chat(cid), "from": owner, "media_group_id": group,
+                    "forward_origin": {"type": "user", "date": now - 60, "sender_user": owner}, "forward_date": now - 60,
+                    "photo": [{"file_id": f"AgAC{uid}s", "file_unique_id": f"{uid}s", "width": 90, "height": 90, "file_size": 1200},
+                              {"file_id": f"AgAC{uid}m", "file_unique_id": f"{uid}m", "width": 800, "height": 600, "file_size": 48000}],
+                    **({"caption": "альбом"} if i == 0 else {})}})
+        elif roll < 0.80:
+            out.append({"callback_query": {
+                "id": str(9000000 + len(out)), "from": owner, "chat_instance": "replay", "data": rnd.choice(CALLBACKS),
+                "message": {"message_id": mid(OWNER_ID), "date": now, "chat": _chat(OWNER_ID),
+                            "from": {"id": BOT_ID, "is_bot": True, "first_name": "ReplayBot"}, "text": "меню"}}})
+        else:
+            base = rnd.choice(sent[-200:])
+            edited = dict(base, edit_date=now + 5, text=f"{rnd.randint(50, 20000)} {rnd.choice(FINANCE_WORDS)}")
+            out.append({"edited_message": edited})
+    out = out[:count]
+    for i, upd in enumerate(out):
+        upd["update_id"] = 100000 + i
+    return out, finance, sources
+
+
+def recorded_updates(path: str):
+    out = []
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if line:
+                out.append(json.loads(line))
+    for i, upd in enumerate(out):
+        upd["update_id"] = 100000 + i  # свежие id: durable-маркеры прошлого прогона не мешают
+    return out
+
+
+# ─── runtime ──────────────────────────────────────────────────────────────────
+
+class _ErrorCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.count = 0
+        self.samples = []
+
+    def emit(self, record):
+        self.count += 1
+        if len(self.samples) < 5:
+            self.samples.append(record.getMessage()[:200])
+
+
+def load_runtime(api: FakeBotApi, workdir: str) -> dict:
+    os.environ.update({
+        "B_T": os.getenv("REPLAY_BOT_TOKEN", "123456:REPLAY"), "ID": str(OWNER_ID),
+        "MEGA_ENABLED": "1", "MEGA_BACKEND": "local",
+        "MEGA_LOCAL_BACKEND_DIR": os.path.join(workdir, "mega"), "MEGA_LOCAL_TMP_DIR": os.path.join(workdir, "mega_tmp"),
+        "KEEP_ALIVE_ENABLED": "0", "WEBHOOK_URL": "", "TELEGRAM_INGEST_MODE": "webhook",
+        "TELEGRAM_API_BASE": api.base,
+    })
+    from telebot import apihelper
+    apihelper.API_URL = api.base + "/bot{0}/{1}"
+    apihelper.FILE_URL = api.base + "/file/bot{0}/{1}"
+    return runpy.run_path(str(R / "bot.py"), run_name="replay")
+
+
+def prepare(ns: dict, finance_chats, sources):
+    """Steady state: чаты уже известны (v164 circles), finance включён, источники альбомов связаны."""
+    ensure = ns["_v164_ensure_isolated_chat"]
+    for cid in finance_chats:
+        try:
+            if cid != OWNER_ID:
+                ensure(cid, 1, actor_user_id=OWNER_ID, source="replay")
+            ns["set_finance_mode"](cid, True)
+        except Exception as e:
+            print(f"  finance chat {cid}: {e}")
+    rules = ns["data"].setdefault("forward_rules", {})
+    for i, src in enumerate(sources):
+        dst = finance_chats[i % len(finance_chats)]
+        try:
+            ensure(src, 2, dst, actor_user_id=OWNER_ID, source="replay")  # одна семья → пересылка разрешена
+        except Exception as e:
+            print(f"  source chat {src}: {e}")
+        rules.setdefault(str(src), {})[str(dst)] = "oneway_to"
+    ns["runtime_mark_ready"]("replay")
+
+
+def lane_pools(ns: dict) -> list:
+    seen, out = set(), []
+    for value in list(ns.values()):
+        if isinstance(value, ns["KeyedTaskPool"]) and id(value) not in seen:
+            seen.add(id(value))
+            out.append(value)
+    return out
+
+
+def _pct(values, q: float) -> float:
+    if not values:
+        return 0.0
+    return round(values[min(len(values) - 1, int(len(values) * q))], 1)
+
+
+def drain(ns: dict, pools: list, timeout: float) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        busy = sum(int(p.stats().get("pending", 0)) + int(p.stats().get("active", 0)) for p in pools)
+        try:
+            busy += int(ns["UPDATE_DISPATCHER"].stats().get("pending", 0))
+        except Exception:
+            pass
+        if not busy:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def replay(ns: dict, updates: list, concurrency: int, timeout: float) -> dict:
+    """Telegram-подобная отдача: до ``concurrency`` соединений, 5xx повторяется с паузой."""
+    path = ns["WEBHOOK_ROUTE_PATH"]
+    headers = {}
+    if ns.get("WEBHOOK_HEADER_SECRET_ENABLED"):
+        headers["X-Telegram-Bot-Api-Secret-Token"] = ns["WEBHOOK_HEADER_SECRET"]
+    queue = list(reversed(updates))
+    qlock = threading.Lock()
+    latencies = []
+    codes = defaultdict(int)
+    by_type = defaultdict(list)
+    deadline = time.time() + timeout
+
+    def worker():
+        client = ns["app"].test_client()
+        while True:
+            with qlock:
+                if not queue:
+                    return
+                upd = queue.pop()
+            kind = next((k for k in ("message", "edited_message", "callback_query") if k in upd), "other")
+            t0 = time.perf_counter()
+            while True:
+                resp = client.post(path, json=upd, headers=headers)
+                with qlock:
+                    codes[resp.status_code] += 1
+                if resp.status_code < 500 or time.time() > deadline:
+                    break
+                time.sleep(0.2)
+            ms = (time.perf_counter() - t0) * 1000.0
+            with qlock:
+                latencies.append(ms)
+                by_type[kind].append(ms)
+
+    threads = [threading.Thread(target=worker, name=f"replay-client-{i}", daemon=True) for i in range(concurrency)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    acked = time.perf_counter() - t0
+    drained = drain(ns, lane_pools(ns), max(5.0, deadline - time.time()))
+    total = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "updates": len(updates), "acked_seconds": round(acked, 2), "seconds": round(total, 2), "drained": drained,
+        "updates_per_second": round(len(updates) / total, 1) if total else 0.0,
+        "http": {str(k): v for k, v in sorted(codes.items())},
+        "e2e_ms": {"p50": _pct(latencies, 0.50), "p95": _pct(latencies, 0.95), "p99": _pct(latencies, 0.99),
+                   "max": round(latencies[-1], 1) if latencies else 0.0},
+        "e2e_by_type_p95_ms": {k: _pct(sorted(v), 0.95) for k, v in sorted(by_type.items())},
+    }
+
+
+def dir_usage(root: str) -> dict:
+    files = size = 0
+    for base, _dirs, names in os.walk(root):
+        for name in names:
+            try:
+                size += os.path.getsize(os.path.join(base, name))
+                files += 1
+            except OSError:
+                pass
+    return {"files": files, "bytes": size}
+
+
+def build_report(ns: dict, api: FakeBotApi, run: dict, errors: _ErrorCounter, workdir: str, rss_boot_mb: float) -> dict:
+    lanes = {}
+    for pool in lane_pools(ns):
+        row = pool.stats()
+        if not row.get("submitted"):
+            continue
+        lanes[row["name"]] = {k: row.get(k) for k in ("workers", "submitted", "completed", "failed", "rejected",
+                                                     "wait_p50_ms", "wait_p95_ms", "wait_p99_ms", "run_p95_ms")}
+    tg = api.snapshot()
+    n = max(1, run["updates"])
+    try:
+        dispatcher = ns["UPDATE_DISPATCHER"].stats()
+    except Exception:
+        dispatcher = {}
+    return dict(run, **{
+        "lanes": lanes,
+        "telegram": {"calls": sum(tg["calls"].values()), "per_update": round(sum(tg["calls"].values()) / n, 2),
+                     "by_method": dict(sorted(tg["calls"].items(), key=lambda kv: -kv[1])),
+                     "throttled_429": sum(tg["throttled"].values())},
+        "rss_mb": {"boot": rss_boot_mb, "peak": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)},
+        "errors": {"count": errors.count, "samples": errors.samples},
+        "dispatcher": {k: v for k, v in dispatcher.items() if isinstance(v, (int, float, str))},
+        "mega_local": dir_usage(os.path.join(workdir, "mega")),
+    })
+
+
+def print_report(rep: dict):
+    print(f"replay: {rep['updates']} updates in {rep['seconds']} s ({rep['updates_per_second']} upd/s), "
+          f"acked {rep['acked_seconds']} s, drained {rep['drained']}, http {rep['http']}")
+    e = rep["e2e_ms"]
+    print(f"  e2e ms   p50 {e['p50']:8.1f}  p95 {e['p95']:8.1f}  p99 {e['p99']:8.1f}  max {e['max']:8.1f}  "
+          f"by type p95 {rep['e2e_by_type_p95_ms']}")
+    for name, row in sorted(rep["lanes"].items()):
+        print(f"  lane {name:16} n={row['submitted']:6}  wait p50 {row['wait_p50_ms']:7.1f}  p95 {row['wait_p95_ms']:7.1f}  "
+              f"p99 {row['wait_p99_ms']:7.1f} ms  run p95 {row['run_p95_ms']:7.1f} ms  failed {row['failed']} rejected {row['rejected']}")
+    tg = rep["telegram"]
+    top = ", ".join(f"{k} {v}" for k, v in list(tg["by_method"].items())[:8])
+    print(f"  telegram {tg['calls']} calls, {tg['per_update']}/update, 429 injected {tg['throttled_429']}: {top}")
+    print(f"  rss boot {rep['rss_mb']['boot']} MB, peak {rep['rss_mb']['peak']} MB; "
+          f"mega {rep['mega_local']['files']} files / {rep['mega_local']['bytes']} B; errors {rep['errors']['count']}")
+    for sample in rep["errors"]["samples"]:
+        print(f"    ! {sample}")
+
+
+def compare(rep: dict, base: dict, tolerance: float) -> list:
+    """Регрессии против сохранённого отчёта: рост латентности/вызовов/памяти больше ``tolerance``."""
+    checks = [
+        ("e2e p95 ms", rep["e2e_ms"]["p95"], base.get("e2e_ms", {}).get("p95")),
+        ("e2e p99 ms", rep["e2e_ms"]["p99"], base.get("e2e_ms", {}).get("p99")),
+        ("telegram calls/update", rep["telegram"]["per_update"], base.get("telegram", {}).get("per_update")),
+        ("peak rss MB", rep["rss_mb"]["peak"], base.get("rss_mb", {}).get("peak")),
+    ]
+    for name, row in rep["lanes"].items():
+        checks.append((f"lane {name} wait p95 ms", row["wait_p95_ms"], (base.get("lanes", {}).get(name) or {}).get("wait_p95_ms")))
+    bad = []
+    for name, now, was in checks:
+        if was is None:
+            continue
+        # латентности < 5 мс — шум таймера, их сравниваем с абсолютным допуском
+        if now > was * (1.0 + tolerance) and now - was > 5.0:
+            bad.append(f"{name}: {was:g} → {now:g}")
+    if rep["errors"]["count"] > base.get("errors", {}).get("count", 0):
+        bad.append(f"errors: {base.get('errors', {}).get('count', 0)} → {rep['errors']['count']}")
+    if not rep["drained"]:
+        bad.append("lanes did not drain")
+    return bad
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--updates", help="JSONL с записанными update (иначе синтетическая смесь)")
+    ap.add_argument("--count", type=int, default=500)
+    ap.add_argument("--chats", type=int, default=40)
+    ap.add_argument("--concurrency", type=int, default=40, help="одновременные webhook-соединения (Telegram: до 40)")
+    ap.add_argument("--latency-ms", type=float, default=40.0)
+    ap.add_argument("--jitter-ms", type=float, default=20.0)
+    ap.add_argument("--rate-429", type=float, default=0.01)
+    ap.add_argument("--retry-after", type=int, default=1)
+    ap.add_argument("--seed", type=int, default=199)
+    ap.add_argument("--timeout", type=float, default=600.0)
+    ap.add_argument("--json", dest="json_out")
+    ap.add_argument("--compare")
+    ap.add_argument("--tolerance", type=float, default=0.25)
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args(argv)
+
+    # пути — до chdir: runtime до самого выхода пишет журнал/SQLite в текущий каталог
+    updates_path, json_out, compare_path = (os.path.abspath(p) if p else None
+                                            for p in (args.updates, args.json_out, args.compare))
+    api = FakeBotApi(args.latency_ms, args.jitter_ms, args.rate_429, args.retry_after, args.seed)
+    workdir = tempfile.mkdtemp(prefix="replay_v199_")
+    os.chdir(workdir)
+    errors = _ErrorCounter()
+    logging.getLogger().addHandler(errors)
+    ns = load_runtime(api, workdir)
+    if not args.verbose:
+        for handler in logging.getLogger().handlers:
+            if handler is not errors:
+                handler.setLevel(logging.ERROR)
+    rss_boot = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+    if updates_path:
+        updates = recorded_updates(updates_path)
+        finance = sorted({int(u[k]["chat"]["id"]) for u in updates for k in ("message", "edited_message")
+                          if k in u and re.search(r"^\s*[-+]?\d", str(u[k].get("text") or ""))})
+        sources = []
+    else:
+        updates, finance, sources = synthetic_updates(args.count, args.chats, args.seed)
+    prepare(ns, finance or [OWNER_ID], sources)
+    api.calls.clear()
+    api.throttled.clear()
+    errors.count, errors.samples = 0, []
+    print(f"replay: workdir {workdir}, fake Bot API {api.base}, {args.latency_ms:g}±{args.jitter_ms:g} ms, "
+          f"429 rate {args.rate_429:g}, {args.concurrency} connections")
+    run = replay(ns, updates, args.concurrency, args.timeout)
+    rep = build_report(ns, api, run, errors, workdir, rss_boot)
+    print_report(rep)
+    if json_out:
+        Path(json_out).write_text(json.dumps(rep, ensure_ascii=False, indent=2), encoding="utf-8")
+    if compare_path:
+        bad = compare(rep, json.loads(Path(compare_path).read_text(encoding="utf-8")), args.tolerance)
+        for line in bad:
+            print(f"  REGRESSION {line}")
+        if bad:
+            return 1
+        print(f"  no regressions vs {args.compare} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    code = main()
+    sys.stdout.flush()
+    os._exit(code)  # daemon-потоки runtime (heartbeat, MEGA, таймеры) не ждём